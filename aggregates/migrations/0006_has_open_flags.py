@@ -0,0 +1,41 @@
+# Generated by Django 5.2.2 on 2026-10-17 01:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_open_flags(apps, schema_editor):
+    '''
+    Backfill has_open_flags for objects that already have unresolved flags.
+    '''
+    Flag = apps.get_model('flags', 'Flag')
+    for model_name in ['aggregatecount']:
+        model = apps.get_model('aggregates', model_name)
+        flagged = Flag.objects.filter(
+            content_type__app_label='aggregates', content_type__model=model_name, resolved=False
+        ).values_list('object_id', flat=True)
+        model.objects.filter(id__in=flagged).update(has_open_flags=True)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flags', '0002_alter_flag_reason_type'),
+        ('aggregates', '0005_aggregategroup_name'),
+        ('indicators', '0039_indicator_description_alter_indicator_type'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aggregatecount',
+            name='has_open_flags',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='aggregatecount',
+            index=models.Index(condition=models.Q(('has_open_flags', False)), fields=['group'], name='count_unflagged_idx'),
+        ),
+        migrations.RunPython(mark_open_flags, migrations.RunPython.noop),
+    ]
@@ -6,6 +6,7 @@ from projects.models import Task, Project
 from indicators.models import Indicator, Option
 from respondents.models import Respondent, KeyPopulation, DisabilityType, RespondentAttributeType
 from django.contrib.contenttypes.fields import GenericRelation
+from flags.models import OpenFlagsMixin
 User = get_user_model()
 
 
@@ -28,7 +29,7 @@ class AggregateGroup(models.Model):
     
     def __str__(self):
         return self.name if self.name else f"Aggregate for {self.indicator.name} ({self.start}-{self.end})"
-class AggregateCount(models.Model):
+class AggregateCount(OpenFlagsMixin, models.Model):
     '''
     An AggregateCount allows a user to attach a number to a set of demographic breakdowns for aggregated
     reporting of an indicator (assuming an indicator allows for such). It must be linked to an AggregateGroup.
@@ -79,6 +80,7 @@ class AggregateCount(models.Model):
     option= models.ForeignKey(Option, on_delete=models.PROTECT, null=True, blank=True)
     unique_only = models.BooleanField(default=False)
     flags = GenericRelation('flags.Flag', related_query_name='flags')
+    has_open_flags = models.BooleanField(default=False) #kept in sync with flags by flags/signals, used to exclude flagged data from analysis
     
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='count_created_by')
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='count_updated_by')
@@ -88,6 +90,10 @@ class AggregateCount(models.Model):
     class Meta:
         unique_together = ('group', 'sex', 'age_range', 'citizenship',
                            'hiv_status', 'pregnancy', 'disability_type', 'kp_type', 'attribute_type', 'option')
+        indexes = [
+            #analysis only reads unflagged counts
+            models.Index(fields=['group'], condition=models.Q(has_open_flags=False), name='count_unflagged_idx'),
+        ]
     
     def __str__(self):
         return f"Count for {self.group.indicator}"
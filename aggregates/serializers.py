@@ -14,6 +14,7 @@ from flags.serializers import FlagSerializer
 from indicators.models import Indicator, Option, LogicCondition, LogicGroup, Assessment
 from indicators.serializers import IndicatorSerializer, OptionSerializer
 from aggregates.models import AggregateCount, AggregateGroup
+from analysis.utils.rollups import queue_count_rollups, get_group_slice
 from flags.utils import create_flag, resolve_flag
 from flags.models import Flag
 from flags.serializers import FlagSerializer
@@ -320,13 +321,13 @@ class AggregateGroupSerializer(serializers.ModelSerializer):
                 if not find_count:
                     create_flag(instance=count, reason=msg, caused_by=user, reason_type=Flag.FlagReason.MPRE)
                 else:
-                    resolve_flag(count.flags, msg)
+                    resolve_flag(count.flags, msg, count)
                 if find_count:
                     msg = f'Value for this count may not be higher than the corresponding value from {prereq.name}.'
                     if val is not None and (find_count.value is None or val > find_count.value):
                         create_flag(instance=count, reason=msg, caused_by=user, reason_type=Flag.FlagReason.MPRE)
                     else:
-                        resolve_flag(count.flags, msg)
+                        resolve_flag(count.flags, msg, count)
 
     
     def __get_related_counts(self, group):
@@ -356,7 +357,7 @@ class AggregateGroupSerializer(serializers.ModelSerializer):
             'group__project': group.project,
             'group__indicator__in': prereq_inds
         }
-        counts = AggregateCount.objects.filter(**filters).exclude(flags__resolved=False)
+        counts = AggregateCount.objects.filter(**filters).filter(has_open_flags=False)
         counts_map = {}
 
         for c in counts:
@@ -431,13 +432,16 @@ class AggregateGroupSerializer(serializers.ModelSerializer):
                 for row in rows
             ]
             saved_instances = AggregateCount.objects.bulk_create(instances)
-            self.__check_counts(group, saved_instances, user)            
+            self.__check_counts(group, saved_instances, user)
+            #bulk_create doesn't send post_save, so the rollups need to be told about the counts
+            queue_count_rollups({get_group_slice(group)})
         return group
     
     def update(self, instance, validated_data):
         user = self.context.get('request').user if self.context.get('request') else None
         rows = validated_data.pop('counts_data')
         with transaction.atomic():
+            previous_slice = get_group_slice(instance)
             for attr, value in validated_data.items():
                 setattr(instance, attr, value)
             instance.updated_by = user
@@ -448,5 +452,6 @@ class AggregateGroupSerializer(serializers.ModelSerializer):
                 for row in rows
             ]
             saved_instances = AggregateCount.objects.bulk_create(instances)
-            self.__check_counts(instance, saved_instances, user)  
+            self.__check_counts(instance, saved_instances, user)
+            queue_count_rollups({previous_slice, get_group_slice(instance)})
         return instance
\ No newline at end of file
@@ -0,0 +1,49 @@
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from aggregates.models import AggregateCount, AggregateGroup
+from analysis.utils.rollups import refresh_count_rollups, get_group_slice
+
+'''
+Signals that keep the analysis monthly rollups (see analysis.utils.rollups) in sync with aggregate counts.
+'''
+
+@receiver(post_save, sender=AggregateCount)
+@receiver(post_delete, sender=AggregateCount)
+def sync_count_rollups(sender, instance, **kwargs):
+    '''
+    Re-sum the month a count's group falls in whenever a count is created, edited, or deleted.
+    - instance (aggregate count instance): the count that changed
+    '''
+    try:
+        group = instance.group
+    except AggregateGroup.DoesNotExist:
+        return #group is being deleted, which is handled below
+    refresh_count_rollups([get_group_slice(group)])
+
+@receiver(pre_save, sender=AggregateGroup)
+def store_previous_group_slice(sender, instance, **kwargs):
+    '''
+    Store the month/organization/project the group was in before it was edited, so that slice can be refreshed too.
+    - instance (aggregate group instance): the group being saved
+    '''
+    previous = sender.objects.filter(pk=instance.pk).first() if instance.pk else None
+    instance._previous_slice = get_group_slice(previous) if previous else None
+
+@receiver(post_save, sender=AggregateGroup)
+def sync_group_rollups(sender, instance, **kwargs):
+    '''
+    If a group's dates/organization/project/indicator change, its counts move to a different slice.
+    - instance (aggregate group instance): the group that was saved
+    '''
+    slices = {get_group_slice(instance)}
+    if getattr(instance, '_previous_slice', None):
+        slices.add(instance._previous_slice)
+    refresh_count_rollups(slices)
+
+@receiver(post_delete, sender=AggregateGroup)
+def clear_group_rollups(sender, instance, **kwargs):
+    '''
+    Re-sum the slice a deleted group was in.
+    - instance (aggregate group instance): the group that was deleted
+    '''
+    refresh_count_rollups([get_group_slice(instance)])
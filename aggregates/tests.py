@@ -1,11 +1,13 @@
 from rest_framework.test import APITestCase
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from unittest.mock import patch
 
 from aggregates.models import AggregateCount, AggregateGroup
 from projects.models import Project, Client, Task, ProjectOrganization
 from organizations.models import Organization
 from indicators.models import Indicator, Assessment, LogicCondition, LogicGroup, Option
+from analysis.utils.aggregates import demographic_aggregates
 
 User = get_user_model()
 
@@ -738,3 +740,35 @@ class AggregatesTest(APITestCase):
         print(response.json())
         self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
 
+
+    def test_counts_reach_rollups(self):
+        '''
+        Counts are bulk created (no save signals), so make sure created/edited counts still make it into the monthly
+        rollups and that the rollups agree with the raw counts.
+        '''
+        self.client.force_authenticate(user=self.admin)
+        def get_aggregates(raw=False):
+            with patch('analysis.utils.aggregates.can_use_rollups', return_value=not raw):
+                aggregates = demographic_aggregates(self.admin, self.bool_indicator, {'sex': True}, split='month')
+            return sorted((item['sex'], item['period'], item['count']) for item in aggregates.values() if item['count'])
+        payload = {
+            'indicator_id': self.bool_indicator.id,
+            'organization_id': self.parent_org.id,
+            'project_id': self.project.id,
+            'start': '2025-01-01',
+            'end': '2025-01-03',
+            'counts_data': [{'value': 25, 'sex': 'M'}, {'value': 5, 'sex': 'F'}],
+        }
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/aggregates/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(get_aggregates(), get_aggregates(raw=True))
+        self.assertEqual(len(get_aggregates()), 2)
+
+        #moving the group to another month should clear the month it was in
+        payload.update({'start': '2025-02-01', 'end': '2025-02-03', 'counts_data': [{'value': 10, 'sex': 'M'}]})
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(f'/api/aggregates/{response.json()["id"]}/', payload, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_aggregates(), get_aggregates(raw=True))
+        self.assertEqual(get_aggregates(), [('M', 'Feb 2025', 10)])
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class AnalysisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'analysis'
+
+    def ready(self):
+        import analysis.signals
+        from django.core.signals import request_finished
+        from analysis.utils.request_logs import flush_due_request_logs
+        #write buffered request logs in batches once responses have been sent
+        request_finished.connect(flush_due_request_logs, dispatch_uid='flush_request_logs')
@@ -0,0 +1,121 @@
+import argparse
+import random
+import time
+from itertools import product
+from analysis.utils.buckets import prep_buckets
+
+'''
+Benchmark comparing the keyed bucket lookup in [../utils/buckets.py] against the old approach, where every
+response was checked against every combination of breakdowns with frozenset(breakdown).issubset(key).
+
+Both paths are fed the same synthetic respondents, so only the bucketing step is timed (the database work is
+identical for both). The old approach is O(responses x buckets), so by default it is only timed on a sample
+and extrapolated to the full set, pass --legacy-sample 0 to time the whole thing (this will take a while).
+
+Run with:
+    python -m analysis.benchmarks.buckets --responses 100000
+'''
+
+SEXES = ['M', 'F', 'NB']
+AGE_RANGES = [
+    'under_1', '1_4', '5_9', '10_14', '15_19', '20_24', '25_29', '30_34', '35_39', '40_44', '45_49',
+    '50_54', '55_59', '60_64', '65_plus'
+]
+KP_TYPES = ['FSW', 'MSM', 'PWID', 'TG', 'INTERSEX', 'LBQ', 'OTHER']
+#the old approach can't tell values that are shared between fields apart (both models have an 'OTHER'), so leave it out
+#here so that both paths should return the same result
+DISABILITY_TYPES = ['VI', 'PD', 'ID', 'HI', 'PSY', 'SI']
+DISTRICTS = ['Central', 'Ghanzi', 'Kgalagadi', 'Kgatleng', 'Kweneng', 'Gaborone']
+QUARTERS = [f'Q{q} {y}' for y in [2024, 2025] for q in range(1, 5)]
+
+def make_responses(n, seed=1):
+    '''
+    Create a list of fake responses with a value for each field (and 0-2 values for M2M fields).
+    - n (integer): number of responses to create
+    - seed (integer, optional): random seed so runs are comparable
+    '''
+    rng = random.Random(seed)
+    responses = []
+    for i in range(n):
+        responses.append({
+            'respondent_id': rng.randint(1, n // 3 or 1),
+            'sex': rng.choice(SEXES),
+            'age_range': rng.choice(AGE_RANGES),
+            'district': rng.choice(DISTRICTS),
+            'kp_type': rng.sample(KP_TYPES, rng.choice([0, 0, 1, 1, 2])),
+            'disability_type': rng.sample(DISABILITY_TYPES, rng.choice([0, 0, 0, 1])),
+            'period': rng.choice(QUARTERS),
+            'amount': 1,
+        })
+    return responses
+
+def legacy_aggregates(fields_map, responses):
+    '''
+    The old approach, every response is checked against every combination of breakdowns.
+    '''
+    cartesian_product = list(product(*fields_map.values()))
+    aggregates = {}
+    for pos, arr in enumerate(cartesian_product):
+        aggregates[pos] = dict(zip(fields_map.keys(), arr))
+        aggregates[pos]['count'] = 0
+    product_index_sets = {frozenset(p): i for i, p in enumerate(cartesian_product)}
+    for r in responses:
+        #the old keys held every value the response had, regardless of what was requested
+        key = frozenset(
+            [r['sex'], r['age_range'], r['district'], r['period']] + r['kp_type'] + r['disability_type']
+        )
+        for breakdown in cartesian_product:
+            if frozenset(breakdown).issubset(frozenset(key)):
+                pos = product_index_sets.get(frozenset(breakdown))
+                if pos is not None:
+                    aggregates[pos]['count'] += r['amount']
+    return aggregates
+
+def keyed_aggregates(fields_map, responses):
+    '''
+    The new approach, one key per response (or per M2M combination) and a single dict lookup each.
+    '''
+    aggregates, product_index = prep_buckets(fields_map)
+    breakdowns = list(fields_map.keys())
+    for r in responses:
+        values = [r[field] if isinstance(r[field], list) else [r[field]] for field in breakdowns]
+        for key in product(*values):
+            pos = product_index.get(key)
+            if pos is not None:
+                aggregates[pos]['count'] += r['amount']
+    return aggregates
+
+def run(n, legacy_sample):
+    fields_map = {
+        'sex': SEXES,
+        'age_range': AGE_RANGES,
+        'kp_type': KP_TYPES,
+        'period': QUARTERS,
+    }
+    cells = len(list(product(*fields_map.values())))
+    responses = make_responses(n)
+    print(f'{n} responses, {cells} buckets (sex x age_range x kp_type x quarter)')
+
+    start = time.perf_counter()
+    keyed = keyed_aggregates(fields_map, responses)
+    keyed_time = time.perf_counter() - start
+    print(f'keyed lookup:   {keyed_time:.2f}s')
+
+    sample = responses if not legacy_sample or legacy_sample >= n else responses[:legacy_sample]
+    start = time.perf_counter()
+    legacy = legacy_aggregates(fields_map, sample)
+    legacy_time = (time.perf_counter() - start) * (n / len(sample))
+    label = 'subset scan:   ' if len(sample) == n else f'subset scan (extrapolated from {len(sample)}):'
+    print(f'{label} {legacy_time:.2f}s')
+    print(f'speedup: {legacy_time / keyed_time:.0f}x')
+
+    #make sure both approaches agree on the rows that were run through both
+    check = keyed if len(sample) == n else keyed_aggregates(fields_map, sample)
+    print('results match' if check == legacy else 'WARNING: results do not match')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark keyed bucket lookup vs. the old subset scan.')
+    parser.add_argument('--responses', type=int, default=100000)
+    parser.add_argument('--legacy-sample', type=int, default=2000)
+    args = parser.parse_args()
+    run(args.responses, args.legacy_sample)
@@ -0,0 +1,256 @@
+import statistics
+import subprocess
+import time
+from datetime import date
+from io import BytesIO
+from django.db import transaction
+from django.test.utils import override_settings
+from django.utils.timezone import now
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+from openpyxl import load_workbook
+
+from indicators.models import Indicator
+from respondents.models import Respondent
+from analysis.models import DashboardSetting, IndicatorChartSetting, ChartIndicator, DashboardIndicatorChart, PivotTable, PivotTableParam, ChartField
+from analysis.serializers import PivotTableSerializer
+from analysis.utils.aggregates import aggregates_switchboard
+from analysis.utils.dashboards import get_dashboard_data
+from analysis.utils.facts import flush_response_facts
+from analysis.utils.line_list import prep_line_list
+from analysis.utils.pivot_tables import PIVOT_PARAMS
+from analysis.utils.query_stats import QueryCollector
+from testing_utils.scale import seed_scale
+
+'''
+Times the hot analysis/upload paths against generated datasets of different sizes (see [../../testing_utils/scale.py])
+so changes can be compared across commits. For each scale the data is seeded inside a transaction that is rolled
+back once the timings are taken, so nothing is left behind, but the rebuilt fact/rollup tables include anything
+already in the database, so run it against an empty (local) database for comparable numbers.
+
+The result cache is turned off and dashboards are calculated without threads (threads use their own connections,
+which can't see the uncommitted data), so every run does the full amount of work.
+
+Run with:
+    python manage.py run_benchmarks --scales 500x1500,5000x15000 --output benchmarks.json
+'''
+
+def get_params(breakdowns):
+    return {param: param in breakdowns for param in PIVOT_PARAMS}
+
+def time_call(func, repeat):
+    '''
+    Runs a function repeat times and returns the min/median/max time and the number of queries it ran.
+    - func (function): the function to time
+    - repeat (integer): number of times to run it
+    '''
+    timings = []
+    for _ in range(repeat):
+        collector = QueryCollector()
+        start = time.perf_counter()
+        with collector.collect():
+            func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(timings), 2),
+        'median_ms': round(statistics.median(timings), 2),
+        'max_ms': round(max(timings), 2),
+        'queries': collector.count,
+    }
+
+def get_commit():
+    '''
+    Returns the current git commit (with -dirty if there are uncommitted changes), or None outside of a checkout.
+    '''
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True, check=True).stdout.strip()
+        return f'{commit}-dirty' if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def create_dashboard(data):
+    '''
+    Creates a dashboard with a mix of charts (shared data, different splits/legends, multiple indicators).
+    '''
+    user, indicators = data['user'], data['indicators']
+    dashboard = DashboardSetting.objects.create(name='Benchmark', created_by=user, project=data['projects'][0])
+    for i, (chart_indicators, axis, legend, stack) in enumerate([
+        ([indicators['number']], 'month', 'sex', None),
+        ([indicators['number']], 'quarter', 'age_range', 'sex'),
+        ([indicators['number']], 'quarter', 'kp_type', None),
+        ([indicators['multi']], None, 'option', 'sex'),
+        ([indicators['multi']], 'quarter', 'organization', None),
+        ([indicators['multi'], indicators['number']], 'quarter', None, None),
+    ]):
+        chart = IndicatorChartSetting.objects.create(axis=axis, legend=legend, stack=stack, created_by=user)
+        for indicator in chart_indicators:
+            ChartIndicator.objects.create(chart=chart, indicator=indicator)
+        DashboardIndicatorChart.objects.create(dashboard=dashboard, chart=chart, order=i)
+    return dashboard
+
+def create_pivot_table(data):
+    table = PivotTable.objects.create(name='Benchmark', indicator=data['indicators']['multi'], project=data['projects'][0], created_by=data['user'])
+    for name in ['sex', 'age_range', 'option']:
+        PivotTableParam.objects.create(pivot_table=table, field=ChartField.objects.get_or_create(name=name)[0])
+    return table
+
+def get_upload_cell(header):
+    '''
+    The value an anonymous respondent would enter in a template column.
+    '''
+    values = {
+        'Is Anonymous': 'TRUE',
+        'Age Range': str(Respondent.AgeRanges.T_24.label),
+        'Sex': str(Respondent.Sex.FEMALE.label),
+        'Village': 'Testingplace',
+        'District': str(Respondent.District.CENTRAL.label),
+        'Citizenship/Nationality': 'BW',
+        'Date of Interaction': date(2025, 6, 1),
+        'Interaction Location': 'Testingplace',
+        'Screened For: BMI (Select All That Apply)': 'Yes',
+        'Referred For: BMI (Select All That Apply)': 'Yes',
+        'Screening Type (Select One)': 'Type A',
+        'Number of Sessions (Enter a Number)': '3',
+        'Received Materials': 'Yes',
+    }
+    return values.get(header, '')
+
+def create_upload(data, rows):
+    '''
+    Downloads the real template for the first assessment task and fills it with rows anonymous respondents.
+    Returns the workbook as bytes.
+    '''
+    from respondents.views.interaction_viewset import InteractionViewSet
+    task = data['tasks'][(data['projects'][0].id, data['user'].organization_id, None)]
+    request = APIRequestFactory().post('/', {'organization_id': task.organization_id, 'task_id': task.id}, format='json')
+    force_authenticate(request, user=data['user'])
+    response = InteractionViewSet.as_view({'post': 'get_template'})(request)
+    wb = load_workbook(BytesIO(response.content))
+    ws = wb['Data']
+    headers = [cell.value for cell in ws[1]]
+    for _ in range(rows):
+        ws.append([get_upload_cell(header) for header in headers])
+    output = BytesIO()
+    wb.save(output)
+    return output.getvalue()
+
+def create_sync_payload(data, rows):
+    '''
+    Builds a mobile sync payload of new interactions for existing respondents.
+    '''
+    indicators = data['indicators']
+    option = data['multi_options'][0]
+    task = data['tasks'][(data['projects'][0].id, data['user'].organization_id, None)]
+    respondent_ids = list(Respondent.objects.order_by('-id').values_list('id', flat=True)[:rows])
+    return [{
+        'local_id': i,
+        'respondent_id': respondent_id,
+        'task_id': task.id,
+        'interaction_date': '2025-06-01',
+        'interaction_location': 'Testingplace',
+        'response_data': {
+            str(indicators['multi'].id): {'value': [option.id]},
+            str(indicators['referred'].id): {'value': [option.id]},
+            str(indicators['single'].id): {'value': data['single_options'][0].id},
+            str(indicators['number'].id): {'value': '3'},
+            str(indicators['boolean'].id): {'value': True},
+        },
+    } for i, respondent_id in enumerate(respondent_ids)]
+
+def get_benchmarks(data, rows=100):
+    '''
+    Returns (name, function) for every benchmark. Anything the functions need (dashboards, templates, etc.) is
+    created up front so it isn't timed.
+    - data (dict): the result of seed_scale
+    - rows (integer, optional): number of rows in the Excel upload/mobile sync
+    '''
+    from respondents.views.interaction_viewset import InteractionViewSet
+    user, indicators, project = data['user'], data['indicators'], data['projects'][0]
+    benchmarks = []
+    for name, indicator, breakdowns in [
+        ('aggregates_assessment', indicators['multi'], ['sex', 'age_range', 'option']),
+        ('aggregates_number', indicators['number'], ['sex', 'kp_type']),
+        ('aggregates_events', indicators[Indicator.Category.EVENTS], ['organization']),
+        ('aggregates_orgs', indicators[Indicator.Category.ORGS], ['organization']),
+        ('aggregates_social', indicators[Indicator.Category.SOCIAL], ['platform', 'metric']),
+        ('aggregates_misc', indicators[Indicator.Category.MISC], ['sex', 'age_range']),
+    ]:
+        params = get_params(breakdowns)
+        benchmarks.append((name, lambda indicator=indicator, params=params: aggregates_switchboard(
+            user, indicator, params, split='quarter', project=project
+        )))
+    benchmarks.append(('line_list', lambda: prep_line_list(user, project=project)))
+
+    dashboard = create_dashboard(data)
+    benchmarks.append(('dashboard', lambda: get_dashboard_data(dashboard, workers=0)))
+
+    table = create_pivot_table(data)
+    refresh = Request(APIRequestFactory().get('/', {'refresh': 1}))
+    benchmarks.append(('pivot_table', lambda: PivotTableSerializer(table, context={'request': refresh}).data))
+
+    workbook = create_upload(data, rows)
+    def upload():
+        request = APIRequestFactory().post('/', {'file': SimpleUploadedFile('template.xlsx', workbook)}, format='multipart')
+        force_authenticate(request, user=user)
+        response = InteractionViewSet.as_view({'post': 'post_template'})(request)
+        #facts are built when the data commits, which never happens inside the benchmark's transaction
+        flush_response_facts()
+        return response
+    benchmarks.append(('excel_upload', upload))
+
+    payload = create_sync_payload(data, rows)
+    def sync():
+        request = APIRequestFactory().post('/', payload, format='json')
+        force_authenticate(request, user=user)
+        response = InteractionViewSet.as_view({'post': 'mobile_upload'})(request)
+        flush_response_facts()
+        return response
+    benchmarks.append(('mobile_sync', sync))
+    return benchmarks
+
+def run_scale(respondents, interactions, repeat=3, rows=100, seed=1, stdout=None):
+    '''
+    Seeds one scale, times every benchmark against it, and rolls the data back. Returns the results for the scale.
+    - respondents (integer): number of respondents to seed
+    - interactions (integer): number of interactions to seed
+    - repeat (integer, optional): number of times to run each benchmark
+    - rows (integer, optional): number of rows in the Excel upload/mobile sync
+    - seed (integer, optional): random seed
+    - stdout (stream, optional): write progress here
+    '''
+    result = {'respondents': respondents, 'interactions': interactions, 'results': {}}
+    with override_settings(ANALYSIS_CACHE_ENABLED=False), transaction.atomic():
+        start = time.perf_counter()
+        data = seed_scale(respondents=respondents, interactions=interactions, seed=seed)
+        result['seed_seconds'] = round(time.perf_counter() - start, 2)
+        result['rows'] = data['counts']
+        for name, func in get_benchmarks(data, rows):
+            try:
+                #a savepoint so a failed benchmark doesn't break the transaction for the rest
+                with transaction.atomic():
+                    result['results'][name] = time_call(func, repeat)
+            except Exception as e:
+                result['results'][name] = {'error': str(e) or e.__class__.__name__}
+            if stdout:
+                stdout.write(f'{respondents}x{interactions} {name}: {result["results"][name]}')
+        transaction.set_rollback(True)
+    return result
+
+def run_benchmarks(scales, repeat=3, rows=100, seed=1, stdout=None):
+    '''
+    Runs every benchmark at each scale. Returns a dict that can be saved as JSON and compared with other commits.
+    - scales (list): list of (respondents, interactions) tuples
+    - repeat (integer, optional): number of times to run each benchmark
+    - rows (integer, optional): number of rows in the Excel upload/mobile sync
+    - seed (integer, optional): random seed
+    - stdout (stream, optional): write progress here
+    '''
+    return {
+        'commit': get_commit(),
+        'created_at': now().isoformat(),
+        'repeat': repeat,
+        'rows': rows,
+        'scales': [run_scale(respondents, interactions, repeat, rows, seed, stdout) for respondents, interactions in scales],
+    }
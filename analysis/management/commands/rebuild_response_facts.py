@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from analysis.utils.facts import rebuild_response_facts
+
+class Command(BaseCommand):
+    '''
+    Drops and rebuilds the analysis response fact table from the responses. Run this once after the table is 
+    first created to backfill existing data, or any time the facts need to be repaired.
+    '''
+    help = 'Rebuild the denormalized response fact table used by analysis.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000, help='Number of responses to build per batch.')
+
+    def handle(self, *args, **options):
+        total = rebuild_response_facts(batch_size=options['batch_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} response facts.'))
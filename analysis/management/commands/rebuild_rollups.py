@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from analysis.utils.rollups import rebuild_rollups
+
+class Command(BaseCommand):
+    '''
+    Drops and rebuilds the monthly rollups from the response facts and aggregate counts. Rollups are kept up to
+    date by signals, so this is only needed to backfill or repair them.
+    '''
+    help = 'Rebuild the monthly rollups used by analysis.'
+
+    def handle(self, *args, **options):
+        total = rebuild_rollups(stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {total} monthly rollups.'))
@@ -0,0 +1,29 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from analysis.benchmarks.endpoints import run_benchmarks
+
+class Command(BaseCommand):
+    '''
+    Times aggregates (by indicator category), line lists, dashboards, pivot tables, Excel uploads, and mobile sync
+    at several dataset sizes and saves the results as JSON (see [../../benchmarks/endpoints.py]).
+    '''
+    help = 'Benchmark the analysis/upload endpoints at several data sizes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scales', default='500x1500,5000x15000', help='Comma separated list of respondentsxinteractions.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of times to run each benchmark.')
+        parser.add_argument('--rows', type=int, default=100, help='Number of rows in the Excel upload/mobile sync.')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, so runs are comparable.')
+        parser.add_argument('--output', default='benchmarks.json', help='File to save the results to.')
+
+    def handle(self, *args, **options):
+        try:
+            scales = [tuple(int(n) for n in scale.split('x')) for scale in options['scales'].split(',')]
+        except ValueError:
+            raise CommandError('Scales should look like 500x1500,5000x15000 (respondents x interactions).')
+        if any(len(scale) != 2 for scale in scales):
+            raise CommandError('Scales should look like 500x1500,5000x15000 (respondents x interactions).')
+        results = run_benchmarks(scales, repeat=options['repeat'], rows=options['rows'], seed=options['seed'], stdout=self.stdout)
+        with open(options['output'], 'w') as f:
+            json.dump(results, f, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'Saved results to {options["output"]}.'))
@@ -1,6 +1,8 @@
 import time
-from django.db import transaction
-from .models import RequestLog
+import random
+from django.conf import settings
+from .utils.query_stats import QueryCollector
+from .utils.request_logs import request_log_buffer
 
 EXCLUDED_PATHS = (
     "/static/",
@@ -10,10 +12,34 @@ EXCLUDED_PATHS = (
     "/admin/css/",
 )
 
+def should_sample():
+    '''
+    Decides whether this request records SQL stats (see REQUEST_LOG_QUERY_SAMPLE_RATE).
+    '''
+    rate = getattr(settings, 'REQUEST_LOG_QUERY_SAMPLE_RATE', 0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
+
+def get_query_stats(collector):
+    '''
+    Converts what a query collector saw into request log fields.
+    - collector (QueryCollector): the collector installed for the request
+    '''
+    threshold = getattr(settings, 'REQUEST_LOG_REPEATED_QUERY_THRESHOLD', 5)
+    repeated_sql, repeated_count = collector.most_repeated()
+    return {
+        'query_count': collector.count,
+        'db_time_ms': collector.total_ms,
+        'slowest_query': collector.slowest_sql,
+        'slowest_query_ms': collector.slowest_ms if collector.slowest_sql else None,
+        #only worth flagging if it looks like a query run once per row
+        'repeated_query': repeated_sql if repeated_count >= threshold else None,
+        'repeated_query_count': repeated_count,
+    }
+
 class RequestLoggingMiddleware:
     """
-    Logs request path, user, status, and duration.
-    Skips static/admin requests. Async-safe and writes after commit.
+    Logs request path, user, status, and duration (and SQL stats for a sample of requests).
+    Skips static/admin requests. Logs are buffered and written in batches (see utils/request_logs.py).
     """
 
     def __init__(self, get_response):
@@ -23,19 +49,24 @@ class RequestLoggingMiddleware:
         if request.path.startswith(EXCLUDED_PATHS):
             return self.get_response(request)
 
+        collector = QueryCollector() if should_sample() else None
         start_time = time.time()
-        response = self.get_response(request)
+        if collector:
+            #queries run while a streamed response is being sent happen after this and aren't counted
+            with collector.collect():
+                response = self.get_response(request)
+        else:
+            response = self.get_response(request)
         duration_ms = (time.time() - start_time) * 1000
+        stats = get_query_stats(collector) if collector else {}
 
-        # defer DB write until after successful transaction
-        def log_request():
-            RequestLog.objects.create(
-                path=request.path,
-                method=request.method,
-                user=request.user if request.user.is_authenticated else None,
-                status_code=response.status_code,
-                response_time_ms=duration_ms,
-            )
-
-        transaction.on_commit(log_request)
-        return response
\ No newline at end of file
+        # no DB write here, the buffer is flushed in batches once requests finish
+        request_log_buffer.add(dict(
+            path=request.path[:200],
+            method=request.method,
+            user_id=request.user.id if request.user.is_authenticated else None,
+            status_code=response.status_code,
+            response_time_ms=duration_ms,
+            **stats,
+        ))
+        return response
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.2 on 2026-10-17 00:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0023_indicatorchartsetting_average'),
+        ('indicators', '0039_indicator_description_alter_indicator_type'),
+        ('organizations', '0006_organization_description'),
+        ('projects', '0025_alter_target_related_to'),
+        ('respondents', '0037_response_response_none'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResponseFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.IntegerField(blank=True, null=True)),
+                ('response_boolean', models.BooleanField(blank=True, null=True)),
+                ('response_date', models.DateField(blank=True, null=True)),
+                ('sex', models.CharField(blank=True, max_length=2, null=True)),
+                ('age_range', models.CharField(blank=True, max_length=10, null=True)),
+                ('district', models.CharField(blank=True, max_length=25, null=True)),
+                ('is_citizen', models.BooleanField(default=False)),
+                ('hiv_positive', models.BooleanField(default=False)),
+                ('pregnant', models.BooleanField(default=False)),
+                ('kp_mask', models.PositiveIntegerField(default=0)),
+                ('disability_mask', models.PositiveIntegerField(default=0)),
+                ('has_open_flag', models.BooleanField(default=False)),
+                ('client', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='response_facts', to='projects.client')),
+                ('indicator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='response_facts', to='indicators.indicator')),
+                ('interaction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='response_facts', to='respondents.interaction')),
+                ('option', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='response_facts', to='indicators.option')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='response_facts', to='organizations.organization')),
+                ('parent_organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='child_response_facts', to='organizations.organization')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='response_facts', to='projects.project')),
+                ('respondent', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='response_facts', to='respondents.respondent')),
+                ('response', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='fact', to='respondents.response')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['indicator', 'response_date'], name='fact_indicator_date_idx'), models.Index(fields=['indicator', 'organization'], name='fact_indicator_org_idx')],
+            },
+        ),
+    ]
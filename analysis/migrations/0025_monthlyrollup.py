@@ -0,0 +1,44 @@
+# Generated by Django 5.2.2 on 2026-10-17 01:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0024_responsefact'),
+        ('indicators', '0039_indicator_description_alter_indicator_type'),
+        ('organizations', '0006_organization_description'),
+        ('projects', '0025_alter_target_related_to'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('response', 'Response'), ('count', 'Aggregate Count')], max_length=10)),
+                ('month', models.DateField(blank=True, null=True)),
+                ('sex', models.CharField(blank=True, max_length=2, null=True)),
+                ('age_range', models.CharField(blank=True, max_length=25, null=True)),
+                ('district', models.CharField(blank=True, max_length=50, null=True)),
+                ('is_citizen', models.BooleanField(blank=True, null=True)),
+                ('hiv_positive', models.BooleanField(blank=True, null=True)),
+                ('pregnant', models.BooleanField(blank=True, null=True)),
+                ('kp_mask', models.PositiveIntegerField(default=0)),
+                ('disability_mask', models.PositiveIntegerField(default=0)),
+                ('unique_only', models.BooleanField(default=False)),
+                ('total', models.BigIntegerField(default=0)),
+                ('number', models.PositiveIntegerField(default=0)),
+                ('interactions', models.PositiveIntegerField(default=0)),
+                ('indicator', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='indicators.indicator')),
+                ('option', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='indicators.option')),
+                ('organization', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='organizations.organization')),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rollups', to='projects.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['indicator', 'source', 'month'], name='rollup_indicator_month_idx'), models.Index(fields=['indicator', 'organization', 'project', 'month'], name='rollup_slice_idx')],
+            },
+        ),
+    ]
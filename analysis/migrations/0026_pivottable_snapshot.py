@@ -0,0 +1,34 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:13
+
+import django.core.serializers.json
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0025_monthlyrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pivottable',
+            name='snapshot',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+        migrations.AddField(
+            model_name='pivottable',
+            name='snapshot_computed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pivottable',
+            name='snapshot_duration_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='pivottable',
+            name='snapshot_version',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+    ]
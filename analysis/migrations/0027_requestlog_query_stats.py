@@ -0,0 +1,43 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0026_pivottable_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='requestlog',
+            name='db_time_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='query_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='repeated_query',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='repeated_query_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='slowest_query',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='requestlog',
+            name='slowest_query_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -1,14 +1,16 @@
 from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
 from django.utils.translation import gettext_lazy as _
 from django.contrib.auth import get_user_model
-from indicators.models import Assessment, Indicator
-from projects.models import Project
+from indicators.models import Assessment, Indicator, Option
+from projects.models import Project, Client
 from organizations.models import Organization
+from respondents.models import Response, Interaction, Respondent
 User = get_user_model()
 class ChartField(models.Model):
     '''
     Shared enum storing model that handles controlled filter/legend/stack fields. If adding any fields to 
-    the respondent/demogrpahic count model, make sure to reflect those changes here as well as [./utils/interactions_prep.py]
+    the respondent/demogrpahic count model, make sure to reflect those changes here as well as [./utils/facts.py]
     (see the respondent/aggregate models for more).
     '''
     class Field(models.TextChoices):
@@ -130,6 +132,9 @@ class PivotTable(models.Model):
     '''
     Model for storing pivot table settings that a user can return to. Supports unlimited breakdowns and 
     scoping by period, project, organization, and filtering repeat onlys (for respondent indicators).
+
+    The last computed result is stored as a snapshot alongside the version of the data it was computed from
+    (see [./utils/pivot_tables.py]), so views can serve it without recalculating.
     '''
     name = models.CharField(max_length=255, null=True, blank=True)
     indicator = models.ForeignKey(Indicator, on_delete=models.CASCADE)
@@ -143,6 +148,11 @@ class PivotTable(models.Model):
     repeat_only = models.BooleanField(default=False)
     repeat_n = models.PositiveIntegerField(blank=True, null=True)
 
+    snapshot = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder) #pivoted rows from the last calculation
+    snapshot_version = models.CharField(max_length=100, null=True, blank=True) #result cache version of the data the snapshot was built from
+    snapshot_computed_at = models.DateTimeField(null=True, blank=True)
+    snapshot_duration_ms = models.FloatField(null=True, blank=True)
+
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='pivot_tables')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -182,4 +192,102 @@ class RequestLog(models.Model):
     method = models.CharField(max_length=10)
     status_code = models.IntegerField()
     response_time_ms = models.FloatField()
-    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
\ No newline at end of file
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+
+    #SQL stats, only recorded for sampled requests (see REQUEST_LOG_QUERY_SAMPLE_RATE and [./utils/query_stats.py])
+    query_count = models.PositiveIntegerField(null=True, blank=True)
+    db_time_ms = models.FloatField(null=True, blank=True)
+    slowest_query = models.TextField(null=True, blank=True) #normalized SQL
+    slowest_query_ms = models.FloatField(null=True, blank=True)
+    repeated_query = models.TextField(null=True, blank=True) #normalized SQL run at least REQUEST_LOG_REPEATED_QUERY_THRESHOLD times (likely an N+1)
+    repeated_query_count = models.PositiveIntegerField(null=True, blank=True)
+
+
+class ResponseFact(models.Model):
+    '''
+    Denormalized copy of a response with everything the aggregators split or filter by stored in one row, so 
+    analytics can be run against a single table with no joins. Rows are kept in sync by the respondents, flags, and 
+    projects signals (see [./utils/facts.py]) and can be rebuilt with manage.py rebuild_response_facts.
+
+    KP/disability statuses are stored as bitmasks (see KP_BITS/DISABILITY_BITS in [./utils/masks.py]) and HIV status/pregnancy
+    are stored as they were on the date of the response.
+    '''
+    response = models.OneToOneField(Response, on_delete=models.CASCADE, related_name='fact')
+    interaction = models.ForeignKey(Interaction, on_delete=models.CASCADE, related_name='response_facts')
+    respondent = models.ForeignKey(Respondent, on_delete=models.CASCADE, related_name='response_facts')
+    indicator = models.ForeignKey(Indicator, on_delete=models.CASCADE, related_name='response_facts')
+    option = models.ForeignKey(Option, on_delete=models.SET_NULL, null=True, blank=True, related_name='response_facts')
+    value = models.IntegerField(null=True, blank=True) #numeric value for number indicators (null if not a number)
+    response_boolean = models.BooleanField(null=True, blank=True)
+    response_date = models.DateField(null=True, blank=True)
+
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='response_facts')
+    parent_organization = models.ForeignKey(Organization, on_delete=models.SET_NULL, null=True, blank=True, related_name='child_response_facts')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='response_facts')
+    client = models.ForeignKey(Client, on_delete=models.SET_NULL, null=True, blank=True, related_name='response_facts')
+
+    sex = models.CharField(max_length=2, null=True, blank=True)
+    age_range = models.CharField(max_length=10, null=True, blank=True)
+    district = models.CharField(max_length=25, null=True, blank=True)
+    is_citizen = models.BooleanField(default=False)
+    hiv_positive = models.BooleanField(default=False) #was the respondent positive on the response date
+    pregnant = models.BooleanField(default=False) #was the respondent pregnant on the response date
+    kp_mask = models.PositiveIntegerField(default=0)
+    disability_mask = models.PositiveIntegerField(default=0)
+    has_open_flag = models.BooleanField(default=False) #interaction or respondent has an unresolved flag
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['indicator', 'response_date'], name='fact_indicator_date_idx'),
+            models.Index(fields=['indicator', 'organization'], name='fact_indicator_org_idx'),
+        ]
+
+class MonthlyRollup(models.Model):
+    '''
+    Pre-summed response facts/aggregate counts for one indicator, organization, project, month, and demographic 
+    cell. Lets aggregates that span the life of a project be answered from a row per month/cell instead of a row 
+    per response. Rows are refreshed one (indicator, organization, project, month) slice at a time whenever the 
+    underlying data changes (see [./utils/rollups.py]) and can be rebuilt with manage.py rebuild_rollups.
+
+    Demographic columns mirror ResponseFact. Rollups built from aggregate counts store None for any field the count
+    was not split by and the count's value in total/number/interactions, so whichever column is read gives the count.
+    '''
+    class Source(models.TextChoices):
+        RESPONSE = 'response', _('Response')
+        COUNT = 'count', _('Aggregate Count')
+
+    source = models.CharField(max_length=10, choices=Source.choices)
+    indicator = models.ForeignKey(Indicator, on_delete=models.CASCADE, related_name='rollups')
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name='rollups')
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name='rollups')
+    month = models.DateField(null=True, blank=True) #first day of the month
+
+    option = models.ForeignKey(Option, on_delete=models.CASCADE, null=True, blank=True, related_name='rollups')
+    sex = models.CharField(max_length=2, null=True, blank=True)
+    age_range = models.CharField(max_length=25, null=True, blank=True)
+    district = models.CharField(max_length=50, null=True, blank=True)
+    is_citizen = models.BooleanField(null=True, blank=True)
+    hiv_positive = models.BooleanField(null=True, blank=True)
+    pregnant = models.BooleanField(null=True, blank=True)
+    kp_mask = models.PositiveIntegerField(default=0)
+    disability_mask = models.PositiveIntegerField(default=0)
+    unique_only = models.BooleanField(default=False) #for counts, mirrors AggregateCount.unique_only
+
+    total = models.BigIntegerField(default=0) #sum of numeric values
+    number = models.PositiveIntegerField(default=0) #number of responses
+    interactions = models.PositiveIntegerField(default=0) #number of interactions (each counted once per month)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['indicator', 'source', 'month'], name='rollup_indicator_month_idx'),
+            models.Index(fields=['indicator', 'organization', 'project', 'month'], name='rollup_slice_idx'),
+        ]
+
+class DataVersion(models.Model):
+    '''
+    Version counters for the aggregate result cache (see [./utils/result_cache.py]), one per indicator plus a global one.
+    Kept in the database instead of the cache so every process reads the same value and bumps are atomic increments,
+    whichever cache backend stores the results.
+    '''
+    key = models.CharField(max_length=50, unique=True) #indicator id or 'all'
+    version = models.BigIntegerField(default=0)
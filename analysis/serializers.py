@@ -1,11 +1,9 @@
 from rest_framework import serializers
 from rest_framework.exceptions import PermissionDenied
 from django.db import transaction
-from analysis.models import DashboardFilter, ChartField, IndicatorChartSetting, DashboardSetting, DashboardIndicatorChart, ChartFilter, PivotTable, PivotTableParam, LineList, RequestLog
-from analysis.utils.aggregates import  aggregates_switchboard
-from analysis.utils.targets import get_target_aggregates
-from analysis.utils.csv import prep_csv
-from analysis.utils.line_list import prep_line_list
+from analysis.models import DashboardFilter, ChartField, IndicatorChartSetting, DashboardSetting, DashboardIndicatorChart, PivotTable, PivotTableParam, LineList, RequestLog
+from analysis.utils.pivot_tables import get_pivot_snapshot
+from analysis.utils.dashboards import get_chart_data, get_chart_filters, get_chart_targets, get_dashboard_data
 from organizations.models import Organization
 from organizations.serializers import OrganizationListSerializer
 from projects.models import Project
@@ -13,7 +11,6 @@ from projects.serializers import ProjectListSerializer, Target
 from profiles.serializers import ProfileListSerializer
 from indicators.models import Indicator, Assessment
 from indicators.serializers import IndicatorSerializer, AssessmentSerializer
-from collections import defaultdict
 from respondents.models import Interaction
 
 class LineListListSerializer(serializers.ModelSerializer):
@@ -26,7 +23,8 @@ class LineListListSerializer(serializers.ModelSerializer):
 
 class LineListSerializer(serializers.ModelSerializer):
     '''
-    Returns detailed data about a line list and allows for the user to create a new line list. 
+    Returns detailed data about a line list and allows for the user to create a new line list. Only returns the
+    line list's settings, the rows are paged seperately (see the rows action in [./views.py]).
     '''
     assessment = AssessmentSerializer(read_only=True)
     assessment_id = serializers.PrimaryKeyRelatedField(queryset=Assessment.objects.all(), write_only=True, source='assessment', allow_null=True, required=False)
@@ -34,26 +32,12 @@ class LineListSerializer(serializers.ModelSerializer):
     organization_id = serializers.PrimaryKeyRelatedField(queryset=Organization.objects.all(), write_only=True, source='organization', allow_null=True, required=False)
     project = ProjectListSerializer(read_only=True)
     project_id = serializers.PrimaryKeyRelatedField(queryset=Project.objects.all(), write_only=True, source='project', allow_null=True, required=False)
-    data = serializers.SerializerMethodField()
 
-    def get_data(self, obj):
-        '''
-        Get list of objects containing information about each row of the line list
-        '''
-        return prep_line_list(
-            user=obj.created_by,
-            assessment=obj.assessment,
-            project=obj.project,
-            organization=obj.organization,
-            start=obj.start, 
-            end=obj.end, 
-            cascade=obj.cascade_organization,
-        )
     class Meta:
         model=LineList
         fields = [
             'id', 'name', 'project', 'project_id', 'organization', 'organization_id',
-            'assessment', 'assessment_id', 'start', 'end', 'cascade_organization', 'data'
+            'assessment', 'assessment_id', 'start', 'end', 'cascade_organization',
         ]
     def create(self, validated_data):
         print(validated_data)
@@ -97,32 +81,27 @@ class PivotTableSerializer(serializers.ModelSerializer):
     )
     display_name = serializers.SerializerMethodField()
     data = serializers.SerializerMethodField()
+    is_stale = serializers.SerializerMethodField()
+    computed_at = serializers.DateTimeField(source='snapshot_computed_at', read_only=True)
+    compute_duration_ms = serializers.FloatField(source='snapshot_duration_ms', read_only=True)
+
+    def to_representation(self, instance):
+        #serve the stored snapshot (pass ?refresh=1 to recalculate it first, see [./utils/pivot_tables.py])
+        request = self.context.get('request')
+        refresh = request is not None and request.query_params.get('refresh') in ['1', 'true']
+        self._snapshot, self._stale = get_pivot_snapshot(instance, refresh=refresh)
+        return super().to_representation(instance)
 
     def get_data(self, obj):
         '''
-        Get data based on the pivot table settings.
+        Get data based on the pivot table settings (pivoted with one param as the column headers, like one
+        would expect a pivot table to look).
         '''
-        table_params = [param.name for param in obj.params.all()]
-        #determine what params/breakdowns the user wants and format them as an object
-        params = {}
-        for cat in ['id', 'age_range', 'sex', 'kp_type', 'disability_type', 'citizenship', 'hiv_status', 'pregnancy', 'option', 'platform', 'metric', 'district', 'organization']:
-            params[cat] = cat in table_params
+        return self._snapshot
 
-        #collec the aggregates
-        data = aggregates_switchboard(
-            obj.created_by, 
-            indicator=obj.indicator, 
-            params=params, 
-            project=obj.project,
-            organization=obj.organization,
-            start=obj.start, 
-            end=obj.end, 
-            repeat_only=obj.repeat_only, 
-            n=obj.repeat_n,
-            cascade=obj.cascade_organization
-        )
-        #convert it to a format with one param as the column headers, like one would expect a pivot table to look
-        return prep_csv(aggregates=data, params=params)
+    def get_is_stale(self, obj):
+        #data has changed since the snapshot was computed and a refresh has been queued
+        return self._stale
 
     def get_params(self, obj):
         return [param.name for param in obj.params.all()]
@@ -138,7 +117,8 @@ class PivotTableSerializer(serializers.ModelSerializer):
         model = PivotTable
         fields = [
             'id', 'name', 'display_name', 'project', 'project_id', 'organization', 'organization_id', 'start', 'end', 'params', 
-            'param_names', 'data', 'repeat_only', 'repeat_n', 'cascade_organization', 'indicator', 'indicator_id'
+            'param_names', 'data', 'is_stale', 'computed_at', 'compute_duration_ms', 'repeat_only', 'repeat_n',
+            'cascade_organization', 'indicator', 'indicator_id'
         ]
 
     def _update_params(self, table, params):
@@ -181,87 +161,44 @@ class IndicatorChartSerializer(serializers.ModelSerializer):
     filters = serializers.SerializerMethodField(read_only=True)
     allow_targets = serializers.SerializerMethodField(read_only=True) #simple helper var to help the frontend determine whether or not to shown the option, cause no one wants that crap where you select an option and its like screw you, there's not data here. Get pranked, nerd
     display_name = serializers.SerializerMethodField(read_only=True)
+    error = serializers.SerializerMethodField(read_only=True)
+
+    def __init__(self, *args, chart_result=None, **kwargs):
+        #data/targets/error the dashboard already calculated for this chart (see analysis.utils.dashboards)
+        self.chart_result = chart_result
+        super().__init__(*args, **kwargs)
+
     def get_chart_data(self, obj):
         '''
         Collect data that will be used in the chart
         '''
-        #based on legend/stack, get list of params to break the data down by
-        params = {}
-        for cat in ['age_range', 'sex', 'kp_type', 'disability_type', 'citizenship', 'hiv_status', 'pregnancy', 'option', 'platform', 'metric', 'organization', 'district']:
-            params[cat] = (cat == obj.legend) or (cat == obj.stack)
-        # collect model filters
-        filters = self.get_filters(obj)
+        #if the dashboard already calculated the data for all of its charts at once, use that
+        if self.chart_result is not None:
+            return self.chart_result['chart_data']
         #get information from the dashboard about any meta filters (see below)
-        project = self.context.get('project')
-        organization = self.context.get('organization')
-        cascade = self.context.get('cascade_organization', False)
-        data={} # dict to store chart data
-
-        #if only one indicator, return the aggreagate
-        if obj.indicators.count() == 1:
-            return aggregates_switchboard(obj.created_by, 
-                indicator=obj.indicators.first(), 
-                params=params, 
-                split=obj.axis, 
-                project=project,
-                organization=organization,
-                start=obj.start, 
-                end=obj.end, 
-                filters=filters, 
-                repeat_only=obj.repeat_only, 
-                n=obj.repeat_n,
-                cascade=cascade,
-                average=obj.average
-            )
-        #if multiple indicators, return an array of indicators (no params should be present)
-        data = []
-        for indicator in obj.indicators.all():
-            ind = aggregates_switchboard(
-                obj.created_by,
-                indicator=indicator,
-                params=params,
-                split=obj.axis,
-                project=project,
-                organization=organization,
-                start=obj.start,
-                end=obj.end,
-                filters=filters,
-                cascade=cascade,
-            )
-            # the indicator will be used as the legend item
-            for period, item in ind.items():
-                row = {
-                    'period': item.get('period', None),
-                    'count': item.get('count', 0),
-                    'indicator': str(indicator),
-                    'order': indicator.order
-                }
-                data.append(row)
-        #return the array
-        return {i: item for i, item in enumerate(data)}
+        return get_chart_data(
+            obj,
+            project=self.context.get('project'),
+            organization=self.context.get('organization'),
+            cascade=self.context.get('cascade_organization', False),
+        )
 
     # build the filters dict
     def get_filters(self, obj):
-        queryset = ChartFilter.objects.filter(chart=obj)
-        filters = defaultdict(list)
-        for fi in queryset:
-            filters[fi.field.name].append(fi.value)
-        return filters
+        return get_chart_filters(obj)
     
     def get_allow_targets(self, obj):
         return Target.objects.filter(indicator__in=obj.indicators.all()).exists()
     
     #collect related target data
     def get_targets(self, obj):
-        if not obj.use_target:
-            return []
-        targets = []
-        project = self.context.get('project')
-        organization = self.context.get('organization')
-        for indicator in obj.indicators.all():
-            target = get_target_aggregates(obj.created_by, indicator=indicator, split=obj.axis, project=project, organization=organization, start=obj.start, end=obj.end)
-            targets.append(target)
-        return targets
+        if self.chart_result is not None:
+            return self.chart_result['targets']
+        return get_chart_targets(obj, project=self.context.get('project'), organization=self.context.get('organization'))
+
+    def get_error(self, obj):
+        #set if the dashboard couldn't load this chart's data (see analysis.utils.dashboards)
+        return self.chart_result['error'] if self.chart_result is not None else None
     
     def get_display_name(self, obj):
         if obj.name:
@@ -272,7 +209,7 @@ class IndicatorChartSerializer(serializers.ModelSerializer):
         model = IndicatorChartSetting
         fields = ['id', 'indicators', 'created_by', 'tabular', 'axis', 'legend', 'stack', 'chart_type', 'use_target',
                   'start', 'end', 'chart_data', 'allow_targets', 'targets', 'filters', 'repeat_only', 'repeat_n', 'name',
-                  'display_name', 'average']
+                  'display_name', 'average', 'error']
 
 
 class DashboardFilterSerializer(serializers.ModelSerializer):
@@ -292,6 +229,11 @@ class DashboardIndicatorChartSerializer(serializers.ModelSerializer):
     '''
     chart = serializers.SerializerMethodField()
 
+    def __init__(self, *args, chart_result=None, **kwargs):
+        #data/targets/error the dashboard already calculated for this chart (see analysis.utils.dashboards)
+        self.chart_result = chart_result
+        super().__init__(*args, **kwargs)
+
     def get_chart(self, obj):
         #pass dashboard level context to the chart for when it collects data
         return IndicatorChartSerializer(
@@ -301,7 +243,8 @@ class DashboardIndicatorChartSerializer(serializers.ModelSerializer):
                 'organization': obj.dashboard.organization,
                 'cascade_organization': obj.dashboard.cascade_organization,
                 'project': obj.dashboard.project,
-            }
+            },
+            chart_result=self.chart_result,
         ).data
 
     class Meta:
@@ -322,7 +265,7 @@ class DashboardSettingSerializer(serializers.ModelSerializer):
     Detailed information about a dashboard that also contains the charts and chart data. 
     '''
     filters = DashboardFilterSerializer(source='dashboardfilter_set', many=True, required=False, allow_null=True)
-    indicator_charts = DashboardIndicatorChartSerializer(source='dashboardindicatorchart_set', required=False, many=True, allow_null=True)
+    indicator_charts = serializers.SerializerMethodField(read_only=True)
     organization = OrganizationListSerializer(read_only=True)
     organization_id = serializers.PrimaryKeyRelatedField(queryset=Organization.objects.all(), write_only=True, source='organization', allow_null=True, required=False)
     project = ProjectListSerializer(read_only=True)
@@ -333,6 +276,14 @@ class DashboardSettingSerializer(serializers.ModelSerializer):
                   'organization', 'cascade_organization', 'project_id', 'organization_id']
         read_only_fields = ['created_by', 'created_at', 'updated_at']
 
+    def get_indicator_charts(self, obj):
+        #calculate every chart's data in one pass so charts on the same indicator share queries
+        dashboard_data = get_dashboard_data(obj)
+        return [
+            DashboardIndicatorChartSerializer(link, context=self.context, chart_result=dashboard_data.get(link.id)).data
+            for link in obj.dashboardindicatorchart_set.all()
+        ]
+
     def create(self, validated_data):
         filters_data = validated_data.pop('dashboardfilter_set', [])
         charts_data = validated_data.pop('dashboardindicatorchart_set', [])
@@ -341,11 +292,12 @@ class DashboardSettingSerializer(serializers.ModelSerializer):
 
 class RequestLogSerializer(serializers.ModelSerializer):
     '''
-    Simple seializer that creates a serialized request log (URL, timestamp, status)
+    Simple seializer that creates a serialized request log (URL, timestamp, status, and SQL stats if sampled)
     '''
     user = ProfileListSerializer(read_only=True)
     class Meta:
         model=RequestLog
         fields = [
-            'id', 'timestamp', 'path', 'method', 'status_code', 'response_time_ms', 'user'
+            'id', 'timestamp', 'path', 'method', 'status_code', 'response_time_ms', 'user', 'query_count', 'db_time_ms',
+            'slowest_query', 'slowest_query_ms', 'repeated_query', 'repeated_query_count'
         ]
\ No newline at end of file
@@ -0,0 +1,159 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+from respondents.models import Response, Interaction, Respondent, KeyPopulationStatus, DisabilityStatus, HIVStatus, Pregnancy
+from aggregates.models import AggregateCount, AggregateGroup
+from events.models import Event, EventTask, EventOrganization
+from social.models import SocialMediaPost, SocialMediaPostTasks
+from projects.models import Project, ProjectOrganization, Task
+from flags.models import Flag
+from analysis.utils.result_cache import bump_indicator_versions, bump_global_version
+
+'''
+Signals that invalidate the cached aggregate results (see analysis.utils.result_cache) whenever something they
+are calculated from is written. Most writes only bump the versions of the indicators they affect, changes to
+projects/tasks can change the scope of any indicator, so those bump the global version.
+'''
+
+def get_respondent_indicators(respondent_id):
+    return Response.objects.filter(interaction__respondent_id=respondent_id).values_list('indicator_id', flat=True)
+
+def get_event_indicators(event_id):
+    return Task.objects.filter(eventtask__event_id=event_id).values_list('indicator_id', flat=True)
+
+def get_post_indicators(post_id):
+    return Task.objects.filter(socialmediaposttasks__post_id=post_id).values_list('indicator_id', flat=True)
+
+def get_flag_indicators(flag):
+    '''
+    Returns the ids of the indicators whose aggregates include the object a flag is attached to.
+    - flag (flag instance): the flag that was raised/resolved
+    '''
+    model = flag.content_type.model_class()
+    if model == Interaction:
+        return Response.objects.filter(interaction_id=flag.object_id).values_list('indicator_id', flat=True)
+    if model == Respondent:
+        return get_respondent_indicators(flag.object_id)
+    if model == AggregateCount:
+        return AggregateCount.objects.filter(id=flag.object_id).values_list('group__indicator_id', flat=True)
+    if model == Event:
+        return get_event_indicators(flag.object_id)
+    if model == SocialMediaPost:
+        return get_post_indicators(flag.object_id)
+    if model == Response:
+        return Response.objects.filter(id=flag.object_id).values_list('indicator_id', flat=True)
+    return []
+
+@receiver(post_save, sender=Response)
+@receiver(post_delete, sender=Response)
+def invalidate_response(sender, instance, **kwargs):
+    bump_indicator_versions([instance.indicator_id])
+
+@receiver(post_save, sender=Interaction)
+def invalidate_interaction(sender, instance, created, **kwargs):
+    '''
+    Responses are saved after a new interaction, and deleting one deletes its responses, so only edits need to be
+    handled here (ex. the date or task changed).
+    '''
+    if created:
+        return
+    bump_indicator_versions(Response.objects.filter(interaction=instance).values_list('indicator_id', flat=True))
+
+@receiver(post_save, sender=Respondent)
+def invalidate_respondent(sender, instance, created, **kwargs):
+    if created:
+        return
+    bump_indicator_versions(get_respondent_indicators(instance.id))
+
+@receiver(post_save, sender=KeyPopulationStatus)
+@receiver(post_delete, sender=KeyPopulationStatus)
+@receiver(post_save, sender=DisabilityStatus)
+@receiver(post_delete, sender=DisabilityStatus)
+@receiver(post_save, sender=HIVStatus)
+@receiver(post_delete, sender=HIVStatus)
+@receiver(post_save, sender=Pregnancy)
+@receiver(post_delete, sender=Pregnancy)
+def invalidate_respondent_status(sender, instance, **kwargs):
+    bump_indicator_versions(get_respondent_indicators(instance.respondent_id))
+
+@receiver(m2m_changed, sender=Respondent.kp_status.through)
+@receiver(m2m_changed, sender=Respondent.disability_status.through)
+def invalidate_respondent_statuses(sender, instance, action, **kwargs):
+    if action not in ['post_add', 'post_remove', 'post_clear']:
+        return
+    if isinstance(instance, Respondent):
+        bump_indicator_versions(get_respondent_indicators(instance.id))
+    else:
+        bump_global_version()
+
+@receiver(post_save, sender=AggregateCount)
+@receiver(post_delete, sender=AggregateCount)
+def invalidate_count(sender, instance, **kwargs):
+    bump_indicator_versions(AggregateGroup.objects.filter(id=instance.group_id).values_list('indicator_id', flat=True))
+
+@receiver(post_save, sender=AggregateGroup)
+@receiver(post_delete, sender=AggregateGroup)
+def invalidate_group(sender, instance, **kwargs):
+    bump_indicator_versions([instance.indicator_id])
+
+@receiver(post_save, sender=Event)
+@receiver(pre_delete, sender=Event)
+def invalidate_event(sender, instance, **kwargs):
+    '''
+    Runs before the delete, since the event's tasks are gone after.
+    '''
+    bump_indicator_versions(get_event_indicators(instance.id))
+
+@receiver(post_save, sender=EventTask)
+@receiver(post_delete, sender=EventTask)
+@receiver(post_save, sender=SocialMediaPostTasks)
+@receiver(post_delete, sender=SocialMediaPostTasks)
+def invalidate_linked_task(sender, instance, **kwargs):
+    bump_indicator_versions(Task.objects.filter(id=instance.task_id).values_list('indicator_id', flat=True))
+
+@receiver(post_save, sender=EventOrganization)
+@receiver(post_delete, sender=EventOrganization)
+def invalidate_event_organization(sender, instance, **kwargs):
+    bump_indicator_versions(get_event_indicators(instance.event_id))
+
+@receiver(m2m_changed, sender=Event.tasks.through)
+@receiver(m2m_changed, sender=Event.organizations.through)
+@receiver(m2m_changed, sender=SocialMediaPost.tasks.through)
+def invalidate_m2m(sender, instance, action, pk_set, **kwargs):
+    '''
+    Tasks/organizations set through the m2m manager don't send the save signals for the through rows.
+    '''
+    if action not in ['pre_clear', 'post_add', 'post_remove']:
+        return
+    if isinstance(instance, Event):
+        indicators = list(get_event_indicators(instance.id))
+    elif isinstance(instance, SocialMediaPost):
+        indicators = list(get_post_indicators(instance.id))
+    else:
+        bump_global_version()
+        return
+    if sender != Event.organizations.through and pk_set:
+        indicators += list(Task.objects.filter(id__in=pk_set).values_list('indicator_id', flat=True))
+    bump_indicator_versions(indicators)
+
+@receiver(post_save, sender=SocialMediaPost)
+@receiver(pre_delete, sender=SocialMediaPost)
+def invalidate_post(sender, instance, **kwargs):
+    bump_indicator_versions(get_post_indicators(instance.id))
+
+@receiver(post_save, sender=Flag)
+@receiver(post_delete, sender=Flag)
+def invalidate_flag(sender, instance, **kwargs):
+    bump_indicator_versions(get_flag_indicators(instance))
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+@receiver(post_save, sender=ProjectOrganization)
+@receiver(post_delete, sender=ProjectOrganization)
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def invalidate_all(sender, instance, **kwargs):
+    '''
+    Project clients, organization parents, and tasks decide which data each user/scope can see, so any of them
+    changing can affect every indicator.
+    '''
+    bump_global_version()
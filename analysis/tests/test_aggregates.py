@@ -17,6 +17,8 @@ from events.models import Event
 from indicators.models import Indicator, Option, Assessment
 from datetime import date, timedelta
 from flags.utils import create_flag
+from analysis.utils.aggregates import event_no_aggregates, event_org_no_aggregates, social_aggregates
+from analysis.utils.facts import flush_response_facts
 User = get_user_model()
 
 class AggregatesViewSetTest(APITestCase):
@@ -187,6 +189,8 @@ class AggregatesViewSetTest(APITestCase):
         self.response3_1 = Response.objects.create(indicator=self.indicator, interaction=self.interaction3, response_option=self.option1, response_date='2025-05-01', response_location='There')
         self.response3_1_1 = Response.objects.create(indicator=self.indicator, interaction=self.interaction3, response_option=self.option2, response_date='2025-05-01', response_location='There')
         self.response3_2 = Response.objects.create(indicator=self.indicator2, interaction=self.interaction3, response_value='22', response_date='2025-05-01', response_location='There')
+        #facts/rollups for the responses are built once the transaction commits, which doesn't happen inside a test case
+        flush_response_facts()
         
         self.aggie_group1 = AggregateGroup.objects.create(
             start='2025-01-09', 
@@ -564,6 +568,37 @@ class AggregatesViewSetTest(APITestCase):
         self.assertEqual(response.data['counts']['by_period']['Q3 2025'], 1)
         '''
     
+    def test_event_grouped_query(self):
+        '''
+        Events are grouped in one query (no matter the number of events), split by quarter and host.
+        '''
+        params = {'organization': True}
+        with self.assertNumQueries(1):
+            aggregates = event_org_no_aggregates(self.admin, self.event_org_ind, split='quarter', params=params)
+        counts = {(item['period'], item['organization']): item['count'] for item in aggregates.values() if item['count']}
+        self.assertEqual(counts, {('Q1 2025', 'Parent'): 2, ('Q2 2025', 'Other'): 1, ('Q3 2025', 'Parent'): 1})
+        with self.assertNumQueries(1):
+            aggregates = event_no_aggregates(self.admin, self.event_ind, split='month', params=params)
+        counts = {(item['period'], item['organization']): item['count'] for item in aggregates.values() if item['count']}
+        self.assertEqual(counts, {('Jan 2025', 'Parent'): 1, ('May 2025', 'Other'): 1, ('Jul 2025', 'Parent'): 1})
+
+    def test_social_grouped_query(self):
+        '''
+        Posts are grouped in one query, and a post linked to several tasks counts toward its earliest task's organization.
+        '''
+        self.child_post.tasks.add(self.social_task)
+        params = {'organization': True, 'metric': True}
+        with self.assertNumQueries(1):
+            aggregates = social_aggregates(self.admin, self.social_ind, params, split='quarter')
+        counts = {(item['period'], item['organization'], item['metric']): item['count'] for item in aggregates.values() if item['count']}
+        self.assertEqual(counts[('Q1 2025', 'Parent', 'likes')], 15)
+        self.assertEqual(counts[('Q3 2025', 'Parent', 'views')], 50)
+        self.assertEqual(counts[('Q2 2025', 'Other', 'comments')], 40)
+        self.assertNotIn('Child', {item['organization'] for item in aggregates.values()})
+        #total engagement without the metric split
+        aggregates = social_aggregates(self.admin, self.social_ind, {'organization': True})
+        self.assertEqual({item['organization']: item['count'] for item in aggregates.values()}, {'Parent': 116, 'Other': 89})
+
     def test_social_split(self):
         '''
         EXPECT (Quarter) --3 total: 
@@ -0,0 +1,38 @@
+from django.test import SimpleTestCase
+from analysis.utils.buckets import prep_buckets, add_grouped_rows
+
+class BucketsTest(SimpleTestCase):
+    '''
+    Test the keyed bucket helpers that the aggregators use to place values.
+    '''
+    def setUp(self):
+        self.fields_map = {
+            'sex': ['M', 'F'],
+            'kp_type': ['FSW', 'TG', 'OTHER'],
+            'disability_type': ['VI', 'OTHER'],
+        }
+
+    def get_count(self, aggregates, **cell):
+        return next(obj['count'] for obj in aggregates.values() if all(obj[k] == v for k, v in cell.items()))
+
+    def test_prep_buckets(self):
+        aggregates, product_index = prep_buckets(self.fields_map, average=True)
+        self.assertEqual(len(aggregates), 12)
+        pos = product_index[('F', 'TG', 'OTHER')]
+        self.assertEqual(aggregates[pos], {'sex': 'F', 'kp_type': 'TG', 'disability_type': 'OTHER', 'count': 0, 'number': 0})
+
+    def test_add_grouped_rows(self):
+        aggregates, product_index = prep_buckets(self.fields_map, average=True)
+        rows = [
+            {'sex': 'F', 'kp_type': 'FSW', 'disability_type': 'VI', 'count': 4, 'number': 2},
+            #values shared by two fields ('OTHER') should only match the field they belong to
+            {'sex': 'M', 'kp_type': 'OTHER', 'disability_type': 'VI', 'count': 3, 'number': 1},
+            #not one of the requested values, so this should not count anywhere
+            {'sex': 'NB', 'kp_type': 'FSW', 'disability_type': 'VI', 'count': 9, 'number': 9},
+        ]
+        add_grouped_rows(aggregates, product_index, list(self.fields_map.keys()), rows, average=True)
+        self.assertEqual(self.get_count(aggregates, sex='F', kp_type='FSW', disability_type='VI'), 4)
+        self.assertEqual(aggregates[product_index[('F', 'FSW', 'VI')]]['number'], 2)
+        self.assertEqual(self.get_count(aggregates, sex='M', kp_type='OTHER', disability_type='VI'), 3)
+        self.assertEqual(self.get_count(aggregates, sex='M', kp_type='OTHER', disability_type='OTHER'), 0)
+        self.assertEqual(sum(obj['count'] for obj in aggregates.values()), 7)
@@ -0,0 +1,43 @@
+from django.test import SimpleTestCase
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+import csv
+from datetime import date
+from io import StringIO
+
+from analysis.models import PivotTable, PivotTableParam, ChartField
+from analysis.utils.aggregates import aggregates_switchboard
+from analysis.utils.csv import iter_csv, prep_csv
+from analysis.tests.test_dashboards import DashboardSetupMixin
+
+class CSVWriterTest(SimpleTestCase):
+    '''
+    Test that the streaming writer sends rows in chunks and formats values.
+    '''
+    def test_chunks(self):
+        rows = [['a', 'b']] + [[i, date(2025, 1, 1)] for i in range(5)]
+        chunks = list(iter_csv(iter(rows), chunk_size=2))
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(chunks[0], 'a,b\r\n0,2025-01-01\r\n')
+        self.assertEqual(list(iter_csv([[None, ['x', 'y']]])), [',"x,y"\r\n'])
+
+class PivotDownloadTest(DashboardSetupMixin, APITestCase):
+    '''
+    Test that a pivot table download is streamed and matches the pivoted aggregates.
+    '''
+    def test_download(self):
+        table = PivotTable.objects.create(name='Table', indicator=self.number_ind, project=self.project, created_by=self.admin)
+        for name in ['sex', 'age_range']:
+            PivotTableParam.objects.create(pivot_table=table, field=ChartField.objects.create(name=name))
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('analysis-download-csv', kwargs={'pk': table.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content).decode()
+
+        params = {name: name in ['sex', 'age_range'] for name in ['age_range', 'sex']}
+        aggregates = aggregates_switchboard(self.admin, self.number_ind, params, project=self.project)
+        expected = [['' if value is None else str(value) for value in row] for row in prep_csv(aggregates, params)]
+        self.assertEqual(list(csv.reader(StringIO(content))), expected)
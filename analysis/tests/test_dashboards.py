@@ -0,0 +1,180 @@
+from django.test import TransactionTestCase
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from unittest.mock import patch
+import time
+import threading
+from datetime import date
+
+from projects.models import Project, Client, Task, ProjectOrganization
+from respondents.models import Respondent, Interaction, KeyPopulation, Response
+from aggregates.models import AggregateCount, AggregateGroup
+from organizations.models import Organization
+from indicators.models import Indicator, Option, Assessment
+from analysis.models import DashboardSetting, IndicatorChartSetting, DashboardIndicatorChart, ChartIndicator
+from analysis.utils import dashboards
+from analysis.utils.dashboards import get_dashboard_data, get_chart_data
+from analysis.utils.facts import flush_response_facts
+User = get_user_model()
+
+class DashboardSetupMixin:
+    '''
+    Creates a dashboard with a mix of charts that can/can't share data.
+    '''
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', role='admin')
+        self.org = Organization.objects.create(name='Parent')
+        self.child_org = Organization.objects.create(name='Child')
+        self.admin.organization = self.org
+        self.admin.save()
+        self.client_obj = Client.objects.create(name='Test Client', created_by=self.admin)
+        self.project = Project.objects.create(
+            name='Alpha Project',
+            client=self.client_obj,
+            status=Project.Status.ACTIVE,
+            start='2025-01-01',
+            end='2025-12-31',
+            created_by=self.admin,
+        )
+        ProjectOrganization.objects.create(project=self.project, organization=self.org)
+        ProjectOrganization.objects.create(project=self.project, organization=self.child_org, parent_organization=self.org)
+        self.assessment = Assessment.objects.create(name='Ass')
+        self.indicator = Indicator.objects.create(assessment=self.assessment, name='Select the Option', type=Indicator.Type.MULTI, allow_aggregate=True)
+        Option.objects.create(name='Option 1', indicator=self.indicator)
+        Option.objects.create(name='Option 2', indicator=self.indicator)
+        self.number_ind = Indicator.objects.create(assessment=self.assessment, name='Enter the Number', type=Indicator.Type.INT, allow_aggregate=True)
+        tasks = [
+            Task.objects.create(project=self.project, organization=self.org, assessment=self.assessment),
+            Task.objects.create(project=self.project, organization=self.child_org, assessment=self.assessment),
+        ]
+        fsw = KeyPopulation.objects.create(name=KeyPopulation.KeyPopulations.FSW)
+        msm = KeyPopulation.objects.create(name=KeyPopulation.KeyPopulations.MSM)
+        for i, (sex, age, day) in enumerate([
+            ('M', Respondent.AgeRanges.T_24, date(2025, 1, 5)),
+            ('F', Respondent.AgeRanges.T_24, date(2025, 2, 10)),
+            ('F', Respondent.AgeRanges.T4_29, date(2025, 4, 3)),
+            ('M', Respondent.AgeRanges.T4_29, date(2025, 5, 20)),
+        ]):
+            respondent = Respondent.objects.create(
+                is_anonymous=True, age_range=age, village='Testingplace', district=Respondent.District.CENTRAL,
+                citizenship='BW', sex=sex,
+            )
+            if i == 1:
+                respondent.kp_status.set([fsw, msm])
+            interaction = Interaction.objects.create(interaction_date=day, task=tasks[i % 2], respondent=respondent)
+            for option in Option.objects.filter(indicator=self.indicator)[:i % 2 + 1]:
+                Response.objects.create(indicator=self.indicator, interaction=interaction, response_option=option, response_date=day)
+            Response.objects.create(indicator=self.number_ind, interaction=interaction, response_value=str(i + 1), response_date=day)
+        #facts/rollups for the responses are built once the transaction commits, which doesn't happen inside a test case
+        flush_response_facts()
+        group = AggregateGroup.objects.create(start='2025-03-01', end='2025-03-31', project=self.project, organization=self.org, indicator=self.number_ind)
+        AggregateCount.objects.create(group=group, sex='M', age_range=Respondent.AgeRanges.T_24, value=10)
+        AggregateCount.objects.create(group=group, sex='F', value=5)
+
+        self.dashboard = DashboardSetting.objects.create(name='Dash', created_by=self.admin, project=self.project)
+        for i, (indicators, axis, legend, stack, average) in enumerate([
+            ([self.number_ind], 'month', 'sex', None, False),
+            ([self.number_ind], 'quarter', 'age_range', 'sex', False),
+            ([self.number_ind], None, None, None, False),
+            ([self.number_ind], 'quarter', 'organization', None, False),
+            ([self.number_ind], 'quarter', 'kp_type', None, False),
+            ([self.number_ind], 'month', 'sex', None, True),
+            ([self.indicator], 'month', 'sex', None, False),
+            ([self.indicator], None, 'option', 'sex', False),
+            ([self.indicator, self.number_ind], 'quarter', None, None, False),
+        ]):
+            chart = IndicatorChartSetting.objects.create(axis=axis, legend=legend, stack=stack, average=average, created_by=self.admin)
+            for indicator in indicators:
+                ChartIndicator.objects.create(chart=chart, indicator=indicator)
+            DashboardIndicatorChart.objects.create(dashboard=self.dashboard, chart=chart, order=i)
+
+    def normalize(self, data):
+        return sorted(str(sorted(item.items())) for item in data.values())
+
+class DashboardDataTest(DashboardSetupMixin, APITestCase):
+    '''
+    Test that calculating a dashboard's charts together returns the same data as calculating each chart on its own,
+    while only fetching the data for charts on the same indicator/scope once.
+    '''
+
+    def test_matches_single_charts(self):
+        with patch('analysis.utils.dashboards.get_response_rows', wraps=dashboards.get_response_rows) as fetch:
+            data = get_dashboard_data(self.dashboard)
+        for link in DashboardIndicatorChart.objects.filter(dashboard=self.dashboard):
+            expected = get_chart_data(link.chart, project=self.project)
+            self.assertEqual(self.normalize(data[link.id]['chart_data']), self.normalize(expected), f'chart {link.order}')
+        #number indicator (shared), number indicator split by kp type, multiselect (shared), multiselect split by option
+        self.assertEqual(fetch.call_count, 4)
+
+    def test_data_endpoint(self):
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('dashboard-get-data', kwargs={'pk': self.dashboard.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.json()['charts']), 9)
+        #only the creator can see their dashboards
+        other = User.objects.create_user(username='other', password='testpass', role='admin')
+        other.organization = self.org
+        other.save()
+        self.client.force_authenticate(user=other)
+        response = self.client.get(reverse('dashboard-get-data', kwargs={'pk': self.dashboard.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_detail_endpoint(self):
+        '''
+        The dashboard's detail view should serve each chart from the data planned for the whole dashboard.
+        '''
+        self.client.force_authenticate(user=self.admin)
+        with patch('analysis.serializers.get_chart_data') as single, \
+            patch('analysis.utils.dashboards.get_chart_filters', wraps=dashboards.get_chart_filters) as get_filters:
+            response = self.client.get(reverse('dashboard-detail', kwargs={'pk': self.dashboard.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        single.assert_not_called()
+        #fetched once per chart for planning/calculating
+        self.assertEqual(get_filters.call_count, 9)
+        expected = get_dashboard_data(self.dashboard)
+        for item in response.json()['indicator_charts']:
+            self.assertEqual(self.normalize(item['chart']['chart_data']), self.normalize(expected[item['id']]['chart_data']))
+
+class DashboardWorkersTest(DashboardSetupMixin, TransactionTestCase):
+    '''
+    Test calculating charts on a thread pool. Each thread uses its own connection, which can't see data inside another
+    connection's transaction, so this data has to actually be committed.
+    '''
+    def test_matches_sequential(self):
+        sequential = get_dashboard_data(self.dashboard, workers=0)
+        threaded = get_dashboard_data(self.dashboard, workers=4, timeout=60)
+        self.assertEqual(sequential.keys(), threaded.keys())
+        for link_id, item in sequential.items():
+            self.assertIsNone(threaded[link_id]['error'])
+            self.assertEqual(self.normalize(item['chart_data']), self.normalize(threaded[link_id]['chart_data']))
+
+    def test_shared_pool(self):
+        '''
+        Every dashboard should run on the same fixed size pool, so threads don't pile up across requests.
+        '''
+        get_dashboard_data(self.dashboard, workers=4, timeout=60)
+        pool = dashboards.get_pool(4)
+        get_dashboard_data(self.dashboard, workers=4, timeout=60)
+        self.assertIs(dashboards.get_pool(4), pool)
+        self.assertLessEqual(len([thread for thread in threading.enumerate() if thread.name.startswith('dashboard')]), 4)
+
+    def test_timeout(self):
+        '''
+        A slow chart should be returned with an error without holding up the rest.
+        '''
+        slow = DashboardIndicatorChart.objects.get(dashboard=self.dashboard, order=0)
+        original = dashboards.get_chart_targets
+        def get_chart_targets(chart, *args, **kwargs):
+            if chart.id == slow.chart_id:
+                time.sleep(2)
+            return original(chart, *args, **kwargs)
+        with patch('analysis.utils.dashboards.get_chart_targets', side_effect=get_chart_targets):
+            started = time.monotonic()
+            data = get_dashboard_data(self.dashboard, workers=4, timeout=0.5)
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertIsNotNone(data[slow.id]['error'])
+        self.assertIsNone(data[slow.id]['chart_data'])
+        #everything else still loaded
+        self.assertTrue(all(item['error'] is None for link_id, item in data.items() if link_id != slow.id))
@@ -0,0 +1,174 @@
+from django.test import TestCase
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from datetime import date
+from io import StringIO
+from unittest.mock import patch
+
+from projects.models import Project, Client, Task, ProjectOrganization
+from respondents.models import Respondent, Interaction, Pregnancy, HIVStatus, KeyPopulation, Response
+from organizations.models import Organization
+from indicators.models import Indicator, Assessment
+from analysis.models import ResponseFact
+from analysis.utils.masks import KP_BITS
+from analysis.utils.facts import sync_response_facts
+from flags.utils import create_flag, resolve_flag
+User = get_user_model()
+
+class ResponseFactTest(TestCase):
+    '''
+    Test that the response fact table stays in sync with the data it is built from and that it can be rebuilt.
+    '''
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', role='admin')
+        self.parent_org = Organization.objects.create(name='Parent')
+        self.child_org = Organization.objects.create(name='Child')
+        self.client_obj = Client.objects.create(name='Test Client', created_by=self.admin)
+        self.project = Project.objects.create(
+            name='Alpha Project',
+            client=self.client_obj,
+            status=Project.Status.ACTIVE,
+            start='2025-01-01',
+            end='2025-12-31',
+            created_by=self.admin,
+        )
+        self.child_link = ProjectOrganization.objects.create(project=self.project, organization=self.child_org, parent_organization=self.parent_org)
+        self.assessment = Assessment.objects.create(name='Ass')
+        self.indicator = Indicator.objects.create(assessment=self.assessment, name='Enter the Number', type=Indicator.Type.INT)
+        self.task = Task.objects.create(project=self.project, organization=self.child_org, assessment=self.assessment)
+
+        self.respondent = Respondent.objects.create(
+            is_anonymous=True,
+            age_range=Respondent.AgeRanges.T_24,
+            village='Testingplace',
+            district=Respondent.District.CENTRAL,
+            citizenship='BW',
+            sex=Respondent.Sex.MALE,
+        )
+        HIVStatus.objects.create(respondent=self.respondent, hiv_positive=True, date_positive=date(2025, 3, 1))
+        self.interaction = Interaction.objects.create(interaction_date='2025-02-01', task=self.task, respondent=self.respondent)
+        #facts for saved responses are built once the transaction commits
+        with self.captureOnCommitCallbacks(execute=True):
+            self.response = Response.objects.create(indicator=self.indicator, interaction=self.interaction, response_value='12', response_date='2025-02-01')
+            self.response2 = Response.objects.create(indicator=self.indicator, interaction=self.interaction, response_value='abc', response_date='2025-04-01')
+
+    def test_fact_created(self):
+        '''
+        Saving a response should create a fact with the task/respondent information copied onto it.
+        '''
+        fact = ResponseFact.objects.get(response=self.response)
+        self.assertEqual(fact.value, 12)
+        self.assertEqual(fact.organization, self.child_org)
+        self.assertEqual(fact.parent_organization, self.parent_org)
+        self.assertEqual(fact.client, self.client_obj)
+        self.assertEqual(fact.sex, Respondent.Sex.MALE)
+        self.assertTrue(fact.is_citizen)
+        #positive after this response, but before the second one
+        self.assertFalse(fact.hiv_positive)
+        fact2 = ResponseFact.objects.get(response=self.response2)
+        self.assertIsNone(fact2.value)
+        self.assertTrue(fact2.hiv_positive)
+
+    def test_built_on_commit(self):
+        '''
+        Responses saved in a transaction should be queued and have their facts built together once it commits.
+        '''
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = Response.objects.create(indicator=self.indicator, interaction=self.interaction, response_value='3', response_date='2025-02-01')
+            Response.objects.create(indicator=self.indicator, interaction=self.interaction, response_value='4', response_date='2025-02-01')
+        self.assertFalse(ResponseFact.objects.filter(response=response).exists())
+        with patch('analysis.utils.facts.sync_response_facts', wraps=sync_response_facts) as sync:
+            for callback in callbacks:
+                callback()
+        #built in one pass, the other callbacks find nothing left to do
+        self.assertEqual(sync.call_count, 1)
+        self.assertEqual(ResponseFact.objects.filter(interaction=self.interaction).count(), 4)
+
+    def test_respondent_changes(self):
+        '''
+        Changes to the respondent or their statuses should be reflected on their facts.
+        '''
+        fsw = KeyPopulation.objects.create(name=KeyPopulation.KeyPopulations.FSW)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.respondent.kp_status.add(fsw)
+            self.respondent.sex = Respondent.Sex.FEMALE
+            self.respondent.save()
+            Pregnancy.objects.create(respondent=self.respondent, term_began=date(2025, 1, 1), term_ended=date(2025, 3, 1))
+        fact = ResponseFact.objects.get(response=self.response)
+        self.assertEqual(fact.kp_mask, KP_BITS['FSW'])
+        self.assertEqual(fact.sex, Respondent.Sex.FEMALE)
+        self.assertTrue(fact.pregnant)
+        self.assertFalse(ResponseFact.objects.get(response=self.response2).pregnant)
+
+    def test_flags(self):
+        '''
+        Open flags on the interaction should be marked on the fact, and cleared once resolved.
+        '''
+        with self.captureOnCommitCallbacks(execute=True):
+            create_flag(self.interaction, 'test interaction', self.admin)
+        self.assertTrue(ResponseFact.objects.get(response=self.response).has_open_flag)
+        with self.captureOnCommitCallbacks(execute=True):
+            resolve_flag(self.interaction.flags.all(), 'test interaction')
+        self.assertFalse(ResponseFact.objects.get(response=self.response).has_open_flag)
+
+    def test_project_changes(self):
+        '''
+        Project client/parent organization changes should be reflected on the facts.
+        '''
+        self.child_link.parent_organization = None
+        self.child_link.save()
+        self.project.client = None
+        self.project.save()
+        fact = ResponseFact.objects.get(response=self.response)
+        self.assertIsNone(fact.parent_organization)
+        self.assertIsNone(fact.client)
+
+    def test_task_moved(self):
+        '''
+        Moving a task to another organization should rebuild its facts once the transaction commits, other edits to it
+        shouldn't rebuild anything.
+        '''
+        with patch('analysis.utils.facts.sync_response_facts', wraps=sync_response_facts) as sync:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.task.save()
+            sync.assert_not_called()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.task.organization = self.parent_org
+                self.task.save()
+                self.assertEqual(ResponseFact.objects.get(response=self.response).organization, self.child_org)
+            self.assertEqual(sync.call_count, 1)
+        self.assertEqual(ResponseFact.objects.get(response=self.response).organization, self.parent_org)
+
+    def test_bulk_edit_built_once(self):
+        '''
+        Editing several respondents/interactions in one transaction should rebuild their facts together once it commits.
+        '''
+        respondent = Respondent.objects.create(is_anonymous=True, age_range=Respondent.AgeRanges.T_24, district=Respondent.District.CENTRAL, sex=Respondent.Sex.MALE)
+        interaction = Interaction.objects.create(interaction_date='2025-02-01', task=self.task, respondent=respondent)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = Response.objects.create(indicator=self.indicator, interaction=interaction, response_value='5', response_date='2025-02-01')
+        with self.captureOnCommitCallbacks() as callbacks:
+            for obj in [self.respondent, respondent]:
+                obj.sex = Respondent.Sex.FEMALE
+                obj.save()
+            create_flag(interaction, 'test interaction', self.admin)
+        self.assertEqual(ResponseFact.objects.get(response=response).sex, Respondent.Sex.MALE)
+        with patch('analysis.utils.facts.sync_response_facts', wraps=sync_response_facts) as sync:
+            for callback in callbacks:
+                callback()
+        self.assertEqual(sync.call_count, 1)
+        self.assertEqual(ResponseFact.objects.filter(sex=Respondent.Sex.FEMALE).count(), 3)
+        self.assertTrue(ResponseFact.objects.get(response=response).has_open_flag)
+
+    def test_response_deleted(self):
+        self.response.delete()
+        self.assertFalse(ResponseFact.objects.filter(response_id=self.response.id).exists())
+
+    def test_rebuild(self):
+        '''
+        The rebuild command should recreate the table from the responses.
+        '''
+        ResponseFact.objects.all().delete()
+        call_command('rebuild_response_facts', stdout=StringIO())
+        self.assertEqual(ResponseFact.objects.count(), 2)
+        self.assertEqual(ResponseFact.objects.get(response=self.response).value, 12)
@@ -0,0 +1,102 @@
+from django.test import TestCase
+from datetime import date, timedelta
+
+from django.contrib.auth import get_user_model
+from projects.models import Project, Client, Task
+from respondents.models import Respondent, Interaction, Response, HIVStatus, Pregnancy
+from organizations.models import Organization
+from indicators.models import Indicator, Assessment
+from analysis.utils.collection import get_hiv_statuses, get_pregnancies, get_interactions_from_indicator
+from analysis.utils.intervals import IntervalIndex
+User = get_user_model()
+
+class IntervalIndexTest(TestCase):
+    '''
+    Test that the interval index gives the same answers as checking each pregnancy/HIV status.
+    '''
+    def setUp(self):
+        self.respondents = []
+        for i in range(3):
+            self.respondents.append(Respondent.objects.create(
+                is_anonymous=True, age_range=Respondent.AgeRanges.T_24, village='Testingplace',
+                district=Respondent.District.CENTRAL, citizenship='BW', sex=Respondent.Sex.FEMALE,
+            ))
+        first, second, third = self.respondents
+        Pregnancy.objects.create(respondent=first, term_began=date(2024, 1, 1), term_ended=date(2024, 9, 1))
+        Pregnancy.objects.create(respondent=first, term_began=date(2024, 8, 1), term_ended=date(2024, 10, 1))
+        Pregnancy.objects.create(respondent=first, term_began=date(2025, 3, 1), term_ended=None)
+        Pregnancy.objects.create(respondent=second, term_began=date(2025, 1, 1), term_ended=date(2025, 2, 1))
+        HIVStatus.objects.create(respondent=first, hiv_positive=True, date_positive=date(2025, 6, 1))
+        HIVStatus.objects.create(respondent=second, hiv_positive=True, date_positive=date(2024, 6, 1))
+        HIVStatus.objects.create(respondent=third, hiv_positive=True, date_positive=date(2023, 1, 1))
+
+    def test_matches_any(self):
+        ids = [r.id for r in self.respondents]
+        pregnancies_map = get_pregnancies(ids)
+        hiv_status_map = get_hiv_statuses(ids)
+        pregnancy_index = IntervalIndex.from_pregnancies(pregnancies_map)
+        hiv_index = IntervalIndex.from_hiv_statuses(hiv_status_map)
+        days = [date(2023, 12, 1) + timedelta(days=15 * i) for i in range(70)]
+        for respondent_id in ids:
+            for day in days:
+                pregnant = any(p.term_began <= day <= (p.term_ended or date.today()) for p in pregnancies_map.get(respondent_id, []))
+                positive = any(hs.date_positive <= day for hs in hiv_status_map.get(respondent_id, []))
+                self.assertEqual(pregnancy_index.contains(respondent_id, day), pregnant, f'{respondent_id} {day}')
+                self.assertEqual(hiv_index.contains(respondent_id, day), positive, f'{respondent_id} {day}')
+
+    def test_contains_many(self):
+        ids = [r.id for r in self.respondents]
+        pregnancy_index = IntervalIndex.from_pregnancies(get_pregnancies(ids))
+        hiv_index = IntervalIndex.from_hiv_statuses(get_hiv_statuses(ids))
+        #an unsorted column that mixes respondents, repeats dates, and includes missing dates/unknown respondents
+        days = [date(2023, 12, 1) + timedelta(days=(37 * i) % 700) for i in range(60)]
+        respondent_ids = [ids[i % len(ids)] for i in range(len(days))] + [ids[0], 0]
+        days += [None, date(2025, 1, 1)]
+        for index in [pregnancy_index, hiv_index]:
+            self.assertEqual(
+                index.contains_many(respondent_ids, days),
+                [index.contains(respondent_id, day) for respondent_id, day in zip(respondent_ids, days)]
+            )
+
+    def test_overlaps_merged(self):
+        first = self.respondents[0]
+        index = IntervalIndex.from_pregnancies(get_pregnancies([first.id]))
+        self.assertEqual(index.starts[first.id], [date(2024, 1, 1), date(2025, 3, 1)])
+        self.assertEqual(index.ends[first.id], [date(2024, 10, 1), date.today()])
+        self.assertFalse(index.contains(first.id, None))
+
+class StatusFilterTest(IntervalIndexTest):
+    '''
+    Test that the pregnancy/HIV status filters (run in the database) agree with the index.
+    '''
+    def setUp(self):
+        super().setUp()
+        self.admin = User.objects.create_user(username='admin', password='testpass', role='admin')
+        org = Organization.objects.create(name='Org')
+        client = Client.objects.create(name='Test Client', created_by=self.admin)
+        project = Project.objects.create(
+            name='Alpha Project', client=client, status=Project.Status.ACTIVE, start='2024-01-01', end='2025-12-31', created_by=self.admin,
+        )
+        assessment = Assessment.objects.create(name='Ass')
+        self.indicator = Indicator.objects.create(assessment=assessment, name='Answered', type=Indicator.Type.BOOL)
+        task = Task.objects.create(project=project, organization=org, assessment=assessment)
+        for respondent in self.respondents:
+            for day in [date(2024, 2, 1), date(2024, 9, 15), date(2025, 1, 15), date(2025, 4, 1), date(2025, 7, 1)]:
+                interaction = Interaction.objects.create(interaction_date=day, task=task, respondent=respondent)
+                Response.objects.create(indicator=self.indicator, interaction=interaction, response_boolean=True, response_date=day)
+
+    def test_filters(self):
+        ids = [r.id for r in self.respondents]
+        pregnancy_index = IntervalIndex.from_pregnancies(get_pregnancies(ids))
+        hiv_index = IntervalIndex.from_hiv_statuses(get_hiv_statuses(ids))
+        responses = list(Response.objects.values_list('id', 'interaction__respondent_id', 'response_date'))
+        for field, value, index, expected in [
+            ('pregnancy', 'pregnant', pregnancy_index, True), ('pregnancy', 'not_pregnant', pregnancy_index, False),
+            ('hiv_status', 'hiv_positive', hiv_index, True), ('hiv_status', 'hiv_negative', hiv_index, False),
+        ]:
+            #building the queryset shouldn't hit the database
+            with self.assertNumQueries(0):
+                queryset = get_interactions_from_indicator(self.admin, self.indicator, filters={field: [value]})
+            matches = {r[0] for r in responses if index.contains(r[1], r[2]) == expected}
+            self.assertEqual(set(queryset.values_list('id', flat=True)), matches, value)
+        self.assertEqual(get_interactions_from_indicator(self.admin, self.indicator, filters={'pregnancy': ['pregnant', 'not_pregnant']}).count(), 15)
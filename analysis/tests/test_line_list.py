@@ -0,0 +1,89 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+import csv
+from io import StringIO
+
+from respondents.models import Response, KeyPopulation, Interaction
+from analysis.models import LineList
+from analysis.utils.line_list import iter_line_list, prep_line_list
+from analysis.tests.test_dashboards import DashboardSetupMixin
+
+class LineListTest(DashboardSetupMixin, APITestCase):
+    '''
+    Test that line lists are read in chunks with a fixed number of queries per chunk.
+    '''
+    def test_rows(self):
+        rows = prep_line_list(self.admin, project=self.project)
+        self.assertEqual(len(rows), Response.objects.count())
+        self.assertEqual([row['index'] for row in rows], list(range(1, len(rows) + 1)))
+        kp_rows = [row for row in rows if row['kp_status']]
+        self.assertTrue(kp_rows)
+        self.assertEqual(sorted(kp_rows[0]['kp_status']), sorted([KeyPopulation.KeyPopulations.FSW, KeyPopulation.KeyPopulations.MSM]))
+        self.assertEqual({row['organization'] for row in rows}, {'Parent', 'Child'})
+        self.assertEqual({row['project'] for row in rows}, {'Alpha Project'})
+
+    def test_query_count(self):
+        #the response query, then KP types, disability types, HIV statuses and pregnancies for each of the 3 chunks
+        with self.assertNumQueries(1 + 4 * 3):
+            rows = list(iter_line_list(self.admin, project=self.project, chunk_size=4))
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows, prep_line_list(self.admin, project=self.project))
+
+    def test_download(self):
+        ll = LineList.objects.create(name='List', project=self.project, created_by=self.admin)
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get(reverse('linelist-download-csv', kwargs={'pk': ll.id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        lines = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(lines[0][:3], ['index', 'is_anonymous', 'first_name'])
+        self.assertEqual(len(lines), 11)
+
+    def test_rows_endpoint(self):
+        '''
+        Paging through the rows returns every row of the full list once, in order.
+        '''
+        #responses without a date should still be paged through (enough that a page ends on one)
+        for value in ['9', '8', '7']:
+            Response.objects.create(indicator=self.number_ind, interaction=Interaction.objects.first(), response_value=value)
+        ll = LineList.objects.create(name='List', project=self.project, created_by=self.admin)
+        self.client.force_authenticate(user=self.admin)
+        url = reverse('linelist-rows', kwargs={'pk': ll.id})
+        #the detail view only has the settings
+        response = self.client.get(reverse('linelist-detail', kwargs={'pk': ll.id}))
+        self.assertNotIn('data', response.json())
+
+        rows = []
+        cursor = None
+        pages = 0
+        while True:
+            params = {'limit': 3, 'fields': 'id,response_date,value'}
+            if cursor:
+                params['cursor'] = cursor
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertNotIn('count', response.json())
+            rows += response.json()['results']
+            pages += 1
+            cursor = response.json()['next']
+            if not cursor:
+                break
+        self.assertEqual(pages, 5)
+        self.assertEqual(set(rows[0].keys()), {'id', 'response_date', 'value'})
+        expected = [{field: row[field] for field in ['id', 'response_date', 'value']} for row in prep_line_list(self.admin, project=self.project)]
+        self.assertEqual(len(rows), 13)
+        self.assertEqual([row['value'] for row in rows], [row['value'] for row in expected])
+        #undated responses come last
+        self.assertIsNone(rows[-1]['response_date'])
+
+        #without fields, rows are numbered across pages like the full list
+        first = self.client.get(url, {'limit': 5}).json()
+        second = self.client.get(url, {'limit': 5, 'cursor': first['next']}).json()
+        self.assertEqual([row['index'] for row in first['results'] + second['results']], list(range(1, 11)))
+
+        response = self.client.get(url, {'count': 'true'})
+        self.assertEqual(response.json()['count'], 13)
+        self.assertEqual(len(response.json()['results']), 13)
+        self.assertEqual(self.client.get(url, {'fields': 'id,password'}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(url, {'cursor': 'nope'}).status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,48 @@
+from django.test import SimpleTestCase, TestCase
+from django.contrib.auth import get_user_model
+from datetime import date
+
+from projects.models import Project, Client, Target
+from organizations.models import Organization
+from indicators.models import Indicator
+from analysis.utils.periods import get_period_calendar, get_quarter_strings_between, parse_period_string
+from analysis.utils.targets import get_target_aggregates
+User = get_user_model()
+
+class PeriodCalendarTest(SimpleTestCase):
+    '''
+    Test that the period calendar is ordered and fills in periods with no data.
+    '''
+    def test_calendar(self):
+        self.assertEqual(get_period_calendar('month', {'Mar 2025', 'Dec 2024', None}), ['Dec 2024', 'Jan 2025', 'Feb 2025', 'Mar 2025'])
+        self.assertEqual(get_period_calendar('quarter', {'Q1 2026', 'Q3 2025'}), ['Q3 2025', 'Q4 2025', 'Q1 2026'])
+        self.assertEqual(get_period_calendar('month', set()), [])
+        self.assertEqual(parse_period_string('Q4 2025'), date(2025, 10, 1))
+
+    def test_quarters_between(self):
+        #a window that starts late in a quarter still includes the quarter it ends in
+        self.assertEqual(get_quarter_strings_between(date(2025, 3, 1), date(2025, 4, 1)), ['Q1 2025', 'Q2 2025'])
+
+class TargetCalendarTest(TestCase):
+    '''
+    Test that target amounts are spread over one shared calendar.
+    '''
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', role='admin')
+        self.org = Organization.objects.create(name='Parent')
+        self.client_obj = Client.objects.create(name='Test Client', created_by=self.admin)
+        self.project = Project.objects.create(
+            name='Alpha Project', client=self.client_obj, status=Project.Status.ACTIVE, start='2025-01-01', end='2025-12-31', created_by=self.admin,
+        )
+        self.indicator = Indicator.objects.create(name='Whatever', category=Indicator.Category.MISC)
+        Target.objects.create(indicator=self.indicator, organization=self.org, project=self.project, amount=30, start=date(2025, 1, 1), end=date(2025, 3, 31))
+        Target.objects.create(indicator=self.indicator, organization=self.org, project=self.project, amount=20, start=date(2025, 3, 1), end=date(2025, 4, 30))
+        Target.objects.create(indicator=self.indicator, organization=self.org, project=self.project, amount=6, start=date(2025, 7, 1), end=date(2025, 7, 31))
+
+    def test_distribution(self):
+        targets = get_target_aggregates(self.admin, self.indicator, split='month')
+        self.assertEqual(list(targets.items()), [
+            ('Jan 2025', 10), ('Feb 2025', 10), ('Mar 2025', 20), ('Apr 2025', 10), ('May 2025', 0), ('Jun 2025', 0), ('Jul 2025', 6),
+        ])
+        targets = get_target_aggregates(self.admin, self.indicator, split='quarter')
+        self.assertEqual(targets, {'Q1 2025': 40, 'Q2 2025': 10, 'Q3 2025': 6})
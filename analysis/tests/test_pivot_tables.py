@@ -0,0 +1,111 @@
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from django.test import override_settings
+from unittest.mock import patch
+from datetime import date
+
+from respondents.models import Response, Interaction, HIVStatus
+from flags.utils import create_flag
+from analysis.models import PivotTable, PivotTableParam, ChartField
+from analysis.utils import pivot_tables
+from jobs.models import Job
+from jobs.utils import run_pending_jobs
+from analysis.tests.test_dashboards import DashboardSetupMixin
+
+class PivotSnapshotTest(DashboardSetupMixin, APITestCase):
+    '''
+    Test that pivot tables are served from their snapshot and refreshed when the data or settings change.
+    '''
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.admin)
+        self.table = PivotTable.objects.create(name='Table', indicator=self.number_ind, project=self.project, created_by=self.admin)
+        PivotTableParam.objects.create(pivot_table=self.table, field=ChartField.objects.create(name='sex'))
+        self.url = reverse('analysis-detail', kwargs={'pk': self.table.id})
+
+    def get_table(self, params=None):
+        response = self.client.get(self.url, params or {})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_snapshot_served(self):
+        first = self.get_table()
+        self.assertFalse(first['is_stale'])
+        self.assertIsNotNone(first['computed_at'])
+        self.assertIsNotNone(first['compute_duration_ms'])
+        #nothing changed, so the second view shouldn't aggregate anything
+        with patch.object(pivot_tables, 'aggregates_switchboard') as aggregate:
+            second = self.get_table()
+        aggregate.assert_not_called()
+        self.assertEqual(second['data'], first['data'])
+        self.assertEqual(second['computed_at'], first['computed_at'])
+
+    @override_settings(ANALYSIS_CACHE_ENABLED=False, CACHES={'analysis': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_snapshot_without_cache(self):
+        #versions don't depend on the cache backend, so a snapshot is still fresh without a shared cache
+        first = self.get_table()
+        second = self.get_table()
+        self.assertFalse(second['is_stale'])
+        self.assertEqual(second['computed_at'], first['computed_at'])
+        self.assertFalse(Job.objects.filter(type=Job.Type.PIVOT_TABLE_REFRESH).exists())
+
+    def test_stale_while_revalidate(self):
+        first = self.get_table()
+        with self.captureOnCommitCallbacks(execute=True):
+            Response.objects.create(indicator=self.number_ind, interaction=Interaction.objects.first(), response_value='9', response_date=date(2025, 1, 5))
+
+        #the old data is served and one refresh is queued, no matter how many times it is viewed
+        stale = self.get_table()
+        self.assertTrue(stale['is_stale'])
+        self.assertEqual(stale['data'], first['data'])
+        self.get_table()
+        self.assertEqual(Job.objects.filter(type=Job.Type.PIVOT_TABLE_REFRESH, status=Job.Status.QUEUED).count(), 1)
+
+        self.assertEqual(run_pending_jobs(), 1)
+        fresh = self.get_table()
+        self.assertFalse(fresh['is_stale'])
+        self.assertNotEqual(fresh['data'], first['data'])
+
+    def test_deletes_are_stale(self):
+        self.get_table()
+        with self.captureOnCommitCallbacks(execute=True):
+            Response.objects.filter(indicator=self.number_ind).first().delete()
+        self.assertTrue(self.get_table()['is_stale'])
+
+    def test_flags_and_statuses_are_stale(self):
+        '''
+        Flags (which only set has_open_flags with an update) and respondent statuses don't touch the responses, but
+        still change the aggregates.
+        '''
+        self.get_table()
+        interaction = Interaction.objects.filter(response__indicator=self.number_ind).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            create_flag(interaction, 'Check this', self.admin)
+        self.assertTrue(self.get_table()['is_stale'])
+
+        self.get_table({'refresh': 1})
+        self.assertFalse(self.get_table()['is_stale'])
+        with self.captureOnCommitCallbacks(execute=True):
+            HIVStatus.objects.create(respondent=interaction.respondent, hiv_positive=True)
+        self.assertTrue(self.get_table()['is_stale'])
+
+    def test_refresh(self):
+        first = self.get_table()
+        with self.captureOnCommitCallbacks(execute=True):
+            Response.objects.create(indicator=self.number_ind, interaction=Interaction.objects.first(), response_value='9', response_date=date(2025, 1, 5))
+        refreshed = self.get_table({'refresh': 1})
+        self.assertFalse(refreshed['is_stale'])
+        self.assertNotEqual(refreshed['data'], first['data'])
+        self.assertFalse(Job.objects.exists())
+
+    def test_settings_changed(self):
+        #a snapshot for different settings is recalculated right away instead of being served
+        first = self.get_table()
+        self.table.refresh_from_db()
+        self.table.start = date(2025, 3, 1)
+        self.table.save()
+        updated = self.get_table()
+        self.assertFalse(updated['is_stale'])
+        self.assertNotEqual(updated['data'], first['data'])
+        self.assertGreater(updated['computed_at'], first['computed_at'])
@@ -0,0 +1,127 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APITestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from organizations.models import Organization
+from analysis.models import RequestLog
+from analysis.middleware import get_query_stats
+from analysis.utils.query_stats import QueryCollector, normalize_sql
+from analysis.utils.request_logs import RequestLogBuffer, request_log_buffer
+User = get_user_model()
+
+class NormalizeSQLTest(SimpleTestCase):
+    '''
+    Test that queries that only differ by their values share a fingerprint.
+    '''
+    def test_normalize(self):
+        self.assertEqual(
+            normalize_sql("SELECT * FROM users WHERE id = 4 AND name = 'o''brien'"),
+            'SELECT * FROM users WHERE id = ? AND name = ?'
+        )
+        self.assertEqual(
+            normalize_sql('SELECT * FROM "users" WHERE "id" IN (%s, %s, %s)'),
+            normalize_sql('SELECT * FROM "users"\n  WHERE "id" IN (%s)'),
+        )
+
+@override_settings(REQUEST_LOG_REPEATED_QUERY_THRESHOLD=5)
+class QueryCollectorTest(TestCase):
+    '''
+    Test that the collector counts queries and flags ones repeated once per row.
+    '''
+    def test_repeated(self):
+        collector = QueryCollector()
+        with collector.collect():
+            User.objects.count()
+            for i in range(6):
+                User.objects.filter(id=i).exists()
+        stats = get_query_stats(collector)
+        self.assertEqual(stats['query_count'], 7)
+        self.assertEqual(stats['repeated_query_count'], 6)
+        self.assertIn('WHERE "users_user"."id" = ?', stats['repeated_query'])
+        self.assertIsNotNone(stats['slowest_query'])
+        self.assertGreaterEqual(stats['db_time_ms'], stats['slowest_query_ms'])
+
+    def test_not_repeated(self):
+        collector = QueryCollector()
+        with collector.collect():
+            User.objects.count()
+        self.assertIsNone(get_query_stats(collector)['repeated_query'])
+
+class RequestLogTest(APITestCase):
+    '''
+    Test that sampled requests store their SQL stats and they are shown in site analytics.
+    '''
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', role='admin')
+        self.admin.organization = Organization.objects.create(name='Org')
+        self.admin.save()
+        self.client.force_authenticate(user=self.admin)
+        request_log_buffer.clear()
+
+    @override_settings(REQUEST_LOG_QUERY_SAMPLE_RATE=1)
+    def test_sampled(self):
+        self.client.get(reverse('analysis-list'))
+        #nothing is written during the request
+        self.assertFalse(RequestLog.objects.exists())
+        request_log_buffer.flush()
+        log = RequestLog.objects.get()
+        self.assertEqual(log.user, self.admin)
+        self.assertGreater(log.query_count, 0)
+        self.assertIsNotNone(log.db_time_ms)
+        self.assertIsNotNone(log.slowest_query)
+
+        response = self.client.get('/api/analysis/meta/site-analytics/')
+        self.assertEqual(response.json()[0]['query_count'], log.query_count)
+
+    @override_settings(REQUEST_LOG_QUERY_SAMPLE_RATE=0)
+    def test_not_sampled(self):
+        self.client.get(reverse('analysis-list'))
+        request_log_buffer.flush()
+        log = RequestLog.objects.get()
+        self.assertIsNone(log.query_count)
+        self.assertIsNotNone(log.response_time_ms)
+
+class RequestLogBufferTest(TestCase):
+    '''
+    Test that buffered logs are written in batches and that a full buffer drops (and counts) new entries.
+    '''
+    def entry(self, user=None):
+        return {'path': '/api/test/', 'method': 'GET', 'user_id': user.id if user else None, 'status_code': 200, 'response_time_ms': 1.5}
+
+    @override_settings(REQUEST_LOG_BATCH_SIZE=3, REQUEST_LOG_FLUSH_SECONDS=60)
+    def test_batch(self):
+        buffer = RequestLogBuffer()
+        buffer.add(self.entry())
+        buffer.add(self.entry())
+        self.assertFalse(buffer.is_due())
+        buffer.add(self.entry())
+        self.assertTrue(buffer.is_due())
+        with self.assertNumQueries(1):
+            self.assertEqual(buffer.flush(), 3)
+        self.assertEqual(RequestLog.objects.count(), 3)
+        self.assertEqual(buffer.stats(), {'pending': 0, 'written': 3, 'dropped': 0, 'failed_flushes': 0})
+
+    @override_settings(REQUEST_LOG_BATCH_SIZE=100, REQUEST_LOG_FLUSH_SECONDS=0)
+    def test_interval(self):
+        buffer = RequestLogBuffer()
+        self.assertFalse(buffer.is_due())
+        buffer.add(self.entry())
+        self.assertTrue(buffer.is_due())
+
+    @override_settings(REQUEST_LOG_BUFFER_LIMIT=2)
+    def test_limit(self):
+        buffer = RequestLogBuffer()
+        self.assertTrue(buffer.add(self.entry()))
+        self.assertTrue(buffer.add(self.entry()))
+        self.assertFalse(buffer.add(self.entry()))
+        self.assertEqual(buffer.stats()['dropped'], 1)
+        self.assertEqual(buffer.stats()['pending'], 2)
+
+    def test_deleted_user(self):
+        user = User.objects.create_user(username='gone', password='testpass', role='admin')
+        buffer = RequestLogBuffer()
+        buffer.add(self.entry(user))
+        user.delete()
+        buffer.flush()
+        self.assertIsNone(RequestLog.objects.get().user)
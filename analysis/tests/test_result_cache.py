@@ -0,0 +1,165 @@
+from django.test import TestCase, override_settings
+from django.core.cache import caches
+from django.contrib.auth import get_user_model
+from unittest.mock import patch
+import tempfile
+import shutil
+
+from projects.models import Project, Client, Task, ProjectOrganization
+from respondents.models import Respondent, Interaction, Response
+from aggregates.models import AggregateCount, AggregateGroup
+from events.models import Event, EventTask
+from organizations.models import Organization
+from indicators.models import Indicator, Assessment
+from analysis.utils.aggregates import aggregates_switchboard
+from analysis.utils.result_cache import get_cache_stats, reset_cache_stats
+from analysis.utils.facts import flush_response_facts
+from flags.utils import create_flag
+User = get_user_model()
+
+class ResultCacheTest(TestCase):
+    '''
+    Test that aggregate results are served from the cache until the data they are built from changes.
+    '''
+    def setUp(self):
+        caches['analysis'].clear()
+        reset_cache_stats()
+        self.admin = User.objects.create_user(username='admin', password='testpass', role='admin')
+        self.org = Organization.objects.create(name='Parent')
+        self.admin.organization = self.org
+        self.admin.save()
+        self.client_obj = Client.objects.create(name='Test Client', created_by=self.admin)
+        self.project = Project.objects.create(
+            name='Alpha Project',
+            client=self.client_obj,
+            status=Project.Status.ACTIVE,
+            start='2025-01-01',
+            end='2025-12-31',
+            created_by=self.admin,
+        )
+        ProjectOrganization.objects.create(project=self.project, organization=self.org)
+        self.assessment = Assessment.objects.create(name='Ass')
+        self.indicator = Indicator.objects.create(assessment=self.assessment, name='Enter the Number', type=Indicator.Type.INT, allow_aggregate=True)
+        self.other = Indicator.objects.create(assessment=self.assessment, name='Other Number', type=Indicator.Type.INT)
+        self.task = Task.objects.create(project=self.project, organization=self.org, assessment=self.assessment)
+        self.respondent = Respondent.objects.create(
+            is_anonymous=True,
+            age_range=Respondent.AgeRanges.T_24,
+            village='Testingplace',
+            district=Respondent.District.CENTRAL,
+            citizenship='BW',
+            sex=Respondent.Sex.MALE,
+        )
+        self.interaction = Interaction.objects.create(interaction_date='2025-02-01', task=self.task, respondent=self.respondent)
+        self.response = Response.objects.create(indicator=self.indicator, interaction=self.interaction, response_value='12', response_date='2025-02-01')
+        Response.objects.create(indicator=self.other, interaction=self.interaction, response_value='3', response_date='2025-02-01')
+        #facts/rollups for the responses are built once the transaction commits, which doesn't happen inside a test case
+        flush_response_facts()
+
+    def get_count(self, indicator=None, **kwargs):
+        aggregates = aggregates_switchboard(self.admin, indicator or self.indicator, {'sex': True}, **kwargs)
+        return sum(item['count'] for item in aggregates.values())
+
+    def test_hit_after_miss(self):
+        self.assertEqual(self.get_count(), 12)
+        with patch('analysis.utils.aggregates.demographic_aggregates') as compute:
+            self.assertEqual(self.get_count(), 12)
+        compute.assert_not_called()
+        stats = get_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+        #different arguments are a different result
+        self.assertEqual(self.get_count(start='2025-03-01'), 0)
+
+    def test_response_invalidates(self):
+        self.assertEqual(self.get_count(), 12)
+        self.assertEqual(self.get_count(self.other), 3)
+        self.response.response_value = '20'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.response.save()
+        self.assertEqual(self.get_count(), 20)
+        #other indicators stay cached
+        with patch('analysis.utils.aggregates.demographic_aggregates') as compute:
+            self.assertEqual(self.get_count(self.other), 3)
+        compute.assert_not_called()
+
+    def test_counts_and_flags_invalidate(self):
+        self.assertEqual(self.get_count(), 12)
+        group = AggregateGroup.objects.create(start='2025-03-01', end='2025-03-31', project=self.project, organization=self.org, indicator=self.indicator)
+        #versions are bumped once the write commits
+        with self.captureOnCommitCallbacks(execute=True):
+            count = AggregateCount.objects.create(group=group, sex='M', value=10)
+        self.assertEqual(self.get_count(), 22)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_flag(count, 'test count', self.admin)
+        self.assertEqual(self.get_count(), 12)
+        with self.captureOnCommitCallbacks(execute=True):
+            create_flag(self.interaction, 'test interaction', self.admin)
+        self.assertEqual(self.get_count(), 0)
+
+    def test_events_invalidate(self):
+        indicator = Indicator.objects.create(name='Events Held', category=Indicator.Category.EVENTS)
+        task = Task.objects.create(project=self.project, organization=self.org, indicator=indicator)
+        self.assertEqual(self.get_count(indicator), 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            event = Event.objects.create(name='Event', host=self.org, status=Event.EventStatus.COMPLETED, start='2025-02-01', end='2025-02-02', location='Here')
+            EventTask.objects.create(event=event, task=task)
+        self.assertEqual(self.get_count(indicator), 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            event.delete()
+        self.assertEqual(self.get_count(indicator), 0)
+
+    def test_file_backend(self):
+        location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, location, ignore_errors=True)
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'analysis': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location},
+        }):
+            self.assertEqual(self.get_count(), 12)
+            self.assertEqual(self.get_count(), 12)
+            self.assertEqual(get_cache_stats()['hits'], 1)
+            self.response.response_value = '5'
+            with self.captureOnCommitCallbacks(execute=True):
+                self.response.save()
+            self.assertEqual(self.get_count(), 5)
+
+    def test_local_backend(self):
+        '''
+        The versions live in the database, so a per process cache should still be invalidated by writes.
+        '''
+        with override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'analysis': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'analysis-test'},
+        }):
+            self.assertEqual(self.get_count(), 12)
+            with patch('analysis.utils.aggregates.demographic_aggregates') as compute:
+                self.assertEqual(self.get_count(), 12)
+            compute.assert_not_called()
+            self.response.response_value = '5'
+            with self.captureOnCommitCallbacks(execute=True):
+                self.response.save()
+            self.assertEqual(self.get_count(), 5)
+
+    def test_bumped_on_commit(self):
+        '''
+        A result computed before a write commits should not be served afterwards.
+        '''
+        self.assertEqual(self.get_count(), 12)
+        with self.captureOnCommitCallbacks() as callbacks:
+            AggregateCount.objects.create(
+                group=AggregateGroup.objects.create(start='2025-03-01', end='2025-03-31', project=self.project, organization=self.org, indicator=self.indicator),
+                sex='M', value=10,
+            )
+        #not committed yet, so the old result is still current
+        with patch('analysis.utils.aggregates.demographic_aggregates') as compute:
+            self.assertEqual(self.get_count(), 12)
+        compute.assert_not_called()
+        for callback in callbacks:
+            callback()
+        self.assertEqual(self.get_count(), 22)
+
+    @override_settings(ANALYSIS_CACHE_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.get_count(), 12)
+        self.assertEqual(self.get_count(), 12)
+        self.assertFalse(get_cache_stats()['enabled'])
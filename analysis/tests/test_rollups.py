@@ -0,0 +1,143 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from unittest.mock import patch
+from datetime import date
+
+from projects.models import Project, Client, Task, ProjectOrganization
+from respondents.models import Respondent, Interaction, HIVStatus, KeyPopulation, Response
+from aggregates.models import AggregateCount, AggregateGroup
+from organizations.models import Organization
+from indicators.models import Indicator, Option, Assessment
+from analysis.models import MonthlyRollup
+from analysis.utils.aggregates import demographic_aggregates, aggregate_only_aggregates
+from analysis.utils.facts import flush_response_facts
+from flags.utils import create_flag
+User = get_user_model()
+
+class MonthlyRollupTest(TestCase):
+    '''
+    Test that the aggregates answered from the monthly rollups match the ones answered from the raw data, and that
+    the rollups are updated as the data changes.
+    '''
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', role='admin')
+        self.parent_org = Organization.objects.create(name='Parent')
+        self.child_org = Organization.objects.create(name='Child')
+        self.admin.organization = self.parent_org
+        self.admin.save()
+        self.client_obj = Client.objects.create(name='Test Client', created_by=self.admin)
+        self.project = Project.objects.create(
+            name='Alpha Project',
+            client=self.client_obj,
+            status=Project.Status.ACTIVE,
+            start='2025-01-01',
+            end='2025-12-31',
+            created_by=self.admin,
+        )
+        ProjectOrganization.objects.create(project=self.project, organization=self.parent_org)
+        ProjectOrganization.objects.create(project=self.project, organization=self.child_org, parent_organization=self.parent_org)
+
+        self.assessment = Assessment.objects.create(name='Ass')
+        self.indicator = Indicator.objects.create(assessment=self.assessment, name='Select the Option', type=Indicator.Type.MULTI, allow_aggregate=True)
+        self.option1 = Option.objects.create(name='Option 1', indicator=self.indicator)
+        self.option2 = Option.objects.create(name='Option 2', indicator=self.indicator)
+        self.number_ind = Indicator.objects.create(assessment=self.assessment, name='Enter the Number', type=Indicator.Type.INT, allow_aggregate=True)
+        self.task = Task.objects.create(project=self.project, organization=self.parent_org, assessment=self.assessment)
+        self.child_task = Task.objects.create(project=self.project, organization=self.child_org, assessment=self.assessment)
+
+        fsw = KeyPopulation.objects.create(name=KeyPopulation.KeyPopulations.FSW)
+        tg = KeyPopulation.objects.create(name=KeyPopulation.KeyPopulations.TG)
+        self.respondents = []
+        for i, (sex, citizenship) in enumerate([('M', 'BW'), ('F', 'ZA'), ('F', 'BW')]):
+            respondent = Respondent.objects.create(
+                is_anonymous=True,
+                age_range=Respondent.AgeRanges.T_24,
+                village='Testingplace',
+                district=Respondent.District.CENTRAL,
+                citizenship=citizenship,
+                sex=sex,
+            )
+            self.respondents.append(respondent)
+        self.respondents[1].kp_status.set([fsw, tg])
+        HIVStatus.objects.create(respondent=self.respondents[2], hiv_positive=True, date_positive=date(2025, 2, 1))
+
+        self.interactions = []
+        for respondent, task, day in [
+            (self.respondents[0], self.task, date(2025, 1, 5)),
+            (self.respondents[1], self.task, date(2025, 2, 10)),
+            (self.respondents[1], self.child_task, date(2025, 4, 3)),
+            (self.respondents[2], self.child_task, date(2025, 5, 20)),
+        ]:
+            interaction = Interaction.objects.create(interaction_date=day, task=task, respondent=respondent)
+            Response.objects.create(indicator=self.indicator, interaction=interaction, response_option=self.option1, response_date=day)
+            Response.objects.create(indicator=self.indicator, interaction=interaction, response_option=self.option2, response_date=day)
+            Response.objects.create(indicator=self.number_ind, interaction=interaction, response_value='7', response_date=day)
+            self.interactions.append(interaction)
+        #facts/rollups for the responses are built once the transaction commits, which doesn't happen inside a test case
+        flush_response_facts()
+
+        group = AggregateGroup.objects.create(start='2025-03-01', end='2025-03-31', project=self.project, organization=self.parent_org, indicator=self.number_ind)
+        AggregateCount.objects.create(group=group, sex='M', value=10)
+        AggregateCount.objects.create(group=group, sex='F', value=5)
+        self.count = AggregateCount.objects.create(group=group, sex='F', kp_type='FSW', value=3)
+
+    def assert_matches_raw(self, func, indicator, params, **kwargs):
+        '''
+        Run the aggregator against the rollups and again against the raw data and make sure they agree.
+        '''
+        from_rollups = func(self.admin, indicator, params, **kwargs)
+        with patch('analysis.utils.aggregates.can_use_rollups', return_value=False):
+            from_raw = func(self.admin, indicator, params, **kwargs)
+        sort = lambda aggregates: sorted(aggregates.values(), key=lambda obj: str(sorted(obj.items())))
+        self.assertEqual(sort(from_rollups), sort(from_raw))
+        return from_rollups
+
+    def test_rollups_match_raw(self):
+        self.assertTrue(MonthlyRollup.objects.exists())
+        for params in [{}, {'sex': True}, {'kp_type': True}, {'option': True, 'citizenship': True}, {'organization': True, 'hiv_status': True}]:
+            for split in [None, 'month', 'quarter']:
+                self.assert_matches_raw(demographic_aggregates, self.indicator, params, split=split)
+                self.assert_matches_raw(demographic_aggregates, self.number_ind, params, split=split)
+        self.assert_matches_raw(demographic_aggregates, self.number_ind, {'sex': True}, average=True)
+        self.assert_matches_raw(demographic_aggregates, self.indicator, {'sex': True}, filters={'kp_type': ['FSW']})
+        self.assert_matches_raw(demographic_aggregates, self.number_ind, {'sex': True}, project=self.project, organization=self.parent_org, cascade=True)
+        self.assert_matches_raw(aggregate_only_aggregates, self.number_ind, {'sex': True, 'kp_type': True}, split='month')
+
+    def test_both_values_filter(self):
+        '''
+        Selecting both values of a boolean filter should leave out counts that don't have one, like the raw counts do.
+        '''
+        group = AggregateGroup.objects.create(start='2025-03-01', end='2025-03-31', project=self.project, organization=self.parent_org, indicator=self.number_ind)
+        AggregateCount.objects.create(group=group, sex='M', citizenship='citizen', value=4)
+        AggregateCount.objects.create(group=group, sex='F', citizenship='non_citizen', value=2)
+        aggregates = self.assert_matches_raw(aggregate_only_aggregates, self.number_ind, {}, filters={'citizenship': ['citizen', 'non_citizen']})
+        self.assertEqual(aggregates[0]['count'], 6)
+
+    def test_multiselect_counted_once(self):
+        '''
+        Interactions with two options should only be counted once unless the data is split by option.
+        '''
+        aggregates = self.assert_matches_raw(demographic_aggregates, self.indicator, {})
+        self.assertEqual(aggregates[0]['count'], 4)
+
+    def test_incremental_updates(self):
+        '''
+        Deleting/flagging responses and editing counts should be reflected in the rollups right away.
+        '''
+        with self.captureOnCommitCallbacks(execute=True):
+            Response.objects.filter(interaction=self.interactions[0], indicator=self.number_ind).delete()
+            create_flag(self.interactions[3], 'test interaction', self.admin)
+        self.count.value = 30
+        self.count.save()
+        aggregates = self.assert_matches_raw(demographic_aggregates, self.number_ind, {})
+        #two unflagged responses of 7 and counts of 10 + 5 + 30
+        self.assertEqual(aggregates[0]['count'], 59)
+
+    def test_date_scoped_falls_back(self):
+        '''
+        Rollups can't be scoped to a date, so these should come from the raw data.
+        '''
+        with patch('analysis.utils.aggregates.get_rollups_from_indicator') as get_rollups:
+            aggregates = demographic_aggregates(self.admin, self.number_ind, {}, start='2025-02-01')
+        get_rollups.assert_not_called()
+        self.assertEqual(aggregates[0]['count'], 39)
@@ -1,15 +1,13 @@
-from django.db.models import Q, Count, OuterRef, Subquery, Min, F
-from respondents.models import Interaction
-from projects.models import Target, ProjectOrganization
-from aggregates.models import AggregateCount, AggregateGroup
-from events.models import Event
-from itertools import product
-from datetime import date
-from collections import defaultdict
+from aggregates.models import AggregateCount
 from indicators.models import Indicator, Option
-from analysis.utils.collection import get_counts_from_indicator, get_interactions_from_indicator, get_hiv_statuses, get_pregnancies, get_events_from_indicator, get_posts_from_indicator
-from analysis.utils.periods import get_month_string, get_quarter_string, get_month_strings_between, get_quarter_strings_between
-from analysis.utils.interactions_prep import build_keys
+from analysis.utils.collection import get_counts_from_indicator, get_interactions_from_indicator, get_facts_from_indicator, get_events_from_indicator, get_posts_from_indicator
+from analysis.utils.buckets import prep_buckets, add_grouped_rows
+from analysis.utils.periods import get_period_calendar
+from analysis.utils.columnar import columnar_repeat_counts
+from analysis.utils.grouping import group_facts, group_counts, group_rollups, group_events, group_posts, POST_METRICS
+from analysis.utils.rollups import can_use_rollups, get_rollups_from_indicator
+from analysis.utils.result_cache import get_or_compute
+from analysis.models import MonthlyRollup
 
 #map to convert some of the different field names from the respondent/count model
 FIELD_MAP = {
@@ -37,98 +35,74 @@ def demographic_aggregates(user, indicator, params, split=None, project=None, or
     - cascade (boolean, optional): if organization and project is selected, also include data from child organizations
     - average (boolean, optional): for integer types, pull an average instead of a sum
     '''
-    #get a list of interactions prefiltered based on user role/filters
-    responses = get_interactions_from_indicator(user, indicator, project, organization, start, end, filters, cascade)
-    if repeat_only:
-        #NOTE: This track respondents that have had the interaction repeatedly (i.e., the number of respondents reached with NCD messages at least three times or number of respondents who have received condoms more than once)
-        #Selecting this will ignore any numeric component to the interaction and just raw count unique respondents
-        responses = get_repeats(responses, n)
-    counts=[] #default counts to empty list
-    if not repeat_only and not average: #only collect counts if repeat is disabled and its not an average
-        #get list of prefiltered counts
-        counts = get_counts_from_indicator(user, indicator, params, project, organization, start, end, filters, cascade)
-
     #build a map  of all requested fields that need to be aggregated by
-    fields_map = {}
-    include_options=False
-    for param, include in params.items():
-        if include:
-            if param == 'option':
-                #get list of options from indicator
-                options = Option.objects.filter(indicator=indicator)
-                if options.exists():
-                    include_options = True
-                    fields_map['option'] = [o.name for o in Option.objects.filter(indicator=indicator).all()]
-                    continue
-                else:
-                    print('WARNING: This indicator has no options.')
-                    continue
-            elif param == 'organization':
-                fields_map['organization'] = set(sorted({r.interaction.task.organization.name for r in responses}) + sorted({count.group.organization.name for count in counts}))
-                continue
-            #this model contains all supported demographic fields, pull the list of options from it
-            field = AggregateCount._meta.get_field(param)
-            if field:
-                fields_map[param] = [value for value, label in field.choices]
-    
-    if not include_options and indicator.type == Indicator.Type.MULTI:
-        #filter to only one row for multiselects if option breakdown is not requested, since these are stored in multiple rows
-        responses = responses.distinct('interaction_id', 'interaction__respondent_id', 'indicator_id')
-
+    fields_map, include_options = get_fields_map(indicator, params)
     #if time split is required, add an additional 'field' deonting the time period
     if split in ['month', 'quarter']:
-        period_func = get_quarter_string if split == 'quarter' else get_month_string
-        periods = set(sorted({period_func(r.response_date) for r in responses}) + sorted({period_func(count.group.end) for count in counts}))
-        fields_map['period'] = periods
+        fields_map['period'] = set()
     #fields_map = {age_range: [18-24, 25-34...], sex: ['Male', 'Female]}
+    breakdowns = list(fields_map.keys())
 
-    #create a cartsial product of all possible combos
-    cartesian_product = list(product(*[bd for bd in fields_map.values()]))
-    #[(18-24, M), (18-24, F)]
+    if repeat_only:
+        #get a list of interactions prefiltered based on user role/filters
+        responses = get_interactions_from_indicator(user, indicator, project, organization, start, end, filters, cascade)
+        #NOTE: This track respondents that have had the interaction repeatedly (i.e., the number of respondents reached with NCD messages at least three times or number of respondents who have received condoms more than once)
+        #Selecting this will ignore any numeric component to the interaction and just raw count unique respondents
+        #respondents should only be counted once per bucket, which can't be done with a sum, so these are bucketed in python
+        return repeat_aggregates(responses, indicator, fields_map, split, include_options, n)
 
-    #use an index based key system to track this
-    product_index = {tuple(p): i for i, p in enumerate(cartesian_product)}
-    
-    #prepare the aggregates dict
-    aggregates = {}
-    for pos, arr in enumerate(cartesian_product):
-        aggregates[pos] = {} #use the index as a key
-        for i, field in enumerate(fields_map.keys()):
-            aggregates[pos][field] = arr[i]
-        aggregates[pos]['count'] = 0 #set default count to 0
-        if average:
-            aggregates[pos]['number'] = 0
-    #{1: {age_range: 18-24, sex: M}, 2: {age_range: 18-24, sex: F}}
+    rows = get_response_rows(user, indicator, params, breakdowns, split, include_options, project, organization, start, end, filters, cascade)
+    count_rows = [] #only collect counts if its not an average
+    if not average:
+        count_rows = get_count_rows(user, indicator, params, breakdowns, split, include_options, project, organization, start, end, filters, cascade)
+    return build_aggregates(fields_map, breakdowns, rows, count_rows, average, split)
+
+def get_response_rows(user, indicator, params, breakdowns, split=None, include_options=False, project=None, organization=None, start=None, end=None, filters=None, cascade=False):
+    '''
+    Returns the response data grouped by the requested breakdowns (see [./grouping.py]). Uses the monthly rollups if the
+    request can be answered at a monthly grain, otherwise lets the database group the flat fact table.
+    - breakdowns (list): ordered list of fields to split the data by (see get_fields_map, plus 'period')
+    - include_options (boolean, optional): if the data is split by option
+    - see demographic_aggregates for the rest
+    '''
+    if can_use_rollups(indicator, params, start, end, filters, include_options):
+        rollups = get_rollups_from_indicator(user, indicator, MonthlyRollup.Source.RESPONSE, project, organization, filters, cascade)
+        return group_rollups(rollups, indicator, breakdowns, split, include_options)
+    facts = get_facts_from_indicator(user, indicator, project, organization, start, end, filters, cascade)
+    return group_facts(facts, indicator, breakdowns, split, include_options)
+
+def get_count_rows(user, indicator, params, breakdowns, split=None, include_options=False, project=None, organization=None, start=None, end=None, filters=None, cascade=False):
+    '''
+    Returns the aggregate counts grouped by the requested breakdowns, from the rollups if possible. Accepts the
+    same arguments as get_response_rows.
+    '''
+    if can_use_rollups(indicator, params, start, end, filters, include_options):
+        counts = get_rollups_from_indicator(user, indicator, MonthlyRollup.Source.COUNT, project, organization, filters, cascade, params.get('option', False))
+        return group_rollups(counts, indicator, breakdowns, split, include_options)
+    counts = get_counts_from_indicator(user, indicator, params, project, organization, start, end, filters, cascade)
+    return group_counts(counts, breakdowns, split)
 
-    #prefetch related information for breakdowns
-    respondent_ids = {r.interaction.respondent_id for r in responses}
-    hiv_status_map = get_hiv_statuses(respondent_ids=respondent_ids)
-    pregnancies_map = get_pregnancies(respondent_ids=respondent_ids)
+def build_aggregates(fields_map, breakdowns, rows, count_rows, average=False, split=None):
+    '''
+    Places grouped response/count rows in their buckets and returns the aggregates.
+    - fields_map (dict): map of each breakdown to its possible values (see get_fields_map)
+    - breakdowns (list): ordered list of fields the data is being split by
+    - rows (list): grouped response rows (see get_response_rows)
+    - count_rows (list): grouped count rows (see get_count_rows)
+    - average (boolean, optional): return the average of the responses instead of the sum (counts are ignored)
+    - split (string, optional): month or quarter, required if period is a breakdown
+    '''
+    #organizations/periods depend on what data exists, so get them from the grouped rows
+    if 'organization' in fields_map:
+        fields_map['organization'] = {row['organization'] for row in rows + count_rows if row['organization'] is not None}
+    #periods are every period from the first to the last with data, in order
+    if 'period' in fields_map:
+        fields_map['period'] = get_period_calendar(split, {row['period'] for row in rows + count_rows})
 
-    product_index_sets = {frozenset(k): v for k, v in product_index.items()}
+    #create a bucket for each combination of the requested breakdowns and add the grouped rows to them
+    aggregates, product_index = prep_buckets(fields_map, average)
+    add_grouped_rows(aggregates, product_index, breakdowns, rows, average)
 
-    seen_respondents = set()
-    #loop through each interaction and add the appropriate value
-    for response in responses:
-        keys = build_keys(response, pregnancies_map, hiv_status_map)
-        for key, value in keys.items():
-            for breakdown in cartesian_product:
-                if frozenset(breakdown).issubset(frozenset(key)):
-                    pos = product_index_sets.get(frozenset(breakdown))
-                    if pos is not None:
-                        # if we're tracking repeats, increase the count by one per respondent
-                        if repeat_only:
-                            if response.interaction.respondent_id not in seen_respondents:
-                                aggregates[pos]['count'] += 1
-                            else:
-                                continue
-                        else:
-                            #otherwise increase by the value, which is one unless its a numeric type
-                            aggregates[pos]['count'] += value
-                            if average:
-                                #if average also tally a number to divide by
-                                aggregates[pos]['number'] += 1
-                        seen_respondents.add(response.interaction.respondent_id)
     # if average, calc the average
     if average:
         for key, obj in aggregates.items():
@@ -137,64 +111,57 @@ def demographic_aggregates(user, indicator, params, split=None, project=None, or
                 obj['count'] = round(obj['count'] / num, 2)
             else: 
                 obj['count'] = None
-
-    if counts: #only perform this if counts are available (and not expressly disabled by the repeat_only/average arg)
-        for count in counts:
-            count_params = []
-            for field in fields_map.keys():
-                if field == 'period':   
-                    field_val=None
-                elif field == 'organization':
-                    field_val = count.group.organization.name 
-                else:
-                    field_val = getattr(count, field)
-                if field == 'option' and field_val is not None:
-                    field_val = field_val.name 
-                
-                if field_val is not None:
-                    count_params.append(field_val)
-            if split in ['month', 'quarter']:
-                count_params.append(period_func(count.group.end))
-
-            param_set = frozenset(count_params)
-            pos = product_index_sets.get(param_set) #find correct spot to add the count to
-            if pos is not None:
-                aggregates[pos]['count'] += count.value #add the count in the correct button
+    #add counts (if available and not expressly disabled by the repeat_only/average arg)
+    add_grouped_rows(aggregates, product_index, breakdowns, count_rows)
     return aggregates
 
-
-def get_repeats(responses, n):
+def get_fields_map(indicator, params):
     '''
-    Helper function to only get repeats.
-    - interactions (queryset): interactions to check in
-    - n (integer): number of interactions a respondent needs within the queryset to be counted
+    Builds a map of each requested breakdown and the list of values it can have. Organization values depend on 
+    the data, so they are left empty for the caller to fill. Returns (fields_map, include_options).
+    - indicator (indicator instance): the indicator whose data is to be aggregated
+    - params (dict): a dictionary of params with true or false values denoting whether this aggregates should be split by that param
     '''
-    # 1️⃣ Find respondents that appear in >= n interactions
-    repeat_respondents = (
-        responses
-        .values('interaction__respondent')
-        .annotate(total=Count('interaction', distinct=True))
-        .filter(total__gte=n)
-        .values_list('interaction__respondent', flat=True)
-    )
+    fields_map = {}
+    include_options=False
+    for param, include in params.items():
+        if include:
+            if param == 'option':
+                #get list of options from indicator
+                options = [o.name for o in Option.objects.filter(indicator=indicator)]
+                if options:
+                    include_options = True
+                    fields_map['option'] = options
+                else:
+                    print('WARNING: This indicator has no options.')
+                continue
+            elif param == 'organization':
+                fields_map['organization'] = set()
+                continue
+            #this model contains all supported demographic fields, pull the list of options from it
+            field = AggregateCount._meta.get_field(param)
+            if field:
+                fields_map[param] = [value for value, label in field.choices]
+    return fields_map, include_options
 
-    # 2️⃣ For those respondents, keep only one response per interaction
-    #     We'll pick the lowest response.id per interaction_id
-    first_response_per_interaction = (
-        responses
-        .filter(interaction_id=OuterRef('interaction_id'))
-        .order_by('id')  # or 'created_at' if you prefer
-    )
-    # then pull list of repeats
-    repeat_only = (
-        responses
-        .filter(interaction__respondent_id__in=repeat_respondents)
-        .annotate(first_id=Subquery(first_response_per_interaction.values('id')[:1]))
-        .filter(id=F('first_id'))
-    )
-    #return queryset of only repeats
-    repeat_only = responses.filter(interaction__respondent_id__in=repeat_respondents)
-    return repeat_only
+def repeat_aggregates(responses, indicator, fields_map, split=None, include_options=False, n=2):
+    '''
+    Builds aggregates for repeat only requests in python, where each respondent with at least n interactions is 
+    counted once in each bucket their first interaction falls in (see [./repeats.py]).
+    - responses (queryset): queryset of responses in scope
+    - indicator (indicator instance): the indicator whose data is to be aggregated
+    - fields_map (dict): map of breakdowns and their values (see get_fields_map)
+    - split (string, optional): split the data into periods (month, quarter)
+    - include_options (boolean, optional): if the data is being split by option
+    - n (integer, optional): number of interactions a respondent needs to be counted
+    '''
+    #each breakdown is pulled as a column from the fact table and encoded as integers (see [./columnar.py])
+    counts = columnar_repeat_counts(responses, fields_map, split, n)
+    #create a bucket for each combination of the requested breakdowns, the counts are in the same order
+    aggregates, product_index = prep_buckets(fields_map)
+    for pos, count in enumerate(counts):
+        aggregates[pos]['count'] = count
+    return aggregates
 
 def aggregate_only_aggregates(user, indicator, params, split=None, project=None, organization=None, start=None, end=None, filters=None, cascade=False):
     '''
@@ -213,62 +180,15 @@ def aggregate_only_aggregates(user, indicator, params, split=None, project=None,
     - filters (dict, optional): filter to only inlcude values that match certain criteria
     - cascade (boolean, optional): if organization and project is selected, also include data from child organizations
     '''
-    #get list of counts that match criteria
-    counts = get_counts_from_indicator(user, indicator, params, project, organization, start, end, filters, cascade)
-    fields_map = {}
-    for param, include in params.items():
-        if include:
-            if param == 'organization':
-                fields_map['organization'] = set(sorted({count.group.organization.name for count in counts}))
-                continue
-            #this model contains all supported demographic fields, pull the list of options from it
-            field = AggregateCount._meta.get_field(param)
-            if field:
-                fields_map[param] = [value for value, label in field.choices]
-      
+    fields_map, include_options = get_fields_map(indicator, params)
     #if time split is required, add an additional 'field' deonting the time period
     if split in ['month', 'quarter']:
-        period_func = get_quarter_string if split == 'quarter' else get_month_string
-        periods = set(sorted({period_func(count.group.end) for count in counts}))
-        fields_map['period'] = periods
+        fields_map['period'] = set()
     #fields_map = {age_range: [18-24, 25-34...], sex: ['Male', 'Female]}
+    breakdowns = list(fields_map.keys())
 
-    #create a cartsial product of all possible combos
-    cartesian_product = list(product(*[bd for bd in fields_map.values()]))
-    #[(18-24, M), (18-24, F)]
-
-    #use an index based key system to track this
-    product_index = {tuple(p): i for i, p in enumerate(cartesian_product)}
-    
-    #prepare the aggregates dict
-    aggregates = {}
-    for pos, arr in enumerate(cartesian_product):
-        aggregates[pos] = {} #use the index as a key
-        for i, field in enumerate(fields_map.keys()):
-            aggregates[pos][field] = arr[i]
-        aggregates[pos]['count'] = 0 #set default count to 0
-    product_index_sets = {frozenset(k): v for k, v in product_index.items()}
-
-    #loop through each count and add the value to the correct bucket
-    for count in counts:
-            count_params = []
-            for field in fields_map.keys():
-                if field == 'period':   
-                    field_val=None
-                else:
-                    field_val = getattr(count, field)
-                if field == 'option' and field_val is not None:
-                    field_val = field_val.name 
-                if field_val is not None:
-                    count_params.append(field_val)
-            if split in ['month', 'quarter']:
-                count_params.append(period_func(count.group.end))
-
-            param_set = frozenset(count_params)
-            pos = product_index_sets.get(param_set) #find correct spot to add the count to
-            if pos is not None:
-                aggregates[pos]['count'] += count.value #add the count in the correct button
-    return aggregates
+    count_rows = get_count_rows(user, indicator, params, breakdowns, split, include_options, project, organization, start, end, filters, cascade)
+    return build_aggregates(fields_map, breakdowns, [], count_rows, split=split)
 
 def event_no_aggregates(user, indicator, split=None, project=None, organization=None, start=None, end=None, cascade=False, params=None):
     '''
@@ -286,45 +206,7 @@ def event_no_aggregates(user, indicator, split=None, project=None, organization=
     - params (dict, optional): a dictionary of params with true or false values denoting whether this 
         aggregates should be split by that param (organization only)
     '''
-    #get list of events that match criteria
-    events = get_events_from_indicator(user, indicator, project, organization, start, end, cascade)
-    aggregates = defaultdict(int)
-
-    #get list of ways the user wants the data broken down by
-    fields_map = {}
-    if split in ['month', 'quarter']:
-        period_func = get_quarter_string if split == 'quarter' else get_month_string
-        fields_map['period'] = list({period_func(e.end) for e in events})
-    for param, include in params.items():
-        if include:
-            if param == 'organization':
-                fields_map['organization'] = set(sorted({e.host.name for e in events}))
-                continue
-    
-    #based on the breakdowns the user wants, generate list of all possible combinations
-    cartesian_keys = list(fields_map.keys())
-    cartesian_product = list(product(*fields_map.values()))
-    product_index = {tuple(comb): i for i, comb in enumerate(cartesian_product)}
-
-    #set counts to 0 for each positon by default
-    aggregates = {}
-    for i, comb in enumerate(cartesian_product):
-        aggregates[i] = dict(zip(cartesian_keys, comb))
-        aggregates[i]['count'] = 0
-
-    #loop through each event and add it to the correct position
-    for event in events:
-        key = [] #key that will match one of the cartesian products
-        if split:
-            period = period_func(event.end) if split else None
-            key.append(period)
-        if fields_map.get('organization'):
-            key.append(event.host.name)
-        key_tuple = tuple(key)
-        pos = product_index.get(key_tuple)
-        if pos is not None:
-            aggregates[pos]['count'] += 1 #update correct count
-    return dict(aggregates)
+    return event_aggregates(user, indicator, split, project, organization, start, end, cascade, params)
 
 def event_org_no_aggregates(user, indicator, split=None, project=None, organization=None, start=None, end=None, cascade=False, params=None):
     '''
@@ -341,46 +223,33 @@ def event_org_no_aggregates(user, indicator, split=None, project=None, organizat
     - filters (dict, optional): filter to only inlcude values that match certain criteria
     - cascade (boolean, optional): if organization and project is selected, also include data from child organizations
     '''
-    #get list of events that fit the conditions
+    return event_aggregates(user, indicator, split, project, organization, start, end, cascade, params, participants=True)
+
+def event_aggregates(user, indicator, split=None, project=None, organization=None, start=None, end=None, cascade=False, params=None, participants=False):
+    '''
+    Shared aggregator for event number/org event number indicators. Events are grouped by period (end date) and host
+    in the database (see [./grouping.py]), so the number of queries doesn't depend on the number of events.
+    - participants (boolean, optional): sum the number of participating organizations instead of counting events
+    - see event_no_aggregates for the other arguments
+    '''
+    #get list of events that match criteria
     events = get_events_from_indicator(user, indicator, project, organization, start, end, cascade)
-    aggregates = defaultdict(int)
 
-    #add period/organization splits
-    fields_map = {}
+    #get list of ways the user wants the data broken down by
+    breakdowns = []
     if split in ['month', 'quarter']:
-        period_func = get_quarter_string if split == 'quarter' else get_month_string
-        fields_map['period'] = list({period_func(e.end) for e in events})
-
-    for param, include in params.items():
-        if include:
-            if param == 'organization':
-                fields_map['organization'] = set(sorted({e.host.name for e in events}))
-                continue
-    #create cartesian product of all combinations based on params/time period
-    cartesian_keys = list(fields_map.keys())
-    cartesian_product = list(product(*fields_map.values()))
-    product_index = {tuple(comb): i for i, comb in enumerate(cartesian_product)}
-
-    #set each count to 0 by default
-    aggregates = {}
-    for i, comb in enumerate(cartesian_product):
-        aggregates[i] = dict(zip(cartesian_keys, comb))
-        aggregates[i]['count'] = 0
-
-    #loop through each event and add it to the correct position of aggregates
-    for event in events:
-        key = [] #key that stores breakdown information that can be matched to the cartesian products
-        if split:
-            period = period_func(event.end) if split else None
-            key.append(period)
-        if fields_map.get('organization'):
-            key.append(event.host.name)
-        key_tuple = tuple(key)
-        pos = product_index.get(key_tuple)
-        if pos is not None:
-            aggregates[pos]['count'] += event.organizations.count() #update correct count
-
-    return dict(aggregates)
+        breakdowns.append('period')
+    if (params or {}).get('organization'):
+        breakdowns.append('organization')
+    rows = group_events(events, breakdowns, split, participants)
+
+    #periods/hosts depend on what data exists
+    fields_map = {field: list({row[field] for row in rows}) for field in breakdowns}
+    if 'period' in fields_map:
+        fields_map['period'] = get_period_calendar(split, fields_map['period'])
+    aggregates, product_index = prep_buckets(fields_map)
+    add_grouped_rows(aggregates, product_index, breakdowns, rows)
+    return aggregates
 
 
 def social_aggregates(user, indicator, params, split=None, project=None, organization=None, start=None, end=None, filters=None, cascade=False):
@@ -401,72 +270,25 @@ def social_aggregates(user, indicator, params, split=None, project=None, organiz
     '''
     #get queryset of posts that match all criteria
     posts = get_posts_from_indicator(user, indicator, project, organization, start, end, filters, cascade)
-    aggregates = defaultdict(int) # create dict that will store aggregates
-    #structure: pos: {platform: fb, metric: comments, count: 7}
 
-    #helper vars that will tell what we need to split by
-    include_platform = False
-    include_metric = False
-    include_organization = False
-    metrics = ['comments', 'views', 'likes', 'reach']
-    fields_map = {}
-    #see if a period split is required
+    #see what the user wants the data split by (other params not supported)
+    breakdowns = []
     if split in ['month', 'quarter']:
-        period_func = get_quarter_string if split == 'quarter' else get_month_string
-        fields_map['period'] = list({period_func(p.published_at) for p in posts})
-
-    #see what params the user wants the data split by
-    for param, include in params.items():
-        if param not in ['platform', 'metric', 'organization']:
-            continue #other params not supported
-        if include:
-            if param == 'platform':
-                include_platform = True
-                fields_map['platform'] = list({p.platform for p in posts})
-            elif param == 'metric':
-                include_metric = True
-                fields_map['metric'] = metrics 
-            elif param == 'organization':
-                include_organization = True
-                fields_map['organization'] = set(sorted({p.tasks.first().organization.name for p in posts}))
-    #create list containing all possible combinations of each parameter that each post will be checked against to see where it should add values to
-    cartesian_keys = list(fields_map.keys())
-    cartesian_product = list(product(*fields_map.values()))
-    product_index = {tuple(comb): i for i, comb in enumerate(cartesian_product)}
-
-    #for each combination, set the default count to 0
-    aggregates = {}
-    for i, comb in enumerate(cartesian_product):
-        aggregates[i] = dict(zip(cartesian_keys, comb))
-        aggregates[i]['count'] = 0
-
-    #for each post, get its value and add it to the correct breakdown set
-    for post in posts:
-        period = period_func(post.published_at) if split else None
-        #if the user wants breakdowns by metric, run through the most once for each metric and add it to the correct key
-        for metric in metrics if include_metric else [None]:
-            #create a key that can be compared to the cartesian products
-            key = []
-            if split:
-                key.append(period)
-            if include_platform:
-                key.append(post.platform)
-            if include_metric:
-                key.append(metric)
-            if include_organization:
-                key.append(post.tasks.first().organization.name)
-
-            key_tuple = tuple(key)
-            pos = product_index.get(key_tuple)
-            if pos is not None:
-                count = (
-                    getattr(post, metric) or 0
-                    if include_metric
-                    else ( (post.comments or 0) + (post.likes or 0) + (post.views or 0) + (post.reach or 0) )
-                )
-                aggregates[pos]['count'] += count
-
-    return dict(aggregates)
+        breakdowns.append('period')
+    for param in ['platform', 'metric', 'organization']:
+        if params.get(param):
+            breakdowns.append(param)
+    rows = group_posts(posts, indicator, breakdowns, split)
+
+    #periods/platforms/organizations depend on what data exists, metrics are always all included
+    fields_map = {
+        field: list(POST_METRICS) if field == 'metric' else list({row[field] for row in rows}) for field in breakdowns
+    }
+    if 'period' in fields_map:
+        fields_map['period'] = get_period_calendar(split, fields_map['period'])
+    aggregates, product_index = prep_buckets(fields_map)
+    add_grouped_rows(aggregates, product_index, breakdowns, rows)
+    return aggregates
 
 def aggregates_switchboard(user, indicator, params, split=None, project=None, organization=None, start=None, end=None, filters=None, repeat_only=False, n=2, cascade=False, average=False):
     '''
@@ -485,6 +307,19 @@ def aggregates_switchboard(user, indicator, params, split=None, project=None, or
     - cascade (boolean, optional): if organization and project is selected, also include data from child organizations
     - average (boolean, optional): for integer types, pull an average instead of a sum
     '''
+    #results are cached until the indicator's data changes (see [./result_cache.py])
+    return get_or_compute(
+        user, indicator,
+        lambda: run_aggregates(user, indicator, params, split, project, organization, start, end, filters, repeat_only, n, cascade, average),
+        params=params, split=split, project=project, organization=organization, start=start, end=end,
+        filters=filters, repeat_only=repeat_only, n=n, cascade=cascade, average=average,
+    )
+
+def run_aggregates(user, indicator, params, split=None, project=None, organization=None, start=None, end=None, filters=None, repeat_only=False, n=2, cascade=False, average=False):
+    '''
+    Runs the correct aggregation function for an indicator's category without checking the cache. Accepts the same
+    arguments as aggregates_switchboard.
+    '''
     aggregates = {}
     if indicator.category == Indicator.Category.ASS: #assessment type
         aggregates = demographic_aggregates(user, indicator, params, split, project, organization, start, end, filters, repeat_only, n, cascade, average)
@@ -0,0 +1,45 @@
+from itertools import product
+
+'''
+Helpers that manage the "buckets" the aggregators add values to. Each bucket is one combination of the
+requested breakdowns (i.e., (18-24, M, Q1 2025)) and is keyed by a tuple of values in the same order as the
+fields map, so placing a value in its bucket is a single dict lookup instead of a scan through every combination.
+'''
+
+def prep_buckets(fields_map, average=False):
+    '''
+    Creates the empty aggregates dict (one position per combination of breakdowns) and an index that maps
+    each combination tuple to its position. Returns (aggregates, product_index).
+    - fields_map (dict): a dict with each field to split by as the key and a list of possible values as the item
+    - average (boolean, optional): also track the number of values added to each bucket so an average can be calculated
+    '''
+    fields = list(fields_map.keys())
+    aggregates = {}
+    product_index = {}
+    #create a cartesian product of all possible combos [(18-24, M), (18-24, F)]
+    for pos, comb in enumerate(product(*fields_map.values())):
+        aggregates[pos] = dict(zip(fields, comb)) #use the index as a key
+        aggregates[pos]['count'] = 0 #set default count to 0
+        if average:
+            aggregates[pos]['number'] = 0
+        product_index[comb] = pos
+    #{1: {age_range: 18-24, sex: M, count: 0}, 2: {age_range: 18-24, sex: F, count: 0}}
+    return aggregates, product_index
+
+def add_grouped_rows(aggregates, product_index, breakdowns, rows, average=False):
+    '''
+    Adds rows that were already grouped by the database (see [./grouping.py]) to their buckets.
+    - aggregates (dict): aggregates dict created by prep_buckets
+    - product_index (dict): combination --> position index created by prep_buckets
+    - breakdowns (list): ordered list of fields the data is being split by (same order as the fields map)
+    - rows (list): list of dicts with a value for each breakdown and a count (and number if average)
+    - average (boolean, optional): also add the number of values so an average can be calculated
+    '''
+    for row in rows:
+        pos = product_index.get(tuple(row[field] for field in breakdowns)) #find correct spot to add the row to
+        if pos is None:
+            continue
+        aggregates[pos]['count'] += row['count']
+        if average:
+            aggregates[pos]['number'] += row['number']
+    return aggregates
@@ -1,12 +1,15 @@
-from django.db.models import Q
+from django.db.models import Q, F, Exists, OuterRef, Value
+from django.db.models.functions import Coalesce
 from respondents.models import Interaction, Response, HIVStatus, Pregnancy
-from projects.models import ProjectOrganization
+from projects.utils import get_org_scope
 from events.models import  Event
 from aggregates.models import AggregateCount, AggregateGroup
 from datetime import date
 from indicators.models import Indicator
 from social.models import SocialMediaPost
 from flags.models import Flag
+from analysis.models import ResponseFact
+from analysis.utils.masks import get_mask, KP_BITS, DISABILITY_BITS
 '''
 This is a set of helpers that prefetches models based on perms/filters/time period so that the aggregators
 can focus on aggregating.
@@ -44,12 +47,7 @@ def get_interactions_from_indicator(user, indicator, project=None, organization=
         queryset=queryset.filter(interaction__task__project__client=user.client_organization)
     elif user.role in ['meofficer', 'manager']:
         # Find all orgs user has access to (own + child)
-        accessible_orgs = list(
-            ProjectOrganization.objects.filter(
-                parent_organization=user.organization
-            ).values_list('organization', flat=True)
-        )
-        accessible_orgs.append(user.organization.id)
+        accessible_orgs = get_org_scope(user).org_ids()
         
         queryset = queryset.filter(
             interaction__task__organization__in=accessible_orgs
@@ -61,12 +59,7 @@ def get_interactions_from_indicator(user, indicator, project=None, organization=
     if organization:
         #if cascade is true and there is a project, get a list of child orgs for the project and include those as well
         if cascade and project:
-            accessible_orgs = list(
-                ProjectOrganization.objects.filter(
-                    parent_organization=organization, project=project
-                ).values_list('organization', flat=True)
-            )
-            accessible_orgs.append(organization.id)
+            accessible_orgs = get_org_scope(user, organization).org_ids(project)
             
             queryset = queryset.filter(
                 interaction__task__organization__in=accessible_orgs
@@ -90,33 +83,30 @@ def get_interactions_from_indicator(user, indicator, project=None, organization=
             elif field in ['pregnancy', 'hiv_status']:
                 if len(values) == 2 or len(values) == 0: #if either no values exist or both are selected, return all
                     continue
-                respondent_ids = {r.interaction.respondent_id for r in queryset}
+                #check each response's respondent/date in the database, so the queryset stays lazy
                 if field == 'pregnancy':
-                    pregnancies_map = get_pregnancies(respondent_ids)
-                    preg_ids = [
-                        response.id for response in queryset
-                        if any(
-                            p.term_began <= response.interaction.interaction_date <= (p.term_ended or date.today())
-                            for p in pregnancies_map.get(response.interaction.respondent.id, [])
+                    pregnant = Exists(
+                        Pregnancy.objects.annotate(ended=Coalesce('term_ended', Value(date.today()))).filter(
+                            respondent_id=OuterRef('interaction__respondent_id'),
+                            term_began__lte=OuterRef('response_date'),
+                            ended__gte=OuterRef('response_date'),
                         )
-                    ]
+                    )
                     if values[0] == 'pregnant':
-                        queryset = queryset.filter(id__in=preg_ids)
+                        queryset = queryset.filter(pregnant)
                     elif values[0] == 'not_pregnant':
-                        queryset = queryset.exclude(id__in=preg_ids)
+                        queryset = queryset.filter(~pregnant)
                 if field == 'hiv_status':
-                    hiv_status_map = get_hiv_statuses(respondent_ids)
-                    pos_ids = [
-                        response.id for response in queryset
-                        if any(
-                            hs.date_positive <= response.response_date
-                            for hs in hiv_status_map.get(response.interaction.respondent.id, [])
+                    positive = Exists(
+                        HIVStatus.objects.filter(
+                            respondent_id=OuterRef('interaction__respondent_id'),
+                            date_positive__lte=OuterRef('response_date'),
                         )
-                    ]
+                    )
                     if values[0] == 'hiv_positive':
-                        queryset = queryset.filter(id__in=pos_ids)
+                        queryset = queryset.filter(positive)
                     elif values[0] == 'hiv_negative':
-                        queryset = queryset.exclude(id__in=pos_ids)
+                        queryset = queryset.filter(~positive)
             elif field == 'citizenship':
                 if len(values) == 2 or len(values) == 0: #if either no values exist or both are selected, return all
                     continue
@@ -132,7 +122,80 @@ def get_interactions_from_indicator(user, indicator, project=None, organization=
                 else:
                     queryset = queryset.filter(**{field_name: values}) #otherwise run a straight filter
     # filter out any flagged interactions or interactions that belong to flagged respondents
-    queryset = queryset.exclude(interaction__flags__resolved=False).exclude(interaction__respondent__flags__resolved=False).distinct()
+    queryset = queryset.filter(interaction__has_open_flags=False, interaction__respondent__has_open_flags=False)
+    #only filters on M2M fields can return a response more than once
+    if filters and any(FILTERS_MAP.get(field) for field in filters):
+        queryset = queryset.distinct()
+    return queryset
+
+def get_facts_from_indicator(user, indicator, project=None, organization=None, start=None, end=None, filters=None, cascade=False):
+    '''
+    Same as get_interactions_from_indicator, but runs against the response fact table so that none of the 
+    permission checks/filters need to join through interactions, tasks, or respondents. Returns a queryset of 
+    ResponseFact instances (see [../models.py]).
+    - user (user instance): The user making the request, for managing perms
+    - indicator (indicator instance): The indicator these responses should be related to 
+    - project (project instance, optional): The project this data should be scoped to
+    - organization (organization instance, optional): The organization this data should be scoped to
+    - start (ISO date string, optional): Start collecting data recorded after this date
+    - end (ISO date string, optional): Only collect data recorded before this date
+    - filters (object, optional): A list of model field filters to apply to this queryset
+    - cascade (boolean, optional): If scoped to an organization and project, should this include the organization's 
+        child organizations as well
+    '''
+    #default queryset is everything related to the indicator, minus anything with an open flag
+    queryset = ResponseFact.objects.filter(indicator=indicator, has_open_flag=False)
+
+    #filter based on perms
+    if user.role == 'client':
+        queryset = queryset.filter(client=user.client_organization)
+    elif user.role in ['meofficer', 'manager']:
+        # Find all orgs user has access to (own + child)
+        accessible_orgs = get_org_scope(user).org_ids()
+        queryset = queryset.filter(organization__in=accessible_orgs)
+    # project param
+    if project:
+        queryset = queryset.filter(project=project)
+    if organization:
+        #if cascade is true and there is a project, children are the facts with this organization as their parent
+        if cascade and project:
+            queryset = queryset.filter(Q(organization=organization) | Q(parent_organization=organization))
+        else:
+            queryset = queryset.filter(organization=organization)
+
+    #date scoping
+    if start:
+        queryset = queryset.filter(response_date__gte=start)
+    if end:
+        queryset = queryset.filter(response_date__lte=end)
+    if indicator.type == Indicator.Type.BOOL:
+        queryset = queryset.filter(response_boolean=True)
+    #sort out filters
+    if filters:
+        for field, values in filters.items():
+            values = values if isinstance(values, list) else [values]
+            if field == 'option':
+                queryset = queryset.filter(option_id__in=values)
+            elif field in ['pregnancy', 'hiv_status', 'citizenship']:
+                if len(values) == 2 or len(values) == 0: #if either no values exist or both are selected, return all
+                    continue
+                column, true_value = {
+                    'pregnancy': ('pregnant', 'pregnant'),
+                    'hiv_status': ('hiv_positive', 'hiv_positive'),
+                    'citizenship': ('is_citizen', 'citizen'),
+                }[field]
+                queryset = queryset.filter(**{column: values[0] == true_value})
+            elif field in ['kp_type', 'disability_type']:
+                #statuses are stored as a bitmask, so match anything that shares a bit with the requested values
+                column, bits = ('kp_mask', KP_BITS) if field == 'kp_type' else ('disability_mask', DISABILITY_BITS)
+                queryset = queryset.annotate(
+                    **{f'{column}_match': F(column).bitand(get_mask(values, bits))}
+                ).filter(**{f'{column}_match__gt': 0})
+            elif field in ['sex', 'age_range', 'district']:
+                queryset = queryset.filter(**{f'{field}__in': values})
+            else:
+                #anything not stored on the fact has to come from the respondent
+                queryset = queryset.filter(**{f'respondent__{FILTERS_MAP.get(field, field)}__in': values})
     return queryset
 
 def get_counts_from_indicator(user, indicator, params, project=None, organization=None, start=None, end=None, filters=None, cascade=False):
@@ -160,12 +223,7 @@ def get_counts_from_indicator(user, indicator, params, project=None, organizatio
     elif user.role == 'client':
         queryset=queryset.filter(group__project__client=user.client_organization)
     else:
-        child_orgs = ProjectOrganization.objects.filter(
-                parent_organization=user.organization,
-            ).values_list('organization', flat=True)
-        queryset = queryset.filter(
-                Q(group__organization=user.organization) | Q(group__organization__in=child_orgs)
-            )
+        queryset = queryset.filter(group__organization__in=get_org_scope(user).org_ids())
 
     #scope queryset to provided arguments   
     if project:
@@ -173,12 +231,7 @@ def get_counts_from_indicator(user, indicator, params, project=None, organizatio
     if organization:
         #if organization, cascade, and project are provided, include both the provided organization and its child orgs in the query
         if cascade and project:
-            accessible_orgs = list(
-                ProjectOrganization.objects.filter(
-                    parent_organization=organization, project=project
-                ).values_list('organization', flat=True)
-            )
-            accessible_orgs.append(organization.id)
+            accessible_orgs = get_org_scope(user, organization).org_ids(project)
             
             queryset = queryset.filter(
                 group__organization__in=accessible_orgs
@@ -206,7 +259,7 @@ def get_counts_from_indicator(user, indicator, params, project=None, organizatio
                 queryset = queryset.filter(**{field: values})
 
     #exclude flagged objects
-    queryset = queryset.exclude(flags__resolved=False).distinct()
+    queryset = queryset.filter(has_open_flags=False)
     return queryset
 
 def get_events_from_indicator(user, indicator, project=None, organization=None, start=None, end=None, cascade=False):
@@ -230,12 +283,7 @@ def get_events_from_indicator(user, indicator, project=None, organization=None,
     elif user.role == 'client':
         queryset=queryset.filter(tasks__indicator=indicator, tasks__project__client=user.client_organization)
     else:
-        child_orgs = ProjectOrganization.objects.filter(
-                parent_organization=user.organization,
-            ).values_list('organization', flat=True)
-        queryset = queryset.filter(
-                Q(tasks__organization=user.organization) | Q(tasks__organization__in=child_orgs)
-            )
+        queryset = queryset.filter(tasks__organization__in=get_org_scope(user).org_ids())
     #filter by project
     if project:
         queryset=queryset.filter(tasks__project=project)
@@ -243,12 +291,7 @@ def get_events_from_indicator(user, indicator, project=None, organization=None,
     if organization:
         #if organization, project, and cascade, fetch both the requested organization and its child organizations for that project
         if cascade and project:
-            accessible_orgs = list(
-                ProjectOrganization.objects.filter(
-                    parent_organization=organization, project=project
-                ).values_list('organization', flat=True)
-            )
-            accessible_orgs.append(organization.id)
+            accessible_orgs = get_org_scope(user, organization).org_ids(project)
             
             queryset = queryset.filter(
                 tasks__organization__in=accessible_orgs
@@ -288,12 +331,7 @@ def get_posts_from_indicator(user, indicator, project, organization, start, end,
         #pull one that shoudn't be there
         queryset=queryset.filter(tasks__project__client=user.client_organization, tasks__indicator=indicator,)
     else:
-        child_orgs = ProjectOrganization.objects.filter(
-                parent_organization=user.organization,
-            ).values_list('organization', flat=True)
-        queryset = queryset.filter(
-                Q(tasks__organization=user.organization) | Q(tasks__organization__in=child_orgs)
-            )
+        queryset = queryset.filter(tasks__organization__in=get_org_scope(user).org_ids())
     
     #project filter
     if project:
@@ -302,12 +340,7 @@ def get_posts_from_indicator(user, indicator, project, organization, start, end,
     if organization:
          #if organization, project, and cascade, fetch both the requested organization and its child organizations for that project
         if cascade and project:
-            accessible_orgs = list(
-                ProjectOrganization.objects.filter(
-                    parent_organization=organization, project=project
-                ).values_list('organization', flat=True)
-            )
-            accessible_orgs.append(organization.id)
+            accessible_orgs = get_org_scope(user, organization).org_ids(project)
             
             queryset = queryset.filter(
                 tasks__organization__in=accessible_orgs
@@ -328,7 +361,8 @@ def get_posts_from_indicator(user, indicator, project, organization, start, end,
                 queryset = queryset.filter(**{lookup: values})
             else:
                 queryset = queryset.filter(**{field: values})
-    queryset = queryset.exclude(flags__resolved=False).distinct()
+    #posts can be linked to more than one task
+    queryset = queryset.filter(has_open_flags=False).distinct()
     return queryset
 
 def get_pregnancies(respondent_ids):
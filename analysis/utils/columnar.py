@@ -0,0 +1,138 @@
+from itertools import product
+from indicators.models import Option
+from organizations.models import Organization
+from analysis.utils.grouping import FACT_FIELDS, FACT_BOOLEANS, FACT_MASKS
+from analysis.utils.masks import get_mask_names
+from analysis.utils.periods import get_period_string, get_period_calendar
+from analysis.utils.repeats import get_repeat_facts
+
+'''
+Columnar bucketing for the aggregates that can't be summed by the database (repeat only, where each respondent
+is counted once per bucket). Instead of building a tuple key per response and looking it up, each breakdown column is pulled
+from the response fact table with values_list and every value is encoded as its index in the fields map. The
+combined mixed-radix code of a row (code of the first field * number of combinations of the remaining fields + ...)
+is exactly the row's position in the buckets created by prep_buckets (see [./buckets.py]), so placing a row is
+arithmetic on integers. Each distinct value is only encoded once.
+
+KP/disability types are stored as bitmasks, so a mask is expanded to one code per type it contains (a row can land
+in more than one bucket).
+'''
+
+def get_multipliers(fields_map):
+    '''
+    Returns the multiplier for each field's code, so that sum(code * multiplier) is the bucket position.
+    - fields_map (dict): map of each breakdown to its (ordered) possible values
+    '''
+    multipliers = []
+    size = 1
+    for values in reversed(list(fields_map.values())):
+        multipliers.append(size)
+        size *= len(values)
+    return list(reversed(multipliers))
+
+def get_fact_column(field):
+    '''
+    Returns the fact column a breakdown is read from (or None if facts don't store it).
+    - field (string): the breakdown
+    '''
+    if field == 'period':
+        return 'response_date'
+    if field in ['organization', 'option']:
+        return f'{field}_id'
+    if field in FACT_BOOLEANS:
+        return FACT_BOOLEANS[field][0]
+    if field in FACT_MASKS:
+        return FACT_MASKS[field][0]
+    if field in FACT_FIELDS:
+        return field
+    return None
+
+def get_encoder(field, values, split=None, names=None):
+    '''
+    Returns a function that converts a raw column value into the list of codes (indexes into values) it belongs to.
+    Results are memoized, since most columns only have a handful of distinct values.
+    - field (string): the breakdown
+    - values (list): the ordered possible values for the breakdown
+    - split (string, optional): month or quarter, for the period
+    - names (dict, optional): id --> name for organizations/options
+    '''
+    index = {value: i for i, value in enumerate(values)}
+    memo = {}
+    def encode(raw):
+        if raw in memo:
+            return memo[raw]
+        if raw is None:
+            labels = []
+        elif field == 'period':
+            labels = [get_period_string(split, raw)]
+        elif names is not None:
+            labels = [names.get(raw)]
+        elif field in FACT_BOOLEANS:
+            labels = [FACT_BOOLEANS[field][1] if raw else FACT_BOOLEANS[field][2]]
+        elif field in FACT_MASKS:
+            labels = get_mask_names(raw, FACT_MASKS[field][1])
+        else:
+            labels = [raw]
+        memo[raw] = [index[label] for label in labels if label in index]
+        return memo[raw]
+    return encode
+
+def columnar_repeat_counts(responses, fields_map, split=None, n=2):
+    '''
+    Counts respondents with at least n interactions once in each bucket their first interaction falls in (see 
+    [./repeats.py]). A respondent can be in more than one bucket (i.e., they have two KP types or selected two
+    options), but is never counted twice in the same one. Returns a list with the count for each bucket position.
+    Organization and period values are filled into the fields map from the data.
+    - responses (queryset): queryset of responses in scope
+    - fields_map (dict): map of each breakdown to its possible values (see get_fields_map)
+    - split (string, optional): month or quarter, required if period is a breakdown
+    - n (integer, optional): number of distinct interactions a respondent needs to be counted
+    '''
+    breakdowns = list(fields_map.keys())
+    columns = {field: get_fact_column(field) for field in breakdowns}
+    columns = {field: column for field, column in columns.items() if column}
+    #position of each breakdown's column in the rows (after the respondent id)
+    positions = {field: i + 1 for i, field in enumerate(columns.keys())}
+    rows = list(get_repeat_facts(responses, n).values_list('respondent_id', *columns.values()))
+
+    #ids are stored instead of names, look the names up once
+    names = {}
+    for field, model in [('organization', Organization), ('option', Option)]:
+        if field in fields_map:
+            names[field] = dict(model.objects.filter(id__in={row[positions[field]] for row in rows}).values_list('id', 'name'))
+    #organizations/periods depend on what data exists
+    if 'organization' in fields_map:
+        fields_map['organization'] = list(set(names['organization'].values()))
+    if 'period' in fields_map:
+        i = positions['period']
+        fields_map['period'] = get_period_calendar(split, {get_period_string(split, row[i]) for row in rows if row[i] is not None})
+
+    multipliers = get_multipliers(fields_map)
+    encoders = []
+    for field in breakdowns:
+        if field not in columns:
+            #not stored on the facts, so nothing will fall in these buckets
+            encoders.append((None, 0))
+        else:
+            encoders.append((get_encoder(field, list(fields_map[field]), split, names.get(field)), positions[field]))
+
+    #positions each respondent falls in
+    cells = {}
+    for row in rows:
+        codes = []
+        for (encode, i), multiplier in zip(encoders, multipliers):
+            field_codes = encode(row[i]) if encode else []
+            if not field_codes:
+                break
+            codes.append([code * multiplier for code in field_codes])
+        else:
+            cells.setdefault(row[0], set()).update(sum(combo) for combo in product(*codes))
+
+    size = 1
+    for values in fields_map.values():
+        size *= len(values)
+    counts = [0] * size
+    for respondent_cells in cells.values():
+        for pos in respondent_cells:
+            counts[pos] += 1
+    return counts
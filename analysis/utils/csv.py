@@ -1,8 +1,79 @@
-def prep_csv(aggregates, params):
+import csv
+from datetime import date
+from django.http import StreamingHttpResponse
+
+'''
+Helpers for building CSV downloads. Rows are written through a generator and sent with a StreamingHttpResponse,
+a chunk of rows at a time, so the file is never held in memory as a whole. Any view that returns a CSV should use
+csv_response.
+'''
+
+#number of rows written before a chunk is sent to the client
+CSV_CHUNK_ROWS = 500
+
+class Echo:
     '''
-    Function that accepts the result of an aggregates function (see [./aggregates.py]) and the params object 
-    used to construct that aggreagates and returns it in a tabular format (one of the params wil be used 
-    as the headers.)
+    Pseudo-buffer for csv.writer that returns each written line instead of storing it.
+    '''
+    def write(self, value):
+        return value
+
+def format_csv_value(value):
+    '''
+    Converts dates and lists to strings (lists are joined with commas) and None to an empty string.
+    - value (any): the value to write
+    '''
+    if isinstance(value, date):
+        return value.isoformat()
+    elif isinstance(value, list):
+        return ','.join(str(x) for x in value)
+    elif value is None:
+        return ''
+    return value
+
+def iter_csv(rows, chunk_size=CSV_CHUNK_ROWS):
+    '''
+    Generator that writes rows as CSV and yields the text a chunk at a time.
+    - rows (iterable): iterable of lists (the first should be the header)
+    - chunk_size (integer, optional): number of rows per chunk
+    '''
+    writer = csv.writer(Echo())
+    chunk = []
+    for row in rows:
+        chunk.append(writer.writerow([format_csv_value(value) for value in row]))
+        if len(chunk) >= chunk_size:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+def iter_dict_rows(rows, fieldnames=None):
+    '''
+    Converts an iterable of dicts into a header followed by lists, so they can be passed to iter_csv. The fieldnames
+    default to the keys of the first row.
+    - rows (iterable): iterable of dicts
+    - fieldnames (list, optional): the columns to write
+    '''
+    for row in rows:
+        if fieldnames is None:
+            fieldnames = list(row.keys())
+            yield fieldnames
+        yield [row.get(field) for field in fieldnames]
+
+def csv_response(rows, filename, chunk_size=CSV_CHUNK_ROWS):
+    '''
+    Returns a StreamingHttpResponse that downloads the rows as a CSV file.
+    - rows (iterable): iterable of lists (the first should be the header)
+    - filename (string): name of the downloaded file
+    - chunk_size (integer, optional): number of rows per chunk
+    '''
+    response = StreamingHttpResponse(iter_csv(rows, chunk_size), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+def iter_pivot_rows(aggregates, params):
+    '''
+    Generator version of prep_csv, yields the header and then each row of the pivot table.
     - aggregates (object): an object returned by one of the aggregates functions from [./aggregates.py]
     - params (object): list of params used to construct the aggreagates objct
     '''
@@ -12,26 +83,27 @@ def prep_csv(aggregates, params):
 
     # Dynamically extract all fields that are not 'count' or column_field
     fields = [f for f in list(aggregates.values())[0].keys() if f not in ['count', column_field]]
-    row1 = fields + column_field_choices  # CSV header: breakdown fields + dynamic columns
+    yield fields + column_field_choices  # CSV header: breakdown fields + dynamic columns
 
     rows_map = {}
     for cell in aggregates.values():
         breakdowns = tuple(cell[k] for k in fields)  # Tuple of breakdown values in defined order
-        column_field_value = cell.get(column_field)
-        count = cell['count']
-
-        #create dict for each breakdown
-        if breakdowns not in rows_map:
-            rows_map[breakdowns] = {}
-        #add count
-        rows_map[breakdowns][column_field_value] = count
+        #create dict for each breakdown and add the count
+        rows_map.setdefault(breakdowns, {})[cell.get(column_field)] = cell['count']
 
     # Build final rows
-    rows = [row1]
     for breakdown_values, counts_dict in rows_map.items():
         row = list(breakdown_values)
         for col_val in column_field_choices:
             row.append(counts_dict.get(col_val, 0))  # default to 0 if missing
-        rows.append(row)
+        yield row
 
-    return rows
\ No newline at end of file
+def prep_csv(aggregates, params):
+    '''
+    Function that accepts the result of an aggregates function (see [./aggregates.py]) and the params object 
+    used to construct that aggreagates and returns it in a tabular format (one of the params wil be used 
+    as the headers.)
+    - aggregates (object): an object returned by one of the aggregates functions from [./aggregates.py]
+    - params (object): list of params used to construct the aggreagates objct
+    '''
+    return list(iter_pivot_rows(aggregates, params))
@@ -0,0 +1,326 @@
+import json
+import logging
+import time
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from django.conf import settings
+from django.db import connections
+from indicators.models import Indicator
+from analysis.models import ChartFilter
+from analysis.utils.aggregates import aggregates_switchboard, get_fields_map, get_response_rows, get_count_rows, build_aggregates
+from analysis.utils.periods import get_quarter_string, parse_period_string
+from analysis.utils.result_cache import get_or_compute
+from analysis.utils.targets import get_target_aggregates
+
+logger = logging.getLogger(__name__)
+
+'''
+Helpers that calculate the data for every chart on a dashboard in one pass. Charts are usually built on the same
+few indicators with the same scope and only differ by their legend/stack/axis, so instead of running the same
+response query once per chart, charts that share an indicator and scope are grouped, the data is grouped once at the
+finest grain any of them needs, and each chart's breakdowns/periods are summed from those shared rows.
+
+Only breakdowns where every response/count falls in exactly one value can be summed away. A respondent can belong
+to more than one KP/disability type and a multiselect interaction can have more than one option, so charts only
+share rows with charts that use the same KP type/disability type/option breakdowns. Averages and repeat only charts
+are calculated on their own.
+
+Charts don't depend on each other, so they can also be calculated at the same time on a pool of threads (opt in with 
+ANALYSIS_DASHBOARD_WORKERS, see settings). The pool is shared by every request in the process, so there are never
+more than that many chart threads (or database connections, each thread closes its own once its chart is done). Any
+chart that takes longer than ANALYSIS_CHART_TIMEOUT seconds to run (or to get a thread) is returned with an error
+instead of holding up the rest of the dashboard.
+'''
+
+#breakdowns each row has exactly one value for, so they can be summed away
+SUMMABLE_PARAMS = ['age_range', 'sex', 'district', 'citizenship', 'hiv_status', 'pregnancy', 'organization']
+#breakdowns that can be grouped by, but not summed away
+FIXED_PARAMS = ['option', 'kp_type', 'disability_type']
+CHART_PARAMS = ['age_range', 'sex', 'kp_type', 'disability_type', 'citizenship', 'hiv_status', 'pregnancy', 'option', 'platform', 'metric', 'organization', 'district']
+
+def get_chart_filters(chart):
+    '''
+    Returns a chart's filters as a field --> list of values dict.
+    - chart (indicator chart setting instance): the chart
+    '''
+    filters = defaultdict(list)
+    for fi in ChartFilter.objects.filter(chart=chart).select_related('field'):
+        filters[fi.field.name].append(fi.value)
+    return filters
+
+def get_chart_data(chart, project=None, organization=None, cascade=False, aggregate=aggregates_switchboard, filters=None):
+    '''
+    Collects the data for one chart.
+    - chart (indicator chart setting instance): the chart
+    - project (project instance, optional): dashboard level project scope
+    - organization (organization instance, optional): dashboard level organization scope
+    - cascade (boolean, optional): include the organization's child organizations
+    - aggregate (function, optional): function used to get each indicator's aggregates (takes the same arguments
+        as aggregates_switchboard)
+    - filters (dict, optional): the chart's filters if they were already fetched (see get_chart_filters)
+    '''
+    #based on legend/stack, get list of params to break the data down by
+    params = {}
+    for cat in CHART_PARAMS:
+        params[cat] = (cat == chart.legend) or (cat == chart.stack)
+    if filters is None:
+        filters = get_chart_filters(chart)
+    indicators = list(chart.indicators.all())
+
+    #if only one indicator, return the aggreagate
+    if len(indicators) == 1:
+        return aggregate(chart.created_by,
+            indicator=indicators[0],
+            params=params,
+            split=chart.axis,
+            project=project,
+            organization=organization,
+            start=chart.start,
+            end=chart.end,
+            filters=filters,
+            repeat_only=chart.repeat_only,
+            n=chart.repeat_n,
+            cascade=cascade,
+            average=chart.average
+        )
+    #if multiple indicators, return an array of indicators (no params should be present)
+    data = []
+    for indicator in indicators:
+        ind = aggregate(
+            chart.created_by,
+            indicator=indicator,
+            params=params,
+            split=chart.axis,
+            project=project,
+            organization=organization,
+            start=chart.start,
+            end=chart.end,
+            filters=filters,
+            cascade=cascade,
+        )
+        # the indicator will be used as the legend item
+        for period, item in ind.items():
+            row = {
+                'period': item.get('period', None),
+                'count': item.get('count', 0),
+                'indicator': str(indicator),
+                'order': indicator.order
+            }
+            data.append(row)
+    return {i: item for i, item in enumerate(data)}
+
+def get_chart_targets(chart, project=None, organization=None):
+    '''
+    Collects the targets for each of a chart's indicators (if the chart shows targets).
+    - chart (indicator chart setting instance): the chart
+    - project (project instance, optional): dashboard level project scope
+    - organization (organization instance, optional): dashboard level organization scope
+    '''
+    if not chart.use_target:
+        return []
+    targets = []
+    for indicator in chart.indicators.all():
+        target = get_target_aggregates(chart.created_by, indicator=indicator, split=chart.axis, project=project, organization=organization, start=chart.start, end=chart.end)
+        targets.append(target)
+    return targets
+
+def get_shared_key(user, indicator, params, split=None, project=None, organization=None, start=None, end=None, filters=None, repeat_only=False, n=2, cascade=False, average=False):
+    '''
+    Returns the key of the group of charts a request can share rows with, or None if it has to be calculated on its own.
+    Accepts the same arguments as aggregates_switchboard.
+    '''
+    if indicator.category not in [Indicator.Category.ASS, Indicator.Category.MISC] or repeat_only or average:
+        return None
+    requested = [param for param, include in params.items() if include]
+    if any(param not in SUMMABLE_PARAMS + FIXED_PARAMS for param in requested):
+        return None
+    return (
+        getattr(user, 'id', None), indicator.id, getattr(project, 'id', None), getattr(organization, 'id', None), cascade,
+        str(start), str(end), json.dumps(filters or {}, sort_keys=True, default=str),
+        tuple(sorted(param for param in requested if param in FIXED_PARAMS)),
+    )
+
+def get_period(label, shared_split, split):
+    '''
+    Converts the period of a shared row to the period a chart is split by.
+    - label (string): the period label of the shared row
+    - shared_split (string): month or quarter, what the shared rows were split by
+    - split (string): month or quarter, what the chart is split by
+    '''
+    if label is None or shared_split == split:
+        return label
+    return get_quarter_string(parse_period_string(label))
+
+def sum_rows(rows, breakdowns, shared_split, split):
+    '''
+    Sums grouped rows down to a smaller set of breakdowns.
+    - rows (list): grouped rows (see get_response_rows)
+    - breakdowns (list): the breakdowns to keep (must be in the rows)
+    - shared_split (string): month or quarter, what the rows were split by
+    - split (string): month or quarter, what the chart is split by
+    '''
+    summed = {}
+    for row in rows:
+        key = tuple(
+            get_period(row['period'], shared_split, split) if field == 'period' else row[field] for field in breakdowns
+        )
+        item = summed.setdefault(key, {**dict(zip(breakdowns, key)), 'count': 0, 'number': 0})
+        item['count'] += row['count']
+        item['number'] += row.get('number', 0)
+    return list(summed.values())
+
+class DashboardPlanner:
+    '''
+    Plans the requests for a set of charts so that charts that can share rows only fetch them once. Register every
+    request with add before calling aggregate (which takes the same arguments as aggregates_switchboard).
+    '''
+    def __init__(self):
+        self.groups = defaultdict(list) #shared key --> list of (params, split) requested
+        self.shared_rows = {} #shared key --> (rows, count_rows, split)
+        self.fetches = 0 #number of times rows were fetched, for checking how much was shared
+        self.locks = defaultdict(threading.Lock) #one per group, so charts calculated at the same time don't both fetch
+
+    def add(self, user, indicator, params, split=None, **kwargs):
+        key = get_shared_key(user, indicator, params, split, **kwargs)
+        if key:
+            self.groups[key].append((params, split))
+            self.locks[key] #create the lock now, before any threads are using the planner
+
+    def aggregate(self, user, indicator, params, split=None, **kwargs):
+        key = get_shared_key(user, indicator, params, split, **kwargs)
+        if not key or key not in self.groups:
+            return aggregates_switchboard(user, indicator, params, split, **kwargs)
+        return get_or_compute(
+            user, indicator,
+            lambda: self.derive(key, user, indicator, params, split, **kwargs),
+            params=params, split=split, **kwargs
+        )
+
+    def get_rows(self, key, user, indicator, project=None, organization=None, start=None, end=None, filters=None, cascade=False, **kwargs):
+        '''
+        Fetches the rows for a group at the finest grain any of its charts need (once).
+        '''
+        with self.locks[key]:
+            if key not in self.shared_rows:
+                self.shared_rows[key] = self.fetch_rows(key, user, indicator, project, organization, start, end, filters, cascade)
+        return self.shared_rows[key]
+
+    def fetch_rows(self, key, user, indicator, project=None, organization=None, start=None, end=None, filters=None, cascade=False):
+        requests = self.groups[key]
+        params = {}
+        for requested, split in requests:
+            for param, include in requested.items():
+                params[param] = params.get(param, False) or include
+        splits = {split for requested, split in requests}
+        split = 'month' if 'month' in splits else 'quarter' if 'quarter' in splits else None
+
+        fields_map, include_options = get_fields_map(indicator, params)
+        breakdowns = list(fields_map.keys()) + (['period'] if split else [])
+        rows = []
+        if indicator.category == Indicator.Category.ASS:
+            rows = get_response_rows(user, indicator, params, breakdowns, split, include_options, project, organization, start, end, filters, cascade)
+        count_rows = get_count_rows(user, indicator, params, breakdowns, split, include_options, project, organization, start, end, filters, cascade)
+        self.fetches += 1
+        return (rows, count_rows, split)
+
+    def derive(self, key, user, indicator, params, split=None, **kwargs):
+        '''
+        Builds one chart's aggregates from its group's shared rows.
+        '''
+        rows, count_rows, shared_split = self.get_rows(key, user, indicator, **kwargs)
+        fields_map, include_options = get_fields_map(indicator, params)
+        if split in ['month', 'quarter']:
+            fields_map['period'] = set()
+        breakdowns = list(fields_map.keys())
+        return build_aggregates(
+            fields_map, breakdowns, sum_rows(rows, breakdowns, shared_split, split), sum_rows(count_rows, breakdowns, shared_split, split),
+            split=split
+        )
+
+def get_dashboard_data(dashboard, workers=None, timeout=None):
+    '''
+    Returns the data and targets for every chart on a dashboard, keyed by the id of the chart's link to the dashboard.
+    Each item is a dict with chart_data, targets, and error (None unless the chart failed/timed out).
+    - dashboard (dashboard setting instance): the dashboard
+    - workers (integer, optional): number of threads to calculate charts on (defaults to ANALYSIS_DASHBOARD_WORKERS,
+        charts are calculated one after another if this is 0)
+    - timeout (number, optional): seconds a chart can take before it is skipped (defaults to ANALYSIS_CHART_TIMEOUT,
+        only applies when using threads)
+    '''
+    workers = getattr(settings, 'ANALYSIS_DASHBOARD_WORKERS', 0) if workers is None else workers
+    timeout = getattr(settings, 'ANALYSIS_CHART_TIMEOUT', 30) if timeout is None else timeout
+    links = list(dashboard.dashboardindicatorchart_set.select_related('chart__created_by').prefetch_related('chart__indicators'))
+    scope = {'project': dashboard.project, 'organization': dashboard.organization, 'cascade': dashboard.cascade_organization}
+    filters = {link.id: get_chart_filters(link.chart) for link in links}
+    planner = DashboardPlanner()
+    def register(*args, **kwargs):
+        planner.add(*args, **kwargs)
+        return {}
+    #register every request first so the planner knows what each group needs, then calculate
+    for link in links:
+        get_chart_data(link.chart, aggregate=register, filters=filters[link.id], **scope)
+
+    def run(link):
+        return {
+            'chart_data': get_chart_data(link.chart, aggregate=planner.aggregate, filters=filters[link.id], **scope),
+            'targets': get_chart_targets(link.chart, scope['project'], scope['organization']),
+            'error': None,
+        }
+    if workers and len(links) > 1:
+        return run_in_pool(links, run, workers, timeout)
+    return {link.id: run(link) for link in links}
+
+#thread pools shared by every request, by number of workers (only ever ANALYSIS_DASHBOARD_WORKERS outside of tests)
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_pool(workers):
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='dashboard')
+        return _pools[workers]
+
+def run_in_pool(links, run, workers, timeout):
+    '''
+    Runs each chart on the shared pool of threads. Charts that raise or run past the timeout are returned with
+    an error marker (and no data) so the rest of the dashboard can still be shown. Threads can't be stopped, so
+    a chart that times out keeps running until it finishes, but it holds one of the pool's threads rather than a 
+    new one, and nothing waits on it. Charts that are still waiting for a thread when they time out are cancelled.
+    - links (list): list of dashboard indicator chart instances
+    - run (function): calculates one link's result
+    - workers (integer): number of threads in the pool
+    - timeout (number): seconds a chart can take before it is skipped
+    '''
+    submitted = time.monotonic()
+    started = {}
+    def job(link):
+        started[link.id] = time.monotonic()
+        try:
+            return run(link)
+        finally:
+            #each thread opens its own connection, close it so they don't pile up
+            connections.close_all()
+
+    results = {}
+    futures = {get_pool(workers).submit(job, link): link for link in links}
+    pending = set(futures)
+    while pending:
+        done, pending = wait(pending, timeout=min(timeout, 0.25), return_when=FIRST_COMPLETED)
+        for future in done:
+            link = futures[future]
+            try:
+                results[link.id] = future.result()
+            except Exception:
+                logger.exception('Chart %s failed', link.chart_id)
+                results[link.id] = {'chart_data': None, 'targets': [], 'error': 'This chart could not be loaded.'}
+        now = time.monotonic()
+        for future in list(pending):
+            link = futures[future]
+            #charts still waiting for a thread time out from when they were submitted
+            if now - started.get(link.id, submitted) > timeout:
+                future.cancel()
+                pending.remove(future)
+                logger.warning('Chart %s took longer than %s seconds', link.chart_id, timeout)
+                results[link.id] = {'chart_data': None, 'targets': [], 'error': f'This chart took longer than {timeout} seconds to load.'}
+    return results
@@ -0,0 +1,228 @@
+import re
+import threading
+from datetime import date
+from django.db import transaction
+from django.db.models import Q
+from respondents.models import Response, KeyPopulationStatus, DisabilityStatus, HIVStatus, Pregnancy
+from projects.models import ProjectOrganization, Task
+from analysis.models import ResponseFact
+from analysis.utils.masks import KP_BITS, DISABILITY_BITS
+from analysis.utils.intervals import IntervalIndex
+from analysis.utils.rollups import refresh_response_rollups, get_fact_slices, get_month, rebuild_rollups
+from analysis.utils.result_cache import bump_indicator_versions
+
+'''
+Helpers that keep the response fact table (see ResponseFact in [../models.py]) in sync. Each fact is a flat copy
+of a response with the respondent/task/project information it is split or filtered by, so the aggregators can
+query one table without joins. These are called from the respondents, flags, and projects signals whenever
+something a fact depends on changes. Any monthly rollups (see [./rollups.py]) the changed facts fall in are 
+refreshed along with them.
+
+Saving a response (or an interaction, task, respondent, status, or flag it depends on) only queues it (see
+queue_response_facts). Everything queued during a transaction is rebuilt together once it commits, so an interaction
+with several responses or a bulk respondent edit builds its facts in one pass and re-sums each month it touches once,
+instead of once per row.
+'''
+
+NUMBER_RE = re.compile(r'^\s*[-+]?[0-9]+\s*$')
+
+def build_facts(responses):
+    '''
+    Builds (unsaved) fact rows for a queryset of responses. Related information is pulled in bulk so the number of
+    queries does not depend on the number of responses.
+    - responses (queryset): queryset of responses to build facts for
+    '''
+    responses = list(responses.select_related('interaction__task__project', 'interaction__respondent'))
+    if not responses:
+        return []
+    respondent_ids = {r.interaction.respondent_id for r in responses}
+
+    #M2M statuses as bitmasks
+    kp_masks = {}
+    for respondent_id, name in KeyPopulationStatus.objects.filter(respondent_id__in=respondent_ids).values_list('respondent_id', 'key_population__name'):
+        kp_masks[respondent_id] = kp_masks.get(respondent_id, 0) | KP_BITS.get(name, 0)
+    disability_masks = {}
+    for respondent_id, name in DisabilityStatus.objects.filter(respondent_id__in=respondent_ids).values_list('respondent_id', 'disability__name'):
+        disability_masks[respondent_id] = disability_masks.get(respondent_id, 0) | DISABILITY_BITS.get(name, 0)
+
+    #dates the respondent became positive/pregnancy terms, so status on the response date can be checked
+    today = date.today()
+    hiv_index = IntervalIndex(
+        (respondent_id, positive, None) for respondent_id, positive in HIVStatus.objects.filter(
+            respondent_id__in=respondent_ids, date_positive__isnull=False
+        ).values_list('respondent_id', 'date_positive')
+    )
+    pregnancy_index = IntervalIndex(
+        (respondent_id, began, ended or today) for respondent_id, began, ended in Pregnancy.objects.filter(
+            respondent_id__in=respondent_ids, term_began__isnull=False
+        ).values_list('respondent_id', 'term_began', 'term_ended')
+    )
+
+    #parent organization for each project/organization pair
+    parents = {
+        (link['project_id'], link['organization_id']): link['parent_organization_id']
+        for link in ProjectOrganization.objects.filter(
+            project_id__in={r.interaction.task.project_id for r in responses}
+        ).values('project_id', 'organization_id', 'parent_organization_id')
+    }
+
+    #statuses on each response date, checked for the whole column at once
+    fact_respondent_ids = [r.interaction.respondent_id for r in responses]
+    fact_dates = [r.response_date for r in responses]
+    hiv_positive = hiv_index.contains_many(fact_respondent_ids, fact_dates)
+    pregnant = pregnancy_index.contains_many(fact_respondent_ids, fact_dates)
+
+    facts = []
+    for i, response in enumerate(responses):
+        interaction = response.interaction
+        task = interaction.task
+        respondent = interaction.respondent
+        on = response.response_date
+        facts.append(ResponseFact(
+            response_id=response.id,
+            interaction_id=interaction.id,
+            respondent_id=respondent.id,
+            indicator_id=response.indicator_id,
+            option_id=response.response_option_id,
+            value=int(response.response_value) if response.response_value and NUMBER_RE.match(response.response_value) else None,
+            response_boolean=response.response_boolean,
+            response_date=on,
+            organization_id=task.organization_id,
+            parent_organization_id=parents.get((task.project_id, task.organization_id)),
+            project_id=task.project_id,
+            client_id=task.project.client_id,
+            sex=respondent.sex,
+            age_range=respondent.age_range,
+            district=respondent.district,
+            is_citizen=(respondent.citizenship or '').upper() == 'BW',
+            hiv_positive=hiv_positive[i],
+            pregnant=pregnant[i],
+            kp_mask=kp_masks.get(respondent.id, 0),
+            disability_mask=disability_masks.get(respondent.id, 0),
+            has_open_flag=interaction.has_open_flags or respondent.has_open_flags,
+        ))
+    return facts
+
+def sync_response_facts(responses, slices=None):
+    '''
+    Replaces the facts for a queryset of responses with freshly built ones.
+    - responses (queryset): queryset of responses whose facts should be rebuilt
+    - slices (iterable, optional): any other rollup slices that should be re-summed with them (ex. deleted responses)
+    '''
+    ids = list(responses.values_list('id', flat=True))
+    slices = set(slices or [])
+    if not ids and not slices:
+        return 0
+    with transaction.atomic():
+        old_facts = ResponseFact.objects.filter(response_id__in=ids)
+        slices |= get_fact_slices(old_facts)
+        old_facts.delete()
+        facts = ResponseFact.objects.bulk_create(build_facts(Response.objects.filter(id__in=ids)))
+        #re-sum the months these responses were/are in
+        slices |= get_fact_slices(ResponseFact.objects.filter(response_id__in=ids))
+        refresh_response_rollups(slices)
+    return len(facts)
+
+#responses/interactions/respondents/rollup slices waiting for the current transaction to commit (per thread, like the connection)
+_pending = threading.local()
+
+def get_pending():
+    if not hasattr(_pending, 'response_ids'):
+        _pending.response_ids = set()
+        _pending.interaction_ids = set()
+        _pending.respondent_ids = set()
+        _pending.task_ids = set()
+        _pending.slices = set()
+    return _pending
+
+def queue_response_facts(response_ids=(), slices=(), interaction_ids=(), respondent_ids=(), task_ids=()):
+    '''
+    Queues responses to have their facts rebuilt (and rollup slices to be re-summed) once the current transaction
+    commits (right away outside of a transaction). 
+    - response_ids (iterable, optional): ids of responses that were saved
+    - slices (iterable, optional): rollup slices that changed (see get_fact_slices)
+    - interaction_ids (iterable, optional): ids of interactions whose responses should all be rebuilt (task/date or flags changed)
+    - respondent_ids (iterable, optional): ids of respondents whose responses should all be rebuilt (demographics, statuses, or flags changed)
+    - task_ids (iterable, optional): ids of tasks whose responses should all be rebuilt (project/organization changed)
+    '''
+    pending = get_pending()
+    pending.response_ids.update(response_ids)
+    pending.interaction_ids.update(interaction_ids)
+    pending.respondent_ids.update(respondent_ids)
+    pending.task_ids.update(task_ids)
+    pending.slices.update(slices)
+    #the first callback to run does all the work, the rest find nothing left. Anything left over from a 
+    #rolled back transaction is rebuilt from what's in the database with the next batch, so is harmless
+    transaction.on_commit(flush_response_facts)
+
+def flush_response_facts():
+    '''
+    Rebuilds everything queued by queue_response_facts in one pass.
+    '''
+    pending = get_pending()
+    response_ids, interaction_ids, respondent_ids, task_ids, slices = (
+        pending.response_ids, pending.interaction_ids, pending.respondent_ids, pending.task_ids, pending.slices
+    )
+    pending.response_ids, pending.interaction_ids, pending.respondent_ids, pending.task_ids, pending.slices = set(), set(), set(), set(), set()
+    if not response_ids and not interaction_ids and not respondent_ids and not task_ids and not slices:
+        return 0
+    responses = Response.objects.filter(
+        Q(id__in=response_ids) | Q(interaction_id__in=interaction_ids) | Q(interaction__respondent_id__in=respondent_ids) |
+        Q(interaction__task_id__in=task_ids)
+    )
+    built = sync_response_facts(responses, slices)
+    #cached results computed between the write and now were calculated from the old facts
+    bump_indicator_versions(
+        {indicator_id for indicator_id, *_ in slices} | 
+        set(responses.values_list('indicator_id', flat=True).distinct())
+    )
+    return built
+
+def refresh_deleted_response_rollups(response):
+    '''
+    The fact is removed by the cascade when a response is deleted, so queue the month it was in to be re-summed.
+    - response (response instance): the response that was deleted
+    '''
+    task = Task.objects.filter(interaction__id=response.interaction_id).values('organization_id', 'project_id').first()
+    if not task:
+        return
+    queue_response_facts(slices=[(response.indicator_id, task['organization_id'], task['project_id'], get_month(response.response_date))])
+
+def rebuild_response_facts(batch_size=2000, stdout=None):
+    '''
+    Drops and rebuilds the entire fact table in batches (and the rollups built from it). Used by 
+    manage.py rebuild_response_facts to backfill existing data or to repair drift.
+    - batch_size (integer, optional): number of responses to build per batch
+    - stdout (stream, optional): write progress here
+    '''
+    ResponseFact.objects.all().delete()
+    ids = list(Response.objects.order_by('id').values_list('id', flat=True))
+    total = 0
+    for i in range(0, len(ids), batch_size):
+        batch = ids[i:i + batch_size]
+        with transaction.atomic():
+            total += len(ResponseFact.objects.bulk_create(build_facts(Response.objects.filter(id__in=batch))))
+        if stdout:
+            stdout.write(f'{total}/{len(ids)} responses')
+    #the rollups are summed from the facts, so rebuild them as well
+    rebuild_rollups(stdout=stdout)
+    return total
+
+def update_fact_parents(project_id, organization_id, parent_organization_id):
+    '''
+    Updates the parent organization stored on facts when an organization's parent in a project changes.
+    - project_id (integer): id of the project
+    - organization_id (integer): id of the child organization
+    - parent_organization_id (integer): id of the new parent (or None if it was removed)
+    '''
+    return ResponseFact.objects.filter(
+        project_id=project_id, organization_id=organization_id
+    ).update(parent_organization_id=parent_organization_id)
+
+def update_fact_client(project_id, client_id):
+    '''
+    Updates the client stored on facts when a project's client changes.
+    - project_id (integer): id of the project
+    - client_id (integer): id of the client (or None)
+    '''
+    return ResponseFact.objects.filter(project_id=project_id).update(client_id=client_id)
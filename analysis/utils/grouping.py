@@ -0,0 +1,309 @@
+from itertools import product
+from django.db.models import F, Value, Sum, Count, CharField, OuterRef, Subquery
+from django.db.models.functions import TruncMonth, TruncQuarter, Coalesce
+from aggregates.models import AggregateCount
+from events.models import Event
+from social.models import SocialMediaPost, SocialMediaPostTasks
+from indicators.models import Indicator, Option
+from organizations.models import Organization
+from analysis.utils.periods import get_period_string
+from analysis.utils.masks import get_mask_names, KP_BITS, DISABILITY_BITS
+
+'''
+Database side aggregation. Instead of pulling every response/count into python and building keys for each
+one, these helpers turn the requested breakdowns into a single values(...).annotate(...) GROUP BY query (against the
+response fact table for respondent data) and return one row per combination that actually has data. The aggregators then only need to place each grouped
+row in its bucket (see [./buckets.py]).
+'''
+
+#breakdowns that are stored as-is on the response fact table
+FACT_FIELDS = ['age_range', 'sex', 'district']
+
+#breakdowns stored as booleans on the fact table --> (column, value if true, value if false)
+FACT_BOOLEANS = {
+    'citizenship': ('is_citizen', 'citizen', 'non_citizen'),
+    'hiv_status': ('hiv_positive', 'hiv_positive', 'hiv_negative'),
+    'pregnancy': ('pregnant', 'pregnant', 'not_pregnant'),
+}
+
+#breakdowns stored as bitmasks on the fact table --> (column, bits)
+FACT_MASKS = {
+    'kp_type': ('kp_mask', KP_BITS),
+    'disability_type': ('disability_mask', DISABILITY_BITS),
+}
+
+#engagement metrics stored on each social media post
+POST_METRICS = ['comments', 'views', 'likes', 'reach']
+
+#where each breakdown lives relative to the aggregate count model
+COUNT_FIELDS = {
+    'organization': 'group__organization__name',
+    'option': 'option__name',
+}
+
+def get_period_trunc(split, field):
+    '''
+    Returns the database function that truncates a date field to the start of its month/quarter.
+    - split (string): month or quarter
+    - field (string): the date field to truncate
+    '''
+    return TruncQuarter(field) if split == 'quarter' else TruncMonth(field)
+
+def get_period_label(split, value):
+    '''
+    Converts a truncated date back to the period string used as the key in the aggregates.
+    - split (string): month or quarter
+    - value (date): start of the period
+    '''
+    if value is None:
+        return None
+    return get_period_string(split, value)
+
+def group_facts(facts, indicator, breakdowns, split=None, include_options=False):
+    '''
+    Runs a single GROUP BY query against the response fact table that sums (numeric indicators) or counts responses
+    for each combination of the requested breakdowns. Returns a list of dicts with a value for each breakdown, plus 
+    'count' (the sum/count) and 'number' (the number of responses, for calculating averages). KP/disability types are 
+    grouped by their bitmask and then expanded, so a respondent with two KP types is counted for both.
+    - facts (queryset): prefiltered queryset of response facts (see [./collection.py])
+    - indicator (indicator instance): the indicator these responses belong to
+    - breakdowns (list): list of fields to split the data by (use 'period' for the time period)
+    - split (string, optional): month or quarter, required if period is a breakdown
+    - include_options (boolean, optional): if the data is split by option (for multiselects, each option is a seperate
+        response, so if this is false each interaction is only counted once)
+    '''
+    columns, annotations = get_fact_columns(breakdowns, split)
+
+    if indicator.type in [Indicator.Type.INT, Indicator.Type.MULTINT]:
+        total = Coalesce(Sum('value'), Value(0))
+        number = Count('id')
+    elif indicator.type == Indicator.Type.MULTI and not include_options:
+        #multiselects are stored in multiple rows, so only count each interaction once
+        total = Count('interaction_id', distinct=True)
+        number = Count('interaction_id', distinct=True)
+    else:
+        total = Count('id')
+        number = Count('id')
+    grouped = run_grouped(facts.annotate(**annotations), columns, total=total, number=number)
+
+    return expand_grouped_rows(grouped, columns, split)
+
+def group_rollups(rollups, indicator, breakdowns, split=None, include_options=False):
+    '''
+    Same as group_facts, but sums the pre-summed monthly rollups (see [./rollups.py]) instead, so the cost depends
+    on the number of months/cells instead of the number of responses.
+    - rollups (queryset): prefiltered queryset of monthly rollups (see [./rollups.py])
+    - indicator (indicator instance): the indicator these rollups belong to
+    - breakdowns (list): list of fields to split the data by (use 'period' for the time period)
+    - split (string, optional): month or quarter, required if period is a breakdown
+    - include_options (boolean, optional): if the data is split by option
+    '''
+    columns, annotations = get_fact_columns(breakdowns, split, 'month')
+    if indicator.type in [Indicator.Type.INT, Indicator.Type.MULTINT]:
+        total = Sum('total')
+    elif indicator.type == Indicator.Type.MULTI and not include_options:
+        #each interaction is only counted in one of its option rows, so these can be summed
+        total = Sum('interactions')
+    else:
+        total = Sum('number')
+    grouped = run_grouped(rollups.annotate(**annotations), columns, total=total, number=Sum('number'))
+    return expand_grouped_rows(grouped, columns, split)
+
+def run_grouped(queryset, columns, **aggregations):
+    '''
+    Runs the GROUP BY query and returns a list of dicts. With no breakdowns, values() would group by every field, 
+    so run a plain aggregate instead.
+    - queryset (queryset): annotated queryset to group
+    - columns (dict): breakdown --> column map
+    - aggregations (kwargs): the aggregates to calculate for each group
+    '''
+    if not columns:
+        return [queryset.aggregate(**aggregations)]
+    return list(queryset.values(*columns.values()).annotate(**aggregations).order_by())
+
+def get_fact_columns(breakdowns, split=None, date_field='response_date'):
+    '''
+    Maps each breakdown to the fact/rollup column it is stored in. Returns the columns and any annotations needed
+    to create the columns that aren't stored directly.
+    - breakdowns (list): list of fields to split the data by (use 'period' for the time period)
+    - split (string, optional): month or quarter, required if period is a breakdown
+    - date_field (string, optional): the date to truncate to get the period
+    '''
+    columns = {}
+    annotations = {}
+    for field in breakdowns:
+        if field == 'period':
+            annotations['bd_period'] = get_period_trunc(split, date_field)
+            columns[field] = 'bd_period'
+        elif field == 'organization':
+            columns[field] = 'organization_id'
+        elif field == 'option':
+            columns[field] = 'option_id'
+        elif field in FACT_BOOLEANS:
+            columns[field] = FACT_BOOLEANS[field][0]
+        elif field in FACT_MASKS:
+            columns[field] = FACT_MASKS[field][0]
+        elif field in FACT_FIELDS:
+            columns[field] = field
+        else:
+            #not a field we can pull from a response, so nothing will fall into these buckets
+            annotations[f'bd_{field}'] = Value(None, output_field=CharField())
+            columns[field] = f'bd_{field}'
+    return columns, annotations
+
+def expand_grouped_rows(grouped, columns, split=None):
+    '''
+    Converts the rows returned by a fact/rollup GROUP BY query into the values used as keys in the aggregates 
+    (names for ids, labels for booleans/periods, one row per KP/disability type in a mask).
+    - grouped (list): list of dicts returned by the query (with a total and number)
+    - columns (dict): breakdown --> column map (see get_fact_columns)
+    - split (string, optional): month or quarter, required if period is a breakdown
+    '''
+    #ids are grouped on instead of names so no join is needed, look the names up once instead
+    names = {}
+    if 'organization' in columns:
+        names['organization'] = dict(Organization.objects.filter(
+            id__in={row['organization_id'] for row in grouped}
+        ).values_list('id', 'name'))
+    if 'option' in columns:
+        names['option'] = dict(Option.objects.filter(
+            id__in={row['option_id'] for row in grouped}
+        ).values_list('id', 'name'))
+
+    rows = []
+    for row in grouped:
+        #list every value this row belongs to for each field (more than one for KP/disability masks)
+        values = []
+        for field, column in columns.items():
+            value = row[column]
+            if field == 'period':
+                values.append([get_period_label(split, value)])
+            elif field in names:
+                values.append([names[field].get(value)])
+            elif field in FACT_BOOLEANS:
+                #counts that weren't split by this field store None, which shouldn't land in either bucket
+                values.append([None if value is None else FACT_BOOLEANS[field][1] if value else FACT_BOOLEANS[field][2]])
+            elif field in FACT_MASKS:
+                values.append(get_mask_names(value or 0, FACT_MASKS[field][1]))
+            else:
+                values.append([value])
+        for combo in product(*values):
+            item = dict(zip(columns.keys(), combo))
+            item['count'] = row['total'] or 0
+            item['number'] = row['number'] or 0
+            rows.append(item)
+    return rows
+
+def group_counts(counts, breakdowns, split=None):
+    '''
+    Runs a single GROUP BY query that sums aggregate counts for each combination of the requested breakdowns.
+    Returns a list of dicts with a value for each breakdown plus 'count'.
+    - counts (queryset): prefiltered queryset of aggregate counts (see [./collection.py])
+    - breakdowns (list): list of fields to split the data by (use 'period' for the time period)
+    - split (string, optional): month or quarter, required if period is a breakdown
+    '''
+    #rescope to a plain subquery of ids so that any joins used for filtering can't duplicate rows in the sums
+    queryset = AggregateCount.objects.filter(id__in=counts.values('id'))
+    columns = {}
+    annotations = {}
+    for field in breakdowns:
+        if field == 'period':
+            annotations['bd_period'] = get_period_trunc(split, 'group__end')
+        else:
+            annotations[f'bd_{field}'] = F(COUNT_FIELDS.get(field, field))
+        columns[field] = f'bd_{field}'
+    grouped = run_grouped(queryset.annotate(**annotations), columns, total=Sum('value'))
+    rows = []
+    for row in grouped:
+        item = {field: row[column] for field, column in columns.items()}
+        if 'period' in item:
+            item['period'] = get_period_label(split, item['period'])
+        item['count'] = row['total'] or 0
+        rows.append(item)
+    return rows
+
+def group_events(events, breakdowns, split=None, participants=False):
+    '''
+    Runs a single GROUP BY query that counts events (or the number of organizations that participated in them)
+    for each combination of the requested breakdowns. Returns a list of dicts with a value for each breakdown plus 'count'.
+    - events (queryset): prefiltered queryset of events (see [./collection.py])
+    - breakdowns (list): list of fields to split the data by ('period' for the end date, 'organization' for the host)
+    - split (string, optional): month or quarter, required if period is a breakdown
+    - participants (boolean, optional): count participating organizations instead of events
+    '''
+    #the collection queryset is distinct over the task joins, so rescope by id before joining the participants
+    queryset = Event.objects.filter(id__in=events.values('id'))
+    columns = {}
+    annotations = {}
+    for field in breakdowns:
+        if field == 'period':
+            annotations['bd_period'] = get_period_trunc(split, 'end')
+        elif field == 'organization':
+            annotations['bd_organization'] = F('host__name')
+        else:
+            annotations[f'bd_{field}'] = Value(None, output_field=CharField())
+        columns[field] = f'bd_{field}'
+    #each participant is one through row, so counting the distinct rows sums the participants of every event in the group
+    total = Count('eventorganization', distinct=True) if participants else Count('id', distinct=True)
+    grouped = run_grouped(queryset.annotate(**annotations), columns, total=total)
+    rows = []
+    for row in grouped:
+        item = {field: row[column] for field, column in columns.items()}
+        if 'period' in item:
+            item['period'] = get_period_label(split, item['period'])
+        item['count'] = row['total'] or 0
+        rows.append(item)
+    return rows
+
+def get_post_organization(indicator):
+    '''
+    Subquery that resolves the organization a post counts toward. A post can be linked to several tasks, so it is
+    credited to the organization of its earliest (lowest id) task for this indicator, which is stable no matter how
+    the tasks are fetched.
+    - indicator (indicator instance): the indicator being aggregated
+    '''
+    return Subquery(
+        SocialMediaPostTasks.objects.filter(post=OuterRef('pk'), task__indicator=indicator)
+        .order_by('task_id').values('task__organization__name')[:1]
+    )
+
+def group_posts(posts, indicator, breakdowns, split=None):
+    '''
+    Runs a single GROUP BY query that sums each engagement metric for every combination of the requested breakdowns,
+    then unpivots the metrics. Returns a list of dicts with a value for each breakdown plus 'count' (total engagement
+    unless the data is split by metric).
+    - posts (queryset): prefiltered queryset of social media posts (see [./collection.py])
+    - indicator (indicator instance): the indicator being aggregated (for resolving a post's organization)
+    - breakdowns (list): list of fields to split the data by ('period', 'platform', 'metric', 'organization')
+    - split (string, optional): month or quarter, required if period is a breakdown
+    '''
+    #rescope by id so the task joins used for filtering can't duplicate posts in the sums
+    queryset = SocialMediaPost.objects.filter(id__in=posts.values('id'))
+    columns = {}
+    annotations = {}
+    for field in breakdowns:
+        if field == 'metric':
+            continue #metrics are columns, not rows, so they are unpivoted below
+        if field == 'period':
+            annotations['bd_period'] = get_period_trunc(split, 'published_at')
+        elif field == 'organization':
+            annotations['bd_organization'] = get_post_organization(indicator)
+        elif field == 'platform':
+            annotations['bd_platform'] = F('platform')
+        else:
+            annotations[f'bd_{field}'] = Value(None, output_field=CharField())
+        columns[field] = f'bd_{field}'
+    sums = {f'total_{metric}': Coalesce(Sum(metric), Value(0)) for metric in POST_METRICS}
+    grouped = run_grouped(queryset.annotate(**annotations), columns, **sums)
+    rows = []
+    for row in grouped:
+        item = {field: row[column] for field, column in columns.items()}
+        if 'period' in item:
+            item['period'] = get_period_label(split, item['period'])
+        if 'metric' in breakdowns:
+            for metric in POST_METRICS:
+                rows.append({**item, 'metric': metric, 'count': row[f'total_{metric}'] or 0})
+        else:
+            item['count'] = sum(row[f'total_{metric}'] or 0 for metric in POST_METRICS)
+            rows.append(item)
+    return rows
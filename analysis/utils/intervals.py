@@ -0,0 +1,107 @@
+from bisect import bisect_right
+from datetime import date
+
+'''
+Index for checking a respondent's status on a given date (was this respondent pregnant on the date of this response,
+had they tested positive by then?). Instead of checking every pregnancy/HIV status a respondent has for each
+response, each respondent's periods are merged and stored as sorted start/end arrays, so a lookup is a binary search
+(O(log k) for k periods). A whole column of response dates can be checked at once with contains_many, which sorts
+each respondent's dates and walks them alongside the periods (O(n log n) to sort, then one pass).
+
+Pregnancies are the period between term_began and term_ended (or today if the term hasn't ended) and HIV statuses
+are open ended periods starting on date_positive.
+'''
+
+class IntervalIndex:
+    '''
+    Sorted, non-overlapping periods for each respondent.
+    - rows (iterable): iterable of (respondent_id, start, end) tuples, end can be None for a period that hasn't ended
+    '''
+    def __init__(self, rows=()):
+        periods = {}
+        for respondent_id, start, end in rows:
+            if start is None:
+                continue
+            periods.setdefault(respondent_id, []).append((start, end))
+
+        self.starts = {}
+        self.ends = {}
+        for respondent_id, items in periods.items():
+            #merge overlapping periods so the last period starting on or before a date is the only one to check
+            items.sort(key=lambda item: item[0])
+            starts, ends = [], []
+            for start, end in items:
+                if ends and (ends[-1] is None or start <= ends[-1]):
+                    if ends[-1] is not None and (end is None or end > ends[-1]):
+                        ends[-1] = end
+                    continue
+                starts.append(start)
+                ends.append(end)
+            self.starts[respondent_id] = starts
+            self.ends[respondent_id] = ends
+
+    @classmethod
+    def from_pregnancies(cls, pregnancies_map):
+        '''
+        Build an index from the map returned by get_pregnancies. Pregnancies that haven't ended run through today.
+        - pregnancies_map (dict): respondent id --> list of pregnancy instances
+        '''
+        today = date.today()
+        return cls(
+            (respondent_id, p.term_began, p.term_ended or today)
+            for respondent_id, pregnancies in pregnancies_map.items() for p in pregnancies
+        )
+
+    @classmethod
+    def from_hiv_statuses(cls, hiv_status_map):
+        '''
+        Build an index from the map returned by get_hiv_statuses. A respondent stays positive from date_positive on.
+        - hiv_status_map (dict): respondent id --> list of HIV status instances
+        '''
+        return cls(
+            (respondent_id, hs.date_positive, None)
+            for respondent_id, statuses in hiv_status_map.items() for hs in statuses
+        )
+
+    def contains(self, respondent_id, on):
+        '''
+        Returns True if one of the respondent's periods includes this date.
+        - respondent_id (int): the respondent to check
+        - on (date): the date to check
+        '''
+        starts = self.starts.get(respondent_id)
+        if not starts or on is None:
+            return False
+        i = bisect_right(starts, on) - 1
+        if i < 0:
+            return False
+        end = self.ends[respondent_id][i]
+        return end is None or on <= end
+
+
+    def contains_many(self, respondent_ids, dates):
+        '''
+        Batch version of contains for a column of respondents and a column of dates. Returns a list of booleans in the
+        same order as the rows.
+        - respondent_ids (iterable): the respondent for each row
+        - dates (iterable): the date for each row
+        '''
+        results = []
+        rows = {}
+        for position, (respondent_id, on) in enumerate(zip(respondent_ids, dates)):
+            results.append(False)
+            if on is not None and respondent_id in self.starts:
+                rows.setdefault(respondent_id, []).append((on, position))
+
+        for respondent_id, items in rows.items():
+            #dates and periods are both sorted, so each period only needs to be passed once
+            items.sort(key=lambda item: item[0])
+            starts = self.starts[respondent_id]
+            ends = self.ends[respondent_id]
+            i = -1
+            for on, position in items:
+                while i + 1 < len(starts) and starts[i + 1] <= on:
+                    i += 1
+                if i >= 0 and (ends[i] is None or on <= ends[i]):
+                    results[position] = True
+        return results
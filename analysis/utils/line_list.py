@@ -1,11 +1,55 @@
+from itertools import islice
 from datetime import date
-from respondents.models import Response
+from django.db.models import F, Q
+from respondents.models import Response, KeyPopulationStatus, DisabilityStatus
 from indicators.models import Indicator
-from projects.models import ProjectOrganization
-from analysis.utils.aggregates import get_hiv_statuses, get_pregnancies
+from projects.utils import get_org_scope
+from analysis.utils.collection import get_hiv_statuses, get_pregnancies
+from analysis.utils.intervals import IntervalIndex
+
+'''
+Line lists are built from a single flat values() query (every column a row needs is joined in) that is read from a
+server side cursor a chunk at a time. Anything that can have more than one value per respondent (KP/disability types,
+HIV statuses, pregnancies) is looked up once per chunk, so an export takes a fixed number of queries per chunk no
+matter how many responses it has.
+
+Rows are ordered by (response_date, id), which is also the key the paginated rows endpoint reads pages by (so a page
+is an index range scan, not an offset over the whole list). Responses without a date come last, the same place a plain
+ascending index (response_keyset_idx on Response) keeps them, so the database can read pages straight off it.
+'''
+
+#number of responses read from the cursor (and resolved together) at a time
+LINE_LIST_CHUNK_SIZE = 2000
+
+#default/max number of rows in one page of the rows endpoint
+LINE_LIST_PAGE_SIZE = 100
+LINE_LIST_MAX_PAGE_SIZE = 1000
+
+#the order rows are returned in (responses without a date last, matching response_keyset_idx)
+LINE_LIST_ORDER = [F('response_date').asc(nulls_last=True), 'id']
+
+#columns of a line list row that can be requested
+LINE_LIST_FIELDS = [
+    'is_anonymous', 'first_name', 'last_name', 'id', 'ward', 'village', 'district', 'sex', 'dob', 'age_range',
+    'citizenship', 'email', 'phone_number', 'comments', 'kp_status', 'disability_status', 'response_date',
+    'response_location', 'organization', 'project', 'indicator', 'option', 'value', 'flagged', 'hiv_status', 'pregnant',
+]
+
+#columns pulled for each response
+LINE_LIST_COLUMNS = [
+    'id', 'response_date', 'response_location', 'response_value', 'response_boolean', 'response_option__name',
+    'indicator__name', 'indicator__type', 'interaction__has_open_flags', 'interaction__task__organization__name',
+    'interaction__task__project__name', 'interaction__respondent_id',
+]
+#respondent columns pulled for each response
+RESPONDENT_COLUMNS = [
+    'is_anonymous', 'first_name', 'last_name', 'ward', 'village', 'district', 'sex', 'dob', 'age_range', 'citizenship',
+    'email', 'phone_number', 'comments', 'has_open_flags',
+]
+
 def prep_line_list(user, start=None, end=None, assessment=None, project=None, organization=None, cascade=False):
     '''
-    Collect a list of responses and return them as an array of set rows for a line list
+    Collect a list of responses and return them as an array of set rows for a line list (see iter_line_list)
     - user (user instance): used to check permissions
     - start (ISO date string, optional): only collect responses after this date
     - end (ISO date string, optional): only collect responses before this date
@@ -14,6 +58,12 @@ def prep_line_list(user, start=None, end=None, assessment=None, project=None, or
     - organization (organization instance, optional): only collect responses whose interaction's task is related to this org
     - cascade (boolean, optional): if project and organization are provided, also collect responses from child organizations
     '''
+    return list(iter_line_list(user, start, end, assessment, project, organization, cascade))
+
+def get_line_list_responses(user, start=None, end=None, assessment=None, project=None, organization=None, cascade=False):
+    '''
+    Returns the queryset of responses in a line list. Accepts the same arguments as prep_line_list.
+    '''
     queryset= Response.objects.all()
     
     #start with perms
@@ -23,12 +73,7 @@ def prep_line_list(user, start=None, end=None, assessment=None, project=None, or
         queryset=queryset.filter(interaction__task__project__client=user.client_organization)
     elif user.role in ['meofficer', 'manager']:
         # Find all orgs user has access to (own + child)
-        accessible_orgs = list(
-            ProjectOrganization.objects.filter(
-                parent_organization=user.organization
-            ).values_list('organization', flat=True)
-        )
-        accessible_orgs.append(user.organization.id)
+        accessible_orgs = get_org_scope(user).org_ids()
         
         queryset = queryset.filter(
             interaction__task__organization__in=accessible_orgs
@@ -45,12 +90,7 @@ def prep_line_list(user, start=None, end=None, assessment=None, project=None, or
     if organization:
         # if project, organization, and cascade, also fetch data from any child orgs
         if cascade and project:
-            accessible_orgs = list(
-                ProjectOrganization.objects.filter(
-                    parent_organization=organization, project=project
-                ).values_list('organization', flat=True)
-            )
-            accessible_orgs.append(organization.id)
+            accessible_orgs = get_org_scope(user, organization).org_ids(project)
             
             queryset = queryset.filter(
                 interaction__task__organization__in=accessible_orgs
@@ -62,56 +102,149 @@ def prep_line_list(user, start=None, end=None, assessment=None, project=None, or
         queryset=queryset.filter(response_date__gte=start)
     if end:
         queryset=queryset.filter(response_date__lte=end)
-    
-    respondent_ids = {r.interaction.respondent_id for r in queryset}
-    hiv_status_map = get_hiv_statuses(respondent_ids=respondent_ids)
-    pregnancies_map = get_pregnancies(respondent_ids=respondent_ids)
+    return queryset
+
+def get_line_list_columns():
+    #every column pulled for a response (including the respondent's)
+    return LINE_LIST_COLUMNS + [f'interaction__respondent__{field}' for field in RESPONDENT_COLUMNS]
+
+def encode_cursor(response_date, response_id, index):
+    '''
+    Returns the cursor that points at the row after this one.
+    - response_date (date): the row's response date (can be None)
+    - response_id (integer): the row's response id
+    - index (integer): the row's position in the whole list (so the next page can keep numbering rows)
+    '''
+    return f"{response_date.isoformat() if response_date else ''},{response_id},{index}"
 
-    rows = [] #stores the line list items
-    #loop through each responses and build a row object
-    for i, r in enumerate(queryset):
+def decode_cursor(cursor):
+    '''
+    Converts a cursor back to (response_date, response_id, index). Raises ValueError if the cursor is invalid.
+    - cursor (string): cursor created by encode_cursor
+    '''
+    response_date, response_id, index = cursor.split(',')
+    index = int(index)
+    if index < 1:
+        raise ValueError('Cursor index must be positive.')
+    return (date.fromisoformat(response_date) if response_date else None, int(response_id), index)
+
+def get_line_list_page(queryset, cursor=None, limit=100, fields=None):
+    '''
+    Returns one page of line list rows after the cursor (keyset pagination over (response_date, id)). Returns
+    (rows, next cursor or None if this is the last page). Rows are numbered from 1 across pages, the cursor carries
+    the position of the last row.
+    - queryset (queryset): responses in the line list (see get_line_list_responses)
+    - cursor (string, optional): cursor returned with the previous page
+    - limit (integer, optional): number of rows per page
+    - fields (list, optional): only return these columns (see LINE_LIST_FIELDS)
+    '''
+    index = 0
+    if cursor:
+        response_date, response_id, index = decode_cursor(cursor)
+        if response_date is None:
+            #already past every dated response
+            queryset = queryset.filter(response_date__isnull=True, id__gt=response_id)
+        else:
+            queryset = queryset.filter(
+                Q(response_date__gt=response_date) | Q(response_date=response_date, id__gt=response_id) | Q(response_date__isnull=True)
+            )
+    #fetch one extra row to see if there is another page
+    chunk = list(queryset.order_by(*LINE_LIST_ORDER).values(*get_line_list_columns())[:limit + 1])
+    next_cursor = None
+    if len(chunk) > limit:
+        chunk = chunk[:limit]
+        next_cursor = encode_cursor(chunk[-1]['response_date'], chunk[-1]['id'], index + limit)
+    rows = list(build_line_list_rows(chunk, fields))
+    if fields is None:
+        for i, row in enumerate(rows, start=index + 1):
+            row['index'] = i
+    return rows, next_cursor
+
+def iter_line_list(user, start=None, end=None, assessment=None, project=None, organization=None, cascade=False, chunk_size=LINE_LIST_CHUNK_SIZE):
+    '''
+    Generator that yields each row of a line list, reading the responses a chunk at a time. Accepts the same
+    arguments as prep_line_list.
+    - chunk_size (integer, optional): number of responses to read/resolve at a time
+    '''
+    queryset = get_line_list_responses(user, start, end, assessment, project, organization, cascade)
+    responses = queryset.order_by(*LINE_LIST_ORDER).values(*get_line_list_columns()).iterator(chunk_size=chunk_size)
+    index = 0
+    while True:
+        chunk = list(islice(responses, chunk_size))
+        if not chunk:
+            return
+        for row in build_line_list_rows(chunk):
+            index += 1
+            row['index'] = index
+            yield row
+
+def build_line_list_rows(chunk, fields=None):
+    '''
+    Converts a chunk of response values into line list rows, fetching the multi-value respondent fields for the whole
+    chunk at once (only if they were requested).
+    - chunk (list): list of dicts with the LINE_LIST_COLUMNS (and respondent columns) for each response
+    - fields (list, optional): only return these columns (see LINE_LIST_FIELDS)
+    '''
+    wanted = lambda field: fields is None or field in fields
+    respondent_ids = {r['interaction__respondent_id'] for r in chunk}
+    kp_types = {}
+    if wanted('kp_status'):
+        for respondent_id, name in KeyPopulationStatus.objects.filter(respondent_id__in=respondent_ids).values_list('respondent_id', 'key_population__name'):
+            kp_types.setdefault(respondent_id, []).append(name)
+    disability_types = {}
+    if wanted('disability_status'):
+        for respondent_id, name in DisabilityStatus.objects.filter(respondent_id__in=respondent_ids).values_list('respondent_id', 'disability__name'):
+            disability_types.setdefault(respondent_id, []).append(name)
+    hiv_index = IntervalIndex.from_hiv_statuses(get_hiv_statuses(respondent_ids=respondent_ids) if wanted('hiv_status') else {})
+    pregnancy_index = IntervalIndex.from_pregnancies(get_pregnancies(respondent_ids=respondent_ids) if wanted('pregnant') else {})
+    chunk_respondent_ids = [r['interaction__respondent_id'] for r in chunk]
+    chunk_dates = [r['response_date'] for r in chunk]
+    hiv_statuses = hiv_index.contains_many(chunk_respondent_ids, chunk_dates)
+    pregnancies = pregnancy_index.contains_many(chunk_respondent_ids, chunk_dates)
+
+    for i, r in enumerate(chunk):
         option = None
         value = None
-        if r.indicator.type in [Indicator.Type.MULTI, Indicator.Type.SINGLE, Indicator.Type.MULTINT]:
-            option = r.response_option.name if r.response_option else None
-            if r.indicator.type in [Indicator.Type.MULTINT]:
-                value = r.response_value
-        elif r.indicator.type in [Indicator.Type.BOOL]:
-            value = r.response_boolean
+        ind_type = r['indicator__type']
+        if ind_type in [Indicator.Type.MULTI, Indicator.Type.SINGLE, Indicator.Type.MULTINT]:
+            option = r['response_option__name']
+            if ind_type in [Indicator.Type.MULTINT]:
+                value = r['response_value']
+        elif ind_type in [Indicator.Type.BOOL]:
+            value = r['response_boolean']
         else:
-            value = r.response_value 
-        respondent = r.interaction.respondent
+            value = r['response_value']
+        respondent_id = r['interaction__respondent_id']
+        respondent = lambda field: r[f'interaction__respondent__{field}']
         row = {
-            'index': i+1,
-            'is_anonymous': respondent.is_anonymous,
-            'first_name': respondent.first_name,
-            'last_name': respondent.last_name,
-            'id': respondent.id,
-            'ward': respondent.ward,
-            'village': respondent.village,
-            'district': respondent.district,
-            'sex': respondent.sex,
-            'dob': respondent.dob,
-            'age_range' : respondent.age_range,
-            'citizenship': respondent.citizenship,
-            'email': respondent.email,
-            'phone_number': respondent.phone_number,
-            'comments': respondent.comments,
-            'kp_status': [kp.name for kp in respondent.kp_status.all()],
-            'disability_status': [d.name for d in respondent.disability_status.all()],
-            'response_date': r.response_date,
-            'response_location': r.response_location,
-            'organization': str(r.interaction.task.organization),
-            'project': str(r.interaction.task.project),
-            'indicator': str(r.indicator),
+            'index': None, #set once the row's position in the whole list is known
+            'is_anonymous': respondent('is_anonymous'),
+            'first_name': respondent('first_name'),
+            'last_name': respondent('last_name'),
+            'id': respondent_id,
+            'ward': respondent('ward'),
+            'village': respondent('village'),
+            'district': respondent('district'),
+            'sex': respondent('sex'),
+            'dob': respondent('dob'),
+            'age_range' : respondent('age_range'),
+            'citizenship': respondent('citizenship'),
+            'email': respondent('email'),
+            'phone_number': respondent('phone_number'),
+            'comments': respondent('comments'),
+            'kp_status': kp_types.get(respondent_id, []),
+            'disability_status': disability_types.get(respondent_id, []),
+            'response_date': r['response_date'],
+            'response_location': r['response_location'],
+            'organization': str(r['interaction__task__organization__name']),
+            'project': str(r['interaction__task__project__name']),
+            'indicator': str(r['indicator__name']),
             'option': option,
             'value': value,
-            'flagged': (r.interaction.flags.filter(resolved=False).count() > 0 or respondent.flags.filter(resolved=False).count() > 0)
+            'flagged': r['interaction__has_open_flags'] or respondent('has_open_flags'),
+            'hiv_status': hiv_statuses[i],
+            'pregnant': pregnancies[i],
         }
-        hiv_status_list = hiv_status_map.get(respondent.id, [])
-        row['hiv_status'] = any(hs.date_positive <= r.response_date for hs in hiv_status_list)
-
-        preg_list = pregnancies_map.get(respondent.id, [])
-        row['pregnant'] = any(p.term_began <= r.response_date <= (p.term_ended or date.today()) for p in preg_list)
-        rows.append(row)
-    return rows
\ No newline at end of file
+        if fields is not None:
+            row = {field: row[field] for field in fields}
+        yield row
@@ -0,0 +1,29 @@
+from respondents.models import KeyPopulation, DisabilityType
+
+'''
+KP/disability statuses are many-to-many on the respondent, but the fact/rollup tables store them as a bitmask
+(one bit per type) so they fit in a single integer column that can be grouped/filtered without a join.
+'''
+
+#each KP/disability type gets one bit, so a respondent's statuses can be stored in a single integer column
+KP_BITS = {value: 1 << i for i, (value, label) in enumerate(KeyPopulation.KeyPopulations.choices)}
+DISABILITY_BITS = {value: 1 << i for i, (value, label) in enumerate(DisabilityType.DisabilityTypes.choices)}
+
+def get_mask(names, bits):
+    '''
+    Converts a list of KP/disability names into a bitmask.
+    - names (list): list of names (i.e., ['FSW', 'MSM'])
+    - bits (dict): KP_BITS or DISABILITY_BITS
+    '''
+    mask = 0
+    for name in names:
+        mask |= bits.get(name, 0)
+    return mask
+
+def get_mask_names(mask, bits):
+    '''
+    Converts a bitmask back into the list of KP/disability names it contains.
+    - mask (integer): the stored bitmask
+    - bits (dict): KP_BITS or DISABILITY_BITS
+    '''
+    return [name for name, bit in bits.items() if mask & bit]
@@ -1,31 +1,84 @@
 from datetime import date, datetime
-from dateutil.relativedelta import relativedelta
+from functools import lru_cache
 
 '''
 Functions that help manage dates when collecting aggregate data.
+
+Rows are bucketed into periods by the database (TruncMonth/TruncQuarter, see [./grouping.py]), so labels only need to
+be formatted once per distinct period (they are cached on the year/month). The period calendar is the sorted list of
+every period between the first and last one, so aggregates come back in chronological order with a zero bucket for
+periods that have no data.
 '''
+@lru_cache(maxsize=None)
+def format_month(year, month):
+    #formats a month once, no matter how many rows fall in it
+    return date(year, month, 1).strftime('%b %Y')
+
+@lru_cache(maxsize=None)
+def format_quarter(year, quarter):
+    return f"Q{quarter} {year}"
+
 def get_month_string(date):
     #returns the month as a string from a date object
-    return date.strftime('%b %Y') 
+    return format_month(date.year, date.month)
 
 def get_quarter_string(date):
     #returns the quarter as a string from a date object
-    return f"Q{((date.month - 1) // 3) + 1} {date.year}"
+    return format_quarter(date.year, ((date.month - 1) // 3) + 1)
+
+def get_period_string(split, value):
+    #returns the month/quarter string for a date object
+    return get_quarter_string(value) if split == 'quarter' else get_month_string(value)
+
+@lru_cache(maxsize=None)
+def parse_period_string(label):
+    '''
+    Converts a period string back to the date its period starts on (the first of the month/quarter).
+    - label (string): a period string (Jan 2025, Q1 2025)
+    '''
+    if label.startswith('Q'):
+        quarter, year = label[1:].split(' ')
+        return date(int(year), (int(quarter) - 1) * 3 + 1, 1)
+    return datetime.strptime(label, '%b %Y').date()
+
+def get_period_start(split, value):
+    #returns the first day of the month/quarter a date is in
+    month = (value.month - 1) // 3 * 3 + 1 if split == 'quarter' else value.month
+    return date(value.year, month, 1)
+
+def get_period_starts(split, start_date, end_date):
+    '''
+    Returns the first day of every month/quarter from the one start_date is in through the one end_date is in.
+    - split (string): month or quarter
+    - start_date (date): first date to include
+    - end_date (date): last date to include
+    '''
+    step = 3 if split == 'quarter' else 1
+    #count in months since year 0 so stepping is integer math
+    current = start_date.year * 12 + (start_date.month - 1) // step * step
+    last = end_date.year * 12 + end_date.month - 1
+    starts = []
+    while current <= last:
+        starts.append(date(current // 12, current % 12 + 1, 1))
+        current += step
+    return starts
+
+def get_period_calendar(split, labels):
+    '''
+    Returns the sorted list of period strings from the earliest to the latest of labels, including any periods in
+    between with no data. None (no date) is dropped.
+    - split (string): month or quarter
+    - labels (iterable): the period strings that have data
+    '''
+    starts = [parse_period_string(label) for label in labels if label is not None]
+    if not starts:
+        return []
+    return [get_period_string(split, value) for value in get_period_starts(split, min(starts), max(starts))]
 
 def get_month_strings_between(start_date, end_date):
     #get list of month strings between two dates
-    months = []
-    current = start_date.replace(day=1)
-    while current <= end_date:
-        months.append(get_month_string(current)) 
-        current += relativedelta(months=1)
-    return months
+    return [get_month_string(value) for value in get_period_starts('month', start_date, end_date)]
 
 def get_quarter_strings_between(start_date, end_date):
     #get list of quarter strings between two dates
-    quarters = []
-    current = start_date.replace(day=1)
-    while current <= end_date:
-        quarters.append(get_quarter_string(current))
-        current += relativedelta(months=3)
-    return quarters
\ No newline at end of file
+    return [get_quarter_string(value) for value in get_period_starts('quarter', start_date, end_date)]
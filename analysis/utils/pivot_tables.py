@@ -0,0 +1,102 @@
+import time
+from django.utils.timezone import now
+
+from analysis.models import PivotTable
+from analysis.utils.aggregates import aggregates_switchboard
+from analysis.utils.csv import prep_csv
+from analysis.utils.result_cache import get_data_version
+from jobs.models import Job
+from jobs.utils import enqueue_job
+
+'''
+Helpers for calculating a saved pivot table's data (used by the pivot table views and background jobs).
+
+Each table stores its last result as a snapshot, along with the version of the data it was built from (the
+indicator's result cache versions, see [./result_cache.py], which every write the aggregates read from bumps, flags
+and respondent statuses included). Views serve the snapshot straight away. If the data has moved on since, the
+snapshot is still served (marked as stale) and a refresh is queued for a worker (see jobs), so the next view gets
+the new numbers. The versions are kept in the database whatever the analysis cache is, so this works with a per
+process cache (or none at all). If the table's own settings have changed since, the old snapshot is no longer for
+the same table and is recalculated in the request.
+'''
+
+#every breakdown a pivot table can be split by
+PIVOT_PARAMS = [
+    'id', 'age_range', 'sex', 'kp_type', 'disability_type', 'citizenship', 'hiv_status', 'pregnancy', 'option',
+    'platform', 'district', 'metric', 'organization',
+]
+
+def get_pivot_params(table):
+    '''
+    Returns the params dict (breakdown --> whether to split by it) for a pivot table.
+    - table (pivot table instance): the pivot table
+    '''
+    table_params = [param.name for param in table.params.all()]
+    return {cat: cat in table_params for cat in PIVOT_PARAMS}
+
+def get_pivot_aggregates(user, table):
+    '''
+    Calculates the aggregates for a pivot table. Returns (aggregates, params).
+    - user (user instance): the user requesting the data, for permissions
+    - table (pivot table instance): the pivot table
+    '''
+    params = get_pivot_params(table)
+    aggregates = aggregates_switchboard(
+        user=user,
+        indicator=table.indicator,
+        params=params,
+        organization=table.organization,
+        project=table.project,
+        start=table.start,
+        end=table.end,
+        repeat_only=table.repeat_only,
+        n=table.repeat_n,
+        cascade=table.cascade_organization
+    )
+    return aggregates, params
+
+def refresh_pivot_snapshot(table):
+    '''
+    Recalculates a pivot table and stores the result as its snapshot. The data version is read before calculating,
+    so anything written while it runs makes the new snapshot stale instead of being missed.
+    - table (pivot table instance): the pivot table
+    '''
+    version = get_data_version(table.indicator)
+    started = time.perf_counter()
+    aggregates, params = get_pivot_aggregates(table.created_by, table)
+    fields = {
+        'snapshot': prep_csv(aggregates=aggregates, params=params),
+        'snapshot_version': version,
+        'snapshot_computed_at': now(),
+        'snapshot_duration_ms': round((time.perf_counter() - started) * 1000, 2),
+    }
+    #update() so saving the snapshot doesn't bump updated_at (which tracks changes to the settings)
+    PivotTable.objects.filter(id=table.id).update(**fields)
+    for field, value in fields.items():
+        setattr(table, field, value)
+    return table
+
+def queue_pivot_refresh(table):
+    '''
+    Queues a background refresh of a pivot table's snapshot, unless one is already waiting.
+    - table (pivot table instance): the pivot table
+    '''
+    queued = Job.objects.filter(type=Job.Type.PIVOT_TABLE_REFRESH, status=Job.Status.QUEUED, params__pivot_table_id=table.id)
+    if queued.exists() or not table.created_by:
+        return None
+    return enqueue_job(Job.Type.PIVOT_TABLE_REFRESH, table.created_by, {'pivot_table_id': table.id})
+
+def get_pivot_snapshot(table, refresh=False):
+    '''
+    Returns a pivot table's snapshot (refreshing it first if needed) and whether it is stale.
+    - table (pivot table instance): the pivot table
+    - refresh (boolean, optional): recalculate the snapshot no matter what
+    '''
+    settings_changed = not table.snapshot_computed_at or table.updated_at > table.snapshot_computed_at
+    if refresh or table.snapshot is None or settings_changed:
+        return refresh_pivot_snapshot(table).snapshot, False
+    version = get_data_version(table.indicator)
+    stale = version != table.snapshot_version
+    if stale:
+        queue_pivot_refresh(table)
+    return table.snapshot, stale
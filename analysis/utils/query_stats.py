@@ -0,0 +1,77 @@
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+from functools import lru_cache
+from django.db import connections
+
+'''
+Collects SQL statistics for a request (see [../middleware.py]): how many queries ran, how long the database took,
+the slowest query, and the query that was repeated the most. Queries are grouped by their normalized SQL (literals and
+parameter lists replaced with ?), so the same query run once per row of a loop (an N+1) shows up as one statement
+repeated many times.
+'''
+
+#longest SQL stored for the slowest/repeated query
+MAX_SQL_LENGTH = 1000
+
+STRING_RE = re.compile(r"'(?:[^']|'')*'")
+NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+PARAM_RE = re.compile(r'%s|\$\d+')
+LIST_RE = re.compile(r'\((?:\s*\?\s*,)*\s*\?\s*\)')
+SPACE_RE = re.compile(r'\s+')
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql):
+    '''
+    Returns the fingerprint of a SQL statement (the statement with any values replaced with ?), so queries that only
+    differ by their values match.
+    - sql (string): the SQL that was run
+    '''
+    sql = STRING_RE.sub('?', sql)
+    sql = PARAM_RE.sub('?', sql)
+    sql = NUMBER_RE.sub('?', sql)
+    sql = LIST_RE.sub('(...)', sql)
+    return SPACE_RE.sub(' ', sql).strip()[:MAX_SQL_LENGTH]
+
+class QueryCollector:
+    '''
+    Database execute wrapper that times every query run while it is installed (see collect).
+    '''
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0
+        self.slowest_sql = None
+        self.slowest_ms = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            self.count += 1
+            self.total_ms += duration_ms
+            fingerprint = normalize_sql(sql)
+            self.fingerprints[fingerprint] += 1
+            if self.slowest_sql is None or duration_ms > self.slowest_ms:
+                self.slowest_sql = fingerprint
+                self.slowest_ms = duration_ms
+
+    def most_repeated(self):
+        '''
+        Returns (fingerprint, count) for the query that ran the most times, or (None, 0) if none ran.
+        '''
+        if not self.fingerprints:
+            return None, 0
+        return self.fingerprints.most_common(1)[0]
+
+    def collect(self):
+        '''
+        Context manager that installs the collector on every database connection for this thread.
+        '''
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
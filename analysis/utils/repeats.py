@@ -0,0 +1,32 @@
+from django.db.models import F, Window
+from django.db.models.functions import DenseRank, FirstValue
+from analysis.models import ResponseFact
+
+'''
+Repeat engagement (repeat_only) helpers. A respondent is a repeat respondent if they had at least n distinct 
+interactions within the data in scope, and they are placed in buckets based on their first interaction (the 
+interaction of their earliest response, by date then id).
+
+Both are worked out by the database in one query with window functions partitioned by respondent:
+    - the number of distinct interactions is the dense rank of the interaction counting up plus counting down, less 
+        one (Postgres doesn't allow COUNT(DISTINCT) as a window function)
+    - the first interaction is the FIRST_VALUE of the interaction ordered by response date/id
+'''
+
+def get_repeat_facts(responses, n):
+    '''
+    Returns a queryset of the response facts from the first interaction of each respondent that had at least n 
+    interactions within the responses.
+    - responses (queryset): queryset of responses in scope (see get_interactions_from_indicator)
+    - n (integer): number of distinct interactions a respondent needs to be counted
+    '''
+    by_respondent = {'partition_by': [F('respondent_id')]}
+    return ResponseFact.objects.filter(response_id__in=responses.values('id')).annotate(
+        interaction_rank=Window(DenseRank(), order_by=[F('interaction_id').asc()], **by_respondent),
+        interaction_rank_desc=Window(DenseRank(), order_by=[F('interaction_id').desc()], **by_respondent),
+        first_interaction=Window(
+            FirstValue('interaction_id'), order_by=[F('response_date').asc(nulls_last=True), F('response_id').asc()], **by_respondent
+        ),
+    ).annotate(
+        interactions=F('interaction_rank') + F('interaction_rank_desc') - 1,
+    ).filter(interactions__gte=n, interaction_id=F('first_interaction'))
@@ -0,0 +1,127 @@
+import atexit
+import threading
+import time
+import traceback
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+from analysis.models import RequestLog
+User = get_user_model()
+
+'''
+Buffers request logs in memory and writes them with one bulk insert per batch, instead of an INSERT per request
+(see [../middleware.py]). The buffer is flushed once REQUEST_LOG_BATCH_SIZE entries are waiting or
+REQUEST_LOG_FLUSH_SECONDS have passed since the last flush. The check runs when a request finishes (after the
+response has been sent), so the client never waits on it. It never runs inside an open transaction, so logs
+aren't written as part of (or rolled back with) someone else's work.
+
+If the database is slow or down, entries build up until REQUEST_LOG_BUFFER_LIMIT and anything past that is
+dropped and counted rather than using more memory. Anything left when a worker shuts down is flushed by
+register_shutdown_flush (called from wsgi.py/asgi.py). Each worker process has its own buffer.
+'''
+
+class RequestLogBuffer:
+    '''
+    Thread safe buffer of request log entries (dicts of RequestLog fields).
+    '''
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.entries = []
+        self.last_flush = time.monotonic()
+        self.written = 0
+        self.dropped = 0
+        self.failed_flushes = 0
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'REQUEST_LOG_BATCH_SIZE', 100)
+
+    @property
+    def interval(self):
+        return getattr(settings, 'REQUEST_LOG_FLUSH_SECONDS', 10)
+
+    @property
+    def limit(self):
+        return getattr(settings, 'REQUEST_LOG_BUFFER_LIMIT', 10000)
+
+    def add(self, entry):
+        '''
+        Adds an entry to the buffer. Returns False (and counts it as dropped) if the buffer is full.
+        - entry (dict): RequestLog fields for one request
+        '''
+        with self.lock:
+            if len(self.entries) >= self.limit:
+                self.dropped += 1
+                return False
+            self.entries.append(entry)
+            return True
+
+    def is_due(self):
+        return len(self.entries) >= self.batch_size or (self.entries and time.monotonic() - self.last_flush >= self.interval)
+
+    def flush(self):
+        '''
+        Writes everything in the buffer with bulk_create. Returns the number of logs written. If the write fails,
+        the entries are put back (up to the limit) to be retried with the next batch.
+        '''
+        #only one thread writes at a time, the others keep adding to the buffer
+        if not self.flush_lock.acquire(blocking=False):
+            return 0
+        try:
+            with self.lock:
+                entries, self.entries = self.entries, []
+                self.last_flush = time.monotonic()
+            if not entries:
+                return 0
+            try:
+                #users deleted since their request was logged would fail the whole batch
+                user_ids = {entry['user_id'] for entry in entries if entry.get('user_id')}
+                existing = set(User.objects.filter(id__in=user_ids).values_list('id', flat=True)) if user_ids else set()
+                logs = [RequestLog(**{**entry, 'user_id': entry.get('user_id') if entry.get('user_id') in existing else None}) for entry in entries]
+                RequestLog.objects.bulk_create(logs, batch_size=500)
+            except Exception:
+                print('Could not write request logs:', traceback.format_exc())
+                self.failed_flushes += 1
+                with self.lock:
+                    space = max(self.limit - len(self.entries), 0)
+                    self.dropped += max(len(entries) - space, 0)
+                    self.entries = entries[:space] + self.entries
+                return 0
+            self.written += len(logs)
+            return len(logs)
+        finally:
+            self.flush_lock.release()
+
+    def clear(self):
+        with self.lock:
+            self.entries = []
+
+    def stats(self):
+        '''
+        Returns how many logs are waiting, have been written, and have been dropped by this worker.
+        '''
+        return {
+            'pending': len(self.entries),
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed_flushes': self.failed_flushes,
+        }
+
+request_log_buffer = RequestLogBuffer()
+
+def flush_due_request_logs(**kwargs):
+    '''
+    request_finished receiver, flushes the buffer if a batch is due (see analysis.apps).
+    '''
+    if connection.in_atomic_block or not request_log_buffer.is_due():
+        return
+    request_log_buffer.flush()
+
+def register_shutdown_flush():
+    '''
+    Flushes whatever is left in the buffer when the process exits. Only call this from the server entry points
+    (wsgi.py/asgi.py) so other processes (tests, management commands) never write leftover logs.
+    '''
+    atexit.register(request_log_buffer.flush)
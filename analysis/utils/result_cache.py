@@ -0,0 +1,171 @@
+import hashlib
+import json
+import threading
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import F
+from analysis.models import DataVersion
+
+'''
+Versioned cache for the results of aggregates_switchboard (see [./aggregates.py]). Every indicator has a version
+counter that is bumped whenever something it is aggregated from is written (see [../signals.py]), and the version is
+part of the cache key, so a write makes every cached result for that indicator unreachable instead of having to find
+and delete them. Changes that can affect any indicator (like an organization moving under a new parent in a project)
+bump a global version instead.
+
+The versions are kept in the database (see DataVersion in [../models.py]), so every process (web workers and the job
+worker) reads the same ones and a bump is a single atomic update. That means results can be stored in any backend
+(see the 'analysis' cache in settings): a per process cache like local memory just means each worker computes its own
+copy. Versions are bumped once the write commits, so a result computed from the old data can only ever be stored
+under the old version. They are also how pivot table snapshots know their data has changed (see [./pivot_tables.py]),
+so they are kept even if ANALYSIS_CACHE_ENABLED turns off storing results.
+'''
+
+CACHE_ALIAS = 'analysis'
+GLOBAL_VERSION_KEY = 'all'
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+def cache_enabled():
+    return getattr(settings, 'ANALYSIS_CACHE_ENABLED', True) and CACHE_ALIAS in settings.CACHES
+
+#hits/misses in this process (reading/writing shared counters would cost a write on every call)
+_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+def _record(stat):
+    with _stats_lock:
+        _stats[stat] += 1
+
+def get_version_key(indicator_id):
+    return str(indicator_id)
+
+def _new_version():
+    #versions start from the clock, so a counter that was deleted can't come back with a value a cached result used
+    return time.time_ns() // 1000
+
+def _create_versions(keys):
+    DataVersion.objects.bulk_create([DataVersion(key=key, version=_new_version()) for key in keys], ignore_conflicts=True)
+
+def _bump(keys):
+    existing = set(DataVersion.objects.filter(key__in=keys).values_list('key', flat=True))
+    DataVersion.objects.filter(key__in=existing).update(version=F('version') + 1)
+    _create_versions([key for key in keys if key not in existing])
+
+def get_versions(indicator_id):
+    '''
+    Returns the current (indicator version, global version), starting any counter that doesn't exist yet.
+    - indicator_id (integer): id of the indicator
+    '''
+    keys = [get_version_key(indicator_id), GLOBAL_VERSION_KEY]
+    versions = dict(DataVersion.objects.filter(key__in=keys).values_list('key', 'version'))
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        _create_versions(missing)
+        versions.update(DataVersion.objects.filter(key__in=missing).values_list('key', 'version'))
+    return versions.get(keys[0], 0), versions.get(keys[1], 0)
+
+def get_data_version(indicator):
+    '''
+    Returns a string that changes whenever anything the indicator is aggregated from (or the indicator itself) is
+    written.
+    - indicator (indicator instance): the indicator
+    '''
+    indicator_version, global_version = get_versions(indicator.id)
+    return f'{indicator_version}:{global_version}:{getattr(indicator, "updated_at", None)}'
+
+def bump_indicator_versions(indicator_ids):
+    '''
+    Invalidates all cached results for a set of indicators once the current transaction commits (right away outside
+    of one).
+    - indicator_ids (iterable): ids of the indicators whose data changed
+    '''
+    keys = [get_version_key(indicator_id) for indicator_id in set(indicator_ids) if indicator_id]
+    if not keys:
+        return
+    transaction.on_commit(lambda: _bump(keys))
+
+def bump_global_version():
+    '''
+    Invalidates all cached results for every indicator once the current transaction commits.
+    '''
+    transaction.on_commit(lambda: _bump([GLOBAL_VERSION_KEY]))
+
+def get_user_scope(user):
+    '''
+    The part of the user that changes what data they can see. Users with the same role at the same organization can
+    share results.
+    - user (user instance): the user making the request
+    '''
+    role = getattr(user, 'role', None)
+    if role == 'admin':
+        return ['admin']
+    if role == 'client':
+        return [role, getattr(user, 'client_organization_id', None)]
+    return [role, getattr(user, 'organization_id', None)]
+
+def build_cache_key(user, indicator, **kwargs):
+    '''
+    Builds the cache key for one aggregates_switchboard call. Includes the current versions, so the key changes as
+    soon as the indicator's data does.
+    - user (user instance): the user making the request
+    - indicator (indicator instance): the indicator being aggregated
+    - kwargs: the remaining arguments passed to aggregates_switchboard
+    '''
+    indicator_version, global_version = get_versions(indicator.id)
+    params = kwargs.pop('params', None) or {}
+    parts = {
+        'indicator': indicator.id,
+        'updated': str(getattr(indicator, 'updated_at', None)),
+        'version': indicator_version,
+        'global': global_version,
+        'scope': get_user_scope(user),
+        'params': sorted(param for param, include in params.items() if include),
+    }
+    for name, value in kwargs.items():
+        parts[name] = getattr(value, 'pk', value) #project/organization instances by id
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return f'analysis:result:{hashlib.sha256(raw.encode()).hexdigest()}'
+
+def get_or_compute(user, indicator, compute, **kwargs):
+    '''
+    Returns the cached result for a call if one exists, otherwise computes and stores it.
+    - user (user instance): the user making the request
+    - indicator (indicator instance): the indicator being aggregated
+    - compute (function): function that calculates the result on a miss
+    - kwargs: the remaining arguments passed to aggregates_switchboard
+    '''
+    if not cache_enabled():
+        return compute()
+    cache = get_cache()
+    key = build_cache_key(user, indicator, **kwargs)
+    result = cache.get(key)
+    if result is not None:
+        _record('hits')
+        return result
+    _record('misses')
+    result = compute()
+    cache.set(key, result)
+    return result
+
+def get_cache_stats():
+    '''
+    Returns the number of hits/misses the result cache has recorded in this process and the hit rate.
+    '''
+    if not cache_enabled():
+        return {'enabled': False, 'hits': 0, 'misses': 0, 'hit_rate': None}
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    return {
+        'enabled': True,
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / (hits + misses), 4) if hits + misses else None,
+    }
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats['hits'] = _stats['misses'] = 0
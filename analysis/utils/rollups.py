@@ -0,0 +1,252 @@
+from datetime import date
+from django.db import transaction
+from django.db.models import F, Sum, Count, Min, Subquery
+from django.db.models.functions import TruncMonth, Coalesce
+from aggregates.models import AggregateCount
+from projects.utils import get_org_scope
+from indicators.models import Indicator
+from analysis.models import ResponseFact, MonthlyRollup
+from analysis.utils.masks import get_mask, KP_BITS, DISABILITY_BITS
+from analysis.utils.result_cache import bump_indicator_versions
+
+'''
+Helpers that maintain and query the monthly rollup table (see MonthlyRollup in [../models.py]). Rollups are
+refreshed one slice (indicator, organization, project, month) at a time, so a change only ever re-sums the
+facts/counts for one organization's month instead of the whole indicator.
+
+The aggregators use rollups whenever the request can be answered at a monthly grain (see can_use_rollups) and
+fall back to the raw facts/counts otherwise.
+'''
+
+#breakdowns/filters that are stored on the rollups
+ROLLUP_FIELDS = ['sex', 'age_range', 'district', 'citizenship', 'hiv_status', 'pregnancy', 'kp_type', 'disability_type', 'option']
+
+#how the count model stores the boolean breakdowns --> (rollup column, value if true)
+COUNT_BOOLEANS = {
+    'citizenship': ('is_citizen', AggregateCount.Citizenship.CIT),
+    'hiv_status': ('hiv_positive', AggregateCount.HIVStatus.YES),
+    'pregnancy': ('pregnant', AggregateCount.Pregnancy.YES),
+}
+
+#the cell columns each rollup row is keyed by (besides the slice)
+CELL_COLUMNS = ['option_id', 'sex', 'age_range', 'district', 'is_citizen', 'hiv_positive', 'pregnant', 'kp_mask', 'disability_mask', 'unique_only']
+
+def get_month(value):
+    '''
+    Returns the first day of the month a date falls in (or None).
+    - value (date or ISO date string): the date
+    '''
+    if isinstance(value, str):
+        value = date.fromisoformat(value)
+    return value.replace(day=1) if value else None
+
+def get_next_month(month):
+    '''
+    Returns the first day of the month after this one.
+    - month (date): first day of a month
+    '''
+    return date(month.year + 1, 1, 1) if month.month == 12 else date(month.year, month.month + 1, 1)
+
+def refresh_response_rollups(slices):
+    '''
+    Re-sums the response rollups for a set of slices from the fact table.
+    - slices (iterable): set of (indicator_id, organization_id, project_id, month) tuples that changed
+    '''
+    for indicator_id, organization_id, project_id, month in set(slices):
+        facts = ResponseFact.objects.filter(
+            indicator_id=indicator_id, organization_id=organization_id, project_id=project_id, has_open_flag=False
+        )
+        if month:
+            facts = facts.filter(response_date__gte=month, response_date__lt=get_next_month(month))
+        else:
+            facts = facts.filter(response_date__isnull=True)
+        if Indicator.objects.filter(id=indicator_id, type=Indicator.Type.BOOL).exists():
+            facts = facts.filter(response_boolean=True)
+
+        cells = {}
+        for row in facts.values(*CELL_COLUMNS[:-1]).annotate(total=Coalesce(Sum('value'), 0), number=Count('id')).order_by():
+            key = tuple(row[column] for column in CELL_COLUMNS[:-1]) + (False,)
+            cells[key] = {'total': row['total'], 'number': row['number'], 'interactions': 0}
+        #only count each interaction in the cell of its first response, so interactions can be summed across options
+        first_ids = facts.values('interaction_id').annotate(first_id=Min('id')).values('first_id')
+        for row in facts.filter(id__in=Subquery(first_ids)).values(*CELL_COLUMNS[:-1]).annotate(interactions=Count('id')).order_by():
+            key = tuple(row[column] for column in CELL_COLUMNS[:-1]) + (False,)
+            cells[key]['interactions'] = row['interactions']
+        save_slice(MonthlyRollup.Source.RESPONSE, indicator_id, organization_id, project_id, month, cells)
+
+def refresh_count_rollups(slices):
+    '''
+    Re-sums the aggregate count rollups for a set of slices. Counts are placed in the month their group ends in.
+    - slices (iterable): set of (indicator_id, organization_id, project_id, month) tuples that changed
+    '''
+    for indicator_id, organization_id, project_id, month in set(slices):
+        counts = AggregateCount.objects.filter(
+            group__indicator_id=indicator_id, group__organization_id=organization_id, group__project_id=project_id,
+            group__end__gte=month, group__end__lt=get_next_month(month),
+        ).filter(has_open_flags=False)
+
+        cells = {}
+        for count in counts.values(
+            'value', 'option_id', 'sex', 'age_range', 'district', 'citizenship', 'hiv_status', 'pregnancy',
+            'kp_type', 'disability_type', 'unique_only'
+        ):
+            booleans = {
+                column: (count[field] == true_value) if count[field] else None
+                for field, (column, true_value) in COUNT_BOOLEANS.items()
+            }
+            key = (
+                count['option_id'], count['sex'], count['age_range'], count['district'], booleans['is_citizen'],
+                booleans['hiv_positive'], booleans['pregnant'], get_mask([count['kp_type']], KP_BITS),
+                get_mask([count['disability_type']], DISABILITY_BITS), count['unique_only'],
+            )
+            cell = cells.setdefault(key, {'total': 0, 'number': 0, 'interactions': 0})
+            for column in ['total', 'number', 'interactions']:
+                cell[column] += count['value']
+        save_slice(MonthlyRollup.Source.COUNT, indicator_id, organization_id, project_id, month, cells)
+
+def queue_count_rollups(slices):
+    '''
+    Re-sums count rollup slices once the current transaction commits (right away outside of one). Used when counts
+    are written with bulk_create, which doesn't send the save signals the rollups are normally kept in sync by.
+    - slices (iterable): set of (indicator_id, organization_id, project_id, month) tuples that changed
+    '''
+    slices = set(slices)
+    def after_commit():
+        refresh_count_rollups(slices)
+        #results cached before the rollups were re-summed are out of date
+        bump_indicator_versions({indicator_id for indicator_id, *_ in slices})
+    transaction.on_commit(after_commit)
+
+def save_slice(source, indicator_id, organization_id, project_id, month, cells):
+    '''
+    Replaces the rollup rows for one slice.
+    - source (string): MonthlyRollup.Source
+    - indicator_id, organization_id, project_id (integers), month (date): the slice
+    - cells (dict): cell key (in CELL_COLUMNS order) --> dict of total/number/interactions
+    '''
+    with transaction.atomic():
+        MonthlyRollup.objects.filter(
+            source=source, indicator_id=indicator_id, organization_id=organization_id, project_id=project_id, month=month
+        ).delete()
+        MonthlyRollup.objects.bulk_create([
+            MonthlyRollup(
+                source=source, indicator_id=indicator_id, organization_id=organization_id, project_id=project_id,
+                month=month, **dict(zip(CELL_COLUMNS, key)), **sums
+            ) for key, sums in cells.items()
+        ])
+
+def get_fact_slices(facts):
+    '''
+    Returns the set of rollup slices a queryset of facts belongs to.
+    - facts (queryset): queryset of response facts
+    '''
+    return {
+        (row['indicator_id'], row['organization_id'], row['project_id'], row['month'])
+        for row in facts.annotate(month=TruncMonth('response_date')).values('indicator_id', 'organization_id', 'project_id', 'month').distinct()
+    }
+
+def get_group_slice(group):
+    '''
+    Returns the rollup slice an aggregate group's counts belong to.
+    - group (aggregate group instance): the group
+    '''
+    return (group.indicator_id, group.organization_id, group.project_id, get_month(group.end))
+
+def rebuild_rollups(stdout=None):
+    '''
+    Drops and rebuilds every rollup. Used by manage.py rebuild_rollups (and after the facts are rebuilt).
+    - stdout (stream, optional): write progress here
+    '''
+    MonthlyRollup.objects.all().delete()
+    response_slices = get_fact_slices(ResponseFact.objects.all())
+    refresh_response_rollups(response_slices)
+    count_slices = {
+        (row['group__indicator_id'], row['group__organization_id'], row['group__project_id'], row['month'])
+        for row in AggregateCount.objects.annotate(month=TruncMonth('group__end')).values(
+            'group__indicator_id', 'group__organization_id', 'group__project_id', 'month'
+        ).distinct()
+    }
+    refresh_count_rollups(count_slices)
+    if stdout:
+        stdout.write(f'{len(response_slices)} response slices, {len(count_slices)} count slices')
+    return MonthlyRollup.objects.count()
+
+def can_use_rollups(indicator, params, start=None, end=None, filters=None, include_options=False):
+    '''
+    Checks if a request can be answered from the rollups. Rollups are monthly and only store the fields in
+    ROLLUP_FIELDS, so any date scoping or unsupported breakdown/filter needs the raw data.
+    - indicator (indicator instance): the indicator being aggregated
+    - params (dict): breakdowns requested
+    - start/end (ISO date strings, optional): date scoping
+    - filters (dict, optional): filters requested
+    - include_options (boolean, optional): if the data is split by option
+    '''
+    if start or end:
+        return False
+    if any(include and param not in ROLLUP_FIELDS + ['organization'] for param, include in params.items()):
+        return False
+    if filters:
+        if any(field not in ROLLUP_FIELDS for field in filters.keys()):
+            return False
+        #multiselect interactions are attributed to their first option, so they can't be filtered by option if they are being counted once
+        if 'option' in filters and indicator.type == Indicator.Type.MULTI and not include_options:
+            return False
+    return True
+
+def get_rollups_from_indicator(user, indicator, source, project=None, organization=None, filters=None, cascade=False, include_options=False):
+    '''
+    Helper to get a queryset of rollups that match a set of conditions. Permissions mirror get_interactions_from_indicator
+    for responses and get_counts_from_indicator for counts (see [./collection.py]).
+    - user (user instance): The user making the request, for managing perms
+    - indicator (indicator instance): The indicator these rollups should be related to
+    - source (string): MonthlyRollup.Source to pull
+    - project (project instance, optional): The project this data should be scoped to
+    - organization (organization instance, optional): The organization this data should be scoped to
+    - filters (object, optional): A list of filters to apply to this queryset (see ROLLUP_FIELDS)
+    - cascade (boolean, optional): If scoped to an organization and project, should this include the organization's
+        child organizations as well
+    - include_options (boolean, optional): if the data is split by option (used to mirror the count unique_only rule)
+    '''
+    queryset = MonthlyRollup.objects.filter(indicator=indicator, source=source)
+
+    #filter based on perms
+    if user.role == 'client':
+        queryset = queryset.filter(project__client=user.client_organization)
+    elif user.role != 'admin' and (source == MonthlyRollup.Source.COUNT or user.role in ['meofficer', 'manager']):
+        accessible_orgs = get_org_scope(user).org_ids()
+        queryset = queryset.filter(organization__in=accessible_orgs)
+    if project:
+        queryset = queryset.filter(project=project)
+    if organization:
+        if cascade and project:
+            accessible_orgs = get_org_scope(user, organization).org_ids(project)
+            queryset = queryset.filter(organization__in=accessible_orgs)
+        else:
+            queryset = queryset.filter(organization=organization)
+
+    if source == MonthlyRollup.Source.COUNT and indicator.type == Indicator.Type.MULTI and not include_options:
+        queryset = queryset.filter(option=None, unique_only=True)
+
+    if filters:
+        for field, values in filters.items():
+            values = values if isinstance(values, list) else [values]
+            if field == 'option':
+                queryset = queryset.filter(option_id__in=values)
+            elif field in COUNT_BOOLEANS:
+                column, true_value = COUNT_BOOLEANS[field]
+                if source == MonthlyRollup.Source.COUNT:
+                    #match get_counts_from_indicator, which filters on the stored value (so counts without one never match)
+                    choices = dict(AggregateCount._meta.get_field(field).choices)
+                    queryset = queryset.filter(**{f'{column}__in': [value == true_value for value in values if value in choices]})
+                    continue
+                if len(values) == 2 or len(values) == 0: #if either no values exist or both are selected, return all
+                    continue
+                queryset = queryset.filter(**{column: values[0] == true_value})
+            elif field in ['kp_type', 'disability_type']:
+                column, bits = ('kp_mask', KP_BITS) if field == 'kp_type' else ('disability_mask', DISABILITY_BITS)
+                queryset = queryset.annotate(
+                    **{f'{column}_match': F(column).bitand(get_mask(values, bits))}
+                ).filter(**{f'{column}_match__gt': 0})
+            else:
+                queryset = queryset.filter(**{f'{field}__in': values})
+    return queryset
@@ -1,10 +1,15 @@
-from django.db.models import Q
+from django.db.models import Count, Sum
 from projects.models import Target, ProjectOrganization
+from projects.utils import get_org_scope
 from datetime import date
 from collections import defaultdict
 from indicators.models import Indicator
+from aggregates.models import AggregateCount
+from events.models import Event
+from social.models import SocialMediaPost
+from analysis.models import ResponseFact
 from analysis.utils.collection import get_counts_from_indicator, get_interactions_from_indicator, get_events_from_indicator, get_posts_from_indicator
-from analysis.utils.periods import get_month_strings_between, get_quarter_strings_between
+from analysis.utils.periods import get_period_start, get_period_starts, get_period_string
 
 def get_target_aggregates(user, indicator, split, start=None, end=None, project=None, organization=None):
     '''
@@ -25,12 +30,7 @@ def get_target_aggregates(user, indicator, split, start=None, end=None, project=
 
     #filter based on perms
     if user.role not in ['admin', 'client']:
-        child_orgs = ProjectOrganization.objects.filter(
-                parent_organization=user.organization,
-            ).values_list('organization', flat=True)
-        queryset = queryset.filter(
-                Q(organization=user.organization) | Q(organization__in=child_orgs)
-            )
+        queryset = queryset.filter(organization__in=get_org_scope(user).org_ids())
 
     #and any other params
     if project:
@@ -42,24 +42,35 @@ def get_target_aggregates(user, indicator, split, start=None, end=None, project=
     if end:
         queryset = queryset.filter(end__lte=end)
 
-    #create a map for getting values broken down by period
-    targets_map = defaultdict(float)
-
-    range_func = get_quarter_strings_between if split == 'quarter' else get_month_strings_between
-
-    for target in queryset:
+    targets = list(queryset.select_related('indicator', 'related_to'))
+    #targets measured as a percentage of another indicator need that indicator's achievement to get an amount
+    achievements = get_achievements(user, [t for t in targets if not t.amount and t.related_to and t.percentage_of_related])
+    windows = []
+    for target in targets:
         amount = target.amount
-        if not amount and target.related_to and target.percentage_of_related:
-            get_achievement(user, target, target.related_to)
+        if not amount and target.id in achievements:
+            amount = round((achievements[target.id]['related_as_number'] or 0) * target.percentage_of_related / 100)
 
         if not amount or not target.start or not target.end:
             continue
+        windows.append((amount, target.start, target.end))
+    if not windows:
+        return {}
 
-        periods = range_func(target.start, target.end)
-        for period in periods:
-            targets_map[period] += round(amount / len(periods))
+    #build one calendar covering every target, then spread each target evenly over its slice of it
+    split = 'quarter' if split == 'quarter' else 'month'
+    calendar = get_period_starts(split, min(w[1] for w in windows), max(w[2] for w in windows))
+    index = {value: i for i, value in enumerate(calendar)}
+    totals = [0] * len(calendar)
+    for amount, target_start, target_end in windows:
+        first = index[get_period_start(split, target_start)]
+        last = index[get_period_start(split, target_end)]
+        share = round(amount / (last - first + 1))
+        for i in range(first, last + 1):
+            totals[i] += share
 
-    return dict(targets_map)
+    #periods in chronological order, including any between targets
+    return {get_period_string(split, value): total for value, total in zip(calendar, totals)}
         
 def get_achievement(user, target, related=None):
     '''
@@ -138,10 +149,12 @@ def get_achievement(user, target, related=None):
         )
         # if event no, add the count of events
         if indicator.category == Indicator.Category.EVENTS:
-            total += len(valid_events)
-        # if org number, add number of participants
+            total += valid_events.count()
+        # if org number, add number of participants (counted per event in the same query)
         elif indicator.category == Indicator.Category.ORGS:
-            total += sum(e.organizations.count() for e in valid_events)
+            total += Event.objects.filter(id__in=valid_events.values('id')).annotate(
+                participants=Count('organizations', distinct=True)
+            ).aggregate(total=Sum('participants'))['total'] or 0
     
     #pull posts for social. Using total engagement for now (though we should probably rethink this)
     elif indicator.category == Indicator.Category.SOCIAL:
@@ -158,5 +171,189 @@ def get_achievement(user, target, related=None):
         total += sum(((p.likes or 0) + (p.comments or 0) + (p.reach or 0) + (p.views or 0)) for p in valid_posts)
     return total
 
+def get_child_map(project_ids):
+    '''
+    Returns a map of (project id, parent organization id) --> set of child organization ids for a set of projects.
+    - project_ids (iterable): ids of the projects to map
+    '''
+    children = defaultdict(set)
+    for project_id, organization_id, parent_id in ProjectOrganization.objects.filter(
+        project_id__in=project_ids, parent_organization__isnull=False
+    ).values_list('project_id', 'organization_id', 'parent_organization_id'):
+        children[(project_id, parent_id)].add(organization_id)
+    return children
+
+def scope_by_role(user, queryset, client_field, organization_field):
+    '''
+    Apply the same role based filters as the collection helpers (see [./collection.py]).
+    - user (user instance): the user making the request
+    - queryset (queryset): queryset to filter
+    - client_field (string): lookup to the client
+    - organization_field (string): lookup to the organization
+    '''
+    if user.role == 'admin':
+        return queryset
+    if user.role == 'client':
+        return queryset.filter(**{client_field: user.client_organization})
+    return queryset.filter(**{f'{organization_field}__in': get_org_scope(user).org_ids()})
+
+def get_window_totals(user, category_indicators, start, end, project_ids):
+    '''
+    Runs the grouped queries for every indicator with a target in one date window. Returns a dict with the totals for
+    each kind of data, indexed by (indicator id, project id) so each target only looks at its own slice:
+        - responses: (indicator, project) --> organization --> interaction count/sum of values, and parents: 
+            (indicator, project) --> parent organization --> the same for its child organizations
+        - counts: (indicator, project) --> organization --> sum of count values
+        - events: (indicator, project) --> organization --> set of event ids, and participants: event id --> number 
+            of participating organizations
+        - posts: (indicator, project) --> organization --> set of post ids, and engagement: post id --> engagement
+    - user (user instance): the user making the request
+    - category_indicators (dict): indicator category --> list of indicator instances
+    - start (date): start of the window
+    - end (date): end of the window
+    - project_ids (iterable): projects the targets belong to
+    '''
+    totals = {
+        'responses': defaultdict(lambda: defaultdict(int)), 'parents': defaultdict(lambda: defaultdict(int)),
+        'counts': defaultdict(lambda: defaultdict(int)), 'events': defaultdict(lambda: defaultdict(set)),
+        'participants': {}, 'posts': defaultdict(lambda: defaultdict(set)), 'engagement': {},
+    }
+    respondent_inds = category_indicators.get(Indicator.Category.ASS, [])
+    if respondent_inds:
+        facts = ResponseFact.objects.filter(
+            indicator__in=respondent_inds, project_id__in=project_ids, has_open_flag=False,
+            response_date__gte=start, response_date__lte=end,
+        )
+        #for responses, yes/no questions only count yes
+        bools = [i.id for i in respondent_inds if i.type == Indicator.Type.BOOL]
+        if bools:
+            facts = facts.exclude(indicator_id__in=bools, response_boolean=False).exclude(indicator_id__in=bools, response_boolean__isnull=True)
+        if user.role == 'client':
+            facts = facts.filter(client=user.client_organization)
+        elif user.role in ['meofficer', 'manager']:
+            facts = facts.filter(organization__in=get_org_scope(user).org_ids())
+        numbers = {i.id for i in respondent_inds if i.type == Indicator.Type.INT}
+        for row in facts.values('indicator_id', 'project_id', 'organization_id', 'parent_organization_id').annotate(
+            interactions=Count('interaction_id', distinct=True), total=Sum('value'),
+        ).order_by():
+            key = (row['indicator_id'], row['project_id'])
+            value = (row['total'] or 0) if row['indicator_id'] in numbers else row['interactions']
+            totals['responses'][key][row['organization_id']] += value
+            #facts store each organization's parent within the project, so children are totaled under their parent
+            if row['parent_organization_id'] and row['parent_organization_id'] != row['organization_id']:
+                totals['parents'][key][row['parent_organization_id']] += value
+
+    count_inds = respondent_inds + category_indicators.get(Indicator.Category.MISC, [])
+    if count_inds:
+        counts = AggregateCount.objects.filter(
+            group__indicator__in=count_inds, group__project_id__in=project_ids, has_open_flags=False,
+            group__start__gte=start, group__end__lte=end,
+        )
+        #multiselect counts that are split by option stack, so only use the totals
+        multis = [i.id for i in count_inds if i.type == Indicator.Type.MULTI]
+        if multis:
+            counts = counts.exclude(group__indicator_id__in=multis, option__isnull=False).exclude(group__indicator_id__in=multis, unique_only=False)
+        counts = scope_by_role(user, counts, 'group__project__client', 'group__organization')
+        for row in counts.values('group__indicator_id', 'group__project_id', 'group__organization_id').annotate(total=Sum('value')).order_by():
+            totals['counts'][(row['group__indicator_id'], row['group__project_id'])][row['group__organization_id']] += row['total'] or 0
+
+    event_inds = category_indicators.get(Indicator.Category.EVENTS, []) + category_indicators.get(Indicator.Category.ORGS, [])
+    if event_inds:
+        events = Event.objects.filter(
+            tasks__indicator__in=event_inds, tasks__project_id__in=project_ids, status=Event.EventStatus.COMPLETED,
+            start__gte=start, end__lte=end,
+        )
+        events = scope_by_role(user, events, 'tasks__project__client', 'tasks__organization')
+        event_ids = set()
+        for indicator_id, project_id, organization_id, event_id in events.values_list(
+            'tasks__indicator_id', 'tasks__project_id', 'tasks__organization_id', 'id'
+        ).order_by().distinct():
+            totals['events'][(indicator_id, project_id)][organization_id].add(event_id)
+            event_ids.add(event_id)
+        if category_indicators.get(Indicator.Category.ORGS):
+            totals['participants'] = dict(
+                Event.objects.filter(id__in=event_ids).annotate(
+                    participants=Count('organizations', distinct=True)
+                ).values_list('id', 'participants')
+            )
+
+    social_inds = category_indicators.get(Indicator.Category.SOCIAL, [])
+    if social_inds:
+        posts = SocialMediaPost.objects.filter(
+            tasks__indicator__in=social_inds, tasks__project_id__in=project_ids, has_open_flags=False,
+            published_at__gte=start, published_at__lte=end,
+        )
+        posts = scope_by_role(user, posts, 'tasks__project__client', 'tasks__organization')
+        for indicator_id, project_id, organization_id, post_id, likes, comments, reach, views in posts.values_list(
+            'tasks__indicator_id', 'tasks__project_id', 'tasks__organization_id', 'id', 'likes', 'comments', 'reach', 'views'
+        ).order_by().distinct():
+            totals['posts'][(indicator_id, project_id)][organization_id].add(post_id)
+            totals['engagement'][post_id] = (likes or 0) + (comments or 0) + (reach or 0) + (views or 0)
+    return totals
+
+def get_total(indicator, target, totals, children):
+    '''
+    Adds up the totals for one indicator within a target's project and organization (plus its child organizations).
+    - indicator (indicator instance): the indicator to total
+    - target (target instance): the target whose scope is being totaled
+    - totals (dict): totals for the target's window (see get_window_totals)
+    - children (dict): project/parent --> child organizations map (see get_child_map)
+    '''
+    key = (indicator.id, target.project_id)
+    organization_id = target.organization_id
+    org_ids = children.get((target.project_id, organization_id), set()) | {organization_id}
+    total = 0
+    if indicator.category == Indicator.Category.ASS:
+        total += totals['responses'].get(key, {}).get(organization_id, 0) + totals['parents'].get(key, {}).get(organization_id, 0)
+    if indicator.category in [Indicator.Category.ASS, Indicator.Category.MISC]:
+        counts = totals['counts'].get(key, {})
+        total += sum(counts.get(org_id, 0) for org_id in org_ids)
+    elif indicator.category in [Indicator.Category.EVENTS, Indicator.Category.ORGS]:
+        by_org = totals['events'].get(key, {})
+        events = set().union(*(by_org.get(org_id, set()) for org_id in org_ids))
+        if indicator.category == Indicator.Category.EVENTS:
+            total += len(events)
+        else:
+            total += sum(totals['participants'].get(event_id, 0) for event_id in events)
+    elif indicator.category == Indicator.Category.SOCIAL:
+        by_org = totals['posts'].get(key, {})
+        posts = set().union(*(by_org.get(org_id, set()) for org_id in org_ids))
+        total += sum(totals['engagement'][post_id] for post_id in posts)
+    return total
+
+def get_achievements(user, targets):
+    '''
+    Batch version of get_achievement for many targets at once (i.e., every target in a project). Targets are grouped 
+    by their date window, and the data for every indicator in a window is pulled with one grouped query per kind of 
+    data (responses, counts, events, posts), so the number of queries depends on the number of windows, not targets.
+    Targets measured as a percentage of a related indicator share the related indicator's totals.
+    Returns a dict of target id --> {'achievement': number, 'related_as_number': number (or None)}.
+    - user (user instance): for checking permissions
+    - targets (iterable): target instances (use select_related('indicator', 'related_to'))
+    '''
+    targets = list(targets)
+    if not targets:
+        return {}
+    windows = defaultdict(dict) #(start, end) --> {indicator id: indicator}
+    for target in targets:
+        for indicator in [target.indicator, target.related_to]:
+            if indicator:
+                windows[(target.start, target.end)][indicator.id] = indicator
+    project_ids = {target.project_id for target in targets}
+    children = get_child_map(project_ids)
 
+    window_totals = {}
+    for (start, end), indicators in windows.items():
+        category_indicators = defaultdict(list)
+        for indicator in indicators.values():
+            category_indicators[indicator.category].append(indicator)
+        window_totals[(start, end)] = get_window_totals(user, category_indicators, start, end, project_ids)
 
+    achievements = {}
+    for target in targets:
+        totals = window_totals[(target.start, target.end)]
+        achievements[target.id] = {
+            'achievement': get_total(target.indicator, target, totals, children),
+            'related_as_number': get_total(target.related_to, target, totals, children) if target.related_to else None,
+        }
+    return achievements
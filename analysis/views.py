@@ -1,9 +1,6 @@
 from django.shortcuts import render, redirect
-from django.http import HttpResponse
 from django.db import transaction
 from django.shortcuts import get_object_or_404
-from datetime import date
-import csv
 from django.utils.timezone import now
 from datetime import datetime, timedelta
 from django.utils import timezone
@@ -29,10 +26,15 @@ from respondents.models import Respondent, KeyPopulation, DisabilityType, Respon
 from aggregates.models import AggregateCount
 from respondents.utils import get_enum_choices
 
-from datetime import datetime
 from analysis.utils.aggregates import aggregates_switchboard
-from analysis.utils.csv import prep_csv
-from io import StringIO
+from analysis.utils.result_cache import get_cache_stats
+from analysis.utils.request_logs import request_log_buffer
+from analysis.utils.dashboards import get_dashboard_data
+from analysis.utils.csv import csv_response, iter_dict_rows, iter_pivot_rows
+from analysis.utils.pivot_tables import get_pivot_aggregates
+from jobs.models import Job
+from jobs.utils import is_async, enqueue_job, job_response
+from analysis.utils.line_list import iter_line_list, get_line_list_responses, get_line_list_page, LINE_LIST_FIELDS, LINE_LIST_PAGE_SIZE, LINE_LIST_MAX_PAGE_SIZE
 
 
 #we may potentially need to rethink the user perms if we have to link this to other sites
@@ -65,33 +67,70 @@ class LineListViewSet(RoleRestrictedViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         ll = self.get_object()
+        #large lists can be exported in the background instead (poll /api/jobs/{id}/ for the file)
+        if is_async(request):
+            return job_response(enqueue_job(Job.Type.LINE_LIST, ll.created_by, {'line_list_id': ll.id}))
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
         filename = f'{ll.name}_{timestamp}.csv'
-        #convert to csv
-        serialized = self.get_serializer(ll).data
-        rows = serialized.get('data', [])
-
-        def serialize_value(value):
-            #helper function that converts date values and lists to strings
-            if isinstance(value, date):
-                return value.isoformat()
-            elif isinstance(value, list):
-                return ','.join(str(x) for x in value)  # join list items with commas
-            elif value is None:
-                return ''
-            else:
-                return str(value)
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-
-        writer = csv.DictWriter(response, fieldnames=rows[0].keys())
-        writer.writeheader()
-        for row in rows:
-            serialized_row = {k: serialize_value(v) for k, v in row.items()} #serialize each value
-            writer.writerow(serialized_row)
+        #stream the rows straight from the cursor, a chunk at a time
+        rows = iter_line_list(
+            user=ll.created_by,
+            assessment=ll.assessment,
+            project=ll.project,
+            organization=ll.organization,
+            start=ll.start,
+            end=ll.end,
+            cascade=ll.cascade_organization,
+        )
+        return csv_response(iter_dict_rows(rows), filename)
 
-        return response
+    @action(detail=True, methods=['get'], url_path='rows')
+    def rows(self, request, pk=None):
+        '''
+        Returns one page of a line list's rows. Pages are read by keyset, so pass the next cursor from the previous page
+        as ?cursor= to get the next one. Accepts ?limit= (rows per page), ?fields= (comma seperated list of columns) and
+        ?count=true (also return the total number of rows, which requires counting the whole list).
+        '''
+        user = request.user
+        if user.role not in ['client', 'admin', 'meofficer', 'manager']:
+            return Response(
+                {"detail": "You do not have permission to view aggregated counts."},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        ll = self.get_object()
+        fields = None
+        if request.query_params.get('fields'):
+            fields = [field.strip() for field in request.query_params.get('fields').split(',') if field.strip()]
+            invalid = [field for field in fields if field not in LINE_LIST_FIELDS]
+            if invalid:
+                return Response(
+                    {"detail": f"Invalid fields: {', '.join(invalid)}."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        try:
+            limit = int(request.query_params.get('limit', LINE_LIST_PAGE_SIZE))
+        except ValueError:
+            return Response({"detail": "Limit must be a number."}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, LINE_LIST_MAX_PAGE_SIZE))
+
+        queryset = get_line_list_responses(
+            user=ll.created_by,
+            assessment=ll.assessment,
+            project=ll.project,
+            organization=ll.organization,
+            start=ll.start,
+            end=ll.end,
+            cascade=ll.cascade_organization,
+        )
+        try:
+            rows, next_cursor = get_line_list_page(queryset, request.query_params.get('cursor'), limit, fields)
+        except ValueError:
+            return Response({"detail": "Invalid cursor."}, status=status.HTTP_400_BAD_REQUEST)
+        data = {'results': rows, 'next': next_cursor}
+        #only count when asked, since it means scanning the whole list
+        if request.query_params.get('count') in ['true', '1']:
+            data['count'] = queryset.count()
+        return Response(data, status=status.HTTP_200_OK)
 
 #we may potentially need to rethink the user perms if we have to link this to other sites
 class TablesViewSet(RoleRestrictedViewSet):
@@ -125,25 +164,10 @@ class TablesViewSet(RoleRestrictedViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         table = self.get_object()
-        #fetch params
-        params = {}
-        table_params = [param.name for param in table.params.all()]
-        params = {}
-        for cat in ['id', 'age_range', 'sex', 'kp_type', 'disability_type', 'citizenship', 'hiv_status', 'pregnancy', 'option', 'platform', 'district', 'metric', 'organization']:
-            params[cat] = cat in table_params
-        #pull aggregates based on params
-        aggregates = aggregates_switchboard(
-            user=user,
-            indicator=table.indicator,
-            params=params,
-            organization=table.organization,
-            project=table.project,
-            start=table.start,
-            end=table.end,
-            repeat_only=table.repeat_only,
-            n=table.repeat_n,
-            cascade=table.cascade_organization
-        )
+        if is_async(request):
+            return job_response(enqueue_job(Job.Type.PIVOT_TABLE, table.created_by, {'pivot_table_id': table.id}))
+        #pull aggregates based on the table's params
+        aggregates, params = get_pivot_aggregates(user, table)
 
         if not aggregates:
             return Response(
@@ -151,21 +175,10 @@ class TablesViewSet(RoleRestrictedViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
         timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
-        filename = f'aggregates_{table.indicator.code}_{timestamp}.csv'
+        filename = f'aggregates_{table.indicator.name}_{timestamp}.csv'
         #convert aggregates to format that looks a bit more like a pivot table, with one param being used as column headers
-        rows = prep_csv(aggregates, params)
-        fieldnames = rows[0]
-        buffer = StringIO()
-        writer = csv.DictWriter(buffer, fieldnames=fieldnames)
-        writer.writeheader()
-
-        for row in rows[1:]:
-            row_dict = dict(zip(fieldnames, row))
-            writer.writerow(row_dict)
-
-        response = HttpResponse(buffer.getvalue(), content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        return response
+        #and stream the rows as they are built
+        return csv_response(iter_pivot_rows(aggregates, params), filename)
     
     @action(detail=False, methods=["get"], url_path='aggregate/(?P<indicator_id>[^/.]+)')
     def indicator_aggregate(self, request, indicator_id=None):
@@ -252,6 +265,22 @@ class DashboardSettingViewSet(RoleRestrictedViewSet):
             "axes": get_enum_choices(IndicatorChartSetting.AxisOptions)
         })
 
+    @action(detail=True, methods=['get'], url_path='data')
+    def get_data(self, request, pk=None):
+        '''
+        Get the data for every chart on a dashboard at once (without the rest of the chart/dashboard settings).
+        Charts that share an indicator and scope are calculated together (see analysis.utils.dashboards).
+        '''
+        dashboard = self.get_object()
+        data = get_dashboard_data(dashboard)
+        return Response({
+            'id': dashboard.id,
+            'charts': [
+                {'id': link.id, 'chart_id': link.chart_id, **data.get(link.id, {})}
+                for link in dashboard.dashboardindicatorchart_set.order_by('order')
+            ]
+        })
+
     @action(detail=True, methods=['patch'], url_path='charts')
     @transaction.atomic
     def create_update_chart(self, request, pk=None):
@@ -478,4 +507,24 @@ class SiteAnalyticsViewSet(RoleRestrictedViewSet):
         one_year_ago = timezone.now() - timedelta(days=365)
         queryset = RequestLog.objects.filter(timestamp__gte=one_year_ago)
         serialized = RequestLogSerializer(queryset, many=True).data
-        return Response(serialized)
\ No newline at end of file
+        return Response(serialized)
+
+    @action(detail=False, methods=["get"], url_path="cache-stats")
+    def cache_stats(self, request):
+        '''
+        Hit/miss counts for the aggregate result cache (see analysis.utils.result_cache).
+        '''
+        user = request.user
+        if getattr(user, "role", None) != "admin":
+            raise PermissionDenied("You do not have permission to view this information.")
+        return Response(get_cache_stats())
+
+    @action(detail=False, methods=["get"], url_path="log-buffer-stats")
+    def log_buffer_stats(self, request):
+        '''
+        Pending/written/dropped counts for this worker's request log buffer (see analysis.utils.request_logs).
+        '''
+        user = request.user
+        if getattr(user, "role", None) != "admin":
+            raise PermissionDenied("You do not have permission to view this information.")
+        return Response(request_log_buffer.stats())
\ No newline at end of file
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bonaso_data_server.settings')
 
 application = get_asgi_application()
+
+# write any buffered request logs when the worker shuts down
+from analysis.utils.request_logs import register_shutdown_flush
+register_shutdown_flush()
@@ -49,6 +49,7 @@ INSTALLED_APPS = [
     'analysis.apps.AnalysisConfig',
     'messaging.apps.MessagingConfig',
     'uploads.apps.UploadsConfig',
+    'jobs.apps.JobsConfig',
     'testing_utils.apps.TestingUtilsConfig',
     'corsheaders',
     'django.contrib.admin',
@@ -117,6 +118,53 @@ DATABASES = {
     )
 }
 
+# Caches
+# The analysis cache stores aggregate results (see analysis/utils/result_cache.py). Results are keyed by data versions
+# kept in the database, so any backend stays correct: local memory gives each worker its own copy, a shared backend
+# (redis/memcached/file/database) lets workers reuse each other's results. ANALYSIS_CACHE_ENABLED only turns off
+# storing results, the data versions pivot tables rely on are still kept.
+
+ANALYSIS_CACHE_ENABLED = os.getenv("ANALYSIS_CACHE_ENABLED", "True") == "True"
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "analysis": {
+        "BACKEND": os.getenv("ANALYSIS_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("ANALYSIS_CACHE_LOCATION", "analysis_cache"),
+        "TIMEOUT": int(os.getenv("ANALYSIS_CACHE_TIMEOUT", 60*60*24)),
+        "OPTIONS": {"MAX_ENTRIES": 5000},
+    },
+}
+
+# Share of API requests that record SQL stats (query count, DB time, slowest/repeated query) on their request log
+# (see analysis/middleware.py). Counting queries adds a little overhead to each one, so keep this low in production.
+# A query run at least REQUEST_LOG_REPEATED_QUERY_THRESHOLD times in one request is recorded as a likely N+1.
+
+REQUEST_LOG_QUERY_SAMPLE_RATE = float(os.getenv("REQUEST_LOG_QUERY_SAMPLE_RATE", 0.05))
+REQUEST_LOG_REPEATED_QUERY_THRESHOLD = int(os.getenv("REQUEST_LOG_REPEATED_QUERY_THRESHOLD", 5))
+
+# Request logs are kept in memory and written in batches of REQUEST_LOG_BATCH_SIZE (or every REQUEST_LOG_FLUSH_SECONDS,
+# whichever comes first). If the database can't keep up, anything past REQUEST_LOG_BUFFER_LIMIT is dropped (and counted).
+
+REQUEST_LOG_BATCH_SIZE = int(os.getenv("REQUEST_LOG_BATCH_SIZE", 100))
+REQUEST_LOG_FLUSH_SECONDS = float(os.getenv("REQUEST_LOG_FLUSH_SECONDS", 10))
+REQUEST_LOG_BUFFER_LIMIT = int(os.getenv("REQUEST_LOG_BUFFER_LIMIT", 10000))
+
+# Dashboards can calculate their charts at the same time on a pool of threads shared by every request in the process
+# (each with its own database connection). Off (0) by default, keep the number of workers * gunicorn workers under the
+# database's max connections.
+ANALYSIS_DASHBOARD_WORKERS = int(os.getenv("ANALYSIS_DASHBOARD_WORKERS", 0))
+ANALYSIS_CHART_TIMEOUT = float(os.getenv("ANALYSIS_CHART_TIMEOUT", 30))
+
+# Job workers (manage.py run_jobs) mark the job they are running every JOB_HEARTBEAT_SECONDS. A running job that hasn't
+# been marked for JOB_STALE_SECONDS belonged to a worker that died, so it is queued again (or failed once it has been
+# tried JOB_MAX_ATTEMPTS times, so a job that keeps killing its worker doesn't run forever).
+JOB_HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", 30))
+JOB_STALE_SECONDS = float(os.getenv("JOB_STALE_SECONDS", 300))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
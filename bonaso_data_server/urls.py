@@ -15,6 +15,7 @@ urlpatterns = [
     path('api/analysis/', include('analysis.urls')),
     path('api/messages/', include('messaging.urls')),
     path('api/uploads/', include('uploads.urls')),
+    path('api/jobs/', include('jobs.urls')),
     path('api/social/', include('social.urls')),
     path('api/flags/', include('flags.urls')),
 
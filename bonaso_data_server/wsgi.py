@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'bonaso_data_server.settings')
 
 application = get_wsgi_application()
+
+# write any buffered request logs when the worker shuts down
+from analysis.utils.request_logs import register_shutdown_flush
+register_shutdown_flush()
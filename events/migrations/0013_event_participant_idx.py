@@ -0,0 +1,20 @@
+# Generated by Django 5.2.2 on 2026-10-17 01:53
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0012_event_project'),
+        ('organizations', '0006_organization_description'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='eventorganization',
+            index=models.Index(fields=['event', 'organization'], name='event_participant_idx'),
+        ),
+    ]
@@ -74,6 +74,12 @@ class EventOrganization(models.Model):
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
     added_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            #participant counts are grouped by event
+            models.Index(fields=['event', 'organization'], name='event_participant_idx'),
+        ]
+
 class EventTask(models.Model):
     '''
     Through model for related tasks.
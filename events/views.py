@@ -24,6 +24,7 @@ from events.models import Event, EventTask, EventOrganization
 from events.serializers import EventSerializer
 from organizations.models import Organization
 from projects.models import Task, ProjectOrganization
+from projects.utils import get_org_scope
 from respondents.utils import get_enum_choices
 
 
@@ -63,9 +64,7 @@ class EventViewSet(RoleRestrictedViewSet):
             base_q = Q(host=user.organization) | Q(organizations=user.organization)
 
             # Child-host relationships (parent-child link within a project)
-            project_child_rels = ProjectOrganization.objects.filter(
-                parent_organization=user.organization
-            )
+            project_child_rels = get_org_scope(user).child_links()
 
             # Events where a child org is the host and both share a project
             child_host_q = Q(
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+from flags.utils import get_open_flag_models, check_open_flags
+from analysis.utils.result_cache import bump_global_version
+
+class Command(BaseCommand):
+    '''
+    Backfills/repairs the has_open_flags marker on flaggable models from the flags table. The marker is kept up to
+    date by signals, so this is only needed after it is first added or if something updated flags in bulk. Use
+    --check to only report objects that are out of sync (exits with an error if any are found).
+    '''
+    help = 'Sync the has_open_flags marker with unresolved flags.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Only report objects that are out of sync.')
+
+    def handle(self, *args, **options):
+        out_of_sync = 0
+        for model in get_open_flag_models():
+            result = check_open_flags(model, repair=not options['check'])
+            total = len(result['missing']) + len(result['stale'])
+            out_of_sync += total
+            self.stdout.write(
+                f"{model._meta.label}: {len(result['missing'])} missing marker, {len(result['stale'])} marked without open flags"
+            )
+        if options['check']:
+            if out_of_sync:
+                raise CommandError(f'{out_of_sync} objects have an out of sync has_open_flags marker.')
+            self.stdout.write(self.style.SUCCESS('has_open_flags is in sync.'))
+        else:
+            #the marker decides what is left out of the aggregates, so cached results/snapshots may be out of date
+            if out_of_sync:
+                bump_global_version()
+            self.stdout.write(self.style.SUCCESS(f'Repaired {out_of_sync} objects.'))
@@ -50,3 +50,17 @@ class Flag(models.Model):
 
     def __str__(self):
         return f'Flag({self.get_reason_type_display()}) on {self.content_type} #{self.object_id}'
+
+class OpenFlagsMixin:
+    '''
+    Mixin for models that store whether they have an unresolved flag (has_open_flags). The marker is only written by
+    flags.utils.sync_open_flags, so saving an existing object leaves it out. Otherwise an instance loaded before one
+    of its flags was raised/resolved would write its out of date value back (and stay excluded from analysis).
+    '''
+    def save(self, *args, **kwargs):
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields 
+                if not field.primary_key and field.name != 'has_open_flags'
+            ]
+        return super().save(*args, **kwargs)
@@ -2,6 +2,11 @@ from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from django.db.models import Q
 from flags.models import Flag
+from respondents.models import Interaction, Respondent
+from aggregates.models import AggregateCount
+from analysis.utils.facts import queue_response_facts
+from analysis.utils.rollups import refresh_count_rollups, get_group_slice
+from flags.utils import sync_open_flags
 from django.db import transaction
 from messaging.models import Alert, AlertRecipient
 from django.contrib.contenttypes.models import ContentType
@@ -87,4 +92,33 @@ def create_alert_on_resolve(sender, instance, **kwargs):
                 AlertRecipient(alert=alert, recipient=user) for user in send_alert_to
             ])
 
-    transaction.on_commit(send_alert)
\ No newline at end of file
+    transaction.on_commit(send_alert)
+
+@receiver(post_save, sender=Flag)
+@receiver(post_delete, sender=Flag)
+def update_open_flags(sender, instance, **kwargs):
+    '''
+    Keep has_open_flags on the flagged object up to date when a flag is raised, resolved, or deleted. This runs
+    before the analysis facts/rollups below are rebuilt, since those read it.
+    - instance (flag instance): the flag that was changed
+    '''
+    sync_open_flags(instance.content_type.model_class(), [instance.object_id])
+
+@receiver(post_save, sender=Flag)
+@receiver(post_delete, sender=Flag)
+def sync_flag_facts(sender, instance, **kwargs):
+    '''
+    The analysis fact table tracks whether a response's interaction/respondent has an open flag, so queue the
+    related facts to be rebuilt whenever a flag on one of those is raised, resolved, or deleted. Flagged counts are left out of the
+    monthly rollups, so re-sum those as well.
+    - instance (flag instance): the flag that was changed
+    '''
+    model = instance.content_type.model_class()
+    if model == Interaction:
+        queue_response_facts(interaction_ids=[instance.object_id])
+    elif model == Respondent:
+        queue_response_facts(respondent_ids=[instance.object_id])
+    elif model == AggregateCount:
+        count = AggregateCount.objects.filter(id=instance.object_id).select_related('group').first()
+        if count:
+            refresh_count_rollups([get_group_slice(count.group)])
@@ -4,6 +4,9 @@ from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from io import StringIO
 
 from projects.models import Project, Client, Task, ProjectOrganization
 from respondents.models import Respondent, Interaction, Pregnancy, HIVStatus, RespondentAttributeType
@@ -219,4 +222,39 @@ class FlagViewSetTest(APITestCase):
         response = self.client.patch(f'/api/flags/{self.flag_other.id}/resolve-flag/', valid_payload, format='json')
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
     
-    
\ No newline at end of file
+    
+    def test_open_flags_marker(self):
+        '''
+        has_open_flags should follow the object's unresolved flags as they are raised, resolved and deleted.
+        '''
+        self.interaction.refresh_from_db()
+        self.interaction_child.refresh_from_db()
+        self.respondent.refresh_from_db()
+        self.assertTrue(self.interaction.has_open_flags)
+        self.assertTrue(self.respondent.has_open_flags)
+        self.assertFalse(self.interaction_child.has_open_flags)
+        #still flagged until every flag is resolved
+        for i, flag in enumerate([self.flag, self.flag_child, self.flag_other]):
+            flag.resolved = True
+            flag.save()
+            self.interaction.refresh_from_db()
+            self.assertEqual(self.interaction.has_open_flags, i < 2)
+        self.flag_resp.delete()
+        self.respondent.refresh_from_db()
+        self.assertFalse(self.respondent.has_open_flags)
+
+    def test_sync_open_flags_command(self):
+        '''
+        The command should report and repair objects whose marker is out of sync.
+        '''
+        Interaction.objects.filter(id=self.interaction.id).update(has_open_flags=False)
+        Respondent.objects.filter(id=self.respondent.id).update(has_open_flags=False)
+        Interaction.objects.filter(id=self.interaction_child.id).update(has_open_flags=True)
+        with self.assertRaises(CommandError):
+            call_command('sync_open_flags', '--check', stdout=StringIO())
+        call_command('sync_open_flags', stdout=StringIO())
+        call_command('sync_open_flags', '--check', stdout=StringIO())
+        self.assertEqual(
+            set(Interaction.objects.filter(has_open_flags=True).values_list('id', flat=True)), {self.interaction.id}
+        )
+        self.assertTrue(Respondent.objects.get(id=self.respondent.id).has_open_flags)
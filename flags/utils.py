@@ -1,7 +1,7 @@
 from django.utils.timezone import now, localtime
 from django.contrib.contenttypes.models import ContentType
 from django.apps import apps
-from django.db.models import Count, F
+from django.db.models import Count, F, Exists, OuterRef
 from django.db.models.functions import TruncMonth
 from django.utils.dateformat import DateFormat
 
@@ -15,7 +15,9 @@ def create_flag(instance, reason, caused_by, reason_type=Flag.FlagReason.OTHER):
     - caused_by (user instance): user whose edit caused the flag, used to determine visibility
     - reason_type (enum): categorical reason for the flag
     '''
-
+    #keep the instance in memory in sync with the marker set by flags/signals (saves never write it, see OpenFlagsMixin)
+    if hasattr(instance, 'has_open_flags'):
+        instance.has_open_flags = True
     flag = Flag.objects.create(
         content_type=ContentType.objects.get_for_model(instance),
         object_id = instance.id,
@@ -25,11 +27,12 @@ def create_flag(instance, reason, caused_by, reason_type=Flag.FlagReason.OTHER):
         caused_by=caused_by
     )
     print('user', flag.caused_by.username)
-def resolve_flag(flags_qs, reason):
+def resolve_flag(flags_qs, reason, instance=None):
     '''
     Helper function that automatically resolves flags if the issue is fixed (for system generated).
     - flag_qs (queryset): queryset of related flags
     - reason (string): reason to resolve
+    - instance (model instance, optional): the flagged object, so its in memory has_open_flags can be refreshed
     '''
     to_resolve = flags_qs.filter(reason=reason, auto_flagged=True, resolved=False).first()
     if to_resolve:
@@ -37,6 +40,9 @@ def resolve_flag(flags_qs, reason):
         to_resolve.auto_resolved = True
         to_resolve.resolved_at = now()
         to_resolve.save()
+        #flags/signals has updated the marker in the database, other flags may still be open
+        if instance is not None and hasattr(instance, 'has_open_flags'):
+            instance.has_open_flags = type(instance).objects.filter(pk=instance.pk).values_list('has_open_flags', flat=True).first() or False
 
 def get_object_from_str(model_str: str, object_id: int):
     '''
@@ -84,3 +90,45 @@ def get_flag_metadata(queryset):
         'by_model': by_model,
         'by_month': by_month,
     }
+
+#models that store whether they have an unresolved flag (has_open_flags)
+OPEN_FLAG_MODELS = ['respondents.Interaction', 'respondents.Respondent', 'aggregates.AggregateCount', 'social.SocialMediaPost']
+
+def get_open_flag_models():
+    '''
+    Returns the model classes that store has_open_flags.
+    '''
+    return [apps.get_model(model_str) for model_str in OPEN_FLAG_MODELS]
+
+def sync_open_flags(model, object_ids):
+    '''
+    Updates has_open_flags for a set of objects based on whether they have an unresolved flag.
+    - model (model class): the model of the flagged objects (ignored if it doesn't store has_open_flags)
+    - object_ids (iterable): ids of the objects to update
+    '''
+    if model is None or model not in get_open_flag_models():
+        return
+    object_ids = set(object_ids)
+    open_ids = set(Flag.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), object_id__in=object_ids, resolved=False
+    ).values_list('object_id', flat=True))
+    #use update so the objects' save signals/auto_now fields aren't triggered
+    model.objects.filter(id__in=open_ids, has_open_flags=False).update(has_open_flags=True)
+    model.objects.filter(id__in=object_ids - open_ids, has_open_flags=True).update(has_open_flags=False)
+
+def check_open_flags(model, repair=False):
+    '''
+    Compares has_open_flags against the flags table for every object of a model. Returns a dict with the ids of
+    objects that are missing the marker and objects that are marked but have no open flags.
+    - model (model class): the model to check
+    - repair (boolean, optional): fix any objects that are out of sync
+    '''
+    open_flags = Exists(Flag.objects.filter(
+        content_type=ContentType.objects.get_for_model(model), object_id=OuterRef('pk'), resolved=False
+    ))
+    missing = list(model.objects.filter(open_flags, has_open_flags=False).values_list('id', flat=True))
+    stale = list(model.objects.filter(~open_flags, has_open_flags=True).values_list('id', flat=True))
+    if repair:
+        model.objects.filter(id__in=missing).update(has_open_flags=True)
+        model.objects.filter(id__in=stale).update(has_open_flags=False)
+    return {'missing': missing, 'stale': stale}
@@ -8,12 +8,12 @@ from rest_framework.decorators import action
 from rest_framework import status
 
 from django.apps import apps
-from django.db.models import Q
 from django.contrib.contenttypes.models import ContentType
 from django.utils.timezone import now
 from users.restrictviewset import RoleRestrictedViewSet
 
 from projects.models import ProjectOrganization
+from projects.utils import get_org_scope
 from flags.models import Flag
 from flags.serializers import FlagSerializer
 from flags.utils import get_flag_metadata
@@ -38,13 +38,7 @@ class FlagViewSet(RoleRestrictedViewSet):
         if user.role in ['admin', 'client']:
             pass
         elif user.role in ['meofficer', 'manager']:
-            child_orgs = ProjectOrganization.objects.filter(
-                parent_organization=user.organization
-            ).values_list('organization', flat=True)
-
-            queryset = queryset.filter(
-                Q(caused_by__organization=user.organization) | Q(caused_by__organization__in=child_orgs)
-            ).distinct()
+            queryset = queryset.filter(caused_by__organization__in=get_org_scope(user).org_ids())
         else:
             queryset = queryset.filter(caused_by=user)
 
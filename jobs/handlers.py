@@ -0,0 +1,94 @@
+import tempfile
+from datetime import datetime
+from django.core.files import File
+from rest_framework.exceptions import APIException
+
+from jobs.models import Job
+from jobs.utils import set_progress
+from analysis.models import LineList, PivotTable
+from analysis.utils.csv import iter_csv, iter_dict_rows, iter_pivot_rows
+from analysis.utils.line_list import iter_line_list, get_line_list_responses, LINE_LIST_CHUNK_SIZE
+from analysis.utils.pivot_tables import get_pivot_aggregates, refresh_pivot_snapshot
+from respondents.utils_file_upload import process_interaction_template
+
+'''
+The work each type of job does. Handlers are passed the running job, raise an exception if it fails, and save any
+output to the job's result (file) or result_data. They run as the user that queued the job, so the same permission
+checks as the matching endpoint apply.
+'''
+
+def save_csv(job, rows, filename):
+    '''
+    Writes rows to a CSV file a chunk at a time and saves it as the job's result.
+    - job (job instance): the running job
+    - rows (iterable): iterable of lists (the first should be the header)
+    - filename (string): name of the result file
+    '''
+    with tempfile.TemporaryFile(mode='w+b') as f:
+        for chunk in iter_csv(rows):
+            f.write(chunk.encode('utf-8'))
+        f.seek(0)
+        job.result.save(filename, File(f), save=False)
+
+def run_line_list_csv(job):
+    '''
+    Exports a line list (params: line_list_id) to a CSV file.
+    '''
+    ll = LineList.objects.get(id=job.params['line_list_id'], created_by=job.created_by)
+    scope = dict(
+        user=ll.created_by, assessment=ll.assessment, project=ll.project, organization=ll.organization,
+        start=ll.start, end=ll.end, cascade=ll.cascade_organization,
+    )
+    total = get_line_list_responses(**scope).count()
+    def track(rows):
+        #update the progress once per chunk
+        for i, row in enumerate(rows):
+            if i and i % LINE_LIST_CHUNK_SIZE == 0:
+                set_progress(job, i * 100 / total)
+            yield row
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    save_csv(job, iter_dict_rows(track(iter_line_list(**scope))), f'{ll.name}_{timestamp}.csv')
+
+def run_pivot_table_csv(job):
+    '''
+    Exports a pivot table (params: pivot_table_id) to a CSV file.
+    '''
+    table = PivotTable.objects.get(id=job.params['pivot_table_id'], created_by=job.created_by)
+    aggregates, params = get_pivot_aggregates(job.created_by, table)
+    if not aggregates:
+        raise ValueError('No aggregate data found for this indicator.')
+    set_progress(job, 50)
+    timestamp = datetime.now().strftime('%Y-%m-%d_%H-%M-%S')
+    save_csv(job, iter_pivot_rows(aggregates, params), f'aggregates_{table.indicator.name}_{timestamp}.csv')
+
+def run_pivot_table_refresh(job):
+    '''
+    Recalculates the stored snapshot of a pivot table (params: pivot_table_id) whose data has changed.
+    '''
+    table = PivotTable.objects.get(id=job.params['pivot_table_id'])
+    refresh_pivot_snapshot(table)
+
+def run_interaction_upload(job):
+    '''
+    Processes an interaction template (the job's upload) as the user that queued it, with the same function the
+    upload endpoint uses, so an upload behaves exactly the same in the background as it does in a request. The
+    result (errors, warnings, conflicts) is stored as the result data.
+    '''
+    with job.upload.open('rb') as f:
+        try:
+            data, status_code = process_interaction_template(job.created_by, File(f, name=job.params.get('filename', 'template.xlsx')))
+        except APIException as err:
+            #permission/validation errors the endpoint would have returned
+            job.result_data = {'detail': err.detail}
+            detail = err.detail[0] if isinstance(err.detail, list) and err.detail else err.detail
+            raise ValueError(str(detail))
+    job.result_data = data
+    if status_code >= 400:
+        raise ValueError(str(data.get('detail') or 'The upload could not be processed. See the result data for details.'))
+
+JOB_HANDLERS = {
+    Job.Type.LINE_LIST: run_line_list_csv,
+    Job.Type.PIVOT_TABLE: run_pivot_table_csv,
+    Job.Type.INTERACTION_UPLOAD: run_interaction_upload,
+    Job.Type.PIVOT_TABLE_REFRESH: run_pivot_table_refresh,
+}
@@ -0,0 +1,39 @@
+import signal
+import time
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from jobs.utils import claim_job, run_job
+
+class Command(BaseCommand):
+    '''
+    Worker process for the job queue. Claims queued jobs one at a time (SKIP LOCKED, so any number of workers can
+    run side by side) and sleeps when there is nothing to do. Stops after the current job on SIGINT/SIGTERM. Use
+    --once to run whatever is queued and exit (i.e., from cron).
+    '''
+    help = 'Run queued background jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit once there are no queued jobs.')
+        parser.add_argument('--sleep', type=float, default=5, help='Seconds to wait between checks when the queue is empty.')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        def stop(signum, frame):
+            self.stopping = True
+        signal.signal(signal.SIGINT, stop)
+        signal.signal(signal.SIGTERM, stop)
+
+        ran = 0
+        while not self.stopping:
+            #drop connections the database may have closed while we were sleeping
+            close_old_connections()
+            job = claim_job()
+            if not job:
+                if options['once']:
+                    break
+                time.sleep(options['sleep'])
+                continue
+            job = run_job(job)
+            ran += 1
+            self.stdout.write(f'Job {job.id} ({job.type}): {job.status}')
+        self.stdout.write(self.style.SUCCESS(f'Ran {ran} jobs.'))
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:09
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Job',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('line_list_csv', 'Line List Download'), ('pivot_table_csv', 'Pivot Table Download'), ('interaction_upload', 'Interaction Template Upload')], max_length=50)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('completed', 'Completed'), ('failed', 'Failed')], default='queued', max_length=25)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('upload', models.FileField(blank=True, null=True, upload_to='jobs/uploads/')),
+                ('result', models.FileField(blank=True, null=True, upload_to='jobs/results/')),
+                ('result_data', models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True)),
+                ('error', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status', 'queued')), fields=['created_at', 'id'], name='job_queued_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jobs', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='job',
+            name='type',
+            field=models.CharField(choices=[('line_list_csv', 'Line List Download'), ('pivot_table_csv', 'Pivot Table Download'), ('interaction_upload', 'Interaction Template Upload'), ('pivot_table_refresh', 'Pivot Table Refresh')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import models
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.translation import gettext_lazy as _
+
+from django.contrib.auth import get_user_model
+User = get_user_model()
+
+class Job(models.Model):
+    '''
+    A piece of work (exports, uploads) that is too slow to run inside a request. Jobs are created as queued,
+    picked up by a worker process (manage.py run_jobs, see [./utils.py]) and then marked completed or failed.
+    While a job runs the worker keeps its heartbeat up to date, so jobs left running by a worker that died can be 
+    queued again.
+
+    KEY FIELDS:
+        Type: What kind of work this is (which handler runs it, see [./handlers.py])
+        Params: Anything the handler needs to find what it is working on (i.e., the line list id)
+        Upload: The file the job is processing, if any (i.e., an interaction template)
+        Result: The file the job created, if any (i.e., a CSV export)
+        Result Data: Any data the job returns instead of a file (i.e., the errors/warnings for an upload)
+    '''
+    class Status(models.TextChoices):
+        QUEUED = 'queued', _('Queued')
+        RUNNING = 'running', _('Running')
+        COMPLETED = 'completed', _('Completed')
+        FAILED = 'failed', _('Failed')
+
+    class Type(models.TextChoices):
+        LINE_LIST = 'line_list_csv', _('Line List Download')
+        PIVOT_TABLE = 'pivot_table_csv', _('Pivot Table Download')
+        INTERACTION_UPLOAD = 'interaction_upload', _('Interaction Template Upload')
+        PIVOT_TABLE_REFRESH = 'pivot_table_refresh', _('Pivot Table Refresh')
+
+    type = models.CharField(max_length=50, choices=Type.choices)
+    status = models.CharField(max_length=25, choices=Status.choices, default=Status.QUEUED)
+    params = models.JSONField(default=dict, blank=True)
+    progress = models.PositiveSmallIntegerField(default=0) #percent complete
+    upload = models.FileField(upload_to='jobs/uploads/', null=True, blank=True)
+    result = models.FileField(upload_to='jobs/results/', null=True, blank=True)
+    result_data = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(null=True, blank=True)
+
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True) #last time the worker running this job checked in
+    attempts = models.PositiveSmallIntegerField(default=0) #number of times a worker has claimed this job
+
+    class Meta:
+        indexes = [
+            #workers only ever look for the oldest queued job
+            models.Index(fields=['created_at', 'id'], condition=models.Q(status='queued'), name='job_queued_idx'),
+            #and for running jobs whose worker has stopped checking in
+            models.Index(fields=['heartbeat_at'], condition=models.Q(status='running'), name='job_running_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.get_type_display()} ({self.status})'
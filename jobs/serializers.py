@@ -0,0 +1,65 @@
+from rest_framework import serializers
+from rest_framework.exceptions import PermissionDenied
+
+from jobs.models import Job
+from jobs.utils import enqueue_job
+from analysis.models import LineList, PivotTable
+
+#roles that can run each type of job (matching the endpoint that runs it in a request)
+JOB_ROLES = {
+    Job.Type.LINE_LIST: ['client', 'admin', 'meofficer', 'manager'],
+    Job.Type.PIVOT_TABLE: ['client', 'admin', 'meofficer', 'manager'],
+    Job.Type.INTERACTION_UPLOAD: ['admin', 'meofficer', 'manager'],
+}
+
+class JobSerializer(serializers.ModelSerializer):
+    '''
+    Returns the status of a job and queues new ones. Each type needs different params:
+        -line_list_csv: line_list_id
+        -pivot_table_csv: pivot_table_id
+        -interaction_upload: upload (the .xlsx template)
+    '''
+    #other types (i.e., pivot_table_refresh) are only queued by the system
+    type = serializers.ChoiceField(choices=[(job_type.value, job_type.label) for job_type in JOB_ROLES])
+    upload = serializers.FileField(write_only=True, required=False)
+    has_result = serializers.SerializerMethodField()
+
+    def get_has_result(self, obj):
+        return bool(obj.result)
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'type', 'status', 'params', 'progress', 'upload', 'has_result', 'result_data', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = ['status', 'progress', 'result_data', 'error', 'created_at', 'started_at', 'finished_at']
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        job_type = attrs.get('type')
+        params = attrs.get('params') or {}
+        if user.role not in JOB_ROLES[job_type]:
+            raise PermissionDenied('You do not have permission to run this job.')
+
+        #make sure whatever the job is working on exists and belongs to this user
+        if job_type == Job.Type.LINE_LIST:
+            if not LineList.objects.filter(id=params.get('line_list_id'), created_by=user).exists():
+                raise serializers.ValidationError({'params': 'A valid line_list_id is required.'})
+            attrs['params'] = {'line_list_id': params['line_list_id']}
+        elif job_type == Job.Type.PIVOT_TABLE:
+            if not PivotTable.objects.filter(id=params.get('pivot_table_id'), created_by=user).exists():
+                raise serializers.ValidationError({'params': 'A valid pivot_table_id is required.'})
+            attrs['params'] = {'pivot_table_id': params['pivot_table_id']}
+        elif job_type == Job.Type.INTERACTION_UPLOAD:
+            upload = attrs.get('upload')
+            if not upload:
+                raise serializers.ValidationError({'upload': 'No file was uploaded.'})
+            if not upload.name.endswith('.xlsx'):
+                raise serializers.ValidationError({'upload': 'Uploaded file must be an .xlsx Excel file.'})
+            attrs['params'] = {'filename': upload.name}
+        return attrs
+
+    def create(self, validated_data):
+        user = self.context['request'].user
+        return enqueue_job(validated_data['type'], user, validated_data['params'], validated_data.get('upload'))
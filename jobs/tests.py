@@ -0,0 +1,123 @@
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.urls import reverse
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.utils.timezone import now
+from unittest.mock import patch
+from datetime import timedelta
+import csv
+from io import StringIO, BytesIO
+from openpyxl import Workbook
+
+from jobs.models import Job
+from jobs.utils import claim_job, run_pending_jobs, requeue_stale_jobs
+from analysis.models import LineList, PivotTable, PivotTableParam, ChartField
+from analysis.tests.test_dashboards import DashboardSetupMixin
+
+class JobQueueTest(DashboardSetupMixin, APITestCase):
+    '''
+    Test that jobs can be queued, are claimed by one worker at a time, and store their results/errors.
+    '''
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.admin)
+        self.line_list = LineList.objects.create(name='List', project=self.project, created_by=self.admin)
+
+    def test_line_list_job(self):
+        response = self.client.post(reverse('job-list'), {'type': Job.Type.LINE_LIST, 'params': {'line_list_id': self.line_list.id}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.json()['status'], Job.Status.QUEUED)
+        job_id = response.json()['id']
+
+        self.assertEqual(run_pending_jobs(), 1)
+        response = self.client.get(reverse('job-detail', kwargs={'pk': job_id}))
+        self.assertEqual(response.json()['status'], Job.Status.COMPLETED)
+        self.assertEqual(response.json()['progress'], 100)
+        self.assertTrue(response.json()['has_result'])
+
+        response = self.client.get(reverse('job-download', kwargs={'pk': job_id}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(lines[0][:3], ['index', 'is_anonymous', 'first_name'])
+        self.assertEqual(len(lines), 11)
+
+    def test_async_download(self):
+        '''
+        ?async=1 queues the download instead of running it.
+        '''
+        table = PivotTable.objects.create(name='Table', indicator=self.number_ind, project=self.project, created_by=self.admin)
+        PivotTableParam.objects.create(pivot_table=table, field=ChartField.objects.create(name='sex'))
+        for url in [
+            reverse('linelist-download-csv', kwargs={'pk': self.line_list.id}),
+            reverse('analysis-download-csv', kwargs={'pk': table.id}),
+        ]:
+            response = self.client.get(url, {'async': 1})
+            self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+            self.assertTrue(Job.objects.filter(id=response.json()['job_id'], status=Job.Status.QUEUED).exists())
+        #the worker drops stale connections between jobs, which would close the test's transaction
+        with patch('jobs.management.commands.run_jobs.close_old_connections'):
+            call_command('run_jobs', once=True)
+        self.assertEqual(Job.objects.filter(status=Job.Status.COMPLETED).count(), 2)
+        self.assertTrue(Job.objects.get(type=Job.Type.PIVOT_TABLE).result.name.endswith('.csv'))
+
+    def test_claim_skips_claimed(self):
+        first = Job.objects.create(type=Job.Type.LINE_LIST, created_by=self.admin, params={'line_list_id': self.line_list.id})
+        second = Job.objects.create(type=Job.Type.LINE_LIST, created_by=self.admin, params={'line_list_id': self.line_list.id})
+        self.assertEqual(claim_job().id, first.id)
+        self.assertEqual(claim_job().id, second.id)
+        self.assertIsNone(claim_job())
+        self.assertEqual(Job.objects.filter(status=Job.Status.RUNNING).count(), 2)
+
+    def test_failed_job(self):
+        job = Job.objects.create(type=Job.Type.LINE_LIST, created_by=self.admin, params={'line_list_id': 0})
+        run_pending_jobs()
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertTrue(job.error)
+        self.assertIsNotNone(job.finished_at)
+
+    def test_permissions(self):
+        #users can't queue jobs on other people's lists or upload anything but a template
+        other = LineList.objects.create(name='Other', project=self.project, created_by=None)
+        response = self.client.post(reverse('job-list'), {'type': Job.Type.LINE_LIST, 'params': {'line_list_id': other.id}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(reverse('job-list'), {'type': Job.Type.INTERACTION_UPLOAD, 'upload': SimpleUploadedFile('file.txt', b'nope')})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        #system jobs can't be queued through the api
+        response = self.client.post(reverse('job-list'), {'type': Job.Type.PIVOT_TABLE_REFRESH, 'params': {}}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_job(self):
+        #the worker processes the stored template directly and records the same error the endpoint would return
+        template = BytesIO()
+        Workbook().save(template)
+        response = self.client.post(reverse('job-list'), {'type': Job.Type.INTERACTION_UPLOAD, 'upload': SimpleUploadedFile('template.xlsx', template.getvalue())})
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(run_pending_jobs(), 1)
+        job = Job.objects.get(id=response.json()['id'])
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn('Metadata', job.error)
+        self.assertIn('Metadata', str(job.result_data['detail']))
+
+    @override_settings(JOB_STALE_SECONDS=60, JOB_MAX_ATTEMPTS=2)
+    def test_requeue_stale(self):
+        '''
+        Jobs left running by a worker that stopped sending heartbeats are queued again, until they run out of attempts.
+        '''
+        job = Job.objects.create(type=Job.Type.LINE_LIST, created_by=self.admin, params={'line_list_id': self.line_list.id})
+        self.assertEqual(claim_job().id, job.id)
+        self.assertEqual(requeue_stale_jobs(), 0)
+
+        Job.objects.filter(id=job.id).update(heartbeat_at=now() - timedelta(minutes=5))
+        self.assertEqual(claim_job().id, job.id)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.RUNNING)
+        self.assertEqual(job.attempts, 2)
+
+        Job.objects.filter(id=job.id).update(heartbeat_at=now() - timedelta(minutes=5))
+        self.assertIsNone(claim_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertTrue(job.error)
@@ -0,0 +1,157 @@
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils.timezone import now
+from rest_framework.response import Response
+from rest_framework import status
+
+from jobs.models import Job
+
+'''
+Helpers for the database backed job queue. Workers (manage.py run_jobs) claim the oldest queued job with
+SELECT ... FOR UPDATE SKIP LOCKED, so several workers can poll the same table without picking up the same job
+and without needing a broker. While a job runs, a thread in the worker updates its heartbeat_at every 
+JOB_HEARTBEAT_SECONDS. Running jobs that stop getting a heartbeat (the worker was killed or lost its connection) 
+are queued again the next time any worker looks for work.
+'''
+
+def is_async(request):
+    '''
+    Returns True if the request asked to run in the background (?async=1).
+    - request (request instance): the request
+    '''
+    return request.query_params.get('async') in ['1', 'true']
+
+def enqueue_job(job_type, user, params=None, upload=None):
+    '''
+    Queues a job to be picked up by a worker. Returns the job.
+    - job_type (string): the type of job (see Job.Type)
+    - user (user instance): the user the job runs as
+    - params (dict, optional): anything the handler needs to find what it is working on
+    - upload (file, optional): a file for the job to process
+    '''
+    job = Job(type=job_type, created_by=user, params=params or {})
+    if upload:
+        job.upload.save(upload.name, upload, save=False)
+    job.save()
+    return job
+
+def job_response(job):
+    '''
+    Response returned by an endpoint that queued a job instead of running it.
+    - job (job instance): the queued job
+    '''
+    return Response(
+        {'job_id': job.id, 'status': job.status, 'detail': 'This request is running in the background.'},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+def requeue_stale_jobs():
+    '''
+    Queues running jobs whose worker has stopped sending a heartbeat again, or fails them if they have already
+    been tried JOB_MAX_ATTEMPTS times. Returns the number of jobs requeued/failed.
+    '''
+    cutoff = now() - timedelta(seconds=settings.JOB_STALE_SECONDS)
+    stale = Job.objects.filter(
+        Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True, started_at__lt=cutoff),
+        status=Job.Status.RUNNING,
+    )
+    failed = stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status=Job.Status.FAILED, error='The worker running this job stopped responding.', finished_at=now()
+    )
+    requeued = stale.update(status=Job.Status.QUEUED, progress=0, started_at=None, heartbeat_at=None)
+    return requeued + failed
+
+def claim_job():
+    '''
+    Claims the oldest queued job (if there is one) and marks it as running. Jobs another worker has locked are
+    skipped instead of waited on.
+    '''
+    requeue_stale_jobs()
+    with transaction.atomic():
+        job = Job.objects.select_for_update(skip_locked=True).filter(status=Job.Status.QUEUED).order_by('created_at', 'id').first()
+        if not job:
+            return None
+        job.status = Job.Status.RUNNING
+        job.started_at = job.heartbeat_at = now()
+        job.attempts += 1
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'attempts'])
+    return job
+
+class Heartbeat:
+    '''
+    Context manager that updates a running job's heartbeat_at from a background thread, so long handlers don't
+    need to check in themselves.
+    '''
+    def __init__(self, job):
+        '''
+        - job (job instance): the running job
+        '''
+        self.job = job
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.beat, daemon=True)
+
+    def beat(self):
+        try:
+            while not self.stopped.wait(settings.JOB_HEARTBEAT_SECONDS):
+                Job.objects.filter(id=self.job.id, status=Job.Status.RUNNING).update(heartbeat_at=now())
+        except Exception:
+            print(f'Job {self.job.id} heartbeat failed:', traceback.format_exc())
+        finally:
+            #the thread has its own connection
+            connection.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.stopped.set()
+        self.thread.join()
+
+def set_progress(job, progress):
+    '''
+    Updates how far along a job is (without touching any other fields).
+    - job (job instance): the running job
+    - progress (integer): percent complete
+    '''
+    job.progress = max(0, min(int(progress), 100))
+    Job.objects.filter(id=job.id).update(progress=job.progress, heartbeat_at=now())
+
+def run_job(job):
+    '''
+    Runs a claimed job with its handler and records the outcome. Errors are stored on the job instead of raised, so
+    one bad job can't take down the worker.
+    - job (job instance): the claimed job
+    '''
+    from jobs.handlers import JOB_HANDLERS
+    try:
+        handler = JOB_HANDLERS[job.type]
+        with Heartbeat(job):
+            handler(job)
+        job.status = Job.Status.COMPLETED
+        job.progress = 100
+    except Exception as e:
+        print(f'Job {job.id} ({job.type}) failed:', traceback.format_exc())
+        job.status = Job.Status.FAILED
+        job.error = str(e) or e.__class__.__name__
+    job.finished_at = now()
+    job.save()
+    return job
+
+def run_pending_jobs(limit=None):
+    '''
+    Claims and runs queued jobs until there are none left (or limit jobs have run). Returns the number of jobs run.
+    - limit (integer, optional): maximum number of jobs to run
+    '''
+    count = 0
+    while limit is None or count < limit:
+        job = claim_job()
+        if not job:
+            break
+        run_job(job)
+        count += 1
+    return count
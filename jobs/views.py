@@ -0,0 +1,45 @@
+from django.http import FileResponse
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.filters import OrderingFilter
+
+from users.restrictviewset import RoleRestrictedViewSet
+from jobs.models import Job
+from jobs.serializers import JobSerializer
+
+class JobViewSet(RoleRestrictedViewSet):
+    '''
+    Queue background jobs and poll their status. Users can only see the jobs they queued.
+    '''
+    permission_classes = [IsAuthenticated]
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['created_at']
+    http_method_names = ['get', 'post']
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        return queryset.filter(created_by=self.request.user).order_by('-created_at')
+
+    def create(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = serializer.save()
+        return Response(self.get_serializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=True, methods=['get'], url_path='download')
+    def download(self, request, pk=None):
+        '''
+        Download the file a completed job created.
+        '''
+        job = self.get_object()
+        if job.status != Job.Status.COMPLETED or not job.result:
+            return Response({"detail": "This job has no file to download."}, status=status.HTTP_404_NOT_FOUND)
+        return FileResponse(
+            job.result.open('rb'),
+            as_attachment=True,
+            filename=job.result.name.split('/')[-1]
+        )
@@ -18,7 +18,8 @@ User = get_user_model()
 from users.restrictviewset import RoleRestrictedViewSet
 
 from profiles.serializers import ProfileListSerializer
-from projects.models import Project, ProjectOrganization
+from projects.models import Project
+from projects.utils import get_org_scope
 from messaging.models import Message, Announcement, MessageRecipient, Alert, AlertRecipient, AnnouncementRecipient
 from messaging.serializers import MessageSerializer, AnnouncementSerializer, AlertSerializer
 
@@ -58,11 +59,7 @@ class MessageViewSet(RoleRestrictedViewSet):
             queryset = User.objects.all()
 
         elif user.role in ['meofficer', 'manager']:
-            org_ids = [user.organization_id]
-            child_orgs = ProjectOrganization.objects.filter(
-                parent_organization=user.organization
-            ).values_list('organization_id', flat=True)
-            org_ids += list(child_orgs)
+            org_ids = get_org_scope(user).org_ids()
             queryset = User.objects.filter(Q(organization_id__in=org_ids)| Q(role='admin'))
 
         elif user.role == 'client':
@@ -135,8 +132,7 @@ class AnnouncementViewSet(RoleRestrictedViewSet):
         if user.role == 'client':
             return Announcement.objects.filter(Q(visible_to_all=True) | Q(project__client=user.client_organization))
         if user.role in ['meofficer', 'manager']:
-            child_org_links = ProjectOrganization.objects.filter(parent_organization=user.organization)
-            child_orgs = [co.organization for co in child_org_links]
+            child_orgs = get_org_scope(user).child_ids()
             queryset = Announcement.objects.filter(
                 Q(visible_to_all=True, project=None) |  # Public & not project-specific
                 Q(organizations=user.organization) |     # Org-specific
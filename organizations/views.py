@@ -1,5 +1,4 @@
 from django.shortcuts import render, redirect
-from django.db.models import Q
 
 from rest_framework.response import Response
 from rest_framework.filters import SearchFilter, OrderingFilter
@@ -10,7 +9,7 @@ from users.restrictviewset import RoleRestrictedViewSet
 from organizations.models import Organization
 from projects.models import Project, Task, ProjectOrganization
 from organizations.serializers import OrganizationListSerializer, OrganizationSerializer
-from projects.utils import get_valid_orgs
+from projects.utils import get_valid_orgs, get_org_scope
 
 from django.contrib.auth import get_user_model
 User = get_user_model()
@@ -36,13 +35,7 @@ class OrganizationViewSet(RoleRestrictedViewSet):
             valid_ids = Task.objects.filter(project__client=user.client_organization).values_list('organization_id', flat=True)
             queryset = Organization.objects.filter(id__in=valid_ids)
         elif role in ['meofficer', 'manager']:
-            child_orgs = ProjectOrganization.objects.filter(
-                parent_organization=user.organization
-            ).values_list('organization__id', flat=True)
-
-            queryset = Organization.objects.filter(
-                Q(id=user.organization.id) | Q(id__in=child_orgs)
-            )
+            queryset = Organization.objects.filter(id__in=get_org_scope(user).org_ids())
             return queryset
         else:
             return Organization.objects.filter(id=user.organization.id)
@@ -6,13 +6,14 @@ from django.db.models import Q
 
 from projects.exceptions import ConflictError
 from projects.models import Project, Task, Client, Target, ProjectOrganization, ProjectActivity, ProjectDeadline, ProjectActivityComment, ProjectActivityOrganization, ProjectDeadlineOrganization
-from projects.utils import ProjectPermissionHelper, test_child_org
+from projects.utils import ProjectPermissionHelper, test_child_org, bump_org_scopes
 from organizations.models import Organization
 from organizations.serializers import OrganizationListSerializer
 from indicators.models import Indicator, Assessment
 from indicators.serializers import IndicatorSerializer, AssessmentSerializer
 from profiles.serializers import ProfileListSerializer
 from analysis.utils.targets import get_achievement
+from analysis.utils.result_cache import bump_global_version
 
 class ClientSerializer(serializers.ModelSerializer):
     '''
@@ -188,7 +189,12 @@ class ProjectDetailSerializer(serializers.ModelSerializer):
             ProjectOrganization(project=project, organization=org, added_by=user)
             for org in organizations if org.id not in existing_org_ids
         ]
+        if not new_links:
+            return
         ProjectOrganization.objects.bulk_create(new_links)
+        #bulk_create doesn't send the save signals that normally refresh these
+        bump_org_scopes()
+        bump_global_version()
 
 
     @transaction.atomic
@@ -242,12 +248,19 @@ class TargetSerializer(serializers.ModelSerializer):
     display_name = serializers.SerializerMethodField()
 
     def get_related_as_number(self, obj):
+        #use precalculated achievements if they were passed (see analysis/utils/targets --> get_achievements)
+        achievements = self.context.get('achievements')
+        if achievements and obj.id in achievements:
+            return achievements[obj.id]['related_as_number']
         user = self.context.get('request').user
         if not obj.related_to:
             return None
         return get_achievement(user, obj, obj.related_to)
     
     def get_achievement(self, obj):
+        achievements = self.context.get('achievements')
+        if achievements and obj.id in achievements:
+            return achievements[obj.id]['achievement']
         user = self.context.get('request').user
         return get_achievement(user, obj)
     
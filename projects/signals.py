@@ -0,0 +1,69 @@
+from django.db.models.signals import pre_save, post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from projects.models import Project, ProjectOrganization, Task
+from analysis.utils.facts import queue_response_facts, update_fact_parents, update_fact_client
+from projects.utils import bump_org_scopes
+
+'''
+Signals that keep the project information stored on the analysis response fact table in sync 
+(see analysis.utils.facts) and memoized organization scopes up to date (see projects.utils.get_org_scope).
+'''
+
+@receiver(post_save, sender=Project)
+def sync_project_client_facts(sender, instance, created, **kwargs):
+    '''
+    If a project's client changes, update the client stored on its facts.
+    - instance (project instance): the project that was saved
+    - created (boolean): was the project just created (it will have no facts yet)
+    '''
+    if created:
+        return
+    update_fact_client(instance.id, instance.client_id)
+
+@receiver(post_save, sender=ProjectOrganization)
+def sync_parent_organization_facts(sender, instance, **kwargs):
+    '''
+    If an organization is assigned a new parent within a project, update the parent stored on its facts.
+    - instance (project organization instance): the link between the project and the organization
+    '''
+    update_fact_parents(instance.project_id, instance.organization_id, instance.parent_organization_id)
+
+@receiver(post_delete, sender=ProjectOrganization)
+def clear_parent_organization_facts(sender, instance, **kwargs):
+    '''
+    If an organization is removed from a project, it no longer has a parent there.
+    - instance (project organization instance): the link that was deleted
+    '''
+    update_fact_parents(instance.project_id, instance.organization_id, None)
+
+@receiver(post_save, sender=ProjectOrganization)
+@receiver(post_delete, sender=ProjectOrganization)
+@receiver(m2m_changed, sender=Project.organizations.through)
+def refresh_org_scopes(sender, **kwargs):
+    '''
+    Parent/child links decide which organizations a user can see, so any memoized scopes need to be rebuilt.
+    '''
+    bump_org_scopes()
+
+@receiver(pre_save, sender=Task)
+def store_task_placement(sender, instance, **kwargs):
+    '''
+    Remember the project/organization a task had before it was saved, so sync_task_facts_on_save can tell if it moved.
+    - instance (task instance): the task about to be saved
+    '''
+    instance._stored_placement = None
+    if instance.pk:
+        instance._stored_placement = Task.objects.filter(pk=instance.pk).values_list('project_id', 'organization_id').first()
+
+@receiver(post_save, sender=Task)
+def sync_task_facts_on_save(sender, instance, created, **kwargs):
+    '''
+    If a task is moved to a different project/organization, queue the facts for the responses recorded under it to be
+    rebuilt once the transaction commits. Edits to anything else on the task don't touch the facts.
+    - instance (task instance): the task that was saved
+    - created (boolean): was the task just created (it will have no responses yet)
+    '''
+    stored = getattr(instance, '_stored_placement', None)
+    if created or stored is None or stored == (instance.project_id, instance.organization_id):
+        return
+    queue_response_facts(task_ids=[instance.id])
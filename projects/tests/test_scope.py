@@ -0,0 +1,80 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from projects.models import Project, Client, ProjectOrganization
+from organizations.models import Organization
+from projects.utils import get_org_scope, get_valid_orgs
+from projects.serializers import ProjectDetailSerializer
+User = get_user_model()
+
+class OrgScopeTest(TestCase):
+    '''
+    Test that organization scopes are only looked up once per user and are rebuilt when parent/child links change.
+    '''
+    def setUp(self):
+        self.admin = User.objects.create_user(username='admin', password='testpass', role='admin')
+        self.manager = User.objects.create_user(username='manager', password='testpass', role='manager')
+        self.parent_org = Organization.objects.create(name='Parent')
+        self.child_org = Organization.objects.create(name='Child')
+        self.grandchild_org = Organization.objects.create(name='Grandchild')
+        self.other_org = Organization.objects.create(name='Other')
+        self.manager.organization = self.parent_org
+        self.manager.save()
+        client = Client.objects.create(name='Test Client', created_by=self.admin)
+        self.project = Project.objects.create(
+            name='Alpha Project', client=client, status=Project.Status.ACTIVE, start='2025-01-01', end='2025-12-31', created_by=self.admin,
+        )
+        self.other_project = Project.objects.create(
+            name='Beta Project', client=client, status=Project.Status.ACTIVE, start='2025-01-01', end='2025-12-31', created_by=self.admin,
+        )
+        ProjectOrganization.objects.create(project=self.project, organization=self.parent_org)
+        ProjectOrganization.objects.create(project=self.project, organization=self.child_org, parent_organization=self.parent_org)
+        ProjectOrganization.objects.create(project=self.project, organization=self.grandchild_org, parent_organization=self.child_org)
+        ProjectOrganization.objects.create(project=self.other_project, organization=self.parent_org)
+        ProjectOrganization.objects.create(project=self.other_project, organization=self.other_org, parent_organization=self.parent_org)
+
+    def test_scope(self):
+        scope = get_org_scope(self.manager)
+        self.assertEqual(scope.org_ids(), {self.parent_org.id, self.child_org.id, self.other_org.id})
+        self.assertEqual(scope.org_ids(self.project), {self.parent_org.id, self.child_org.id})
+        self.assertEqual(scope.child_ids(self.other_project.id), {self.other_org.id})
+        #cascading from another organization
+        self.assertEqual(get_org_scope(self.manager, self.child_org).org_ids(self.project), {self.child_org.id, self.grandchild_org.id})
+        #the subquery should match the set
+        self.assertEqual(set(Organization.objects.filter(id__in=scope.child_subquery()).values_list('id', flat=True)), scope.child_ids())
+
+    def test_active_only(self):
+        #get_valid_orgs only counts children in active projects
+        self.other_project.status = Project.Status.COMPLETED
+        self.other_project.save()
+        scope = get_org_scope(self.manager)
+        self.assertEqual(scope.org_ids(active_only=True), {self.parent_org.id, self.child_org.id})
+        self.assertIn(self.other_org.id, scope.org_ids())
+        self.assertEqual(set(get_valid_orgs(self.manager)), {self.parent_org.id, self.child_org.id})
+
+    def test_memoized(self):
+        get_org_scope(self.manager).org_ids()
+        with self.assertNumQueries(0):
+            self.assertIs(get_org_scope(self.manager), get_org_scope(self.manager))
+            get_org_scope(self.manager).org_ids()
+
+    def test_invalidated(self):
+        self.assertNotIn(self.grandchild_org.id, get_org_scope(self.manager).org_ids())
+        link = ProjectOrganization.objects.get(organization=self.grandchild_org)
+        link.parent_organization = self.parent_org
+        link.save()
+        self.assertIn(self.grandchild_org.id, get_org_scope(self.manager).org_ids())
+        link.delete()
+        self.assertNotIn(self.grandchild_org.id, get_org_scope(self.manager).org_ids())
+
+    def test_invalidated_by_serializer(self):
+        '''
+        Organizations added through the project serializer are bulk created (no save signals), so make sure scopes
+        built before are still rebuilt.
+        '''
+        scope = get_org_scope(self.manager)
+        request = type('Request', (), {'user': self.admin})()
+        serializer = ProjectDetailSerializer(self.project, data={'organization_id': [self.other_org.id]}, partial=True, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        self.assertIsNot(get_org_scope(self.manager), scope)
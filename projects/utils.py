@@ -1,24 +1,114 @@
 from projects.models import Project, ProjectOrganization
+from organizations.models import Organization
 from django.db.models import Q
 
-def get_valid_orgs(user):
+#bumped by projects/signals whenever a parent/child link changes, so memoized scopes know to rebuild
+_scope_generation = 0
+
+def bump_org_scopes():
     '''
-    Quick helper to pull a general list of child orgs plus the users own org.
+    Mark every memoized organization scope as out of date.
     '''
-    if user.role not in ['meofficer', 'manager']:
-        return [user.organization.id]
+    global _scope_generation
+    _scope_generation += 1
+
+class OrgScope:
+    '''
+    The organizations whose data an organization's members can see: the organization itself plus its child
+    organizations (in any project, or within one project). Each lookup is only run once per scope, so get one with
+    get_org_scope to share it between every helper/viewset handling a request.
+    '''
+    def __init__(self, organization_id):
+        '''
+        - organization_id (integer): id of the parent organization (can be None for users without an organization)
+        '''
+        self.organization_id = organization_id
+        self.generation = _scope_generation
+        self._child_ids = {}
+
+    def child_links(self, project=None, active_only=False):
+        '''
+        Returns a (lazy) queryset of the project organization links where this organization is the parent, for 
+        use in subqueries (i.e., Exists(scope.child_links().filter(organization=OuterRef(...)))).
+        - project (project instance or id, optional): only include links in this project
+        - active_only (boolean, optional): only include links in active projects
+        '''
+        links = ProjectOrganization.objects.filter(parent_organization_id=self.organization_id)
+        if project is not None:
+            links = links.filter(project_id=getattr(project, 'id', project))
+        if active_only:
+            links = links.filter(project__status=Project.Status.ACTIVE)
+        return links
+
+    def child_subquery(self, project=None, active_only=False):
+        '''
+        Returns the child organization ids as a SQL subquery (for organization__in=...).
+        - project (project instance or id, optional): only include children in this project
+        - active_only (boolean, optional): only include children in active projects
+        '''
+        return self.child_links(project, active_only).values('organization_id')
 
-    # Get active projects
-    valid_projects = Project.objects.filter(status=Project.Status.ACTIVE)
+    def child_ids(self, project=None, active_only=False):
+        '''
+        Returns a frozen set of the child organization ids.
+        - project (project instance or id, optional): only include children in this project
+        - active_only (boolean, optional): only include children in active projects
+        '''
+        key = (getattr(project, 'id', project), active_only)
+        if key not in self._child_ids:
+            if self.organization_id is None:
+                self._child_ids[key] = frozenset()
+            else:
+                self._child_ids[key] = frozenset(self.child_links(project, active_only).values_list('organization_id', flat=True))
+        return self._child_ids[key]
+
+    def org_ids(self, project=None, active_only=False):
+        '''
+        Returns a frozen set of the organization's id plus its child organization ids.
+        - project (project instance or id, optional): only include children in this project
+        - active_only (boolean, optional): only include children in active projects
+        '''
+        if self.organization_id is None:
+            return frozenset()
+        return self.child_ids(project, active_only) | {self.organization_id}
 
-    # Get child orgs across all active projects where this user is the parent org
-    child_orgs = ProjectOrganization.objects.filter(
-        project__in=valid_projects,
-        parent_organization=user.organization
-    ).values_list('organization_id', flat=True)
+    def child_orgs(self, project=None):
+        '''
+        Returns a list of the child organization instances.
+        - project (project instance or id, optional): only include children in this project
+        '''
+        return list(Organization.objects.filter(id__in=self.child_ids(project)))
 
-    # Return both the user’s org and all matched child orgs
-    return list(child_orgs) + [user.organization.id]
+def get_org_scope(user, organization=None):
+    '''
+    Returns the OrgScope for a user's organization (or another organization, i.e., when cascading to an 
+    organization's children). Scopes are memoized on the user instance, which lives for one request, so every 
+    lookup made while handling the request shares the same results.
+    - user (user instance): the user making the request
+    - organization (organization instance, optional): organization to get the scope of instead of the user's
+    '''
+    organization_id = organization.id if organization else getattr(user, 'organization_id', None)
+    scopes = getattr(user, '_org_scopes', None)
+    if scopes is None:
+        scopes = {}
+        #not every user instance (i.e., AnonymousUser) allows new attributes
+        try:
+            user._org_scopes = scopes
+        except AttributeError:
+            pass
+    scope = scopes.get(organization_id)
+    if scope is None or scope.generation != _scope_generation:
+        scope = OrgScope(organization_id)
+        scopes[organization_id] = scope
+    return scope
+
+def get_valid_orgs(user):
+    '''
+    Quick helper to pull a general list of child orgs (across all active projects) plus the users own org.
+    '''
+    if user.role not in ['meofficer', 'manager']:
+        return [user.organization.id]
+    return list(get_org_scope(user).org_ids(active_only=True))
 
 def test_child_org(user, organization, project):
     '''
@@ -57,10 +147,7 @@ class ProjectPermissionHelper:
         self.org_link = ProjectOrganization.objects.filter(organization=self.org).first()
         self.parent_org = self.org_link.parent_organization if self.org_link else None
 
-        child_org_links = ProjectOrganization.objects.filter(parent_organization=self.org)
-        if self.project:
-            child_org_links = child_org_links.filter(project=self.project)
-        self.child_orgs = [co.organization for co in child_org_links]
+        self.child_orgs = get_org_scope(user).child_orgs(self.project)
 
     def verify_in_project(self):
         '''
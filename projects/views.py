@@ -20,6 +20,7 @@ from organizations.serializers import OrganizationListSerializer
 from projects.models import Project, ProjectOrganization, Client, Task, Target, ProjectActivity, ProjectDeadline, ProjectActivityOrganization, ProjectDeadlineOrganization
 from projects.serializers import ProjectListSerializer, ProjectDetailSerializer, TaskSerializer, TargetSerializer, ClientSerializer, ProjectActivitySerializer, ProjectDeadlineSerializer
 from projects.utils import ProjectPermissionHelper, test_child_org
+from analysis.utils.targets import get_achievements
 from indicators.models import Indicator
 from respondents.models import Interaction
 from respondents.utils import get_enum_choices
@@ -585,6 +586,22 @@ class TargetViewSet(RoleRestrictedViewSet):
     def perform_update(self, serializer):
         serializer.save(updated_by=self.request.user)
 
+    @action(detail=False, methods=['get'], url_path='achievement')
+    def get_achievement(self, request):
+        '''
+        Get every target in a project the user can see along with its achievement, calculated for all of them at 
+        once (used by the project overview). Accepts the same filters as the list view.
+        '''
+        project_id = request.query_params.get('project')
+        if not project_id:
+            return Response({"detail": "A project is required."}, status=status.HTTP_400_BAD_REQUEST)
+        targets = list(self.filter_queryset(self.get_queryset()).select_related(
+            'indicator', 'related_to', 'project', 'organization'
+        ))
+        achievements = get_achievements(request.user, targets)
+        serializer = TargetSerializer(targets, many=True, context={'request': request, 'achievements': achievements})
+        return Response(serializer.data)
+
     def destroy(self, request, *args, **kwargs):
         '''
         Allow user to delete targets for child orgs (or admins can delete anything)
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.2 on 2026-10-17 01:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_open_flags(apps, schema_editor):
+    '''
+    Backfill has_open_flags for objects that already have unresolved flags.
+    '''
+    Flag = apps.get_model('flags', 'Flag')
+    for model_name in ['interaction', 'respondent']:
+        model = apps.get_model('respondents', model_name)
+        flagged = Flag.objects.filter(
+            content_type__app_label='respondents', content_type__model=model_name, resolved=False
+        ).values_list('object_id', flat=True)
+        model.objects.filter(id__in=flagged).update(has_open_flags=True)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flags', '0002_alter_flag_reason_type'),
+        ('projects', '0025_alter_target_related_to'),
+        ('respondents', '0037_response_response_none'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='interaction',
+            name='has_open_flags',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='respondent',
+            name='has_open_flags',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='interaction',
+            index=models.Index(condition=models.Q(('has_open_flags', False)), fields=['task', 'interaction_date'], name='interaction_unflagged_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='respondent',
+            index=models.Index(condition=models.Q(('has_open_flags', False)), fields=['id'], name='respondent_unflagged_idx'),
+        ),
+        migrations.RunPython(mark_open_flags, migrations.RunPython.noop),
+    ]
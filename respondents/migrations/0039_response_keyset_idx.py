@@ -0,0 +1,20 @@
+# Generated by Django 5.2.2 on 2026-10-17 02:05
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('indicators', '0039_indicator_description_alter_indicator_type'),
+        ('respondents', '0038_has_open_flags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='response',
+            index=models.Index(fields=['response_date', 'id'], name='response_keyset_idx'),
+        ),
+    ]
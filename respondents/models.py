@@ -10,6 +10,7 @@ User = get_user_model()
 from indicators.models import Option, Indicator
 from projects.models import Task
 from events.models import Event
+from flags.models import OpenFlagsMixin
 
 '''
 The respondent model relies on a variety of TextChoices. These are both used to control inputs but also
@@ -66,7 +67,7 @@ class RespondentAttributeType(models.Model):
     def __str__(self):
         return self.name
 
-class Respondent(models.Model):
+class Respondent(OpenFlagsMixin, models.Model):
     '''
     Model that's basically used to centrally store demographic information attached to interactions
     and help us better organize how that data is viewed/analyzed. Ideally, almost all indicators
@@ -141,7 +142,7 @@ class Respondent(models.Model):
          when validating ids)
         - respondents/interaction_viewset --> InteractionViewSet --> post_template will set to BW by default
         - analysis/utils/collection (for filtering citizen vs. non-citizen)
-        -analysus/utils/interactions_prep --> build_keys (for creating citizenship boolean).
+        - analysis/utils/facts --> build_facts (for creating citizenship boolean).
     '''
     citizenship = models.CharField(max_length=255, verbose_name='Citizenship/Nationality') 
     special_attribute = models.ManyToManyField(RespondentAttributeType, through='RespondentAttribute', blank=True, verbose_name='Special Respondent Attributes')
@@ -152,12 +153,19 @@ class Respondent(models.Model):
     comments = models.TextField(blank=True, null=True, verbose_name='Comments')
     
     flags = GenericRelation('flags.Flag', related_query_name='flags')
+    has_open_flags = models.BooleanField(default=False) #kept in sync with flags by flags/signals, used to exclude flagged data from analysis
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='respondent_created_by')
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='respondent_updated_by')
 
+    class Meta:
+        indexes = [
+            #analysis only reads unflagged respondents
+            models.Index(fields=['id'], condition=models.Q(has_open_flags=False), name='respondent_unflagged_idx'),
+        ]
+
     
 
     def clean(self):
@@ -282,7 +290,7 @@ class HIVStatus(models.Model):
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='hiv_status_created_by')
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='hiv_status_updated_by')
 
-class Interaction(models.Model):
+class Interaction(OpenFlagsMixin, models.Model):
     '''
     An interaction is linked to a respondent and a task with an assessment. It helps organize responses by 
     session/org/project/respondent
@@ -293,12 +301,19 @@ class Interaction(models.Model):
     interaction_date = models.DateField()
     interaction_location = models.CharField(max_length=255, null=True, blank=True, verbose_name='Interaction Location')
     flags = GenericRelation('flags.Flag', related_query_name='flags')
+    has_open_flags = models.BooleanField(default=False) #kept in sync with flags by flags/signals, used to exclude flagged data from analysis
     
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='interaction_created_by')
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='interaction_updated_by')
 
+    class Meta:
+        indexes = [
+            #analysis only reads unflagged interactions
+            models.Index(fields=['task', 'interaction_date'], condition=models.Q(has_open_flags=False), name='interaction_unflagged_idx'),
+        ]
+
 class Response(models.Model):
     '''
     Individual response linked to an interaction and an indicator. Contains the actual values collected
@@ -321,3 +336,9 @@ class Response(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='response_created_by')
     updated_by = models.ForeignKey(User, on_delete=models.SET_NULL, default=None, null=True, blank=True, related_name='response_updated_by')
+
+    class Meta:
+        indexes = [
+            #line list pages are read in (response_date, id) order, undated responses last (see LINE_LIST_ORDER)
+            models.Index(fields=['response_date', 'id'], name='response_keyset_idx'),
+        ]
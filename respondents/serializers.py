@@ -4,6 +4,7 @@ from rest_framework.exceptions import PermissionDenied
 from datetime import date
 from django.utils.timezone import now
 
+from django.db import transaction
 from django.db.models import Q
 
 from respondents.models import Respondent, Interaction, Response, Pregnancy, HIVStatus, KeyPopulation, DisabilityType, RespondentAttribute, RespondentAttributeType, KeyPopulationStatus, DisabilityStatus
@@ -768,6 +769,8 @@ class InteractionSerializer(serializers.ModelSerializer):
                 created_by=user,
             )
 
+    #atomic so the responses are saved together (and their facts are built together once it commits)
+    @transaction.atomic
     def create(self, validated_data):
         user = self.context['request'].user
         response_data = validated_data.pop('response_data', [])
@@ -779,6 +782,7 @@ class InteractionSerializer(serializers.ModelSerializer):
         interaction.save()
         return interaction
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         user = self.context['request'].user
         response_data = validated_data.pop('response_data', [])
@@ -1,7 +1,8 @@
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete, pre_save, m2m_changed
 from django.dispatch import receiver
 from django.db.models import Q
-from respondents.models import KeyPopulationStatus, DisabilityStatus, HIVStatus, RespondentAttribute, RespondentAttributeType, Interaction, Respondent
+from respondents.models import KeyPopulationStatus, DisabilityStatus, HIVStatus, Pregnancy, RespondentAttribute, RespondentAttributeType, Interaction, Respondent, Response
+from analysis.utils.facts import queue_response_facts, refresh_deleted_response_rollups
 from django.db import transaction
 from messaging.models import Alert, AlertRecipient
 from django.contrib.contenttypes.models import ContentType
@@ -135,3 +136,78 @@ def handle_govern_interaction(sender, instance, created, **kwargs):
         else:
             RespondentAttribute.objects.get_or_create(respondent=respondent, attribute=attr)
 '''
+
+
+
+# === Analytics fact table ===
+'''
+Keep the response fact table used by analysis in sync (see analysis.utils.facts). Facts for deleted responses/interactions
+are removed by the cascade, so only the monthly rollups they were summed into need to be handled for deletes.
+'''
+@receiver(post_save, sender=Response)
+def sync_response_fact(sender, instance, **kwargs):
+    '''
+    Queue the fact for a response to be built/rebuilt once the transaction it was saved in commits. The receivers
+    below queue their changes the same way, so a bulk edit rebuilds everything it touched in one pass.
+    - instance (response instance): the response that was saved
+    '''
+    queue_response_facts([instance.pk])
+
+@receiver(post_save, sender=Interaction)
+def sync_interaction_fact(sender, instance, created, **kwargs):
+    '''
+    If an interaction is edited (task/date), queue the facts for its responses to be rebuilt. New interactions have no responses yet.
+    - instance (interaction instance): the interaction that was saved
+    - created (boolean): was the interaction just created
+    '''
+    if created:
+        return
+    queue_response_facts(interaction_ids=[instance.id])
+
+@receiver(post_save, sender=Respondent)
+def sync_respondent_fact(sender, instance, created, **kwargs):
+    '''
+    If a respondent's demographic information is edited, queue the facts for all of their responses to be rebuilt.
+    - instance (respondent instance): the respondent that was saved
+    - created (boolean): was the respondent just created
+    '''
+    if created:
+        return
+    queue_response_facts(respondent_ids=[instance.id])
+
+@receiver(post_save, sender=KeyPopulationStatus)
+@receiver(post_delete, sender=KeyPopulationStatus)
+@receiver(post_save, sender=DisabilityStatus)
+@receiver(post_delete, sender=DisabilityStatus)
+@receiver(post_save, sender=HIVStatus)
+@receiver(post_delete, sender=HIVStatus)
+@receiver(post_save, sender=Pregnancy)
+@receiver(post_delete, sender=Pregnancy)
+def sync_respondent_status_fact(sender, instance, **kwargs):
+    '''
+    KP/disability statuses, HIV status, and pregnancies are all stored on the facts, so queue them to be rebuilt if any change.
+    - instance (status instance): the status object that was changed
+    '''
+    if instance.respondent_id:
+        queue_response_facts(respondent_ids=[instance.respondent_id])
+
+@receiver(m2m_changed, sender=Respondent.kp_status.through)
+@receiver(m2m_changed, sender=Respondent.disability_status.through)
+def sync_respondent_m2m_fact(sender, instance, action, reverse, **kwargs):
+    '''
+    Setting KP/disability statuses through the M2M manager (.set()/.add()) doesn't send save signals for the through model.
+    - instance (respondent instance): the respondent whose statuses changed
+    - action (string): which part of the change this is, only act once it has finished
+    - reverse (boolean): the change was made from the KP/disability side
+    '''
+    if action not in ['post_add', 'post_remove', 'post_clear'] or reverse:
+        return
+    queue_response_facts(respondent_ids=[instance.id])
+
+@receiver(post_delete, sender=Response)
+def sync_deleted_response_rollup(sender, instance, **kwargs):
+    '''
+    The fact for a deleted response is removed by the cascade, but the month it was summed into still needs to be re-summed.
+    - instance (response instance): the response that was deleted
+    '''
+    refresh_deleted_response_rollups(instance)
@@ -331,6 +331,36 @@ class RespondentViewSetTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(respondent.flags.filter(resolved=True).count(), 3)
 
+    def test_resolved_marker(self):
+        '''
+        Resolving the auto flags through the serializer should clear has_open_flags, and the save at the end of
+        the update shouldn't write the stale value back.
+        '''
+        self.client.force_authenticate(user=self.data_collector)
+        flag_payload = {
+            'is_anonymous':False,
+            'id_no': '000000',
+            'first_name': 'Test',
+            'last_name': 'Testerson',
+            'dob': '2000-01-01',
+            'ward': 'Here',
+            'village': 'Place', 
+            'citizenship': 'BW',
+            'sex': Respondent.Sex.FEMALE,
+            'district': Respondent.District.CENTRAL,
+        }
+        response = self.client.post('/api/record/respondents/', flag_payload, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        respondent = Respondent.objects.get(id_no='000000')
+        self.assertTrue(respondent.has_open_flags)
+
+        response = self.client.patch(f'/api/record/respondents/{respondent.id}/', {'id_no': '111121111', 'village': 'Other Place'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        respondent.refresh_from_db()
+        self.assertEqual(respondent.village, 'Other Place')
+        self.assertEqual(respondent.flags.filter(resolved=False).count(), 0)
+        self.assertFalse(respondent.has_open_flags)
+
     def test_not_fire_non_citizen(self):
         '''
         Omang rules do not apply to non-citizens, so no auto-flags should be generated.
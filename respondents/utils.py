@@ -29,7 +29,7 @@ def respondent_flag_check(respondent, user):
     if len(id_no) != 9:
         _maybe_create_flag(flags, respondent, length_reason, user)
     else:
-        resolve_flag(flags, length_reason)
+        resolve_flag(flags, length_reason, respondent)
 
     # Rule 2: Fifth digit must be '1' or '2'
     fifth_digit_reason = 'Invalid ID Number (Omang) (fifth digit must be a "1" or "2").'
@@ -39,18 +39,18 @@ def respondent_flag_check(respondent, user):
         if fifth not in ['1', '2']:
             _maybe_create_flag(flags, respondent, fifth_digit_reason, user)
         else:
-            resolve_flag(flags, fifth_digit_reason)
+            resolve_flag(flags, fifth_digit_reason, respondent)
 
         # Rule 3: Fifth digit must match declared sex
         if (respondent.sex == 'M' and fifth != '1') or (respondent.sex == 'F' and fifth != '2'):
             if respondent.sex == 'NB' or respondent.kp_status.filter(
                 Q(name='TG') | Q(name='INTERSEX')
             ).exists():
-                resolve_flag(flags, sex_reason)
+                resolve_flag(flags, sex_reason, respondent)
             else:
                 _maybe_create_flag(flags, respondent, sex_reason, user)
         else:
-            resolve_flag(flags, sex_reason)
+            resolve_flag(flags, sex_reason, respondent)
     else:
         # If ID is too short, mark both digit-based flags
         _maybe_create_flag(flags, respondent, fifth_digit_reason, user)
@@ -4,6 +4,15 @@ import re
 from dateutil.parser import parse as parse_date
 from datetime import date, timedelta, datetime
 from openpyxl.utils.datetime import from_excel
+from openpyxl import load_workbook
+import pycountry
+from rest_framework import status
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from projects.models import Task, ProjectOrganization
+from respondents.models import Respondent, Interaction, HIVStatus, KeyPopulation, DisabilityType, RespondentAttributeType
+from respondents.serializers import RespondentSerializer, InteractionSerializer
+from indicators.models import Indicator, Option
 
 def excel_columns():
         '''
@@ -84,3 +93,749 @@ def is_truthy(value):
     if isinstance(value, str):
         return value.strip().lower() in ['true', 'yes', '1']
     return False
+
+
+def check_template_upload(user, uploaded_file):
+    '''
+    Checks that a user can upload interaction templates and that the file looks like one. Returns None if it does,
+    otherwise the (response data, status code) to return.
+    - user (user instance): the user uploading the template
+    - uploaded_file (file): the uploaded template
+    '''
+    #check user has adequate role
+    if user.role not in ['admin', 'meofficer', 'manager']:
+        raise PermissionDenied('You do not have permission to access templates.')
+    #throw an error if its the wrong file type
+    if not uploaded_file:
+        return {"detail": "No file was uploaded."}, status.HTTP_400_BAD_REQUEST
+    if not uploaded_file.name.endswith('.xlsx'):
+        return {"detail": "Uploaded file must be an .xlsx Excel file."}, status.HTTP_400_BAD_REQUEST
+    return None
+
+def process_interaction_template(user, uploaded_file):
+    '''
+    Converts an uploaded interaction template into respondents/interactions. Used by the upload endpoint and by
+    the background job that processes big templates (see jobs/handlers.py), so both behave the same. Returns the
+    (response data, status code) with any errors, warnings, and conflicts with respondents already in the database.
+    - user (user instance): the user uploading the template (used for permissions)
+    - uploaded_file (file): the uploaded template
+    '''
+    invalid = check_template_upload(user, uploaded_file)
+    if invalid:
+        return invalid
+
+    #custom errors/warnings
+    errors = []
+    warnings = []
+
+    #read metadata sheet that has task/organization info and throw an error if its missing or wrong
+    try:
+        wb = load_workbook(filename=uploaded_file)
+        ws = wb['Metadata']
+    except Exception:
+        raise ValidationError("Unable to read 'Metadata' sheet. Please check the template.")
+    try:
+        org_id = int(ws['A2'].value)
+    except (TypeError, ValueError):
+        raise ValidationError("Organization ID must be numeric.")
+    if not org_id:
+        raise ValidationError("Template requires a valid organization ID.")
+    #check perms
+    if user.role != 'admin':
+        #non admins should only have access to their org and child orgs
+        if str(org_id) != str(user.organization_id): #if not their org then...
+            if not ProjectOrganization.objects.filter(parent_organization=user.organization, organization_id=org_id).exists(): #check if its a valid child for the project
+                raise PermissionDenied('You do not have permission to access this template.')
+
+    #make sure all the columns are present (row 1)
+    ws = wb['Data'] 
+    headers = {}
+    for row in ws.iter_rows(min_row=1, max_row=1):
+        for cell in row:
+            if cell.value:
+                header_name = str(cell.value).strip()
+                headers[header_name] = {
+                    'column': cell.column,
+                    'options': [],
+                    'multiple': False
+                }
+
+    #pull the labels used for the dropdown options (the same ones used to create the tempalte)
+    #for simplicity/verification, we're treating everything as lowercase no spaces
+    district_labels = [choice.label.lower().replace(' ', '') for choice in Respondent.District]
+    sex_labels = [choice.label.lower().replace(' ', '') for choice in Respondent.Sex]
+    age_range_labels = [choice.label.lower().replace(' ', '')  for choice in Respondent.AgeRanges]
+    kp_type_labels = [choice.label.lower().replace(' ', '')  for choice in KeyPopulation.KeyPopulations]
+    dis_labels = [dis.label.lower().replace(' ', '')  for dis in DisabilityType.DisabilityTypes]
+    auto_attr = [RespondentAttributeType.Attributes.PLWHIV, RespondentAttributeType.Attributes.KP, RespondentAttributeType.Attributes.PWD]
+    special_attribute_labels = [attr.label.lower().replace(' ', '') for attr in RespondentAttributeType.Attributes if attr not in auto_attr]
+    
+    #helper for getting verbose name used in template
+    def get_verbose(field_name):
+        return Respondent._meta.get_field(field_name).verbose_name
+    
+    #helper for checking respondent columns
+    def expect_column(field_name, options=None, multiple=False):
+        verbose = get_verbose(field_name)
+        if verbose in headers:
+            if options:
+                headers[verbose]['options'] = options
+            headers[verbose]['multiple'] = multiple
+        else:
+            errors.append(f"Template is missing {verbose} column.")
+    
+    # make sure that all the required columns are present. If its missing one, the template was tampered with
+    # and is not valid
+
+    expect_column('id_no')
+    expect_column('first_name')
+    expect_column('last_name')
+    expect_column('age_range', options=age_range_labels)
+    expect_column('dob')
+    expect_column('sex', options = sex_labels)
+    expect_column('ward')
+    expect_column('village')
+    expect_column('district', options=district_labels)
+    expect_column('citizenship')
+    expect_column('email')
+    expect_column('phone_number')
+    expect_column('kp_status', options=kp_type_labels, multiple=True)
+    expect_column('disability_status', options=dis_labels, multiple=True) 
+    expect_column('special_attribute', options=special_attribute_labels, multiple=True)
+
+    if not 'Date of Interaction' in headers:
+        errors.append('Template is missing Date of Interaction column.')
+    if not 'Interaction Location' in headers:
+        errors.append('Template is missing Interaction Location column.')
+    if not 'HIV Status' in headers:
+        errors.append('Template is missing HIV Status column.')
+    if not 'Date Positive' in headers:
+        errors.append('Template is missing Date Positive column.')
+    if not 'Pregnancy Began (Date)' in headers:
+        errors.append('Template is missing Pregnant Began column.')
+    if not 'Pregnancy Ended (Date)' in headers:
+        errors.append('Template is missing Pregnant Ended column.')
+    
+    metadata_ws = wb['Metadata']
+
+    #helper to pull column based on indicator name/type
+    def get_indicator_column(indicator, option=None, stmt=None):
+        header = indicator.name
+        if indicator.type in [Indicator.Type.MULTI, Indicator.Type.MULTINT]:
+            header = f'{indicator.name}: {option} ({stmt})'
+        elif indicator.type == Indicator.Type.INT:
+            header = header + ' (Enter a Number)'
+        elif indicator.type == Indicator.Type.SINGLE:
+            header = header + ' (Select One)'
+        header = headers.get(header)
+        if header:
+            return header['column']
+        return None
+    
+    #tracker to help when creating errors
+    indicator_columns = {}
+    
+    cell = metadata_ws[f'B2']  #task_id location
+    task = None
+    #check perms
+    try:
+        task_id = int(cell.value)
+    except (TypeError, ValueError):
+        errors.append(f"Task ID in metadata sheet cell B2 must be numeric.")
+    if task_id:
+        task = Task.objects.filter(id=task_id).select_related('organization').first()
+    if not task:
+        errors.append(f"Task with ID {task_id} not found in metadata.")
+    if str(task.organization_id) != str(org_id):
+        errors.append("This task does not belong to this organization.")
+    if not task.assessment:
+        errors.append("This template is only valid for assessments.")
+    # Role-based permissions
+    if user.role != 'admin':
+        if task.organization != user.organization and not ProjectOrganization.objects.filter(
+            parent_organization=user.organization,
+            project_id=task.project_id,
+            organization_id=org_id
+        ).exists():
+            raise PermissionDenied("You do not have permission to use this template.")
+
+    #make sure each indicator is here
+    for indicator in Indicator.objects.filter(assessment=task.assessment).all():
+        if indicator.type in [Indicator.Type.MULTI, Indicator.Type.MULTINT]:
+            #if its a multi/multint, check that a column for each option is there
+            options = Option.objects.filter(indicator=indicator.match_options) if indicator.match_options else Option.objects.filter(indicator=indicator)
+            #append helper text
+            stmt = stmt = 'Select All That Apply' if indicator.type == Indicator.Type.MULTI else 'Enter a Number'
+            for option in options.all():
+                col = get_indicator_column(indicator, option, stmt)
+                if not col:
+                    errors.append(f'Missing column "{indicator.name}: {option.name} {stmt}"')
+                col = get_indicator_column(indicator, option, stmt)
+                indicator_columns[str(indicator.id)] = col
+        else:
+            #otherwise there should only be one column (still get helper text)
+            suffix = (
+                " (Select One)" if indicator.type == Indicator.Type.SINGLE else
+                " (Enter a Number)" if indicator.type == Indicator.Type.INT else
+                ""
+            )
+            col = get_indicator_column(indicator)
+            if not col:
+                errors.append(f'Missing column "{indicator.name}{suffix}"')
+            indicator_columns[str(indicator.id)] = col
+
+    
+    #gets a specific cell value based on a field
+    def get_cell_value(row, field_name):
+        header = headers.get(get_verbose(field_name))
+        if header:
+            return row[header['column'] - 1]
+        return None
+
+    #gets a column position based on a respondent field
+    def get_column(field_name):
+        header = headers.get(get_verbose(field_name))
+        if header:
+            return header['column']
+        return None
+    
+    #gets indicator value from a row/indicator (plus option/statement for multiselect/multint)
+    def get_indicator_value(row, indicator, option=None, stmt=None):
+        header = indicator.name
+        if indicator.type in [Indicator.Type.MULTI, Indicator.Type.MULTINT]:
+            header = f'{indicator.name}: {option} ({stmt})'
+        elif indicator.type == Indicator.Type.INT:
+            header = header + ' (Enter a Number)'
+        elif indicator.type == Indicator.Type.SINGLE:
+            header = header + ' (Select One)'
+        header = headers.get(header)
+        if header:
+            return row[header['column'] - 1]
+        return None
+
+    def get_options(field_name):
+        header = headers.get(get_verbose(field_name))
+        if header:
+            return header['options']
+        return []
+    
+    if len(errors) > 0:
+        return {'errors': errors, 'warnings': warnings,  }, status.HTTP_400_BAD_REQUEST
+    
+    #track both new and existing respondents as we're going through each row
+    created = []
+    existing = []
+
+    #loop through each row and collect/validate the data
+    for i, row in enumerate(ws.iter_rows(min_row=2, values_only=True), start=2):
+        respondent = None
+
+        #set unique array for tracking row errors/warnings
+        row_errors = []
+        row_warnings = []
+
+        anon = is_truthy(get_cell_value(row, 'is_anonymous'))
+
+        #check if this respondent already exists (mathcing id_no)
+        id_no = get_cell_value(row, 'id_no') or None
+        if id_no and not anon:
+            respondent = Respondent.objects.filter(id_no=id_no).first()
+
+        #make sure first_name/last_name are present if respondent is not anonymous
+        first_name = get_cell_value(row, 'first_name') or None
+        last_name = get_cell_value(row, 'last_name') or None
+
+        if not anon and not first_name:
+            row_errors.append(f"Respondent at column: {get_column('first_name')}, row: {i} requires a first name.")
+        if not anon and not last_name:
+            row_errors.append(f"Respondent at column: {get_column('last_name')}, row: {i} requires a last name.")
+
+        #check that dob is present for non-anons and is a valid date
+        dob = get_cell_value(row, 'dob') or None
+        if anon:
+            dob = None
+        else:
+            if dob:
+                parsed = valid_excel_date(dob)
+                if not parsed:
+                    row_errors.append(f"Date of birth {dob} at column: {get_column('dob')}, row: {i} is invalid. Double check the format and make sure that it is not in the future")
+                dob = parsed
+            else:
+                row_errors.append(f"Date of birth at column: {get_column('dob')}, row: {i} is required for non-anonymous respondents.")
+        
+        #check that sex is  a valid value
+        sex = get_cell_value(row, 'sex')
+        if sex:
+            sex=sex.lower().replace(' ', '')
+            if not sex in get_options('sex'):
+                row_errors.append(f"Sex at column: {get_column('sex')}, row: {i} is not a valid choice.")
+        else:
+            row_errors.append(f"Sex at column: {get_column('sex')}, row: {i} is required.")
+        
+        #check that age range is present for anons (ignore for non-anons since we alread have the DOB)
+        age_range = get_cell_value(row, 'age_range')
+        if anon:
+            if age_range:
+                age_range = age_range.lower().replace(' ', '')
+                if not age_range in get_options('age_range'):
+                    row_errors.append(f"Age Range value at column: {get_column('age_range')}, row: {i} is not a valid choice.")
+            else:
+                row_errors.append(f"Age range at column: {get_column('sex')}, row: {i} is required for anonymous respondents.")
+        
+        #get ward, optional
+        ward = get_cell_value(row, 'ward') or None
+        
+        #get village and district (required, district must match a value)
+        village = get_cell_value(row, 'village') or None
+        if not village:
+            row_errors.append(f"Village at column: {get_column('village')}, row: {i} is required for all respondents.")
+
+        district = get_cell_value(row, 'district') or None
+        if district:
+            district = district.lower().replace(' ', '')
+            if not district in get_options('district'):
+                row_errors.append(f"District at column: {get_column('district')}, row: {i} is not a valid choice.")
+        else:
+            row_errors.append(f"District at column: {get_column('district')}, row: {i} is required.")
+        
+        #get the citizenship, if left blank, assume they are a citizen but throw a warning to make sure
+        citizenship = get_cell_value(row, 'citizenship') or None
+        if not citizenship:
+            citizenship = 'BW'
+            row_warnings.append(f"Citizenship at column: {get_column('citizenship')}, row: {i} is required for all respondents. This value will default to BW. If this is incorrect, please check this field again.")
+        #if not blank, verify a proper country name was provided
+        else:
+            try:
+                citizenship = pycountry.countries.lookup(citizenship).alpha_2
+            except LookupError:
+                row_errors.append(f"Citizenship {citizenship} at column: {get_column('citizenship')}, row: {i} is not a valid country name/code.")
+        
+        #get/validate email and phone if provided
+        email = get_cell_value(row, 'email') or None
+        if email and not is_email(email):
+            row_warnings.append(f"Email at column: {get_column('email')}, row: {i} is not a valid format.")
+            email = None
+        phone_number = get_cell_value(row, 'phone_number') or None
+        if phone_number and not is_phone_number(phone_number):
+            row_warnings.append(f"Phone Number at column: {get_column('phone_number')}, row: {i} is not a valid format.")
+            phone_number = None
+
+        #get choice from label for respondent fields
+        def get_choice_key_from_label(choices, label):
+            if not label:
+                return None
+            for key, value in choices:
+                if value.lower().replace(' ', '') == label.lower().replace(' ', ''):
+                    return key
+            return None
+        
+        #validate that the correct options were provided
+        sex = get_choice_key_from_label(Respondent.Sex.choices, sex)
+        district = get_choice_key_from_label(Respondent.District.choices, district)
+        if age_range and not dob:
+            age_range = get_choice_key_from_label(Respondent.AgeRanges.choices, age_range)
+        elif dob:
+            age_range = None
+
+        #validate our m2m fields
+        kp_types = []
+        kp_status_names_raw = get_cell_value(row, 'kp_status') or ''
+        if kp_status_names_raw:
+            # Clean and split
+            cleaned = kp_status_names_raw.replace(' ', '').lower()
+            input_kp_names = set(re.split(r'[,:;]', cleaned))
+
+            valid_labels = get_options('kp_status')
+            valid_lookup = {label.replace(' ', '').lower(): label for label in valid_labels}
+
+            matched = [name for name in input_kp_names if name in valid_lookup]
+            invalid_kp = input_kp_names - set(matched)
+
+            if invalid_kp:
+                row_warnings.append(
+                    f"Invalid key population statuses at row {i}: {', '.join(invalid_kp)}"
+                )
+            for cleaned_name in matched:
+                key = get_choice_key_from_label(KeyPopulation.KeyPopulations.choices, cleaned_name)
+                if not key:
+                    continue
+                kp, _ = KeyPopulation.objects.get_or_create(name=key)
+                kp_types.append(kp)
+
+        disability_types = []
+        disability_status_names_raw = get_cell_value(row, 'disability_status') or ''
+        if disability_status_names_raw:
+            # Clean and split
+            cleaned = disability_status_names_raw.replace(' ', '').lower()
+            input_disability_names = set(re.split(r'[,:;]', cleaned))
+
+            valid_labels = get_options('disability_status')
+            valid_lookup = {label.replace(' ', '').lower(): label for label in valid_labels}
+
+            matched = [name for name in input_disability_names if name in valid_lookup]
+            invalid_disability = input_disability_names - set(matched)
+
+            if invalid_disability:
+                row_warnings.append(
+                    f"Invalid disability statuses at row {i}: {', '.join(invalid_disability)}"
+                )
+            
+            for cleaned_name in matched:
+                key = get_choice_key_from_label(DisabilityType.DisabilityTypes.choices, cleaned_name)
+                if not key:
+                    continue
+                dis, _ = DisabilityType.objects.get_or_create(name=key)
+                disability_types.append(dis)
+
+        special_attr_names_raw = get_cell_value(row, 'special_attribute') or ''
+        attr_types = []
+        if special_attr_names_raw:
+            # Clean and split
+            cleaned = special_attr_names_raw.replace(' ', '').lower()
+            input_attr_names = set(re.split(r'[,:;]', cleaned))
+
+            valid_labels = get_options('special_attribute')
+            valid_lookup = {label.replace(' ', '').lower(): label for label in valid_labels}
+
+            matched = [name for name in input_attr_names if name in valid_lookup]
+            invalid_attr = input_attr_names - set(matched)
+
+            if invalid_attr:
+                row_warnings.append(
+                    f"Invalid respondent attribute at row {i}: {', '.join(invalid_attr)}"
+                )
+            
+            for cleaned_name in matched:
+                key = get_choice_key_from_label(RespondentAttributeType.Attributes.choices, cleaned_name)
+                if not key:
+                    continue
+                attr, _ = RespondentAttributeType.objects.get_or_create(name=key)
+                attr_types.append(attr)
+
+        #get/validate HIV Status cols
+        hs_col = headers['HIV Status']['column']-1 
+        hiv_status = row[hs_col] if len(row) > hs_col else None
+        dp_col = headers['Date Positive']['column']-1 
+        date_positive = row[dp_col] if len(row) > dp_col else None
+        if hiv_status:
+            if hiv_status.lower().replace(' ', '') == 'hivpositive':
+                hiv_status = True
+                if not date_positive:
+                    row_warnings.append(f"HIV Status at row {i} does not have a date positive. We will automatically set the date as today. Please double check this entry.")
+                    date_positive = date.today()
+                parsed = valid_excel_date(date_positive)
+                if not parsed:
+                    row_errors.append(
+                        f"Date positive '{date_positive}' at column: {dp_col}, row: {i} is invalid."
+                        "Double check the format and make sure that it is not in the future."
+                    )
+                else:
+                    date_positive = parsed
+            else:
+                hiv_status=None
+                date_positive = None
+        else:
+            hiv_status = None
+            date_positive = None
+        
+        #get/validate pregnancy term_began/term_ended cols
+        tb_col = headers['Pregnancy Began (Date)']['column']-1 
+        term_began = row[tb_col] if len(row) > tb_col else None
+        te_col = headers['Pregnancy Ended (Date)']['column']-1 
+        term_ended = row[te_col] if len(row) > te_col else None
+        if not term_ended and not term_began:
+            term_ended = None
+            term_began = None
+        else:
+            if term_ended and not term_began:
+                row_errors.append(
+                        f"Pregnancy at row {i} requires a start date."
+                    )
+            else:
+                if term_began:
+                    parsed = valid_excel_date(term_began)
+                    if not parsed:
+                        row_errors.append(
+                            f"Pregnancy Term Began '{term_began}' at column: {tb_col}, row: {i} is invalid."
+                            "Double check the format and make sure that it is not in the future."
+                        )
+                    else:
+                        term_began = parsed
+                    if term_ended:
+                        parsed = valid_excel_date(term_ended)
+                        if not parsed:
+                            row_errors.append(
+                                f"Pregnancy Term Began '{term_began}' at column: {tb_col}, row: {i} is invalid."
+                                "Double check the format and make sure that it is not in the future."
+                            )
+                        else:
+                            term_ended = parsed
+                    else:
+                        term_ended = None
+        
+        #if there are any errors up to this point, the user needs to verify the respondent before any any data is recorded
+        if len(row_errors) > 0:
+            row_errors.append("This respondent and their interactions will not be saved until these errors are fixed")
+            errors.extend(row_errors)
+            warnings.extend(row_warnings)
+            continue
+        
+        #mock a request so the Respondent serializer can take us the rest of the way
+        class FakeRequest:
+            def __init__(self, user):
+                self.user = user
+
+        def process_row(row_data, request_user):
+            serializer = RespondentSerializer(data=row_data, context={"request": FakeRequest(request_user)})
+            if serializer.is_valid():
+                respondent = serializer.save()
+                return respondent, None
+            else:
+                return None, serializer.errors
+        
+        #append the created data to our master list if new 
+        if not respondent:
+            respondent_data = upload = {
+                'id_no': id_no,
+                'is_anonymous': anon,
+                'first_name': first_name,
+                'last_name': last_name,
+                'ward': ward,
+                'village': village,
+                'district': district,
+                'sex': sex,
+                'dob': dob,
+                'age_range' : age_range,
+                'citizenship': citizenship,
+                'email': email,
+                'phone_number': phone_number,
+                'kp_status_names': [kp.name for kp in kp_types],
+                'disability_status_names': [d.name for d in disability_types],
+                'special_attribute_names': [attr.name for attr in attr_types],
+                'hiv_status_data': {'hiv_positive': hiv_status, 'date_positive': date_positive},
+                'pregnancy_data': [{'term_began': term_began, 'term_ended': term_ended}],
+            }
+            respondent, err = process_row(respondent_data, user)
+            if err:
+                row_errors.append({"row": i + 1, "errors": err})
+            else:
+                created.append(respondent)
+        #if existing append them to the existing list, we'll use this later in the frontend to compare users
+        else:
+            ex_stat = HIVStatus.objects.filter(respondent=respondent).first()
+            upload = {
+                'is_anonymous': anon,
+                'first_name': first_name,
+                'last_name': last_name,
+                'ward': ward,
+                'village': village,
+                'district': district,
+                'sex': sex,
+                'dob': dob,
+                'age_range' : age_range,
+                'citizenship': citizenship,
+                'email': email,
+                'phone_number': phone_number,
+                'kp_status_names': sorted([kp.name for kp in kp_types]),
+                'disability_status_names': sorted([d.name for d in disability_types]),
+                'special_attribute_names': sorted([attr.name for attr in attr_types]),
+                'hiv_status_data': {'hiv_positive': hiv_status, 'date_positive': date_positive},
+                'pregnancy_data': [{'term_began': term_began, 'term_ended': term_ended}],
+            }
+            auto_attr = [RespondentAttributeType.Attributes.PLWHIV, RespondentAttributeType.Attributes.KP, RespondentAttributeType.Attributes.PWD]
+            in_db = {
+                'is_anonymous': respondent.is_anonymous,
+                'first_name': respondent.first_name,
+                'last_name': respondent.last_name,
+                'ward': respondent.ward,
+                'village': respondent.village,
+                'district': respondent.district,
+                'sex': respondent.sex,
+                'dob': respondent.dob,
+                'age_range' : respondent.age_range,
+                'citizenship': respondent.citizenship,
+                'email': respondent.email,
+                'phone_number': respondent.phone_number,
+                'kp_status_names': sorted([kp.name for kp in respondent.kp_status.all()]),
+                'disability_status_names': sorted([d.name for d in respondent.disability_status.all()]),
+                'special_attribute_names': sorted([
+                    attr.name for attr in respondent.special_attribute.all()
+                    if getattr(attr, 'name', None) not in auto_attr   # adjust field name if needed
+                ]),
+                'hiv_status_data': {'hiv_positive': ex_stat.hiv_positive if ex_stat else None, 'date_positive': ex_stat.date_positive if ex_stat else None},
+            }
+            # Remove pregnancy before comparing to prevent potential conflicts since the formats differ
+            upload_preg = upload.pop('pregnancy_data', None)
+            if not anon:
+                in_db['age_range'] = None
+
+            #if there are any changes from the one in the db, add the val to existing so the user can determine what to do next
+            if upload != in_db:
+                existing.append({'id': respondent.id, 'upload': upload, 'in_database': in_db})
+
+        #get date of interaction and make sure its legit
+        doi_col = headers['Date of Interaction']['column']-1 
+        interaction_date = row[doi_col] if len(row) > doi_col else None
+        #validate interaction date
+        if interaction_date:
+            parsed = valid_excel_date(interaction_date)
+            if not parsed:
+                row_errors.append(
+                    f"Date of interaction '{interaction_date}' at column: {doi_col}, row: {i} is invalid. "
+                    "Double check the format and make sure that it is not in the future."
+                )
+            interaction_date = parsed
+        else:
+            row_errors.append(
+                f"Date of interaction at column: {doi_col}, row: {i} is required. "
+            )
+        loc_col = headers['Interaction Location']['column']-1 
+
+        comments = get_cell_value(row, 'comments') or None #get interaction comments
+        
+        #make sure a location is provided
+        interaction_location = row[loc_col] if len(row) > loc_col else None
+        if not interaction_location:
+            row_errors.append(
+                f"Date of location at column: {doi_col}, row: {i} is required. "
+            )
+        
+        #any errors with date/location, don't record any interactions until its fixed
+        if len(row_errors) > 0:
+            row_errors.append(f"This respondent has been saved, but none of their interactions will until this date is fixed.")
+            errors.extend(row_errors)
+            warnings.extend(row_warnings)
+            continue
+        
+        #otherwise, loop throught the task columns
+        
+        response_data = {}
+        for indicator in Indicator.objects.filter(assessment=task.assessment).order_by('order'):
+            col = get_indicator_column(indicator)
+            val = str(get_indicator_value(row, indicator)).lower().replace(' ', '') if indicator.type != Indicator.Type.TEXT else str(get_indicator_value(row, indicator))
+            #for multi, loop through each col and combine the valid vals into an array
+            if indicator.type == Indicator.Type.MULTI:
+                val = []
+                for option in Option.objects.filter(indicator=indicator) if not indicator.match_options else Option.objects.filter(indicator=indicator.match_options):
+                    col = get_indicator_column(indicator, option, 'Select All That Apply')
+                    o_val = str(get_indicator_value(row, indicator, option, 'Select All That Apply'))
+                    o_val = o_val.lower().replace(' ', '')
+                    if o_val in ['', 'no', 'none', 'na', 'n/a', 'false', 'unsure', 'maybe']:
+                        continue
+                    val.append(option.id)
+                if len(val) == 0 and indicator.allow_none:
+                    val = ['none']
+            #for multint, create a list with value/optionid from each column
+            elif indicator.type == Indicator.Type.MULTINT:
+                val = []
+                for option in Option.objects.filter(indicator=indicator):
+                    col = get_indicator_column(indicator, option, 'Enter a Number')
+                    o_val = str(get_indicator_value(row, indicator, option, 'Enter a Number'))
+                    o_val = o_val.lower().replace(' ', '')
+                    try:
+                        numeric_component = int(o_val)
+                        if numeric_component < 0:
+                            row_warnings.append(f'Number at column: {col}, row: {i} must be greater than 0.')
+                            continue
+                        val.append({'option': option.id, 'value': numeric_component})
+                    except (ValueError, TypeError):
+                        row_warnings.append(f'Number at column: {col}, row: {i} is not a valid number.')
+                        continue   
+            #grab the option text and make sure its readable
+            elif indicator.type == Indicator.Type.SINGLE:
+                if val in ['none', '', None] and indicator.allow_none:
+                    val == 'none'
+                elif val in ['', 'none', 'na', 'n/a', 'unsure', 'maybe']:
+                    continue
+                else:
+                    valid_map = {
+                        o.name.lower().replace(' ', ''): o.id
+                        for o in Option.objects.filter(indicator=indicator).all()
+                    }
+                    if val not in valid_map:
+                        row_warnings.append(
+                            f'Could not parse value "{val}" at column: {col}, row: {i}. Please enter a valid option.'
+                        )
+                        continue
+                    else:
+                        val = valid_map[val]
+                        print(val)
+
+            #get the value in yes/no or adjacent and convert to boolean
+            elif indicator.type == Indicator.Type.BOOL:
+                if val in ['yes', 'true', '1']:
+                    val = True
+                elif val in ['no', 'false', '0']:
+                    val = False
+                elif val in ['', 'none', 'na', 'n/a', 'unsure', 'maybe']:
+                    continue
+                else:
+                    row_warnings.append(f'Could not parse value at column: {col}, row: {i}. Please enter "yes" or "no".')
+                    continue
+            #verify its a number
+            elif indicator.type == Indicator.Type.INT:
+                if val in ['', 'none', 'na', 'n/a', 'unsure', 'maybe']:
+                    continue
+                try:
+                    numeric_component = int(val)
+                    if numeric_component < 0:
+                        row_warnings.append(f'Number at column: {col}, row: {i} must be greater than 0.')
+                        continue
+                except (ValueError, TypeError):
+                    row_warnings.append(f'Number at column: {col}, row: {i} is not a valid number.')
+                    continue
+            else:
+                if val in ['', 'None',]:
+                    continue
+            
+            response_data[str(indicator.id)] = { 'value': val }
+
+        #to check for duplicates, so repeat uploads to fix mistakes don't recreate interactions
+        lookup_fields = {
+            'respondent': respondent,
+            'interaction_date': interaction_date,
+            'task': task,
+        }
+
+        # Try to fetch the existing interaction
+        instance = Interaction.objects.filter(**lookup_fields).first()
+
+        # Pass instance to serializer if it exists (update), otherwise it will create, let it take us the rest of the way
+        serializer = InteractionSerializer(
+            instance=instance,
+            data={
+                'respondent_id': respondent.id,
+                'interaction_date': interaction_date,
+                'interaction_location': interaction_location,
+                'task_id': task.id,
+                'response_data': response_data,
+                'comments': comments,
+            },
+            context={'request': FakeRequest(user), 'respondent': respondent}
+        )
+        try:
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        except ValidationError as e:
+            # Flatten error details for easier reading
+            error_details = serializer.errors
+            details = error_details.get("details", {})
+            indicator_id = str(details.get("indicator_id", "?"))  # convert to str so we can find the col in our map
+            col = indicator_columns.get(indicator_id, "?")
+            print(error_details)
+            for field, msgs in error_details.items():
+                if field == "details":
+                    continue  # skip metadata key
+                if isinstance(msgs, list):
+                    for msg in msgs:
+                        row_errors.append(f"Row {i}, Column {col}, {str(msg)}")
+                else:
+                    row_errors.append(f"Row {i}, Column {col}, {str(msgs)}")
+        
+        #push our row errors to the main append
+        errors.extend(row_errors)
+        warnings.extend(row_warnings)
+    print('warnings', warnings)
+    print('errors', errors)
+    #wow, you made it. Congrats!
+    return {'errors': errors, 'warnings': warnings, 'created': len(created), 'conflicts': existing }, status.HTTP_200_OK
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.2 on 2026-10-17 01:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_open_flags(apps, schema_editor):
+    '''
+    Backfill has_open_flags for objects that already have unresolved flags.
+    '''
+    Flag = apps.get_model('flags', 'Flag')
+    for model_name in ['socialmediapost']:
+        model = apps.get_model('social', model_name)
+        flagged = Flag.objects.filter(
+            content_type__app_label='social', content_type__model=model_name, resolved=False
+        ).values_list('object_id', flat=True)
+        model.objects.filter(id__in=flagged).update(has_open_flags=True)
+
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flags', '0002_alter_flag_reason_type'),
+        ('organizations', '0006_organization_description'),
+        ('projects', '0025_alter_target_related_to'),
+        ('social', '0006_socialmediapost_organization'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='socialmediapost',
+            name='has_open_flags',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='socialmediapost',
+            index=models.Index(condition=models.Q(('has_open_flags', False)), fields=['published_at'], name='post_unflagged_idx'),
+        ),
+        migrations.RunPython(mark_open_flags, migrations.RunPython.noop),
+    ]
@@ -2,13 +2,14 @@ from django.db import models
 from django.utils.translation import gettext_lazy as _
 from django.core.exceptions import ValidationError
 from django.contrib.contenttypes.fields import GenericRelation
+from flags.models import OpenFlagsMixin
 
 from django.contrib.auth import get_user_model
 User = get_user_model()
 from projects.models import Task
 from organizations.models import Organization
 
-class SocialMediaPost(models.Model):
+class SocialMediaPost(OpenFlagsMixin, models.Model):
     '''
     Post for recording social media data. Is linked to one or more tasks (if indicator is of the social type)
     and will contribute to targets.
@@ -45,6 +46,7 @@ class SocialMediaPost(models.Model):
     link_to_post = models.URLField(blank=True)
     published_at = models.DateField(blank=True, null=True)
     flags = GenericRelation('flags.Flag', related_query_name='flags')
+    has_open_flags = models.BooleanField(default=False) #kept in sync with flags by flags/signals, used to exclude flagged data from analysis
 
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -53,6 +55,10 @@ class SocialMediaPost(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            #analysis only reads unflagged posts
+            models.Index(fields=['published_at'], condition=models.Q(has_open_flags=False), name='post_unflagged_idx'),
+        ]
 
     def clean(self):
         super().clean()
@@ -13,6 +13,7 @@ from users.restrictviewset import RoleRestrictedViewSet
 from social.models import SocialMediaPost
 from social.serializers import SocialMediaPostSerializer
 from projects.models import ProjectOrganization
+from projects.utils import get_org_scope
 from respondents.utils import get_enum_choices
 
 class SocialMediaPostViewSet(RoleRestrictedViewSet):
@@ -38,9 +39,7 @@ class SocialMediaPostViewSet(RoleRestrictedViewSet):
             base_q = Q(organization=user.organization)
 
             # Child-host relationships (parent-child link within a project)
-            project_child_rels = ProjectOrganization.objects.filter(
-                parent_organization=user.organization
-            )
+            project_child_rels = get_org_scope(user).child_links()
 
             # Posts for a child_org scoped to correct projects but project comes via tasks
             child_host_task_q = Q(
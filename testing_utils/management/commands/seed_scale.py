@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from testing_utils.scale import seed_scale
+
+class Command(BaseCommand):
+    '''
+    Fills the database with a generated dataset of a given size (projects, an organization hierarchy, an assessment
+    with logic, respondents and their statuses, interactions/responses, aggregate counts, events, social posts, and
+    flags) for load testing. See [../../scale.py]. Never run this against production.
+    '''
+    help = 'Generate a large synthetic dataset for performance testing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--respondents', type=int, default=1000, help='Number of respondents to create.')
+        parser.add_argument('--interactions', type=int, default=3000, help='Number of interactions to create.')
+        parser.add_argument('--organizations', type=int, default=12, help='Number of organizations to create.')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed, so runs are comparable.')
+
+    def handle(self, *args, **options):
+        result = seed_scale(
+            respondents=options['respondents'], interactions=options['interactions'],
+            organizations=options['organizations'], seed=options['seed'], stdout=self.stdout
+        )
+        counts = ', '.join(f'{count} {name}' for name, count in result['counts'].items())
+        self.stdout.write(self.style.SUCCESS(f'Created {counts}. Log in as {result["user"].username} (set a password first).'))
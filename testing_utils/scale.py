@@ -0,0 +1,301 @@
+import random
+import uuid
+from datetime import date, timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+
+from organizations.models import Organization
+from projects.models import Project, Task, Client, ProjectOrganization
+from indicators.models import Indicator, Assessment, Option, LogicCondition, LogicGroup
+from respondents.models import (
+    Respondent, Interaction, Response, KeyPopulation, KeyPopulationStatus, DisabilityType, DisabilityStatus, HIVStatus, Pregnancy
+)
+from aggregates.models import AggregateGroup, AggregateCount
+from events.models import Event, EventTask, EventOrganization
+from social.models import SocialMediaPost, SocialMediaPostTasks
+from flags.models import Flag
+from flags.utils import get_open_flag_models, check_open_flags
+from analysis.utils.facts import rebuild_response_facts
+User = get_user_model()
+
+'''
+Generates a realistic dataset of any size for measuring how the analysis/upload endpoints scale (see
+manage.py seed_scale and analysis/benchmarks/endpoints.py). Everything past the setup (projects, organizations,
+the assessment) is written with bulk_create, which skips the signals that keep the flag markers, response facts
+and rollups in sync, so those are repaired/rebuilt once at the end instead.
+
+The data is random but seeded, so two runs with the same arguments create the same shape of data.
+'''
+
+PROJECT_START = date(2024, 1, 1)
+PROJECT_END = date(2025, 12, 31)
+BATCH_SIZE = 5000
+
+def random_date(rng, start=PROJECT_START, end=PROJECT_END):
+    return start + timedelta(days=rng.randint(0, (end - start).days))
+
+def quarter_bounds():
+    '''
+    Returns (start, end) for each quarter in the seeded projects.
+    '''
+    bounds = []
+    for year in range(PROJECT_START.year, PROJECT_END.year + 1):
+        for quarter in range(4):
+            start = date(year, quarter * 3 + 1, 1)
+            end = date(year + (quarter == 3), (quarter * 3 + 3) % 12 + 1, 1) - timedelta(days=1)
+            bounds.append((start, end))
+    return bounds
+
+def write(stdout, message):
+    if stdout:
+        stdout.write(message)
+
+def create_setup(label, organizations, rng):
+    '''
+    Creates the client, projects, organization hierarchy (one parent for every three children), an assessment
+    covering each indicator type with logic, standalone indicators, and the tasks linking them together.
+    '''
+    client = Client.objects.create(name=f'{label} Client')
+    projects = [
+        Project.objects.create(
+            name=f'{label} Project {i + 1}', client=client, status=Project.Status.ACTIVE, start=PROJECT_START, end=PROJECT_END
+        ) for i in range(2)
+    ]
+    orgs = [Organization.objects.create(name=f'{label} Organization {i + 1}') for i in range(max(organizations, 2))]
+    parents = orgs[:max(1, len(orgs) // 4)]
+    children = orgs[len(parents):]
+    for project in projects:
+        ProjectOrganization.objects.bulk_create(
+            [ProjectOrganization(project=project, organization=org) for org in parents] +
+            [ProjectOrganization(project=project, organization=org, parent_organization=parents[i % len(parents)]) for i, org in enumerate(children)]
+        )
+
+    assessment = Assessment.objects.create(name=f'{label} Assessment')
+    multi = Indicator.objects.create(name='Screened For', type=Indicator.Type.MULTI, assessment=assessment, required=True, allow_aggregate=True, order=0)
+    multi_options = [Option.objects.create(name=name, indicator=multi) for name in ['BMI', 'Blood Pressure', 'Blood Glucose']]
+    #only shown if something was selected above, and can only use the options that were
+    referred = Indicator.objects.create(name='Referred For', type=Indicator.Type.MULTI, assessment=assessment, match_options=multi, order=1)
+    group = LogicGroup.objects.create(indicator=referred, group_operator=LogicGroup.Operator.AND)
+    LogicCondition.objects.create(
+        group=group, source_type=LogicCondition.SourceType.ASS, source_indicator=multi,
+        condition_type=LogicCondition.ExtraChoices.ANY, operator=LogicCondition.Operator.EQUALS
+    )
+    single = Indicator.objects.create(name='Screening Type', type=Indicator.Type.SINGLE, assessment=assessment, required=True, order=2)
+    single_options = [Option.objects.create(name=name, indicator=single) for name in ['Type A', 'Type B']]
+    number = Indicator.objects.create(name='Number of Sessions', type=Indicator.Type.INT, assessment=assessment, required=True, allow_aggregate=True, order=3)
+    boolean = Indicator.objects.create(name='Received Materials', type=Indicator.Type.BOOL, assessment=assessment, order=4)
+
+    standalone = {
+        category: Indicator.objects.create(name=f'{label} {category}', category=category, allow_aggregate=category == Indicator.Category.MISC)
+        for category in [Indicator.Category.EVENTS, Indicator.Category.ORGS, Indicator.Category.SOCIAL, Indicator.Category.MISC]
+    }
+    tasks = {}
+    for project in projects:
+        for org in orgs:
+            tasks[(project.id, org.id, None)] = Task(project=project, organization=org, assessment=assessment)
+            for category, indicator in standalone.items():
+                tasks[(project.id, org.id, category)] = Task(project=project, organization=org, indicator=indicator)
+    Task.objects.bulk_create(tasks.values())
+
+    return {
+        'client': client, 'projects': projects, 'organizations': orgs, 'parents': parents, 'assessment': assessment,
+        'indicators': {'multi': multi, 'referred': referred, 'single': single, 'number': number, 'boolean': boolean, **standalone},
+        'multi_options': multi_options, 'single_options': single_options, 'tasks': tasks,
+    }
+
+def create_respondents(label, n, rng, stdout=None):
+    '''
+    Creates n respondents (mostly anonymous) with KP/disability statuses, HIV statuses, and pregnancies.
+    '''
+    respondents = []
+    for i in range(n):
+        sex = rng.choices(Respondent.Sex.values, weights=[55, 43, 2])[0]
+        anonymous = rng.random() < 0.7
+        respondents.append(Respondent(
+            is_anonymous=anonymous,
+            id_no=None if anonymous else f'{label}-{i}',
+            first_name=None if anonymous else 'Test',
+            last_name=None if anonymous else f'Respondent {i}',
+            dob=None if anonymous else random_date(rng, date(1960, 1, 1), date(2008, 1, 1)),
+            ward=None if anonymous else 'Ward',
+            age_range=rng.choice(Respondent.AgeRanges.values[4:12]),
+            sex=sex,
+            village='Testingplace',
+            district=rng.choice(Respondent.District.values),
+            citizenship='BW' if rng.random() < 0.9 else 'ZA',
+        ))
+    respondents = Respondent.objects.bulk_create(respondents, batch_size=BATCH_SIZE)
+    write(stdout, f'{len(respondents)} respondents')
+
+    kps = [KeyPopulation.objects.get_or_create(name=name)[0] for name in KeyPopulation.KeyPopulations.values]
+    disabilities = [DisabilityType.objects.get_or_create(name=name)[0] for name in DisabilityType.DisabilityTypes.values]
+    kp_statuses, disability_statuses, hiv_statuses, pregnancies = [], [], [], []
+    for respondent in respondents:
+        if rng.random() < 0.2:
+            kp_statuses += [KeyPopulationStatus(respondent=respondent, key_population=kp) for kp in rng.sample(kps, rng.randint(1, 2))]
+        if rng.random() < 0.08:
+            disability_statuses.append(DisabilityStatus(respondent=respondent, disability=rng.choice(disabilities)))
+        if rng.random() < 0.5:
+            positive = rng.random() < 0.3
+            hiv_statuses.append(HIVStatus(respondent=respondent, hiv_positive=positive, date_positive=random_date(rng, date(2015, 1, 1), PROJECT_END) if positive else None))
+        if respondent.sex == Respondent.Sex.FEMALE and rng.random() < 0.1:
+            began = random_date(rng)
+            pregnancies.append(Pregnancy(respondent=respondent, is_pregnant=True, term_began=began, term_ended=began + timedelta(days=270)))
+    KeyPopulationStatus.objects.bulk_create(kp_statuses, batch_size=BATCH_SIZE)
+    DisabilityStatus.objects.bulk_create(disability_statuses, batch_size=BATCH_SIZE)
+    HIVStatus.objects.bulk_create(hiv_statuses, batch_size=BATCH_SIZE)
+    Pregnancy.objects.bulk_create(pregnancies, batch_size=BATCH_SIZE)
+    return respondents
+
+def build_responses(setup, interaction, rng):
+    '''
+    Returns the responses for one interaction (a value for each indicator in the assessment that follows its logic).
+    '''
+    indicators = setup['indicators']
+    day = interaction.interaction_date
+    screened = rng.sample(setup['multi_options'], rng.randint(1, 2))
+    responses = [Response(interaction=interaction, indicator=indicators['multi'], response_option=option, response_date=day) for option in screened]
+    if rng.random() < 0.5:
+        responses.append(Response(interaction=interaction, indicator=indicators['referred'], response_option=screened[0], response_date=day))
+    responses += [
+        Response(interaction=interaction, indicator=indicators['single'], response_option=rng.choice(setup['single_options']), response_date=day),
+        Response(interaction=interaction, indicator=indicators['number'], response_value=str(rng.randint(1, 20)), response_date=day),
+        Response(interaction=interaction, indicator=indicators['boolean'], response_boolean=rng.random() < 0.6, response_date=day),
+    ]
+    return responses
+
+def create_interactions(setup, respondents, n, rng, stdout=None):
+    '''
+    Creates n interactions spread over the respondents and assessment tasks, and their responses, a batch at a time.
+    '''
+    tasks = [task for key, task in setup['tasks'].items() if key[2] is None]
+    total = 0
+    responses = 0
+    for start in range(0, n, BATCH_SIZE):
+        batch = [
+            Interaction(
+                respondent=rng.choice(respondents), task=rng.choice(tasks), interaction_date=random_date(rng), interaction_location='Testingplace'
+            ) for _ in range(min(BATCH_SIZE, n - start))
+        ]
+        batch = Interaction.objects.bulk_create(batch)
+        responses += len(Response.objects.bulk_create(
+            [response for interaction in batch for response in build_responses(setup, interaction, rng)], batch_size=BATCH_SIZE
+        ))
+        total += len(batch)
+        write(stdout, f'{total}/{n} interactions')
+    return total, responses
+
+def create_counts(setup, rng):
+    '''
+    Creates an aggregate group for each project/organization/quarter for the indicators that allow them, split by
+    sex and a few age ranges.
+    '''
+    indicators = [setup['indicators']['number'], setup['indicators'][Indicator.Category.MISC]]
+    groups = AggregateGroup.objects.bulk_create([
+        AggregateGroup(indicator=indicator, organization=org, project=project, start=start, end=end)
+        for indicator in indicators for project in setup['projects'] for org in setup['organizations'] for start, end in quarter_bounds()
+    ], batch_size=BATCH_SIZE)
+    counts = AggregateCount.objects.bulk_create([
+        AggregateCount(group=group, sex=sex, age_range=age_range, value=rng.randint(0, 50))
+        for group in groups for sex in [Respondent.Sex.FEMALE, Respondent.Sex.MALE] for age_range in Respondent.AgeRanges.values[4:7]
+    ], batch_size=BATCH_SIZE)
+    return counts
+
+def create_events(setup, n, rng):
+    '''
+    Creates n events hosted by random organizations, linked to the host's event tasks, with a few participants each.
+    '''
+    events = []
+    for i in range(n):
+        start = random_date(rng)
+        events.append(Event(
+            name=f'Event {i + 1}', host=rng.choice(setup['organizations']), project=rng.choice(setup['projects']),
+            status=Event.EventStatus.COMPLETED if rng.random() < 0.85 else Event.EventStatus.PLANNED,
+            event_type=rng.choice(Event.EventType.values), location='Testingplace', start=start, end=start + timedelta(days=rng.randint(0, 2)),
+        ))
+    events = Event.objects.bulk_create(events, batch_size=BATCH_SIZE)
+    tasks = setup['tasks']
+    EventTask.objects.bulk_create([
+        EventTask(event=event, task=tasks[(event.project_id, event.host_id, category)])
+        for event in events for category in [Indicator.Category.EVENTS, Indicator.Category.ORGS]
+    ], batch_size=BATCH_SIZE)
+    EventOrganization.objects.bulk_create([
+        EventOrganization(event=event, organization=org)
+        for event in events for org in rng.sample(setup['organizations'], min(rng.randint(1, 4), len(setup['organizations'])))
+    ], batch_size=BATCH_SIZE)
+    return events
+
+def create_posts(setup, n, rng):
+    '''
+    Creates n social media posts with metrics, linked to the posting organization's social task.
+    '''
+    posts = []
+    for i in range(n):
+        posts.append(SocialMediaPost(
+            name=f'Post {i + 1}', organization=rng.choice(setup['organizations']), platform=rng.choice(SocialMediaPost.Platform.values[:-1]),
+            likes=rng.randint(0, 500), views=rng.randint(0, 5000), comments=rng.randint(0, 100), reach=rng.randint(0, 10000),
+            published_at=random_date(rng),
+        ))
+    posts = SocialMediaPost.objects.bulk_create(posts, batch_size=BATCH_SIZE)
+    tasks = setup['tasks']
+    SocialMediaPostTasks.objects.bulk_create([
+        SocialMediaPostTasks(post=post, task=tasks[(rng.choice(setup['projects']).id, post.organization_id, Indicator.Category.SOCIAL)])
+        for post in posts
+    ], batch_size=BATCH_SIZE)
+    return posts
+
+def create_flags(objects, share, rng, user):
+    '''
+    Flags a share of a list of objects (about a third of the flags are resolved).
+    '''
+    flags = []
+    for obj in rng.sample(objects, int(len(objects) * share)):
+        resolved = rng.random() < 0.3
+        flags.append(Flag(
+            content_type=ContentType.objects.get_for_model(obj), object_id=obj.id, reason_type=rng.choice(Flag.FlagReason.values),
+            reason='Seeded flag', auto_flagged=rng.random() < 0.5, caused_by=user, created_by=user,
+            resolved=resolved, resolved_reason='Seeded resolution' if resolved else None, resolved_by=user if resolved else None,
+        ))
+    return Flag.objects.bulk_create(flags, batch_size=BATCH_SIZE)
+
+def seed_scale(respondents=1000, interactions=3000, organizations=12, seed=1, stdout=None):
+    '''
+    Creates a dataset with the given number of respondents/interactions (and events, posts, counts, and flags in
+    proportion). Returns a dict with the admin user, the setup objects (projects, organizations, indicators, etc.)
+    and the number of rows created of each type.
+    - respondents (integer, optional): number of respondents
+    - interactions (integer, optional): number of interactions (each has 4-6 responses)
+    - organizations (integer, optional): number of organizations in the hierarchy
+    - seed (integer, optional): random seed so runs are comparable
+    - stdout (stream, optional): write progress here
+    '''
+    rng = random.Random(seed)
+    label = f'Scale {respondents}x{interactions} {uuid.uuid4().hex[:6]}'
+    setup = create_setup(label, organizations, rng)
+    admin = User.objects.create_user(
+        username=label.lower().replace(' ', '_'), password=uuid.uuid4().hex, role='admin', organization=setup['parents'][0]
+    )
+    people = create_respondents(label, respondents, rng, stdout)
+    interaction_count, response_count = create_interactions(setup, people, interactions, rng, stdout)
+    counts = create_counts(setup, rng)
+    events = create_events(setup, max(5, interactions // 50), rng)
+    posts = create_posts(setup, max(5, interactions // 100), rng)
+
+    flag_count = len(create_flags(people, 0.01, rng, admin))
+    flag_count += len(create_flags(list(Interaction.objects.filter(task__assessment=setup['assessment']).only('id')), 0.02, rng, admin))
+    flag_count += len(create_flags(counts, 0.01, rng, admin))
+    flag_count += len(create_flags(posts, 0.02, rng, admin))
+    #bulk_create skips the signals that maintain these, so repair/rebuild them once
+    for model in get_open_flag_models():
+        check_open_flags(model, repair=True)
+    write(stdout, 'rebuilding response facts and rollups')
+    rebuild_response_facts(stdout=stdout)
+
+    return {
+        'user': admin,
+        **setup,
+        'counts': {
+            'respondents': len(people), 'interactions': interaction_count, 'responses': response_count,
+            'aggregate_counts': len(counts), 'events': len(events), 'posts': len(posts), 'flags': flag_count,
+        },
+    }
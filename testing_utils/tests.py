@@ -1,3 +1,26 @@
 from django.test import TestCase
 
-# Create your tests here.
+from respondents.models import Respondent, Interaction, Response
+from analysis.models import ResponseFact
+from flags.models import Flag
+from testing_utils.scale import seed_scale
+from analysis.benchmarks.endpoints import get_benchmarks, time_call
+
+class SeedScaleTest(TestCase):
+    '''
+    Test that the scale generator creates the requested data (with facts built for it) and that every benchmark
+    can run against it.
+    '''
+    def test_seed(self):
+        data = seed_scale(respondents=40, interactions=120, organizations=6)
+        self.assertEqual(Respondent.objects.count(), 40)
+        self.assertEqual(Interaction.objects.count(), 120)
+        self.assertEqual(data['counts']['responses'], Response.objects.count())
+        self.assertEqual(ResponseFact.objects.count(), Response.objects.count())
+        #the flag markers are synced after the bulk insert
+        flagged = Flag.objects.filter(resolved=False, content_type__model='interaction').values_list('object_id', flat=True)
+        self.assertEqual(set(Interaction.objects.filter(has_open_flags=True).values_list('id', flat=True)), set(flagged))
+
+        for name, func in get_benchmarks(data, rows=2):
+            result = time_call(func, repeat=1)
+            self.assertGreater(result['queries'], 0, name)
@@ -11,8 +11,8 @@ from rest_framework import status
 from uploads.models import NarrativeReport
 from uploads.serializers import NarrativeReportSerializer
 from projects.models import ProjectOrganization
+from projects.utils import get_org_scope
 
-from django.db.models import Q
 
 
 
@@ -39,10 +39,7 @@ class NarrativeReportViewSet(viewsets.ModelViewSet):
         if user.role == 'client':
             return NarrativeReport.objects.filter(project__client=user.client_organization)
         elif user.role in ['meofficer', 'manager']:
-            child_orgs = ProjectOrganization.objects.filter(
-                parent_organization=user.organization,
-            ).values_list('organization', flat=True)
-            return NarrativeReport.objects.filter(Q(organization=user.organization) | Q(organization__in=child_orgs))
+            return NarrativeReport.objects.filter(organization__in=get_org_scope(user).org_ids())
         else:
             return NarrativeReport.objects.none()
     